@@ -1,6 +1,14 @@
 import arrow
+import base58
+import copy
+import pickle
+import pytest
+import random
+import time
 from calendar import timegm
 from two1.bitcoin.block import Block
+from two1.bitcoin.block import MerkleTree
+from two1.bitcoin.block import verify_merkle_proof
 from two1.bitcoin.crypto import HDKey
 from two1.bitcoin.crypto import HDPrivateKey
 from two1.bitcoin.crypto import HDPublicKey
@@ -12,9 +20,24 @@ from two1.bitcoin.txn import CoinbaseInput
 from two1.bitcoin.txn import Transaction
 from two1.bitcoin.txn import TransactionInput
 from two1.bitcoin.txn import TransactionOutput
+from two1.bitcoin import crypto
+from two1.bitcoin import utils
+from two1.bitcoin.utils import addresses_from_pubkeys
+from two1.bitcoin.utils import address_to_key_hash
+from two1.bitcoin.utils import b58decode
+from two1.bitcoin.utils import b58decode_check
+from two1.bitcoin.utils import b58encode
+from two1.bitcoin.utils import b58encode_check
+from two1.bitcoin.utils import ByteWriter
 from two1.bitcoin.utils import bytes_to_str
 from two1.bitcoin.utils import difficulty_to_target
+from two1.bitcoin.utils import key_hash_to_address
+from two1.bitcoin.utils import LRUCache
+from two1.bitcoin.utils import pack_compact_int
+from two1.bitcoin.utils import pubkey_to_address
 from two1.bitcoin.utils import target_to_bits
+from two1.bitcoin.utils import unpack_compact_int
+from two1.bitcoin.utils import unpack_compact_int_from
 
 
 def txn_from_json(txn_json):
@@ -175,6 +198,118 @@ def test_utils():
     assert target_to_bits(0x00000000000404CB000000000000000000000000000000000000000000000000) == 0x1b0404cb
 
 
+def test_base58():
+    assert b58encode(b'') == ''
+    assert b58encode(b'\x00\x00\x01') == '112'
+    assert b58encode(b'hello world') == 'StV1DL6CwTryKyV'
+    assert b58decode('StV1DL6CwTryKyV') == b'hello world'
+    assert b58decode('111') == bytes(3)
+    assert key_hash_to_address(bytes(20)) == '1111111111111111111114oLvT2'
+
+    rand = random.Random(3)
+    for n in list(range(40)) + [78, 82]:
+        for zeros in [0, 1, 3]:
+            b = bytes(zeros) + bytes(rand.getrandbits(8) for _ in range(n))
+            assert b58encode(b) == base58.b58encode(b)
+            assert b58encode_check(b) == base58.b58encode_check(b)
+            assert b58decode(b58encode(b)) == b
+            assert b58decode_check(b58encode_check(b)) == b
+
+    with pytest.raises(ValueError):
+        b58decode('1O')
+    with pytest.raises(ValueError):
+        b58decode_check('1111111111111111111114oLvT3')
+    with pytest.raises(ValueError):
+        b58decode_check('1')
+
+
+def test_address_caches():
+    key = PrivateKey(0x1234).public_key
+    utils.address_cache.clear()
+    utils.pubkey_address_cache.clear()
+
+    address = key.address()
+    assert address == key_hash_to_address(key.hash160())
+    assert key.address(testnet=True) == key_hash_to_address(key.hash160(), 0x6f)
+    assert key.address(compressed=False) == key_hash_to_address(key.hash160(False))
+    assert key.address() == address
+    assert utils.pubkey_address_cache.stats.hits == 1
+    assert pubkey_to_address(key.compressed_bytes) == address
+
+    assert address_to_key_hash(address) == (0, key.hash160())
+    assert address_to_key_hash(address) == (0, key.hash160())
+    assert utils.address_cache.stats.hits == 1
+
+    keys = [PrivateKey(i).public_key.compressed_bytes for i in range(1, 6)]
+    assert addresses_from_pubkeys(keys, 0x6f) == [key_hash_to_address(utils.hash160(k), 0x6f) for k in keys]
+    assert addresses_from_pubkeys(keys[:2], 0x6f) == addresses_from_pubkeys(keys, 0x6f)[:2]
+
+
+def test_pubkey_cache():
+    key = PrivateKey(0x4321).public_key
+    crypto.pubkey_cache.clear()
+
+    pk = PublicKey.from_bytes(key.compressed_bytes)
+    assert (pk.point.x, pk.point.y) == (key.point.x, key.point.y)
+    assert PublicKey.from_hex(key.compressed_bytes.hex()) is pk
+    assert crypto.pubkey_cache.stats.hits == 1
+    assert crypto.pubkey_cache.stats.misses == 1
+
+    # Uncompressed keys are not cached
+    assert PublicKey.from_bytes(bytes(key)) is not pk
+    assert len(crypto.pubkey_cache) == 1
+
+    # Cached keys are shared, so they can't be modified
+    for name in ['point', 'ripe', 'ripe_compressed', '_address']:
+        with pytest.raises(AttributeError):
+            setattr(pk, name, None)
+    with pytest.raises(AttributeError):
+        del pk.point
+    assert pk.hash160() == key.hash160()
+    assert copy.deepcopy(pk).point == pk.point
+    assert pickle.loads(pickle.dumps(pk)).point == pk.point
+
+    crypto.pubkey_cache.resize(0)
+    try:
+        assert PublicKey.from_bytes(key.compressed_bytes) is not pk
+    finally:
+        crypto.pubkey_cache.resize(crypto.PUBKEY_CACHE_SIZE)
+
+
+@pytest.mark.benchmark
+def test_base58_benchmark():
+    rand = random.Random(4)
+    n = 2000
+    h160s = [bytes(rand.getrandbits(8) for _ in range(20)) for _ in range(n)]
+
+    def timed(f):
+        start = time.perf_counter()
+        rv = [f(h) for h in h160s]
+        return rv, (time.perf_counter() - start) / n * 1e6
+
+    expected, ref_encode = timed(lambda h: base58.b58encode_check(b'\x00' + h))
+    addresses, encode = timed(lambda h: b58encode_check(b'\x00' + h))
+    assert addresses == expected
+
+    _, ref_decode = timed(lambda h: base58.b58decode_check(addresses[0]))
+    _, decode = timed(lambda h: b58decode_check(addresses[0]))
+
+    keys = [PrivateKey(i + 1).public_key.compressed_bytes for i in range(200)]
+    utils.pubkey_address_cache.clear()
+    start = time.perf_counter()
+    addresses_from_pubkeys(keys)
+    cold = (time.perf_counter() - start) / len(keys) * 1e6
+    start = time.perf_counter()
+    addresses_from_pubkeys(keys)
+    warm = (time.perf_counter() - start) / len(keys) * 1e6
+
+    print("Base58Check address encoding: %.1f us (base58 package: %.1f us)" % (encode, ref_encode))
+    print("Base58Check address decoding: %.1f us (base58 package: %.1f us)" % (decode, ref_decode))
+    print("Public key to address: %.1f us uncached, %.1f us cached" % (cold, warm))
+    assert encode < ref_encode
+    assert decode < ref_decode
+
+
 def test_txn():
     txn_str = "0100000001205607fb482a03600b736fb0c257dfd4faa49e45db3990e2c4994796031eae6e000000008b483045022100ed84be709227397fb1bc13b749f235e1f98f07ef8216f15da79e926b99d2bdeb02206ff39819d91bc81fecd74e59a721a38b00725389abb9cbecb42ad1c939fd8262014104e674caf81eb3bb4a97f2acf81b54dc930d9db6a6805fd46ca74ac3ab212c0bbf62164a11e7edaf31fbf24a878087d925303079f2556664f3b32d125f2138cbefffffffff0128230000000000001976a914f1fd1dc65af03c30fe743ac63cef3a120ffab57d88ac00000000"  # nopep8
     tx = Transaction.from_hex(txn_str)
@@ -208,3 +343,259 @@ def test_txn():
                                ["18HMSYbh3PbXfxL6f6Cy9FjCK7AC4tB2ZX"]]
     assert addrs['outputs'] == [["19mkZEZinQ77SrXbzxd5QJksikQFmfUNfo"],
                                 ["3PWbQBs5YDbmFCe5RdDjzqApJxs25Apvnd"]]
+
+
+def test_from_buffer():
+    txn_strs = [
+        "0100000001205607fb482a03600b736fb0c257dfd4faa49e45db3990e2c4994796031eae6e000000008b483045022100ed84be709227397fb1bc13b749f235e1f98f07ef8216f15da79e926b99d2bdeb02206ff39819d91bc81fecd74e59a721a38b00725389abb9cbecb42ad1c939fd8262014104e674caf81eb3bb4a97f2acf81b54dc930d9db6a6805fd46ca74ac3ab212c0bbf62164a11e7edaf31fbf24a878087d925303079f2556664f3b32d125f2138cbefffffffff0128230000000000001976a914f1fd1dc65af03c30fe743ac63cef3a120ffab57d88ac00000000",  # nopep8
+        "0100000002cb246d110b6087cd3b5e3d3b7a74505ea995721208ddfc15b6b3b718271e0b41010000006b48304502201f2cf747f9f8e3f770bef848e6787c9fca31e3086c390e505c1339936a15a78f022100a9e5f761162b8a4387c4009ce9469e92302fda68afe85371181b6e13b84f052d01210339e1274cd66db3dbe23e4def7ae9eb81644c15347cf0b39c741fb947c8ef1f12ffffffffb828405fca4f578073fe02bb00e999407bbaa3f5556f4c3571fd5fef28e47de8010000006a47304402206b7a8851fb2284201f31854bc857a8e1a1c4d5dbd19efe76d89d2c02083ff397022029a231c2750005b5ec4c437a8fa7163eaffe02e5fb51d9b8bb5edc5bb88040720121036744acff73b223a6f04190b60a980f8de1ed0271bba92144850e90c1af489fb3ffffffff0232530000000000001976a9146037aac7480f0fa0c7740560a7bf2f37ec17597988acb0ad01000000000017a914ef5a22f491632b2f18c59352dd64fa4ec346a8118700000000"  # nopep8
+    ]
+    txn_bytes = [bytes.fromhex(t) for t in txn_strs]
+
+    # Several transactions back-to-back, preceded by some junk
+    buf = b'\xde\xad' + b''.join(txn_bytes) + b'\xbe\xef'
+    offset = 2
+    for tb in txn_bytes:
+        txn, new_offset = Transaction.from_buffer(memoryview(buf), offset)
+        assert new_offset - offset == len(tb)
+        assert bytes(txn) == tb
+        offset = new_offset
+    assert buf[offset:] == b'\xbe\xef'
+
+    # The tuple API is a thin wrapper over from_buffer
+    txn, rest = Transaction.from_bytes(txn_bytes[1] + b'\x01\x02')
+    assert bytes(txn) == txn_bytes[1]
+    assert rest == b'\x01\x02'
+
+    inp, rest = TransactionInput.from_bytes(bytes(txn.inputs[1]) + b'\x03')
+    assert bytes(inp) == bytes(txn.inputs[1])
+    assert rest == b'\x03'
+
+    out, offset = TransactionOutput.from_buffer(bytes(txn.outputs[1]))
+    assert bytes(out) == bytes(txn.outputs[1])
+    assert offset == len(bytes(txn.outputs[1]))
+
+    for n in [0, 0xfc, 0xfd, 0xffff, 0x10000, 0xffffffff, 0x100000000]:
+        b = b'\x00' + pack_compact_int(n)
+        assert unpack_compact_int_from(b, 1) == (n, len(b))
+        assert unpack_compact_int(b[1:]) == (n, b'')
+
+    txns = [Transaction.from_bytes(tb)[0] for tb in txn_bytes]
+    block = Block(0, 1, Hash(bytes(32)), 0x495fab29, 0x1d00ffff, 0x7c2bac1d, txns)
+    block_bytes = bytes(block)
+    block2, offset = Block.from_buffer(b'\x00' * 4 + block_bytes, 4)
+    assert offset == 4 + len(block_bytes)
+    assert bytes(block2) == block_bytes
+    assert block2.hash == block.hash
+
+    block3, rest = Block.from_bytes(block_bytes)
+    assert rest == b''
+    assert block3.block_header.merkle_root_hash == block.block_header.merkle_root_hash
+
+
+def test_txn_serialization_cache():
+    txn_str = "0100000002cb246d110b6087cd3b5e3d3b7a74505ea995721208ddfc15b6b3b718271e0b41010000006b48304502201f2cf747f9f8e3f770bef848e6787c9fca31e3086c390e505c1339936a15a78f022100a9e5f761162b8a4387c4009ce9469e92302fda68afe85371181b6e13b84f052d01210339e1274cd66db3dbe23e4def7ae9eb81644c15347cf0b39c741fb947c8ef1f12ffffffffb828405fca4f578073fe02bb00e999407bbaa3f5556f4c3571fd5fef28e47de8010000006a47304402206b7a8851fb2284201f31854bc857a8e1a1c4d5dbd19efe76d89d2c02083ff397022029a231c2750005b5ec4c437a8fa7163eaffe02e5fb51d9b8bb5edc5bb88040720121036744acff73b223a6f04190b60a980f8de1ed0271bba92144850e90c1af489fb3ffffffff0232530000000000001976a9146037aac7480f0fa0c7740560a7bf2f37ec17597988acb0ad01000000000017a914ef5a22f491632b2f18c59352dd64fa4ec346a8118700000000"  # nopep8
+    tx = Transaction.from_hex(txn_str)
+    stats = Transaction.serialization_check_stats
+
+    stats.reset()
+    h = tx.hash
+    assert tx.to_hex() == txn_str
+    assert tx.hash is h
+    assert stats.misses == 1
+    assert stats.hits == 2
+
+    def check(expected_changed=True):
+        new_hash = tx.hash
+        assert (new_hash != h) == expected_changed
+        assert new_hash == Transaction.from_hex(tx.to_hex()).hash
+        return new_hash
+
+    # Mutating fields of the transaction, its inputs, outputs and scripts
+    # must all invalidate the cached serialization.
+    tx.lock_time = 1
+    h = check()
+    tx.outputs[0].value += 1
+    h = check()
+    tx.outputs[1].script = Script.build_p2pkh(bytes(20))
+    h = check()
+    tx.outputs[1].script.append("OP_NOP")
+    h = check()
+    tx.inputs[0].script[0] = bytes(71)
+    h = check()
+    tx.inputs[1].sequence_num = 0
+    h = check()
+    tx.inputs[1].outpoint = Hash(bytes(32))
+    h = check()
+    tx.outputs.append(TransactionOutput(1000, Script.build_p2sh(bytes(20))))
+    h = check()
+    del tx.inputs[0]
+    h = check()
+    check(False)
+
+    Script.serialization_stats.reset()
+    s = Script.build_p2sh(bytes(20))
+    assert s.to_hex() == bytes_to_str(bytes(s))
+    assert Script.serialization_stats.misses == 1
+    assert Script.serialization_stats.hits == 1
+    assert str(stats).startswith("Transaction serialization check: ")
+
+
+def test_lru_cache():
+    cache = LRUCache("test", 3)
+    for i in range(3):
+        cache.put(i, str(i))
+    assert cache.get(0) == '0'
+    cache.put(3, '3')
+
+    # 1 was the least recently used
+    assert len(cache) == 3
+    assert cache.get(1) is None
+    assert cache.get(1, 'x') == 'x'
+    assert [cache.get(i) for i in [0, 2, 3]] == ['0', '2', '3']
+    assert cache.stats.hits == 4
+    assert cache.stats.misses == 2
+
+    cache.resize(1)
+    assert len(cache) == 1
+    assert cache.get(3) == '3'
+
+    cache.resize(0)
+    assert not cache.enabled
+    cache.put(4, '4')
+    assert len(cache) == 0
+    assert cache.get(4) is None
+    assert cache.stats.misses == 2
+
+    cache.clear()
+    assert cache.stats.lookups == 0
+
+
+def test_byte_writer():
+    w = ByteWriter()
+    w.write(b'\x01')
+    w.write_u16(0x0302)
+    w.write_u32(0x07060504)
+    w.write_u64(0x0f0e0d0c0b0a0908)
+    for n in [0, 0xfc, 0xfd, 0xffff, 0x10000, 0xffffffff, 0x100000000]:
+        w.write_compact_int(n)
+    w.write_var_str(b'abc')
+    expected = (bytes(range(1, 16)) +
+                b''.join(pack_compact_int(n) for n in [0, 0xfc, 0xfd, 0xffff, 0x10000, 0xffffffff, 0x100000000]) +
+                b'\x03abc')
+    assert w.getvalue() == expected
+    assert len(w) == len(expected)
+
+    # Serialize several objects into one preallocated buffer, after
+    # some existing data
+    txn = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                      [TransactionInput(Hash(bytes(32)), 0, Script("OP_1 " + "0x" + "ab" * 300), 0xffffffff)],
+                      [TransactionOutput(1000, Script("OP_HASH160 0x" + "cd" * 20 + " OP_EQUAL"))],
+                      0)
+    txn_bytes = bytes(txn)
+    buf = bytearray(b'\xff' * 2 + bytes(2 * len(txn_bytes)))
+    w = ByteWriter(buf, 2)
+    txn.serialize_into(w)
+    txn.serialize_into(w)
+    assert w.getvalue() == txn_bytes * 2
+    assert len(buf) == 2 + 2 * len(txn_bytes)
+    assert bytes(buf[:2]) == b'\xff' * 2
+
+    # Writing past the end of the buffer grows it
+    w.write_u32(1)
+    assert len(buf) == 6 + 2 * len(txn_bytes)
+
+    block = Block(0, 1, Hash(bytes(32)), 0x495fab29, 0x1d00ffff, 0x7c2bac1d, [txn])
+    w = ByteWriter()
+    block.serialize_into(w)
+    assert w.getvalue() == bytes(block) == bytes(block.block_header) + b'\x01' + txn_bytes
+    assert len(bytes(block.block_header)) == 80
+
+    # Coinbase inputs hold a raw bytes script rather than a Script
+    cb = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                     [CoinbaseInput(100, b'\x01\x02')],
+                     [TransactionOutput(5000000000, Script.build_p2pkh(bytes(20)))],
+                     0)
+    w = ByteWriter()
+    cb.serialize_into(w)
+    assert w.getvalue() == bytes(cb)
+    assert Transaction.from_bytes(w.getvalue())[0].hash == cb.hash
+
+
+def test_hash_slots():
+    h = Hash.dhash(b'abc')
+    h2 = Hash(str(h))
+    assert h == h2 and h == bytes(h) and h == str(h)
+    assert h != Hash(bytes(32))
+
+    # Hashes can be used as dict keys, interchangeably with their bytes
+    d = {h: 1}
+    assert d[h2] == 1
+    assert d[bytes(h)] == 1
+    assert Hash(bytes(32)) not in d
+
+    for obj in [h,
+                TransactionInput(h, 0, Script(), 0),
+                CoinbaseInput(1, b''),
+                TransactionOutput(0, Script()),
+                PrivateKey(1).public_key.point,
+                PrivateKey(1).sign(b'abc')]:
+        assert not hasattr(obj, '__dict__')
+
+
+def test_merkle_tree():
+    def naive_root(hashes):
+        hashes = [bytes(h) for h in hashes]
+        while len(hashes) > 1:
+            if len(hashes) % 2:
+                hashes.append(hashes[-1])
+            hashes = [bytes(Hash.dhash(hashes[i] + hashes[i + 1])) for i in range(0, len(hashes), 2)]
+        return Hash(hashes[0])
+
+    for n in [1, 2, 3, 5, 8, 13]:
+        txids = [Hash.dhash(bytes([i])) for i in range(n)]
+        tree = MerkleTree(txids)
+        assert tree.num_leaves == n
+        assert tree.hash == naive_root(txids)
+
+        for i, txid in enumerate(txids):
+            assert tree.leaf(i) == txid
+            assert tree.index(txid) == i
+            proof = tree.proof(i)
+            assert verify_merkle_proof(txid, i, proof, tree.hash)
+            assert not verify_merkle_proof(Hash(bytes(32)), i, proof, tree.hash)
+            if n > 1:
+                if proof[0] != txid:
+                    assert not verify_merkle_proof(txid, i ^ 1, proof, tree.hash)
+                assert not verify_merkle_proof(txid, i + (1 << len(proof)), proof, tree.hash)
+
+        txids[n - 1] = Hash(bytes(32))
+        tree.update(n - 1, txids[n - 1])
+        assert tree.hash == naive_root(txids)
+        assert tree.index(txids[n - 1]) == n - 1
+
+    cb = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                     [CoinbaseInput(1, b'')],
+                     [TransactionOutput(5000000000, Script())],
+                     0)
+    txns = [cb] + [Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                               [TransactionInput(Hash.dhash(bytes([i])), 0, Script(), 0xffffffff)],
+                               [TransactionOutput(1000, Script())],
+                               0) for i in range(6)]
+    block = Block(1, 1, Hash(bytes(32)), 0x495fab29, 0x1d00ffff, 0x7c2bac1d, txns)
+    root = block.block_header.merkle_root_hash
+    assert root == naive_root(t.hash for t in txns)
+
+    index, proof = block.merkle_proof(txns[4].hash)
+    assert index == 4
+    assert verify_merkle_proof(txns[4].hash, index, proof, root)
+    assert block.get_merkle_edge() == [bytes(h) for h in block.merkle_proof(cb.hash)[1]]
+
+    # Changing the coinbase only updates the left edge
+    block.coinbase_transaction = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                                             [CoinbaseInput(2, b'')],
+                                             [TransactionOutput(5000000000, Script())],
+                                             0)
+    assert block.block_header.merkle_root_hash != root
+    assert block.block_header.merkle_root_hash == naive_root(t.hash for t in block.txns)
+    assert verify_merkle_proof(txns[4].hash, index, proof, block.block_header.merkle_root_hash) is False
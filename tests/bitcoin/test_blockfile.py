@@ -0,0 +1,101 @@
+import os
+import struct
+
+import pytest
+
+from two1.bitcoin import blockfile
+from two1.bitcoin.block import Block
+from two1.bitcoin.blockfile import BlockFileReader
+from two1.bitcoin.blockfile import MAINNET_MAGIC
+from two1.bitcoin.blockfile import TESTNET_MAGIC
+from two1.bitcoin.exceptions import InvalidBlockError
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.script import Script
+from two1.bitcoin.txn import CoinbaseInput
+from two1.bitcoin.txn import Transaction
+from two1.bitcoin.txn import TransactionOutput
+
+
+def make_blocks(n):
+    blocks = []
+    prev = Hash(bytes(32))
+    for height in range(n):
+        cb = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                         [CoinbaseInput(height, b'')],
+                         [TransactionOutput(5000000000, Script())],
+                         0)
+        block = Block(height, 1, prev, 0x495fab29 + height, 0x1d00ffff, height, [cb])
+        blocks.append(block)
+        prev = block.hash
+    return blocks
+
+
+def record(block, magic=MAINNET_MAGIC):
+    b = bytes(block)
+    return magic + struct.pack('<I', len(b)) + b
+
+
+def test_block_file_reader(tmpdir, monkeypatch):
+    blocks = make_blocks(6)
+    with open(os.path.join(str(tmpdir), "blk00000.dat"), "wb") as f:
+        f.write(b''.join(record(b) for b in blocks[:4]))
+        # Preallocated, unused space
+        f.write(bytes(64))
+    with open(os.path.join(str(tmpdir), "blk00001.dat"), "wb") as f:
+        f.write(record(blocks[4]))
+        # A partially written record is ignored
+        f.write(record(blocks[5])[:-10])
+    open(os.path.join(str(tmpdir), "blk00002.dat"), "wb").close()
+
+    index_path = os.path.join(str(tmpdir), "index.dat")
+    with BlockFileReader(str(tmpdir), index_path=index_path) as reader:
+        assert len(reader) == 5
+        assert reader.block_hashes() == [b.hash for b in blocks[:5]]
+        assert blocks[2].hash in reader
+        assert blocks[5].hash not in reader
+
+        assert [bytes(h) for h in reader.headers()] == [bytes(b.block_header) for b in blocks[:5]]
+        assert [bytes(b) for b in reader.blocks()] == [bytes(b) for b in blocks[:5]]
+        assert bytes(reader.get_block(blocks[4].hash)) == bytes(blocks[4])
+        assert reader.get_header(blocks[1].hash).hash == blocks[1].hash
+
+        path, offset, length = reader.locate(blocks[1].hash)
+        assert path.endswith("blk00000.dat")
+        assert offset == len(record(blocks[0])) + 8
+        assert length == len(bytes(blocks[1]))
+        with reader.get_raw_block(blocks[1].hash) as raw:
+            assert bytes(raw) == bytes(blocks[1])
+
+        with pytest.raises(KeyError):
+            reader.get_block(blocks[5].hash)
+
+    assert os.path.exists(index_path)
+
+    # Finish writing the last block: only the new data is scanned
+    with open(os.path.join(str(tmpdir), "blk00001.dat"), "wb") as f:
+        f.write(record(blocks[4]) + record(blocks[5]))
+
+    with BlockFileReader(str(tmpdir), index_path=index_path) as reader:
+        assert reader.block_hashes() == [b.hash for b in blocks]
+        assert reader._scanned[0] == sum(len(record(b)) for b in blocks[:4])
+        assert bytes(reader.get_block(blocks[5].hash)) == bytes(blocks[5])
+
+    with BlockFileReader(str(tmpdir), index_path=index_path) as reader:
+        assert len(reader) == 6
+        assert bytes(reader.get_block(blocks[0].hash)) == bytes(blocks[0])
+
+    # Files opened before a failure are closed
+    opened = []
+
+    def tracking_open(*args, **kwargs):
+        f = open(*args, **kwargs)
+        opened.append(f)
+        return f
+    monkeypatch.setattr(blockfile, "open", tracking_open, raising=False)
+
+    with pytest.raises(InvalidBlockError):
+        BlockFileReader(str(tmpdir), magic=TESTNET_MAGIC)
+    with pytest.raises(FileNotFoundError):
+        BlockFileReader([os.path.join(str(tmpdir), "blk00000.dat"), os.path.join(str(tmpdir), "blk00009.dat")])
+    assert len(opened) == 4
+    assert all(f.closed for f in opened)
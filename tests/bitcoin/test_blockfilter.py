@@ -0,0 +1,97 @@
+import os
+import random
+import time
+
+import pytest
+
+from two1.bitcoin import blockfilter
+from two1.bitcoin.blockfilter import FilterQuery
+from two1.bitcoin.blockfilter import GCSFilter
+from two1.bitcoin.blockfilter import basic_filter_items
+from two1.bitcoin.blockfilter import filter_header
+from two1.bitcoin.blockfilter import siphash24
+from two1.bitcoin.block import Block
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.script import Script
+from two1.bitcoin.txn import CoinbaseInput
+from two1.bitcoin.txn import Transaction
+from two1.bitcoin.txn import TransactionOutput
+
+
+def p2pkh(rand):
+    return bytes(Script.build_p2pkh(bytes(rand.getrandbits(8) for _ in range(20))))
+
+
+def test_siphash():
+    # Reference vector from the SipHash paper
+    key = bytes(range(16))
+    k0, k1 = int.from_bytes(key[:8], 'little'), int.from_bytes(key[8:], 'little')
+    assert siphash24(k0, k1, bytes(range(15))) == 0xa129ca6149be45e5
+
+
+def test_testnet_genesis_filter():
+    # Test vector from BIP158: the filter of the testnet genesis block
+    block_hash = Hash("000000000933ea01ad0ee984209779baaec3ced90fa3f408719526f8d77f4943")
+    script = Script("0x04678afdb0fe5548271967f1a67130b7105cd6a828e03909a67962e0ea1f61deb6"
+                    "49f6bc3f4cef38c4f35504e51ec112de5c384df7ba0b8d578a4c702b6bf11d5f OP_CHECKSIG")
+    cb = Transaction(1, [CoinbaseInput(0, b'')], [TransactionOutput(5000000000, script),
+                                                  TransactionOutput(0, Script("OP_RETURN 0x00"))], 0)
+    block = Block(0, 1, Hash(bytes(32)), 1296688602, 0x1d00ffff, 414098458, [cb])
+    assert basic_filter_items(block, []) == {bytes(script)}
+
+    f = GCSFilter.build(basic_filter_items(block, []), bytes(block_hash))
+    assert bytes(f).hex() == "019dfca8"
+    assert str(Hash(filter_header(f, bytes(32)))) == \
+        "21584579b7eb08997773e5aeff3a7f932700042d0ed2a6129012b7d7ae81b750"
+
+
+@pytest.mark.parametrize("use_numpy", [True, False], ids=["numpy", "python"])
+def test_gcs_filter(use_numpy, monkeypatch):
+    if not use_numpy:
+        monkeypatch.setattr(blockfilter, "np", None)
+    elif blockfilter.np is None:
+        pytest.skip("NumPy is not installed")
+
+    rand = random.Random(158)
+    key = bytes(rand.getrandbits(8) for _ in range(16))
+    items = [p2pkh(rand) for _ in range(200)] + [b'\x01', bytes(range(16)), b'x' * 100]
+    f = GCSFilter.build(items + items[:10], key)
+    assert f.n == len(items)
+
+    f2 = GCSFilter.from_bytes(bytes(f), key)
+    assert f2.values() == f.values()
+    assert all(f2.match(i) for i in items)
+
+    others = [p2pkh(rand) for _ in range(200)]
+    assert not f2.match_any(others)
+    assert f2.match_any(others + [items[5]])
+    assert f2.match_any(FilterQuery([b'x' * 100]))
+    assert not f2.match_any([])
+    assert not GCSFilter.build([], key).match_any(items)
+
+    k0 = int.from_bytes(key[:8], 'little')
+    k1 = int.from_bytes(key[8:], 'little')
+    hashed = FilterQuery(items).hashed(k0, k1, f.n * f.m)
+    assert [int(v) for v in hashed] == f.values()
+
+
+@pytest.mark.benchmark
+def test_filter_matching_benchmark():
+    rand = random.Random(0)
+    num_filters = 500 if blockfilter.np is not None else 10
+    filters = []
+    for _ in range(num_filters):
+        f = GCSFilter.build([p2pkh(rand) for _ in range(100)], os.urandom(16))
+        filters.append(GCSFilter.from_bytes(bytes(f), f.key))
+    query = FilterQuery([p2pkh(rand) for _ in range(1000)])
+
+    t = time.perf_counter()
+    matched = sum(f.match_any(query) for f in filters)
+    elapsed = time.perf_counter() - t
+
+    rate = num_filters / elapsed
+    print("Matched %d scripts against %d filters in %.3fs: %.0f filters/s, %.0f script checks/s (%d matched)" %
+          (len(query), num_filters, elapsed, rate, rate * len(query), matched))
+
+    # The false positive rate is 1 / 784931 per script
+    assert matched <= 5
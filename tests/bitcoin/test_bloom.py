@@ -0,0 +1,199 @@
+import random
+import time
+
+import pytest
+
+from two1.bitcoin.bloom import BLOOM_UPDATE_ALL
+from two1.bitcoin.bloom import BLOOM_UPDATE_NONE
+from two1.bitcoin.bloom import BLOOM_UPDATE_P2PUBKEY_ONLY
+from two1.bitcoin.bloom import BloomFilter
+from two1.bitcoin.bloom import murmur3
+from two1.bitcoin.bloom import outpoint_bytes
+from two1.bitcoin.bloom import script_pushes
+from two1.bitcoin.crypto import PrivateKey
+from two1.bitcoin.exceptions import DeserializationError
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.script import Script
+from two1.bitcoin.txn import Transaction
+from two1.bitcoin.txn import TransactionInput
+from two1.bitcoin.txn import TransactionOutput
+from two1.bitcoin.utils import key_hash_to_address
+
+
+def test_murmur3():
+    # Vectors from Bitcoin Core's hash_tests.cpp
+    assert murmur3(0x00000000, b'') == 0x00000000
+    assert murmur3(0xfba4c795, b'') == 0x6a396f08
+    assert murmur3(0xffffffff, b'') == 0x81f16f39
+    assert murmur3(0x00000000, bytes.fromhex("00")) == 0x514e28b7
+    assert murmur3(0xfba4c795, bytes.fromhex("00")) == 0xea3f0b17
+    assert murmur3(0x00000000, bytes.fromhex("ff")) == 0xfd6cf10d
+    assert murmur3(0x00000000, bytes.fromhex("0011")) == 0x16c6b7ab
+    assert murmur3(0x00000000, bytes.fromhex("001122")) == 0x8eb51c3d
+    assert murmur3(0x00000000, bytes.fromhex("00112233")) == 0xb4471bf8
+    assert murmur3(0x00000000, bytes.fromhex("0011223344")) == 0xe2301fa8
+    assert murmur3(0x9747b28c, b'Hello, world!') == 0x24884cba
+
+
+@pytest.mark.parametrize("tweak, expected", [
+    (0, "03614e9b050000000000000001"),
+    (2147483649, "03ce4299050000000100008001")])
+def test_serialize(tweak, expected):
+    # Vectors from Bitcoin Core's bloom_tests.cpp
+    bf = BloomFilter(3, 0.01, tweak, BLOOM_UPDATE_ALL)
+    items = [bytes.fromhex(h) for h in ["99108ad8ed9bb6274d3980bab5a85c048f0950c8",
+                                        "b5a2c786d9ef4658287ced5914b37a1b4aa32eee",
+                                        "b9300670b4c5366e95b2699e8b18bc75e5f729c5"]]
+    bf.insert(items[0])
+    assert items[0] in bf
+    assert bytes.fromhex("19108ad8ed9bb6274d3980bab5a85c048f0950c8") not in bf
+    for item in items[1:]:
+        bf.insert(item)
+    assert all(item in bf for item in items)
+    assert bytes(bf).hex() == expected
+
+    bf2 = BloomFilter.from_bytes(bytes(bf))
+    assert (bf2.n_hash_funcs, bf2.tweak, bf2.flags) == (bf.n_hash_funcs, bf.tweak, bf.flags)
+    assert all(item in bf2 for item in items)
+
+    with pytest.raises(DeserializationError):
+        BloomFilter.from_bytes(bytes(bf)[:-1])
+
+
+def test_false_positive_rate():
+    rand = random.Random(1)
+    n = 1000
+    bf = BloomFilter(n, 0.001)
+    items = [bytes(rand.getrandbits(8) for _ in range(20)) for _ in range(n)]
+    for item in items:
+        bf.insert(item)
+    assert all(item in bf for item in items)
+
+    fps = sum(1 for i in range(10000) if i.to_bytes(20, 'big') in bf)
+    assert fps < 30
+
+
+def test_script_pushes():
+    h160 = bytes(range(20))
+    assert script_pushes(bytes(Script.build_p2pkh(h160))) == [h160]
+    assert script_pushes(b'\x00\x4c\x02ab\x4d\x01\x00c\x4e\x01\x00\x00\x00d') == [b'', b'ab', b'c', b'd']
+    # Truncated push
+    assert script_pushes(b'\x01a\x05abc') == [b'a']
+
+
+def make_txn(inputs, outputs):
+    return Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                       [TransactionInput(Hash(txid), index, Script(script), 0xffffffff)
+                        for txid, index, script in inputs],
+                       [TransactionOutput(value, Script(script)) for value, script in outputs],
+                       0)
+
+
+def test_match_transaction():
+    h160 = bytes([1]) * 20
+    pubkey = b'\x02' + bytes([3]) * 32
+    sig = bytes([0x30]) * 71
+    p2pkh = bytes(Script.build_p2pkh(h160))
+    p2pk = b'\x21' + pubkey + b'\xac'
+    sig_script = bytes([len(sig)]) + sig + bytes([len(pubkey)]) + pubkey
+
+    fund = make_txn([(bytes([9]) * 32, 0, b'\x01\x01')], [(1000, b'\x51'), (5000, p2pkh), (6000, p2pk)])
+    spend = make_txn([(bytes(fund.hash), 1, sig_script)], [(4000, b'\x51')])
+    spend_p2pk = make_txn([(bytes(fund.hash), 2, bytes([len(sig)]) + sig)], [(4000, b'\x51')])
+    other = make_txn([(bytes([8]) * 32, 0, b'\x01\x01')], [(1000, b'\x51')])
+
+    # Outputs pushing an inserted item match, and their outpoints are
+    # inserted according to the flags.
+    bf = BloomFilter(10, 0.000001, 0, BLOOM_UPDATE_ALL)
+    bf.insert(h160)
+    assert not bf.match_transaction(other)
+    assert not bf.match_transaction(spend)
+    assert bf.match_transaction(fund)
+    assert outpoint_bytes(fund.hash, 1) in bf
+    assert bf.match_transaction(spend)
+
+    bf = BloomFilter(10, 0.000001, 0, BLOOM_UPDATE_NONE)
+    bf.insert(h160)
+    assert bf.match_transaction(fund)
+    assert not bf.match_transaction(spend)
+
+    bf = BloomFilter(10, 0.000001, 0, BLOOM_UPDATE_P2PUBKEY_ONLY)
+    bf.insert(h160)
+    bf.insert(pubkey)
+    assert bf.match_transaction(fund)
+    assert outpoint_bytes(fund.hash, 1) not in bf
+    assert outpoint_bytes(fund.hash, 2) in bf
+    assert bf.match_transaction(spend_p2pk)
+    # Matches through the public key pushed by the input script
+    assert bf.match_transaction(spend)
+
+    # Transaction hashes and spent outpoints match
+    bf = BloomFilter(10, 0.000001)
+    bf.insert(bytes(other.hash))
+    assert bf.match_transaction(other)
+    bf = BloomFilter(10, 0.000001)
+    bf.insert_outpoint(Hash(bytes([8]) * 32), 0)
+    assert bf.match_transaction(other)
+
+    # Spends are matched whatever the order of the transactions
+    bf = BloomFilter(10, 0.000001)
+    bf.insert_address(key_hash_to_address(h160))
+    assert bf.filter_transactions([spend, other, fund]) == [spend, fund]
+
+
+@pytest.mark.benchmark
+def test_prescreen_benchmark():
+    rand = random.Random(2)
+    n_addresses = 1000
+    n_txns = 2000
+
+    def rand_bytes(n):
+        return bytes(rand.getrandbits(8) for _ in range(n))
+
+    # Signature scripts of the kind spending P2PKH outputs
+    keys = [PrivateKey(rand.getrandbits(128) + 1) for _ in range(20)]
+    sig_scripts = []
+    for key in keys:
+        sig = key.sign(rand_bytes(32)).to_der() + b'\x01'
+        pubkey = key.public_key.compressed_bytes
+        sig_scripts.append(bytes([len(sig)]) + sig + bytes([len(pubkey)]) + pubkey)
+
+    def rand_sig_script():
+        return rand.choice(sig_scripts)
+
+    wallet = [rand_bytes(20) for _ in range(n_addresses)]
+    addresses = set(key_hash_to_address(h) for h in wallet)
+    bf = BloomFilter(2 * n_addresses, 0.0001)
+    for addr in addresses:
+        bf.insert_address(addr)
+
+    txns = []
+    for i in range(n_txns):
+        # One in a hundred transactions pays to the wallet
+        pay_to = wallet[i % n_addresses] if i % 100 == 0 else rand_bytes(20)
+        txns.append(make_txn([(rand_bytes(32), 0, rand_sig_script()) for _ in range(2)],
+                             [(1000, bytes(Script.build_p2pkh(pay_to))),
+                              (2000, bytes(Script.build_p2pkh(rand_bytes(20))))]))
+
+    def walk(txns):
+        rv = []
+        for t in txns:
+            a = t.get_addresses()
+            if addresses.intersection(set().union(*(a['inputs'] + a['outputs']))):
+                rv.append(t)
+        return rv
+
+    start = time.perf_counter()
+    expected = walk(txns)
+    walk_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matched = bf.filter_transactions(txns)
+    screened = walk(matched)
+    screen_time = time.perf_counter() - start
+
+    print("%d transactions: %.1f ms walking all scripts, %.1f ms with a bloom filter (%d matched)" %
+          (n_txns, walk_time * 1000, screen_time * 1000, len(matched)))
+    assert screened == expected
+    assert len(expected) == n_txns // 100
+    assert len(matched) < 2 * len(expected)
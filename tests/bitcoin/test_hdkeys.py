@@ -1,4 +1,5 @@
 import pytest
+import time
 
 from two1.bitcoin import crypto
 
@@ -139,6 +140,8 @@ def test_mnemonic_key_generation():
                      "1TJqdM2Hfw8SM26NdrBT1yVbqVcXoKdBQ"]
 
     assert [crypto.HDPublicKey.from_parent(int_chain_key, i).address() for i in range(20)] == int_addresses
+    batch = crypto.HDPublicKey.from_parent_batch(int_chain_key.public_key, list(range(20)))
+    assert [k.address() for k in batch] == int_addresses
 
     assert ext_chain_key.to_b58check() == "xprvA1fFrEZ8jPQTA6nguZQauChJ8ubexZhRbyowy1kzi7WiAodkwWxM9w8NaCzhEWqMukV7zXwAdzRZJ5mVCwG8NmhVBkZfrjEa1aZUTnvzSDL"  # nopep8
     assert ext_chain_key.public_key.to_b58check() == "xpub6EecFk62ZkxkNasA1awbGLe2gwS9N2RGyCjYmQAcGT3h3bxuV4GbhjSrRTJBzbkmu8fMzoUDAixdHSuso7aw2BEPVfUh6R4AFJWLjps2JX6"  # nopep8
@@ -165,3 +168,64 @@ def test_mnemonic_key_generation():
                      "1LjBL9rDSNWqDZMyGr3h1H7XrSTxzLYhAu"]
 
     assert [crypto.HDPublicKey.from_parent(ext_chain_key, i).address() for i in range(20)] == ext_addresses
+    batch = crypto.HDPublicKey.from_parent_batch(ext_chain_key.public_key, list(range(20)))
+    assert [k.address() for k in batch] == ext_addresses
+
+
+def test_child_cache():
+    m = crypto.HDPrivateKey.master_key_from_entropy()[0]
+
+    # Private children are derived again rather than cached
+    child = crypto.HDPrivateKey.from_parent(m, 5)
+    child2 = crypto.HDPrivateKey.from_parent(m, 5)
+    assert child2 is not child and child2.to_b58check() == child.to_b58check()
+    assert not hasattr(m, 'child_cache')
+
+    pub = m.public_key
+    pub_child = crypto.HDPublicKey.from_parent(pub, 5)
+    assert pub_child.to_b58check() == child.public_key.to_b58check()
+    assert crypto.HDPublicKey.from_parent(pub, 5) is pub_child
+    assert pub.child_cache.stats.hits == 1
+    assert crypto.HDPublicKey.from_parent_batch(pub, [4, 5])[1] is pub_child
+    with pytest.raises(ValueError):
+        crypto.HDPublicKey.from_parent(pub, 0x80000000)
+
+    for i in range(crypto.HDPublicKey.CHILD_CACHE_SIZE + 10):
+        crypto.HDPublicKey.from_parent(pub, i)
+    assert len(pub.child_cache) == crypto.HDPublicKey.CHILD_CACHE_SIZE
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_derive_children(workers, monkeypatch):
+    monkeypatch.setattr(crypto, "DERIVE_CHUNK_SIZE", 20)
+    m = crypto.HDPrivateKey.master_key_from_entropy()[0]
+    chain_key = crypto.HDPrivateKey.from_parent(m, 1)
+    expected = [crypto.HDPrivateKey.from_parent(chain_key, i).public_key.to_b58check()
+                for i in range(30, 100)]
+
+    children = crypto.derive_children(chain_key, range(30, 100), workers=workers)
+    assert [c.to_b58check() for c in children] == expected
+    assert crypto.HDPublicKey.from_parent(chain_key.public_key, 99) is children[-1]
+    assert crypto.derive_children(chain_key.public_key, []) == []
+    with pytest.raises(ValueError):
+        crypto.derive_children(chain_key, [0x80000000], workers=workers)
+
+
+@pytest.mark.benchmark
+def test_derive_children_benchmark():
+    n = 2000
+    m = crypto.HDPrivateKey.master_key_from_entropy()[0]
+    chain_key = crypto.HDPrivateKey.from_parent(m, 0).public_key
+    crypto.HDPublicKey.from_parent(chain_key, n)
+
+    start = time.perf_counter()
+    serial = [crypto.HDPublicKey.from_parent(chain_key, i) for i in range(n)]
+    serial_time = time.perf_counter() - start
+
+    chain_key.child_cache.clear()
+    start = time.perf_counter()
+    derived = crypto.derive_children(chain_key, range(n), workers=4)
+    parallel_time = time.perf_counter() - start
+
+    print("%d children: %.2f s one at a time, %.2f s with derive_children" % (n, serial_time, parallel_time))
+    assert [c.compressed_bytes for c in derived] == [c.compressed_bytes for c in serial]
@@ -0,0 +1,154 @@
+import os
+
+import pytest
+
+from two1.bitcoin import headerchain
+from two1.bitcoin.block import BlockHeader
+from two1.bitcoin.exceptions import InvalidBlockHeaderError
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.headerchain import HeaderChain
+from two1.bitcoin.utils import bits_to_target
+from two1.bitcoin.utils import target_to_bits
+
+# Easiest target, as used by regtest
+POW_LIMIT_BITS = 0x207fffff
+
+
+def mine(prev_hash, time, bits=POW_LIMIT_BITS, version=1):
+    header = BlockHeader(version, prev_hash, Hash(bytes(32)), time, bits, 0)
+    while not header.valid:
+        header.nonce += 1
+    return header
+
+
+def mine_chain(prev_hash, n, start_time=1000000, spacing=600, bits=POW_LIMIT_BITS, version=1):
+    headers = []
+    for i in range(n):
+        header = mine(prev_hash, start_time + i * spacing, bits, version)
+        headers.append(header)
+        prev_hash = header.hash
+    return headers
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def use_numpy(request, monkeypatch):
+    if request.param:
+        if headerchain.np is None:
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(headerchain, "np", None)
+
+
+def test_append_and_reorg(use_numpy, tmpdir):
+    path = os.path.join(str(tmpdir), "headers.dat")
+    chain = HeaderChain(path, start_height=100, pow_limit_bits=POW_LIMIT_BITS)
+    assert len(chain) == 0
+    assert chain.tip is None
+
+    headers = mine_chain(Hash(bytes(32)), 10)
+    chain.append(headers[0])
+    assert chain.add_headers(headers[1:5]) == []
+    # Overlapping and raw headers are accepted
+    assert chain.add_headers(b''.join(bytes(h) for h in headers[3:])) == []
+
+    assert len(chain) == 10
+    assert chain.height == 109
+    assert chain.tip.hash == headers[-1].hash
+    assert chain.get_hash(104) == headers[4].hash
+    assert bytes(chain.get_header(104)) == bytes(headers[4])
+    assert chain.height_of(headers[4].hash) == 104
+    assert headers[4].hash in chain
+    assert chain.confirmations(headers[-1].hash) == 1
+    assert chain.confirmations(headers[4].hash) == 6
+    assert chain.confirmations(Hash(bytes(32))) == 0
+
+    with pytest.raises(InvalidBlockHeaderError):
+        chain.append(headers[5])
+    with pytest.raises(InvalidBlockHeaderError):
+        chain.add_headers(mine_chain(Hash(bytes([1]) * 32), 2))
+
+    # A shorter branch is not connected
+    fork = mine_chain(headers[6].hash, 3, start_time=2000000)
+    assert chain.add_headers(fork) is None
+    assert chain.tip.hash == headers[-1].hash
+
+    # A longer one replaces the tip
+    fork = mine_chain(headers[6].hash, 4, start_time=2000000)
+    disconnected = chain.add_headers(fork)
+    assert [h.hash for h in disconnected] == [h.hash for h in headers[7:]]
+    assert chain.height == 110
+    assert chain.tip.hash == fork[-1].hash
+    assert headers[8].hash not in chain
+    assert chain.confirmations(headers[6].hash) == 5
+    chain.close()
+
+    with HeaderChain(path, start_height=100, pow_limit_bits=POW_LIMIT_BITS) as chain2:
+        assert len(chain2) == 11
+        assert chain2.tip.hash == fork[-1].hash
+        assert chain2.get_hash(105) == headers[5].hash
+
+
+def test_validation(use_numpy):
+    chain = HeaderChain(pow_limit_bits=POW_LIMIT_BITS)
+    headers = mine_chain(Hash(bytes(32)), 5)
+    chain.add_headers(headers[:2])
+
+    # Broken linkage
+    bad = headers[2:]
+    bad[1] = mine(Hash(bytes(32)), bad[1].time)
+    with pytest.raises(InvalidBlockHeaderError) as e:
+        chain.add_headers(bad)
+    assert "does not follow" in str(e.value)
+    assert len(chain) == 2
+
+    # Insufficient proof of work
+    bad = BlockHeader(1, headers[2].hash, Hash(bytes(32)), headers[3].time, POW_LIMIT_BITS, 0)
+    while bad.valid:
+        bad.nonce += 1
+    with pytest.raises(InvalidBlockHeaderError) as e:
+        chain.add_headers([headers[2], bad])
+    assert "target" in str(e.value)
+
+    # Target easier than the limit
+    strict = HeaderChain(pow_limit_bits=0x1f00ffff)
+    with pytest.raises(InvalidBlockHeaderError) as e:
+        strict.add_headers(headers)
+    assert "limit" in str(e.value)
+
+    # Difficulty changes outside of a retarget
+    harder = mine(headers[1].hash, headers[2].time, bits=0x2000ffff)
+    with pytest.raises(InvalidBlockHeaderError) as e:
+        chain.append(harder)
+    assert "retarget" in str(e.value)
+
+    relaxed = HeaderChain(pow_limit_bits=POW_LIMIT_BITS, check_retarget=False)
+    relaxed.add_headers(headers[:2] + [harder])
+    assert len(relaxed) == 3
+
+    # Exponents below 3 shift the mantissa right, down to a zero target
+    assert bits_to_target(0x02008000) == 0x80
+    assert bits_to_target(0x02000001) == 0
+    tiny = BlockHeader(1, headers[1].hash, Hash(bytes(32)), headers[2].time, 0x02000001, 0)
+    with pytest.raises(InvalidBlockHeaderError) as e:
+        relaxed.add_headers(headers[:2] + [tiny])
+    assert "hash does not meet the target" in str(e.value)
+
+    chain.add_headers(headers[2:])
+    assert len(chain) == 5
+
+
+def test_retarget(use_numpy):
+    chain = HeaderChain(pow_limit_bits=POW_LIMIT_BITS)
+    # Blocks found four times faster than expected
+    headers = mine_chain(Hash(bytes(32)), headerchain.RETARGET_INTERVAL, spacing=150)
+    chain.add_headers(headers)
+
+    expected = target_to_bits(bits_to_target(POW_LIMIT_BITS) // 4)
+    prev_hash = headers[-1].hash
+    with pytest.raises(InvalidBlockHeaderError) as e:
+        chain.append(mine(prev_hash, headers[-1].time + 150))
+    assert "retarget" in str(e.value)
+
+    chain.append(mine(prev_hash, headers[-1].time + 150, bits=expected))
+    assert chain.height == headerchain.RETARGET_INTERVAL
+    assert chain.tip.bits == expected
@@ -3,6 +3,7 @@ import pytest
 from two1.bitcoin.exceptions import ScriptParsingError
 from two1.bitcoin.script import Script
 from two1.bitcoin.txn import Transaction
+from two1.bitcoin.txn import TransactionOutput
 from two1.bitcoin.utils import bytes_to_str, pack_var_str
 
 
@@ -34,6 +35,24 @@ def test_serialization():
     assert bytes(s) == bytes(s1)
 
 
+def test_disassemble():
+    tokens = ['OP_DUP', b'\x01' * 20, 'OP_0', b'\x02' * 0x4c, b'\x03' * 0x100, b'\x04' * 0x10000, 'OP_CHECKSIG']
+    s = Script(bytes(Script(tokens)))
+    s._check_tokenized()
+    assert s._tokens == tokens
+
+    # Long scripts are disassembled in one pass
+    tokens = [b'\x05' * 20, 'OP_DROP'] * 20000
+    s = Script(bytes(Script(tokens)))
+    s._check_tokenized()
+    assert s._tokens == tokens
+
+    # A truncated push pushes what is left
+    s = Script(bytes([0x05, 0x01, 0x02]))
+    s._check_tokenized()
+    assert s._tokens == [b'\x01\x02']
+
+
 def test_validate_template():
     template = ['OP_HASH160', bytes, 'OP_EQUALVERIFY', 'OP_CHECKSIG']
     scr = Script('OP_HASH160 0x68bf827a2fa3b31e53215e5dd19260d21fdf053e OP_EQUALVERIFY OP_NOP')
@@ -194,3 +213,63 @@ def test_multisig_sig():
                              '14JfSvgEq8A8S7qcvxeaSCxhn1u1L71vo4',
                              '1Kyy7pxzSKG75L9HhahRZgYoer9FePZL4R',
                              '347N1Thc213QqfYCz3PZkjoJpNv5b14kBd']
+
+
+def test_raw_classification():
+    h160 = bytes.fromhex("68bf827a2fa3b31e53215e5dd19260d21fdf053e")
+
+    # Standard scripts are classified without being disassembled
+    for s, p2pkh in [(Script(bytes(Script.build_p2pkh(h160))), True),
+                     (Script(bytes(Script.build_p2sh(h160))), False)]:
+        assert s.is_p2pkh() == p2pkh
+        assert s.is_p2sh() != p2pkh
+        assert not s.is_multisig_redeem()
+        assert not s.is_multisig_sig()
+        assert not s.is_p2pkh_sig()
+        assert s.get_hash160() == h160
+        assert len(s.get_addresses()) == 1
+        assert not s._tokens
+
+    # The 20 bytes must be pushed directly
+    s = Script(b'\xa9\x4c\x14' + h160 + b'\x87')
+    assert not s.is_p2sh()
+    assert s.get_hash160() == h160
+
+    # Pay-to-Public-Key
+    pub_key = bytes.fromhex("0411db93e1dcdb8a016b49840f8c53bc1eb68a382e97b1482ecad7b148a6909a5c"
+                            "b2e0eaddfb84ccf9744464f82e160bfa9b8b64f9d4c03f999b8643f656b412a3")
+    s = Script(bytes([len(pub_key)]) + pub_key + b'\xac')
+    assert s.get_addresses() == ['12cbQLTFMXRnSzktFkuoG3eHoMeFtpTu3S']
+
+    # Empty and non-standard scripts
+    for s in [Script(b''), Script(b'\xae'), Script(b'\x51\x21\xae'), Script("OP_1 OP_2 OP_ADD")]:
+        assert not s.is_p2pkh()
+        assert not s.is_p2sh()
+        assert not s.is_multisig_redeem()
+        assert not s.is_multisig_sig()
+        assert not s.is_p2pkh_sig()
+        assert s.get_addresses() == []
+
+
+def test_non_minimal_push_not_standard():
+    h160 = bytes.fromhex("68bf827a2fa3b31e53215e5dd19260d21fdf053e")
+
+    # P2PKH and P2SH scripts pushing the hash with OP_PUSHDATA1 are not
+    # standard (as in Bitcoin Core), so they pay to no address
+    p2pkh = Script(b'\x76\xa9\x4c\x14' + h160 + b'\x88\xac')
+    p2sh = Script(b'\xa9\x4c\x14' + h160 + b'\x87')
+    for s in [p2pkh, p2sh]:
+        assert not s.is_p2pkh()
+        assert not s.is_p2sh()
+        assert s.get_addresses() == []
+
+    txn = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                      [],
+                      [TransactionOutput(1000, p2pkh), TransactionOutput(1000, p2sh)],
+                      0)
+    assert txn.output_index_for_address(h160) is None
+    assert txn.get_addresses()['outputs'] == [[], []]
+
+    # The same hashes pushed directly are found
+    txn.outputs.append(TransactionOutput(1000, Script.build_p2sh(h160)))
+    assert txn.output_index_for_address(h160) == 2
@@ -2,11 +2,13 @@ import pytest
 
 from two1.bitcoin.hash import Hash
 from two1.bitcoin.exceptions import ScriptInterpreterError
+from two1.bitcoin.exceptions import ScriptParsingError
 from two1.bitcoin.script import Script
 from two1.bitcoin.script_interpreter import ScriptInterpreter
 from two1.bitcoin.txn import Transaction
 from two1.bitcoin.txn import TransactionInput
 from two1.bitcoin.txn import TransactionOutput
+from two1.bitcoin import script_interpreter
 from two1.bitcoin import utils
 
 
@@ -946,9 +948,78 @@ def test_disabled_ops():
         assert list(si.stack) == [1]
 
 
+def test_reserved_words():
+    for opcode in ScriptInterpreter.RESERVED_WORDS + ["OP_UNKNOWN"]:
+        si = ScriptInterpreter()
+        si.run_script(Script("OP_1 " + opcode + " OP_2"))
+
+        assert si.stop
+        assert not si.valid
+        assert list(si.stack) == [1]
+
+    # Reserved words in a branch that is not taken are skipped
+    si = ScriptInterpreter()
+    si.run_script(Script("OP_0 OP_IF OP_RESERVED OP_ENDIF OP_1"))
+    assert si.valid
+
+    for opcode in ScriptInterpreter.NOP_WORDS:
+        si = ScriptInterpreter()
+        si.run_script(Script("OP_1 " + opcode + " OP_2"))
+
+        assert si.valid
+        assert list(si.stack) == [1, 2]
+
+    with pytest.raises(ScriptParsingError):
+        si.run_script(Script("OP_1 foo"))
+
+
+def test_pushdata_length_checks():
+    ast = [['OP_PUSHDATA1', b'\x4c', b'\x01' * 0x4c]]
+    assert script_interpreter._compile_ast(ast) == ((0x4c, (0x4c, b'\x01' * 0x4c)),)
+
+    with pytest.raises(ScriptInterpreterError):
+        script_interpreter._compile_ast([['OP_PUSHDATA1', b'\x4d', b'\x01' * 0x4c]])
+    with pytest.raises(ScriptInterpreterError):
+        script_interpreter._compile_ast([['OP_PUSHDATA2', b'\x4c\x00', b'\x01' * 0x4c]])
+
+
 def test_stack_overflow():
     s = Script("OP_0 " * 1001 + "OP_1")
 
     si = ScriptInterpreter()
     with pytest.raises(ScriptInterpreterError):
         si.run_script(s)
+
+
+def test_compile():
+    s = Script.build_p2pkh(bytes(20))
+    code = ScriptInterpreter.compile(s)
+    assert code == ((0x76, ()), (0xa9, ()), (0x01, (bytes(20),)), (0x88, ()), (0xac, ()))
+    assert all(isinstance(op, int) for op, args in code)
+
+    # Compiled scripts are cached by their raw bytes
+    cache = script_interpreter.compiled_script_cache
+    hits = cache.stats.hits
+    assert ScriptInterpreter.compile(Script(bytes(s))) is code
+    assert cache.stats.hits == hits + 1
+
+    s = Script("OP_1 OP_IF OP_2 OP_ELSE OP_3 OP_ENDIF OP_NOTIF OP_4 OP_ENDIF")
+    code = ScriptInterpreter.compile(s)
+    assert code == ((0x51, (0x51,)),
+                    (0x63, (0x63, ((0x52, (0x52,)),), ((0x53, (0x53,)),))),
+                    (0x64, (0x64, ((0x54, (0x54,)),), None)))
+
+    # Pushes of up to 75 bytes and the OP_PUSHDATAs
+    for n in [1, 0x4b, 0x4c, 0x100, 0x10000]:
+        si = ScriptInterpreter()
+        si.run_script(Script(bytes(Script([b'\x01' * n]))))
+        assert list(si.stack) == [b'\x01' * n]
+
+    # Opcodes that used to be dispatched by name
+    si = ScriptInterpreter()
+    si.run_script(Script(bytes([0x52, 0x52, 0xa1, 0x52, 0x51, 0xa2])))
+    assert list(si.stack) == [1, 0]
+
+    for raw in [b'\x67', b'\x68', b'\x51\x63\x51', b'\x51\x63\x67\x67\x68', b'\xff', b'\x4d\x01']:
+        with pytest.raises(ScriptParsingError):
+            ScriptInterpreter.compile(raw)
@@ -1,3 +1,4 @@
+import hashlib
 import pytest
 from two1.bitcoin import crypto, hash, script, txn, utils
 
@@ -186,3 +187,160 @@ def test_multisig_sign():
     assert not tx.verify_input_signature(0, script_pub_key)
 
     assert tx.verify_partial_multisig(0, script_pub_key)
+
+
+def test_sign_txn_invalidates_cached_hash():
+    address1 = keys[0][1].address(compressed=False)
+    address2 = keys[1][1].address(compressed=False)
+
+    prev_txn_hash = hash.Hash('6eae1e03964799c4e29039db459ea4fad4df57c2b06f730b60032a48fb075620')
+    prev_script_pub_key = script.Script.build_p2pkh(utils.address_to_key_hash(address1)[1])
+    txn_input = txn.TransactionInput(prev_txn_hash, 0, script.Script(""), 0xffffffff)
+    out_script_pub_key = script.Script.build_p2pkh(utils.address_to_key_hash(address2)[1])
+    txn_output = txn.TransactionOutput(9000, out_script_pub_key)
+    transaction = txn.Transaction(txn.Transaction.DEFAULT_TRANSACTION_VERSION,
+                                  [txn_input],
+                                  [txn_output],
+                                  0)
+
+    unsigned_hash = transaction.hash
+    unsigned_hex = transaction.to_hex()
+    assert transaction.hash is unsigned_hash
+
+    transaction.sign_input(0, txn.Transaction.SIG_HASH_ALL, keys[0][0], prev_script_pub_key)
+
+    assert transaction.to_hex() != unsigned_hex
+    assert transaction.hash != unsigned_hash
+    assert transaction.hash == txn.Transaction.from_hex(transaction.to_hex()).hash
+    assert str(transaction.hash) == "695f0b8605cc8a117c3fe5b959e6ee2fabfa49dcc615ac496b5dd114105cd360"
+
+
+def _reference_sig_hash(tx, input_index, hash_type, sub_script):
+    # Straightforward (copying) implementation of the legacy signature
+    # hash, following bitcoin core's SignatureHash().
+    base_type = hash_type & 0x1f
+    if base_type == txn.Transaction.SIG_HASH_SINGLE and input_index >= len(tx.outputs):
+        return (1).to_bytes(32, 'little')
+
+    inputs = []
+    for i, inp in enumerate(tx.inputs):
+        if i == input_index:
+            inputs.append(txn.TransactionInput(inp.outpoint, inp.outpoint_index, sub_script, inp.sequence_num))
+        elif not hash_type & txn.Transaction.SIG_HASH_ANY:
+            seq = inp.sequence_num
+            if base_type in (txn.Transaction.SIG_HASH_NONE, txn.Transaction.SIG_HASH_SINGLE):
+                seq = 0
+            inputs.append(txn.TransactionInput(inp.outpoint, inp.outpoint_index, script.Script(""), seq))
+
+    if base_type == txn.Transaction.SIG_HASH_NONE:
+        outputs = []
+    elif base_type == txn.Transaction.SIG_HASH_SINGLE:
+        outputs = [txn.TransactionOutput(0xffffffffffffffff, script.Script("")) for _ in range(input_index)]
+        outputs.append(tx.outputs[input_index])
+    else:
+        outputs = tx.outputs
+
+    tx_copy = txn.Transaction(tx.version, inputs, outputs, tx.lock_time)
+    return bytes(hash.Hash.dhash(bytes(tx_copy) + utils.pack_u32(hash_type)))
+
+
+@pytest.mark.parametrize("hash_type", [0x01, 0x02, 0x03, 0x81, 0x82, 0x83])
+def test_sig_hash_types(hash_type):
+    prev_script_pub_keys = [script.Script.build_p2pkh(k[1].hash160(compressed=True)) for k in keys]
+    prev_script_pub_keys.append(prev_script_pub_keys[0])
+    inputs = [txn.TransactionInput(hash.Hash(bytes([i]) * 32), i, script.Script(""), 0xfffffffe - i)
+              for i in range(3)]
+    outputs = [txn.TransactionOutput(1000 * (i + 1), script.Script.build_p2pkh(bytes([i]) * 20))
+               for i in range(2)]
+    tx = txn.Transaction(txn.Transaction.DEFAULT_TRANSACTION_VERSION, inputs, outputs, 12345)
+
+    for i in range(3):
+        assert tx.get_sig_hash(i, hash_type, prev_script_pub_keys[i]) == \
+            _reference_sig_hash(tx, i, hash_type, prev_script_pub_keys[i])
+
+    for i, private_key in enumerate([keys[0][0], keys[1][0], keys[0][0]]):
+        tx.sign_input(i, hash_type, private_key, prev_script_pub_keys[i])
+
+    for i in range(3):
+        assert tx.verify_input_signature(i, prev_script_pub_keys[i])
+        assert not tx.verify_input_signature(i, prev_script_pub_keys[(i + 1) % 2])
+
+    # Changing an output only invalidates signatures that commit to it
+    tx.outputs[1].value += 1
+    base_type = hash_type & 0x1f
+    committed = [base_type == txn.Transaction.SIG_HASH_ALL,
+                 base_type in (txn.Transaction.SIG_HASH_ALL, txn.Transaction.SIG_HASH_SINGLE),
+                 base_type == txn.Transaction.SIG_HASH_ALL]
+    for i in range(3):
+        assert tx.verify_input_signature(i, prev_script_pub_keys[i]) != committed[i]
+
+
+def test_verify_input_signatures():
+    addresses = [k[1].address(compressed=False) for k in keys]
+    prev_script_pub_keys = [script.Script.build_p2pkh(utils.address_to_key_hash(a)[1]) for a in addresses]
+    not_checksig = script.Script("OP_CHECKSIG OP_NOT")
+
+    inputs = [txn.TransactionInput(hash.Hash(bytes([i]) * 32), i, script.Script(""), 0xffffffff)
+              for i in range(4)]
+    outputs = [txn.TransactionOutput(9000, prev_script_pub_keys[0])]
+    tx = txn.Transaction(txn.Transaction.DEFAULT_TRANSACTION_VERSION, inputs, outputs, 0)
+
+    tx.sign_input(0, txn.Transaction.SIG_HASH_ALL, keys[0][0], prev_script_pub_keys[0])
+    tx.sign_input(1, txn.Transaction.SIG_HASH_ALL, keys[1][0], prev_script_pub_keys[1])
+    tx.sign_input(2, txn.Transaction.SIG_HASH_ALL, keys[0][0], prev_script_pub_keys[0])
+    # Input 3 carries a signature for another input, which is only
+    # accepted because the result of OP_CHECKSIG is negated.
+    tx.inputs[3].script = tx.inputs[2].script
+
+    sub_scripts = [prev_script_pub_keys[0], prev_script_pub_keys[1], prev_script_pub_keys[1], not_checksig]
+    expected = [True, True, False, True]
+    assert [tx.verify_input_signature(i, s) for i, s in enumerate(sub_scripts)] == expected
+    assert tx.verify_input_signatures(sub_scripts) == expected
+
+    with pytest.raises(ValueError):
+        tx.verify_input_signatures(sub_scripts[:2])
+
+    # PublicKey.verify_batch
+    msg = b"Hello, World!!"
+    sig = keys[0][0].sign(msg)
+    items = [(msg, sig, keys[0][1]), (msg, sig, keys[1][1]), (msg + b'!', sig, keys[0][1])]
+    assert crypto.PublicKey.verify_batch(items) == [True, False, False]
+    assert crypto.PublicKey.verify_batch([]) == []
+
+
+def test_sig_cache():
+    msg = b"Hello, World!!"
+    sig = keys[0][0].sign(msg)
+    other_sig = keys[1][0].sign(msg)
+    size = crypto.sig_cache.max_size
+
+    try:
+        crypto.sig_cache.clear()
+        assert keys[0][1].verify(msg, sig)
+        assert crypto.sig_cache.stats.misses == 1
+        assert keys[0][1].verify(msg, sig)
+        assert keys[0][1].verify(hashlib.sha256(msg).digest(), sig, False)
+        assert crypto.sig_cache.stats.hits == 2
+
+        # Failures are not cached
+        assert not keys[0][1].verify(msg, other_sig)
+        assert not keys[0][1].verify(msg, other_sig)
+        assert crypto.sig_cache.stats.misses == 3
+        assert len(crypto.sig_cache) == 1
+
+        # Batches use and fill the cache too
+        items = [(msg, sig, keys[0][1]), (msg, other_sig, keys[1][1]), (msg, other_sig, keys[0][1])]
+        assert crypto.PublicKey.verify_batch(items) == [True, True, False]
+        assert crypto.sig_cache.stats.hits == 3
+        assert len(crypto.sig_cache) == 2
+        assert keys[1][1].verify(msg, other_sig)
+        assert crypto.sig_cache.stats.hits == 4
+
+        # Disabling the cache
+        crypto.sig_cache.resize(0)
+        assert keys[0][1].verify(msg, sig)
+        assert len(crypto.sig_cache) == 0
+        assert crypto.sig_cache.stats.hits == 4
+    finally:
+        crypto.sig_cache.resize(size)
+        crypto.sig_cache.clear()
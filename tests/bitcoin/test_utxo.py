@@ -0,0 +1,138 @@
+import os
+import tracemalloc
+
+import pytest
+
+from two1.bitcoin import verify_block
+from two1.bitcoin.block import Block
+from two1.bitcoin.crypto import PrivateKey
+from two1.bitcoin.exceptions import InvalidBlockError
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.script import Script
+from two1.bitcoin.txn import CoinbaseInput
+from two1.bitcoin.txn import Transaction
+from two1.bitcoin.txn import TransactionInput
+from two1.bitcoin.txn import TransactionOutput
+from two1.bitcoin.utxo import UTXOSet
+from two1.bitcoin.utxo import outpoint_key
+
+keys = [PrivateKey(k) for k in range(3000, 3003)]
+scripts = [Script.build_p2pkh(k.public_key.hash160()) for k in keys]
+
+
+def coinbase(height, script):
+    return Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                       [CoinbaseInput(height, b'')],
+                       [TransactionOutput(5000000000, script), TransactionOutput(0, Script("OP_RETURN 0x00"))],
+                       0)
+
+
+def spend(outpoints, key_indices, outputs):
+    txn = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                      [TransactionInput(h, i, Script(), 0xffffffff) for h, i in outpoints],
+                      outputs,
+                      0)
+    for i, k in enumerate(key_indices):
+        txn.sign_input(i, Transaction.SIG_HASH_ALL, keys[k], scripts[k])
+    return txn
+
+
+def make_block(prev_hash, txns):
+    return Block(0, 1, prev_hash, 0x495fab29, 0x1d00ffff, 0, txns)
+
+
+def test_utxo_set(tmpdir):
+    utxos = UTXOSet()
+    cb0 = coinbase(0, scripts[0])
+    block0 = make_block(Hash(bytes(32)), [cb0])
+    assert utxos.apply_block(block0) == b''
+    assert utxos.height == 0
+    assert utxos.best_block_hash == block0.hash
+    # OP_RETURN outputs are not added
+    assert len(utxos) == 1
+    assert (cb0.hash, 0) in utxos
+    assert outpoint_key(cb0.hash, 0) in utxos
+
+    entry = utxos.get(cb0.hash, 0)
+    assert entry.value == 5000000000
+    assert entry.script == bytes(scripts[0])
+    assert entry.height == 0
+    assert entry.coinbase
+
+    # Spends the coinbase, then an output created in the same block
+    txn1 = spend([(cb0.hash, 0)], [0], [TransactionOutput(3000000000, scripts[1]),
+                                        TransactionOutput(1000000000, scripts[2])])
+    txn2 = spend([(txn1.hash, 0)], [1], [TransactionOutput(2000000000, scripts[2])])
+    block1 = make_block(block0.hash, [coinbase(1, scripts[0]), txn1, txn2])
+    assert verify_block(block1, utxos.lookup, workers=1) == [[True], [True], [True]]
+
+    undo1 = utxos.apply_block(block1)
+    assert utxos.height == 1
+    assert len(utxos) == 3
+    assert utxos.get(cb0.hash, 0) is None
+    assert utxos.get(txn1.hash, 0) is None
+    assert not utxos.get(txn2.hash, 0).coinbase
+    assert utxos.get(txn2.hash, 0).height == 1
+    assert [bytes(o.script) for o in utxos.prevouts(spend([(txn1.hash, 1)], [2], []))] == [bytes(scripts[2])]
+
+    # A block spending unknown or already spent outputs leaves the set unchanged
+    before = dict(utxos._coins)
+    txn3 = spend([(txn1.hash, 1)], [2], [TransactionOutput(1000, scripts[0])])
+    txn4 = spend([(txn2.hash, 0), (cb0.hash, 0)], [2, 0], [TransactionOutput(1000, scripts[0])])
+    with pytest.raises(InvalidBlockError):
+        utxos.apply_block(make_block(block1.hash, [coinbase(2, scripts[0]), txn3, txn4]))
+    assert utxos._coins == before
+    assert utxos.height == 1
+
+    path = os.path.join(str(tmpdir), "utxos.dat")
+    utxos.save_snapshot(path)
+    loaded = UTXOSet.load_snapshot(path)
+    assert loaded._coins == utxos._coins
+    assert loaded.height == 1
+    assert loaded.best_block_hash == block1.hash
+
+    loaded.undo_block(block1, undo1)
+    assert loaded.height == 0
+    assert loaded.best_block_hash == block0.hash
+    assert loaded.get(cb0.hash, 0) == entry
+    assert len(loaded) == 1
+
+    with pytest.raises(ValueError):
+        utxos.undo_block(block1, b'')
+
+    empty = os.path.join(str(tmpdir), "empty.dat")
+    UTXOSet().save_snapshot(empty)
+    loaded = UTXOSet.load_snapshot(empty)
+    assert len(loaded) == 0
+    assert loaded.height == -1
+    assert loaded.best_block_hash is None
+
+
+@pytest.mark.benchmark
+def test_utxo_set_memory():
+    n = 20000
+    outputs = [TransactionOutput(i, Script.build_p2pkh(i.to_bytes(20, 'big'))) for i in range(n)]
+    txids = [Hash.dhash(i.to_bytes(4, 'big')) for i in range(n)]
+
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        utxos = UTXOSet()
+        for txid, out in zip(txids, outputs):
+            utxos.add(txid, 0, out, 100)
+        compact, _ = tracemalloc.get_traced_memory()
+        compact -= start
+
+        start, _ = tracemalloc.get_traced_memory()
+        objects = {}
+        for txid, out in zip(txids, outputs):
+            objects[(txid, 0)] = TransactionOutput(out.value, Script(bytes(out.script)))
+        objects_size, _ = tracemalloc.get_traced_memory()
+        objects_size -= start
+    finally:
+        tracemalloc.stop()
+
+    print("%d outputs: %d bytes/output in a UTXOSet, %d bytes/output as objects" %
+          (n, compact // n, objects_size // n))
+    assert len(utxos) == n
+    assert compact < objects_size
@@ -0,0 +1,138 @@
+import pytest
+import time
+
+from two1.bitcoin import verify
+from two1.bitcoin.block import Block
+from two1.bitcoin.crypto import PrivateKey
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.script import Script
+from two1.bitcoin.txn import CoinbaseInput
+from two1.bitcoin.txn import Transaction
+from two1.bitcoin.txn import TransactionInput
+from two1.bitcoin.txn import TransactionOutput
+
+keys = [PrivateKey(k) for k in range(4000, 4003)]
+scripts = [Script.build_p2pkh(k.public_key.hash160()) for k in keys]
+utxos = {(bytes(Hash(bytes([i]) * 32)), 0): TransactionOutput(100000, scripts[i]) for i in range(3)}
+
+
+def utxo_lookup(txid, index):
+    return utxos.get((bytes(txid), index))
+
+
+def make_txn(outpoints, key_indices, outputs):
+    txn = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                      [TransactionInput(h, i, Script(), 0xffffffff) for h, i in outpoints],
+                      outputs,
+                      0)
+    for i, k in enumerate(key_indices):
+        txn.sign_input(i, Transaction.SIG_HASH_ALL, keys[k], scripts[k])
+    return txn
+
+
+def make_block(txns, coinbase_value=5000000000 + 70000, height=1):
+    cb = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                     [CoinbaseInput(height, b'')],
+                     [TransactionOutput(coinbase_value, scripts[0])],
+                     0)
+    block = Block(height, 1, Hash(bytes(32)), 0x495fab29, 0x207fffff, 0, [cb] + txns)
+    while not block.block_header.valid:
+        block.block_header.nonce += 1
+    return block
+
+
+def good_txns():
+    # Pays 70000 in fees
+    txn1 = make_txn([(Hash(bytes([0]) * 32), 0), (Hash(bytes([1]) * 32), 0)], [0, 1],
+                    [TransactionOutput(150000, scripts[2])])
+    # Spends an output of txn1, in the same block
+    txn2 = make_txn([(txn1.hash, 0)], [2], [TransactionOutput(140000, scripts[1])])
+    txn3 = make_txn([(Hash(bytes([2]) * 32), 0)], [2], [TransactionOutput(90000, scripts[0])])
+    return [txn1, txn2, txn3]
+
+
+@pytest.mark.parametrize("workers, pipelined", [(1, False), (1, True), (2, True)])
+def test_validate_block(workers, pipelined):
+    block = make_block(good_txns())
+    result = Block.validate_block(b'\x00' + bytes(block), 1, utxo_lookup, offset=1,
+                                  workers=workers, pipelined=pipelined)
+    assert result.valid, result.error
+    assert result.error is None
+    assert result.input_results == [[True], [True, True], [True], [True]]
+    assert bytes(result.block) == bytes(block)
+    assert result.block.merkle_tree.hash == block.block_header.merkle_root_hash
+    assert set(result.timings) == set(Block.VALIDATION_STAGES) | {'total'}
+    assert all(t >= 0 for t in result.timings.values())
+    assert result.timings['total'] > 0
+
+    # Coinbase claims more than the reward plus fees
+    bad = make_block(good_txns(), coinbase_value=5000000000 + 70001)
+    result = Block.validate_block(bytes(bad), 1, utxo_lookup, workers=workers, pipelined=pipelined)
+    assert not result.valid
+    assert "Coinbase" in result.error
+    # The reward halves
+    result = Block.validate_block(bytes(block), 210000, utxo_lookup, workers=workers, pipelined=pipelined)
+    assert "Coinbase" in result.error
+
+
+@pytest.mark.parametrize("pipelined", [False, True])
+def test_validate_block_errors(pipelined):
+    def error(block, lookup=utxo_lookup, b=None):
+        result = Block.validate_block(b or bytes(block), 1, lookup, workers=2, pipelined=pipelined)
+        assert not result.valid
+        return result.error
+
+    txns = good_txns()
+    assert "unknown output" in error(make_block(txns), lambda h, i: None)
+
+    # Signed with the wrong key
+    txns[2] = make_txn([(Hash(bytes([2]) * 32), 0)], [1], [TransactionOutput(90000, scripts[0])])
+    assert "failed verification" in error(make_block(txns))
+
+    txns = good_txns()
+    txns[2] = make_txn([(Hash(bytes([2]) * 32), 0)], [2], [TransactionOutput(200000, scripts[0])])
+    assert "more than its inputs" in error(make_block(txns))
+
+    txns = good_txns()
+    txns[2] = make_txn([(Hash(bytes([1]) * 32), 0)], [1], [TransactionOutput(90000, scripts[0])])
+    assert "double spends" in error(make_block(txns))
+
+    block = make_block(good_txns())
+    block.block_header.merkle_root_hash = Hash(bytes(32))
+    while not block.block_header.valid:
+        block.block_header.nonce += 1
+    assert "Merkle root" in error(block)
+
+    block = make_block(good_txns())
+    while block.block_header.valid:
+        block.block_header.nonce += 1
+    assert "target" in error(block)
+
+    assert "cannot be parsed" in error(None, b=bytes(make_block(good_txns()))[:-10])
+
+    def broken_lookup(txid, index):
+        raise KeyError("UTXO set unavailable")
+    assert "UTXO set unavailable" in error(make_block(good_txns()), broken_lookup)
+
+
+def test_validate_block_cancels_scripts(monkeypatch):
+    calls = []
+
+    def verify_chunk(txn, input_indices, sub_scripts):
+        calls.append(txn)
+        if len(calls) == 1:
+            return [False] * len(input_indices)
+        time.sleep(0.05)
+        return [True] * len(input_indices)
+
+    monkeypatch.setattr(verify, "_uses_threads", lambda: True)
+    monkeypatch.setattr(verify, "_verify_chunk", verify_chunk)
+
+    # Signatures are not checked by verify_chunk, so the inputs are left unsigned
+    txns = [make_txn([(Hash(bytes([i]) * 32), 1)], [], [TransactionOutput(1000, scripts[0])]) for i in range(20)]
+    result = Block.validate_block(bytes(make_block(txns, 5000000000)), 1,
+                                  lambda h, i: TransactionOutput(100000, scripts[0]),
+                                  workers=2, pipelined=False)
+    assert "failed verification" in result.error
+    # The chunks still queued when the failure was seen never ran
+    assert len(calls) < len(txns)
@@ -0,0 +1,89 @@
+import pytest
+
+from two1.bitcoin import verify
+from two1.bitcoin import verify_block
+from two1.bitcoin import verify_transaction
+from two1.bitcoin.block import Block
+from two1.bitcoin.crypto import PrivateKey
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.script import Script
+from two1.bitcoin.txn import CoinbaseInput
+from two1.bitcoin.txn import Transaction
+from two1.bitcoin.txn import TransactionInput
+from two1.bitcoin.txn import TransactionOutput
+
+keys = [PrivateKey(k) for k in range(1000, 1003)]
+scripts = [Script.build_p2pkh(k.public_key.hash160()) for k in keys]
+
+
+def make_txn(inputs, key_indices, outputs):
+    txn = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                      [TransactionInput(h, i, Script(), 0xffffffff) for h, i in inputs],
+                      outputs,
+                      0)
+    for i, k in enumerate(key_indices):
+        txn.sign_input(i, Transaction.SIG_HASH_ALL, keys[k], scripts[k])
+    return txn
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_verify_transaction(workers, monkeypatch):
+    # Use the pool even for a few inputs
+    monkeypatch.setattr(verify, "MIN_CHUNK_SIZE", 1)
+    prevouts = [TransactionOutput(1000, scripts[i % 3]) for i in range(12)]
+    inputs = [(Hash(bytes([i]) * 32), i) for i in range(12)]
+    txn = make_txn(inputs, [i % 3 for i in range(12)], [TransactionOutput(5000, scripts[0])])
+
+    assert verify_transaction(txn, prevouts, workers=workers) == [True] * 12
+
+    # Outputs can also be given as scripts, and may be unknown
+    prevouts[3] = scripts[0]
+    prevouts[4] = scripts[0]
+    prevouts[5] = None
+    expected = [True] * 12
+    expected[4] = False
+    expected[5] = False
+    assert verify_transaction(txn, prevouts, workers=workers) == expected
+
+    with pytest.raises(ValueError):
+        verify_transaction(txn, prevouts[1:], workers=workers)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_verify_block(workers, monkeypatch):
+    monkeypatch.setattr(verify, "MIN_CHUNK_SIZE", 1)
+    utxos = {(bytes(Hash(bytes([i]) * 32)), 0): TransactionOutput(1000, scripts[i]) for i in range(3)}
+
+    def utxo_lookup(txid, index):
+        return utxos.get((bytes(txid), index))
+
+    cb = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                     [CoinbaseInput(1, b'')],
+                     [TransactionOutput(5000000000, scripts[0])],
+                     0)
+    # Spends two known outputs
+    txn1 = make_txn([(Hash(bytes([0]) * 32), 0), (Hash(bytes([1]) * 32), 0)], [0, 1],
+                    [TransactionOutput(1500, scripts[2])])
+    # Spends an output of txn1, in the same block
+    txn2 = make_txn([(txn1.hash, 0)], [2], [TransactionOutput(1000, scripts[1])])
+    # Spends an unknown output
+    txn3 = make_txn([(Hash(bytes([7]) * 32), 0)], [0], [TransactionOutput(1000, scripts[1])])
+    # Signed with the wrong key
+    txn4 = make_txn([(Hash(bytes([2]) * 32), 0)], [1], [TransactionOutput(1000, scripts[1])])
+
+    block = Block(1, 1, Hash(bytes(32)), 0x495fab29, 0x1d00ffff, 0x7c2bac1d, [cb, txn1, txn2, txn3, txn4])
+    assert verify_block(block, utxo_lookup, workers=workers) == [[True], [True, True], [True], [False], [False]]
+
+
+def test_verify_serial_by_default(monkeypatch):
+    def new_executor(workers):
+        raise AssertionError("No pool should be created")
+    monkeypatch.setattr(verify, "_new_executor", new_executor)
+
+    prevouts = [TransactionOutput(1000, scripts[i % 3]) for i in range(2)]
+    inputs = [(Hash(bytes([i]) * 32), i) for i in range(2)]
+    txn = make_txn(inputs, [0, 1], [TransactionOutput(1500, scripts[0])])
+
+    assert verify_transaction(txn, prevouts) == [True, True]
+    # Too few inputs to be worth a pool
+    assert verify_transaction(txn, prevouts, workers=8) == [True, True]
@@ -0,0 +1,97 @@
+import pytest
+
+from two1.bitcoin.block import Block
+from two1.bitcoin.blockfilter import build_basic_filter
+from two1.bitcoin.crypto import PrivateKey
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.headerchain import HeaderChain
+from two1.bitcoin.script import Script
+from two1.bitcoin.txn import CoinbaseInput
+from two1.bitcoin.txn import Transaction
+from two1.bitcoin.txn import TransactionInput
+from two1.bitcoin.txn import TransactionOutput
+from two1.blockchain.exceptions import DataProviderError
+from two1.blockchain.filter_provider import FilterProvider
+
+keys = [PrivateKey(k) for k in range(2000, 2004)]
+addresses = [k.public_key.address() for k in keys]
+scripts = [Script.build_p2pkh(k.public_key.hash160()) for k in keys]
+
+
+def coinbase(height, script):
+    return Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                       [CoinbaseInput(height, b'')],
+                       [TransactionOutput(5000000000, script)],
+                       0)
+
+
+def make_chain():
+    chain = HeaderChain(pow_limit_bits=0x207fffff)
+    blocks = {}
+    filters = {}
+
+    funding = coinbase(1, scripts[0])
+    spend = Transaction(Transaction.DEFAULT_TRANSACTION_VERSION,
+                        [TransactionInput(funding.hash, 0, Script(), 0xffffffff)],
+                        [TransactionOutput(4000000000, scripts[1])],
+                        0)
+    spend.sign_input(0, Transaction.SIG_HASH_ALL, keys[0], scripts[0])
+
+    txns = [[coinbase(0, scripts[3])],
+            [funding],
+            [coinbase(2, scripts[3])],
+            [coinbase(3, scripts[3]), spend],
+            [coinbase(4, scripts[2])]]
+    prev_hash = Hash(bytes(32))
+    for height, block_txns in enumerate(txns):
+        prev_scripts = [scripts[0]] if height == 3 else []
+
+        block = Block(height, 1, prev_hash, 1000000 + 600 * height, 0x207fffff, 0, block_txns)
+        while not block.block_header.valid:
+            block.block_header.nonce += 1
+        chain.append(block.block_header)
+        blocks[bytes(block.hash)] = block
+        filters[bytes(block.hash)] = build_basic_filter(block, prev_scripts)
+        prev_hash = block.hash
+
+    return chain, blocks, filters, spend
+
+
+def test_filter_provider():
+    chain, blocks, filters, spend = make_chain()
+    fetched = []
+
+    def get_block(block_hash):
+        fetched.append(chain.height_of(block_hash))
+        return blocks[bytes(block_hash)]
+
+    provider = FilterProvider(chain, get_block, lambda h: filters.get(bytes(h)))
+    assert provider.get_block_height() == 4
+
+    txns = provider.get_transactions(addresses[:2])
+    assert sorted(fetched) == [1, 3]
+    assert [t['metadata']['block'] for t in txns[addresses[0]]] == [1, 3]
+    assert [t['transaction'].hash for t in txns[addresses[1]]] == [spend.hash]
+    meta = txns[addresses[1]][0]['metadata']
+    assert meta['block_hash'] == chain.get_hash(3)
+    assert meta['confirmations'] == 2
+    assert meta['network_time'] == 1000000 + 600 * 3
+
+    assert provider.get_transactions_by_id([str(spend.hash)])[str(spend.hash)]['transaction'] is spend
+    with pytest.raises(DataProviderError):
+        provider.get_transactions_by_id([str(Hash(bytes(32)))])
+
+    fetched.clear()
+    txns = provider.get_transactions(addresses[:2], limit=1, min_block=2)
+    assert fetched == [3]
+    assert len(txns[addresses[0]]) == 1
+
+    # Blocks without a filter are always read
+    del filters[bytes(chain.get_hash(4))]
+    fetched.clear()
+    txns = provider.get_transactions([addresses[2]], min_block=2)
+    assert fetched == [4]
+    assert len(txns[addresses[2]]) == 1
+
+    with pytest.raises(NotImplementedError):
+        provider.broadcast_transaction(spend)
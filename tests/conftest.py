@@ -46,6 +46,7 @@ def pytest_configure(config):
     """ Register all markers here """
     config.addinivalue_line("markers", "integration: mark a test as an integration test.")
     config.addinivalue_line("markers", "unit: mark a test as a unit test.")
+    config.addinivalue_line("markers", "benchmark: mark a test as a (slow) performance benchmark.")
 
 
 def pytest_report_header(config):
@@ -58,6 +59,9 @@ def pytest_runtest_setup(item):
     integration_marker = item.get_marker("integration")
     if integration_marker and integration_marker.name not in item.config.getoption("-m"):
         pytest.skip("test {} is an integration test")
+    benchmark_marker = item.get_marker("benchmark")
+    if benchmark_marker and benchmark_marker.name not in item.config.getoption("-m"):
+        pytest.skip("test {} is a benchmark")
 
 
 # fixtures
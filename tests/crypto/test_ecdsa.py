@@ -1,6 +1,8 @@
 import hashlib
 import pytest
 import random
+import threading
+import time
 
 from two1.crypto.ecdsa_base import Point
 from two1.crypto import ecdsa_openssl
@@ -293,3 +295,253 @@ def test_secp256k1(curve):
     sig_full = (sig_pt.x << curve.nlen) + sig_pt.y
 
     assert sig_full == 0xb552edd27580141f3b2a5463048cb7cd3e047b97c9f98076c32dbdf85a68718b279fa72dd19bfae05577e06c7c0c1900c371fcd5893f7e1d56a37d30174671f6  # nopep8
+
+
+@pytest.mark.parametrize("curve", [
+    ecdsa_python.p256(),
+    ecdsa_python.secp256k1()
+    ])
+def test_fixed_base_table(curve, tmpdir):
+    table = curve.fixed_base_table
+    assert table is curve.fixed_base_table
+    assert table is type(curve)().fixed_base_table
+
+    scalars = [0, 1, 2, 15, 16, curve.n - 1, curve.n, curve.n + 1]
+    scalars += [random.randrange(1, curve.n) for i in range(20)]
+    for k in scalars:
+        expected = (curve.base_point * k).to_affine()
+        assert curve.base_point_mul(k).to_affine() == expected
+        assert curve.base_point_mul(k, True).to_affine() == expected
+
+    # Serialization round-trip and rejection of corrupted tables
+    b = table.to_bytes()
+    table2 = ecdsa_python.FixedBaseTable.from_bytes(curve, curve.G, table.window, b)
+    assert table2.rows == table.rows
+    corrupted = b[:-1] + bytes([b[-1] ^ 1])
+    assert ecdsa_python.FixedBaseTable.from_bytes(curve, curve.G, table.window, corrupted) is None
+    assert ecdsa_python.FixedBaseTable.from_bytes(curve, curve.G, table.window + 1, b) is None
+
+    # Disk caching
+    cached_curve = type(curve)()
+    cached_curve.table_cache_dir = str(tmpdir)
+    for i in range(2):
+        assert cached_curve._load_fixed_base_table().rows == table.rows
+        assert len(tmpdir.listdir()) == 1
+
+
+@pytest.mark.parametrize("curve", [
+    ecdsa_python.p256(),
+    ecdsa_python.secp256k1()
+    ])
+def test_verify_batch(curve):
+    items = []
+    expected = []
+    for i in range(10):
+        private_key, public_key = curve.gen_key_pair()
+        message = bytes([i]) * i
+        sig_pt, _ = curve.sign(message, private_key)
+
+        # Check the joint multiplication against separate ones
+        u = random.randrange(1, curve.n)
+        v = random.randrange(1, curve.n)
+        q_multiples = [(q.x, q.y) for q in [(public_key * j).to_affine() for j in range(1, 16, 2)]]
+        X, Y, Z = curve._joint_mul(u, v, q_multiples)
+        pt = ecdsa_python.ECPointJacobian(curve, X, Y, Z).to_affine()
+        assert pt == (curve.base_point * u + public_key.to_jacobian() * v).to_affine()
+
+        items.append((message, sig_pt, public_key))
+        expected.append(True)
+        items.append((message + b'\x00', sig_pt, public_key))
+        expected.append(False)
+        items.append((message, Point(sig_pt.x, curve.n - sig_pt.y), public_key))
+        expected.append(True)
+        items.append((message, Point(sig_pt.x, 0), public_key))
+        expected.append(False)
+        items.append((message, Point(sig_pt.x + curve.n, sig_pt.y), public_key))
+        expected.append(False)
+
+    assert curve.verify_batch(items) == expected
+    assert [curve.verify(*item) for item in items] == expected
+    assert curve.verify_batch([]) == []
+
+
+@pytest.mark.parametrize("curve", [
+    ecdsa_python.p256(),
+    ecdsa_python.secp256k1()
+    ])
+def test_public_point_mul(curve):
+    if curve.endomorphism is not None:
+        beta, lam = curve.endomorphism[:2]
+        G = curve.base_point.to_affine()
+        assert (curve.base_point * lam).to_affine() == ecdsa_python.ECPointAffine(curve, (beta * G.x) % curve.p, G.y)
+
+        for k in [0, 1, lam, curve.n - 1] + [random.randrange(curve.n) for i in range(100)]:
+            k1, k2 = curve._split_scalar(k)
+            assert (k1 + k2 * lam - k) % curve.n == 0
+            assert max(abs(k1), abs(k2)).bit_length() <= (curve.nlen + 1) // 2 + 1
+
+    point = curve.base_point * random.randrange(1, curve.n)
+    scalars = [0, 1, 2, curve.n - 1, curve.n, curve.n + 1]
+    scalars += [random.randrange(1, curve.n) for i in range(20)]
+    for k in scalars:
+        expected = (point * k).to_affine()
+        assert curve.public_point_mul(point, k).to_affine() == expected
+        assert curve.public_point_mul(point.to_affine(), k).to_affine() == expected
+    assert curve.public_point_mul(ecdsa_python.ECPointJacobian(curve, 0, 1, 0, True), 5).infinity
+
+
+@pytest.mark.benchmark
+def test_verify_benchmark():
+    n = 20
+    curve = ecdsa_python.secp256k1()
+    items = []
+    for i in range(n):
+        private_key, public_key = curve.gen_key_pair()
+        message = bytes([i]) * 32
+        sig_pt, rec_id = curve.sign(message, private_key)
+        items.append((message, sig_pt, public_key, rec_id))
+
+    def timed(curve):
+        start = time.perf_counter()
+        for message, sig_pt, public_key, _ in items:
+            assert curve.verify(message, sig_pt, public_key)
+        verify = (time.perf_counter() - start) / n * 1000
+
+        start = time.perf_counter()
+        for message, sig_pt, public_key, rec_id in items:
+            keys = curve.recover_public_key(message, sig_pt, rec_id)
+            assert keys[0][0] == public_key
+        recover = (time.perf_counter() - start) / n * 1000
+        return verify, recover
+
+    plain_curve = ecdsa_python.secp256k1()
+    plain_curve.endomorphism = None
+    glv_verify, glv_recover = timed(curve)
+    plain_verify, plain_recover = timed(plain_curve)
+
+    print("verify: %.2f ms with GLV, %.2f ms without" % (glv_verify, plain_verify))
+    print("recover_public_key: %.2f ms with GLV, %.2f ms without" % (glv_recover, plain_recover))
+    assert glv_verify < plain_verify
+
+
+@pytest.mark.parametrize("curve", [
+    ecdsa_python.p256(),
+    ecdsa_python.secp256k1()
+    ])
+def test_to_affine_batch(curve):
+    with pytest.raises(ValueError):
+        curve.modinv(curve.n, curve.n)
+    k = random.randrange(1, curve.n)
+    assert (curve.modinv(k, curve.n) * k) % curve.n == 1
+
+    points = [curve.base_point * random.randrange(1, curve.n) for i in range(10)]
+    points += [points[0].to_affine(), ecdsa_python.ECPointJacobian(curve, 0, 1, 0, True), points[1]]
+    affine = ecdsa_python.to_affine_batch(points)
+    assert affine == [pt.to_affine() for pt in points]
+    assert affine[-2].infinity and not affine[-3].infinity
+    assert ecdsa_python.to_affine_batch([]) == []
+
+    private_keys = [random.randrange(1, curve.n) for i in range(10)]
+    assert curve.public_key_batch(private_keys) == [curve.public_key(k) for k in private_keys]
+
+    items = [(k, pt.to_affine()) for k, pt in zip(private_keys, points)]
+    items.append((curve.n - private_keys[0], curve.public_key(private_keys[0])))
+    result = curve.tweak_add_batch(items)
+    assert result[:-1] == [(curve.base_point * k + pt.to_jacobian()).to_affine() for k, pt in items[:-1]]
+    assert result[-1].infinity
+
+
+@pytest.mark.benchmark
+def test_to_affine_batch_benchmark():
+    n = 200
+    curve = ecdsa_python.secp256k1()
+    points = [curve.base_point * random.randrange(1, curve.n) for i in range(n)]
+
+    start = time.perf_counter()
+    affine = [pt.to_affine() for pt in points]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = ecdsa_python.to_affine_batch(points)
+    batch_time = time.perf_counter() - start
+
+    print("%d points to affine: %.2f ms one at a time, %.2f ms batched" %
+          (n, single_time * 1000, batch_time * 1000))
+    assert batch == affine
+
+
+def test_openssl_object_reuse():
+    curve = ecdsa_openssl.secp256k1()
+    res = ecdsa_openssl.ossl.thread_resources()
+    private_key, public_key = curve.gen_key_pair()
+    message = b'object reuse'
+    sig_pt, _ = curve.sign(message, private_key)
+    assert curve.verify(message, sig_pt, public_key)
+
+    # Native objects are pooled, not allocated for every call
+    keys = res.key_pool(curve.curve_name)
+    allocated = (keys.allocated, res.sigs.allocated)
+    for i in range(10):
+        assert curve.public_key(private_key) == public_key
+        assert curve.verify(message, sig_pt, public_key)
+    assert (keys.allocated, res.sigs.allocated) == allocated
+
+    # Each thread has its own resources
+    other = []
+    thread = threading.Thread(target=lambda: other.append(ecdsa_openssl.ossl.thread_resources()))
+    thread.start()
+    thread.join()
+    assert other[0] is not res
+
+    # Verifying again with the same public keys hits the cache
+    items = []
+    for i in range(20):
+        private_key, public_key = curve.gen_key_pair()
+        sig_pt, _ = curve.sign(message, private_key)
+        items.append((sig_pt, public_key))
+
+    res.clear()
+    for sig_pt, public_key in items:
+        assert curve.verify(message, sig_pt, public_key)
+    hits = res.public_key_hits
+    for sig_pt, public_key in items:
+        assert curve.verify(message, sig_pt, public_key)
+    assert res.public_key_hits - hits == len(items)
+    assert len(res.public_keys) <= res.PUBLIC_KEY_CACHE_SIZE
+
+
+def test_openssl_y_from_x_not_on_curve():
+    curve = ecdsa_openssl.secp256k1()
+    # Leave a valid point in the pooled EC_POINT
+    curve.public_key(12345)
+
+    assert curve.y_from_x(5) == []
+    assert ecdsa_python.secp256k1().y_from_x(5) == []
+
+
+@pytest.mark.benchmark
+def test_openssl_verify_benchmark():
+    curve = ecdsa_openssl.secp256k1()
+    res = ecdsa_openssl.ossl.thread_resources()
+    message = b'object reuse'
+
+    # Measure the per-call overhead with and without cached public keys
+    n = 200
+    items = []
+    for i in range(n):
+        private_key, public_key = curve.gen_key_pair()
+        sig_pt, _ = curve.sign(message, private_key)
+        items.append((sig_pt, public_key))
+
+    res.clear()
+    start = time.perf_counter()
+    for sig_pt, public_key in items:
+        assert curve.verify(message, sig_pt, public_key)
+    cold = (time.perf_counter() - start) / n * 1e6
+
+    start = time.perf_counter()
+    for sig_pt, public_key in items:
+        assert curve.verify(message, sig_pt, public_key)
+    warm = (time.perf_counter() - start) / n * 1e6
+
+    print("openssl verify: %.1f us with new keys, %.1f us with cached keys" % (cold, warm))
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import pytest
+import random
+import time
+
+from two1.crypto.ecdsa_base import Point
+from two1.crypto import ecdsa_python
+
+try:
+    from two1.crypto import ecdsa_secp256k1
+except ImportError:
+    pytest.skip("libsecp256k1 is not available", allow_module_level=True)
+
+ref_curve = ecdsa_python.secp256k1()
+curve = ecdsa_secp256k1.secp256k1()
+
+
+def make_low_s(curve, p, rec_id):
+    new_p = p
+    if p.y >= (curve.n // 2):
+        new_p = Point(p.x, curve.n - p.y)
+        rec_id ^= 0x1
+
+    return new_p, rec_id
+
+
+def test_curve_params():
+    assert isinstance(curve, ecdsa_python.secp256k1)
+    assert curve == ref_curve
+    assert ecdsa_secp256k1.ECPointAffine is ecdsa_python.ECPointAffine
+
+
+def test_parity():
+    rnd = random.Random(0x5ec9256)
+    for i in range(50):
+        private_key = rnd.randrange(1, curve.n)
+        message = os.urandom(rnd.randrange(0, 100))
+
+        # Public keys
+        pub_key = curve.public_key(private_key)
+        ref_pub_key = ref_curve.public_key(private_key)
+        assert pub_key == ref_pub_key
+        assert bytes(pub_key) == bytes(ref_pub_key)
+
+        # y from x
+        assert curve.y_from_x(pub_key.x) == ref_curve.y_from_x(pub_key.x)
+
+        # Signing: both backends produce the same lower-s signature
+        sig_pt, rec_id = curve.sign(message, private_key)
+        ref_sig_pt, ref_rec_id = make_low_s(ref_curve, *ref_curve.sign(message, private_key))
+        assert (sig_pt, rec_id) == (ref_sig_pt, ref_rec_id)
+
+        # Verification, including high-s and bad signatures
+        high_s = Point(sig_pt.x, curve.n - sig_pt.y)
+        bad_sig = Point(sig_pt.x, (sig_pt.y + 1) % curve.n)
+        for sig in [sig_pt, high_s, bad_sig]:
+            assert curve.verify(message, sig, pub_key) == ref_curve.verify(message, sig, pub_key)
+        assert curve.verify(message, sig_pt, pub_key)
+        assert curve.verify(message, high_s, pub_key)
+        assert not curve.verify(message, bad_sig, pub_key)
+        assert not curve.verify(message + b'\x00', sig_pt, pub_key)
+
+        # Pre-hashed messages
+        hashed = hashlib.sha256(message).digest()
+        assert curve.sign(hashed, private_key, False) == (sig_pt, rec_id)
+        assert curve.verify(hashed, sig_pt, pub_key, False)
+
+        # Recovery
+        keys = curve.recover_public_key(message, sig_pt, rec_id)
+        assert keys == ref_curve.recover_public_key(message, sig_pt, rec_id)
+        assert keys[0][0] == pub_key
+
+        # The pure-Python backend does not check that r + n is a valid
+        # x coordinate for recovery ids 2 and 3, so it may return more
+        # (invalid) candidates than libsecp256k1.
+        keys = curve.recover_public_key(message, sig_pt)
+        ref_keys = ref_curve.recover_public_key(message, sig_pt)
+        assert (pub_key, rec_id) in keys
+        assert all(k in ref_keys for k in keys)
+
+
+def test_vectors():
+    # Taken from https://bitcointalk.org/index.php?topic=285142.25
+    private_key = 0x1
+    message = b"Satoshi Nakamoto"
+    sig_pt, _ = curve.sign(message, private_key)
+    sig_full = (sig_pt.x << curve.nlen) + sig_pt.y
+
+    assert sig_full == (0x934b1ea10a4b3c1757e2b0c017d0b6143ce3c9a7e6a4a49860d7a6ab210ee3d8 << 256 |
+                        0x2442ce9d2b916064108014783e923ec36b49743e2ffa1c4496f01a512aafd9e5)
+
+    # An explicit nonce falls back to the pure-Python implementation
+    k = 0x8F8A276C19F4149656B280621E358CCE24F5F52542772691EE69063B74F15D15
+    assert curve._sign(message, private_key, True, k) == ref_curve._sign(message, private_key, True, k)
+
+    x = 0x79be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798
+    y1, y2 = curve.y_from_x(x)
+    assert y1 == 0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8
+    assert y2 == curve.p - y1
+
+    # x = 5 is not on the curve
+    assert curve.y_from_x(5) == []
+
+
+@pytest.mark.benchmark
+def test_benchmark():
+    private_key = 0xf8b8af8ce3c7cca5e300d33939540c10d45ce001b8f252bfbc57ba0342904181
+    message = b"Alan Turing"
+    pub_key = curve.public_key(private_key)
+    sig_pt, _ = curve.sign(message, private_key)
+
+    rates = []
+    for c, num in [(ref_curve, 20), (curve, 1000)]:
+        start = time.perf_counter()
+        for i in range(num):
+            assert c.verify(message, sig_pt, pub_key)
+        rates.append(num / (time.perf_counter() - start))
+
+    print("verify/s: python %.1f, libsecp256k1 %.1f" % tuple(rates))
+    assert rates[1] > rates[0]
@@ -1,9 +1,16 @@
 import inspect
 import os.path
+import pytest
 import time
+import tracemalloc
 
 from two1.blockchain.twentyone_provider import TwentyOneProvider
 from two1.bitcoin.hash import Hash
+from two1.bitcoin.script import Script
+from two1.bitcoin.txn import TransactionInput
+from two1.bitcoin.txn import TransactionOutput
+from two1.bitcoin.utils import address_to_key_hash
+from two1.bitcoin.utils import key_hash_to_address
 from two1.wallet.cache_manager import CacheManager
 from two1.wallet.wallet_txn import WalletTransaction
 
@@ -389,3 +396,133 @@ def test_whole(cache, exp_conf_balance, exp_unconf_balance):
 
     assert conf_balance == exp_conf_balance
     assert unconf_balance == exp_unconf_balance
+
+
+class DictHash(Hash):
+    """ A Hash keeping its fields in a __dict__, as before Hash declared
+        __slots__: the class attributes shadow the slot descriptors.
+        Instances still reserve the (unused) slots, so the footprint is
+        a little larger than it was.
+    """
+    _bytes = None
+
+
+class DictTransactionInput(TransactionInput):
+    outpoint = outpoint_index = script = sequence_num = _serialized = None
+
+
+class DictTransactionOutput(TransactionOutput):
+    value = script = _serialized = None
+
+
+def _build_cache(num_txns, hash_cls, input_cls, output_cls):
+    """ Returns a CacheManager holding num_txns wallet transactions built
+        from the given classes, and the memory allocated to build it.
+    """
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        cm = CacheManager()
+        for i in range(num_txns):
+            h160 = i.to_bytes(20, 'big')
+            txn = WalletTransaction(
+                1,
+                [input_cls(hash_cls(i.to_bytes(32, 'little')), 0, Script(b'\x00'), 0xffffffff)],
+                [output_cls(1000, Script(b'\x76\xa9\x14' + h160 + b'\x88\xac')),
+                 output_cls(2000, Script(b'\xa9\x14' + h160 + b'\x87'))],
+                0)
+            cm.insert_txn(txn)
+        size = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+    return cm, size
+
+
+@pytest.mark.benchmark
+def test_memory_benchmark():
+    num_txns = 50000
+    assert '_bytes' in vars(DictHash(bytes(32)))
+    assert 'value' in vars(DictTransactionOutput(1, Script()))
+
+    cm, after = _build_cache(num_txns, Hash, TransactionInput, TransactionOutput)
+    txids = sorted(cm._txn_cache)
+    del cm
+    cm, before = _build_cache(num_txns, DictHash, DictTransactionInput, DictTransactionOutput)
+
+    print("%d transactions: %.1f MiB with slots, %.1f MiB without (%.0f vs %.0f bytes/txn)" %
+          (num_txns, after / 2**20, before / 2**20, after / num_txns, before / num_txns))
+
+    # Both caches hold the same transactions
+    assert sorted(cm._txn_cache) == txids
+    assert before > after
+
+
+def test_bloom_filter(cache, exp_conf_balance, exp_unconf_balance):
+    cm = CacheManager()
+    cm.load_from_dict(cache, prune_provisional=False)
+    txns = [cm._txn_cache[txid] for txid in sorted(cm._txn_cache)]
+
+    # All transactions of the wallet match, whatever their order
+    bf = cm.bloom_filter
+    assert all(bf.match_transaction(t) for t in txns)
+    cm._bloom_filter = None
+    assert cm.filter_relevant_txns(reversed(txns)) == list(reversed(txns))
+
+    # Transactions paying to or spending from other addresses do not
+    other = WalletTransaction(
+        1,
+        [TransactionInput(Hash(bytes(range(32))), 0, Script(b'\x01\x02'), 0xffffffff)],
+        [TransactionOutput(1000, Script.build_p2pkh(bytes(20)))],
+        0)
+    assert cm.filter_relevant_txns([other] + txns) == txns
+
+    # A new address is matched once inserted
+    addr = key_hash_to_address(bytes([7]) * 20)
+    to_addr = WalletTransaction(
+        1,
+        [TransactionInput(Hash(bytes(range(32))), 1, Script(b'\x01\x02'), 0xffffffff)],
+        [TransactionOutput(1000, Script.build_p2pkh(bytes([7]) * 20))],
+        0)
+    assert cm.filter_relevant_txns([to_addr]) == []
+    cm.insert_address(0x80000000, 0, 10000, addr)
+    assert cm.filter_relevant_txns([to_addr]) == [to_addr]
+
+
+def test_bloom_filter_capacity(cache, exp_conf_balance, exp_unconf_balance):
+    cm = CacheManager()
+    cm.load_from_dict(cache, prune_provisional=False)
+    bf = cm.bloom_filter
+    count = cm._bloom_count
+    assert count <= cm._bloom_capacity
+
+    # Screening doesn't insert anything into the cache's filter
+    addrs = [key_hash_to_address(i.to_bytes(20, 'big')) for i in range(1, 11)]
+    txns = list(cm._txn_cache.values())
+    data = bytes(bf.data)
+    cm.filter_relevant_txns(txns, addrs)
+    assert bytes(bf.data) == data
+    assert cm._bloom_count == count
+
+    # Each inserted address is counted once
+    for i, a in enumerate(addrs):
+        cm.insert_address(0x80000000, 0, 10000 + i, a)
+    assert cm.bloom_filter is bf
+    assert cm._bloom_count == count + len(addrs)
+
+    # Reinserting known transactions only adds the wallet's outpoints
+    cm._txn_cache.clear()
+    for t in txns:
+        cm.insert_txn(t)
+    assert cm._bloom_count - count - len(addrs) <= sum(len(t.outputs) for t in txns)
+
+    # The filter is rebuilt larger rather than filled past its capacity
+    i = len(addrs)
+    while cm._bloom_filter is not None:
+        assert cm._bloom_count <= cm._bloom_capacity
+        cm.insert_address(0x80000000, 0, 10000 + i, key_hash_to_address((i + 1).to_bytes(20, 'big')))
+        i += 1
+    bf = cm.bloom_filter
+    assert cm._bloom_count <= cm._bloom_capacity // 2
+    assert all(bf.contains(address_to_key_hash(key_hash_to_address((j + 1).to_bytes(20, 'big')))[1])
+               for j in range(i))
@@ -19,6 +19,14 @@ Bitcoin data structures after learning the functions in this module.
 from .block import BlockHeader
 from .block import Block
 from .block import CompactBlock
+from .block import MerkleTree
+from .block import verify_merkle_proof
+
+from .blockfile import BlockFileReader
+
+from .blockfilter import GCSFilter
+
+from .bloom import BloomFilter
 
 from .crypto import PrivateKeyBase
 from .crypto import PublicKeyBase
@@ -28,6 +36,7 @@ from .crypto import Signature
 from .crypto import HDKey
 from .crypto import HDPrivateKey
 from .crypto import HDPublicKey
+from .crypto import derive_children
 
 from .exceptions import DeserializationError
 from .exceptions import InvalidTransactionInputError
@@ -42,6 +51,8 @@ from .exceptions import ScriptTypeError
 
 from .hash import Hash
 
+from .headerchain import HeaderChain
+
 from .script import Script
 
 from .txn import TransactionInput
@@ -49,3 +60,8 @@ from .txn import TransactionOutput
 from .txn import CoinbaseInput
 from .txn import UnspentTransactionOutput
 from .txn import Transaction
+
+from .utxo import UTXOSet
+
+from .verify import verify_transaction
+from .verify import verify_block
@@ -1,25 +1,185 @@
-"""This submodule provides the MerkleNode, Block, BlockHeader, and CompactBlock
+"""This submodule provides the MerkleTree, Block, BlockHeader, and CompactBlock
 classes. It allows you to work programmatically with the individual blocks in
 the Bitcoin blockchain."""
+import collections
+import concurrent.futures
+import hashlib
+import os
+import queue
+import struct
+import threading
+import time
+
 from sha256 import sha256 as sha256_midstate
 
 from two1.bitcoin.hash import Hash
 from two1.bitcoin.txn import Transaction
-from two1.bitcoin.utils import bytes_to_str, pack_u32, unpack_u32, bits_to_target, pack_compact_int, unpack_compact_int
+from two1.bitcoin.utils import bytes_to_str, bits_to_target, unpack_compact_int_from, ByteWriter
+from two1.bitcoin.utils import compute_reward
+
+_HEADER_STRUCT = struct.Struct('<I32s32sIII')
+
+
+class MerkleTree(object):
+    """ A Merkle tree stored as a flat, level-ordered array of digests.
+
+    All nodes live in a single contiguous buffer of 32-byte digests
+    (internal byte order): first the leaves (transaction hashes), then
+    each level above them, ending with the root. As in Bitcoin, a level
+    with an odd number of nodes is completed by pairing its last node
+    with itself.
+
+    Args:
+        txids (list): Hashes (Hash or bytes, internal byte order) of the
+            transactions, in block order.
+    """
+
+    def __init__(self, txids):
+        txids = [bytes(t) for t in txids]
+        if not txids:
+            raise ValueError("A merkle tree needs at least one leaf.")
+
+        # Number of nodes and offset (in nodes) of each level
+        self._counts = [len(txids)]
+        self._offsets = [0]
+        while self._counts[-1] > 1:
+            self._offsets.append(self._offsets[-1] + self._counts[-1])
+            self._counts.append((self._counts[-1] + 1) // 2)
+
+        self._buf = bytearray((self._offsets[-1] + 1) * 32)
+        self._buf[:len(txids) * 32] = b''.join(txids)
+        self._index = None
+
+        for level in range(1, len(self._counts)):
+            for i in range(self._counts[level]):
+                self._hash_node(level, i)
+
+    def _node(self, level, i):
+        start = (self._offsets[level] + i) * 32
+        return bytes(self._buf[start:start + 32])
+
+    def _hash_node(self, level, i):
+        """ Recomputes node i of level from its two children.
+        """
+        child = (self._offsets[level - 1] + 2 * i) * 32
+        if 2 * i + 1 < self._counts[level - 1]:
+            data = self._buf[child:child + 64]
+        else:
+            data = self._buf[child:child + 32] * 2
+        start = (self._offsets[level] + i) * 32
+        self._buf[start:start + 32] = hashlib.sha256(hashlib.sha256(data).digest()).digest()
+
+    @property
+    def num_leaves(self):
+        """ int: Number of leaves (transactions) in the tree.
+        """
+        return self._counts[0]
+
+    @property
+    def hash(self):
+        """ Hash: The merkle root.
+        """
+        return Hash(bytes(self._buf[-32:]))
+
+    def leaf(self, index):
+        """ Returns the leaf at index.
+
+        Args:
+            index (int): Position of the transaction in the block.
+
+        Returns:
+            Hash: The transaction hash.
+        """
+        if not 0 <= index < self.num_leaves:
+            raise IndexError("leaf index out of range")
+        return Hash(self._node(0, index))
+
+    def index(self, txid):
+        """ Returns the position of a transaction in the tree.
+
+        Args:
+            txid (Hash or bytes): The transaction hash.
+
+        Returns:
+            int: The index of the leaf or None if the transaction is
+            not in the tree.
+        """
+        if self._index is None:
+            self._index = {}
+            for i in range(self.num_leaves - 1, -1, -1):
+                self._index[self._node(0, i)] = i
+        return self._index.get(bytes(txid))
+
+    def update(self, index, txid):
+        """ Replaces a leaf and recomputes the nodes above it.
 
+        Only the log2(n) nodes on the path from the leaf to the root
+        are rehashed.
 
-class MerkleNode:
-    """A MerkleNode object from which you can build a Merkle tree.
+        Args:
+            index (int): Position of the leaf to replace.
+            txid (Hash or bytes): The new transaction hash.
+        """
+        if not 0 <= index < self.num_leaves:
+            raise IndexError("leaf index out of range")
+        txid = bytes(txid)
+        if len(txid) != 32:
+            raise ValueError("txid must be 32 bytes long")
+
+        self._buf[index * 32:index * 32 + 32] = txid
+        self._index = None
+        for level in range(1, len(self._counts)):
+            index //= 2
+            self._hash_node(level, index)
+
+    def proof(self, index):
+        """ Returns the inclusion proof of the leaf at index.
+
+        Args:
+            index (int): Position of the leaf.
 
-       Args:
-           hash: SHA-256 byte string (internal byte order)
-           left_child: MerkleNode object
-           right_child: MerkleNode object
+        Returns:
+            list(Hash): The sibling of each node on the path from the
+            leaf up to (but excluding) the root.
+        """
+        if not 0 <= index < self.num_leaves:
+            raise IndexError("leaf index out of range")
+
+        rv = []
+        for level in range(len(self._counts) - 1):
+            sibling = index ^ 1
+            if sibling >= self._counts[level]:
+                sibling = index
+            rv.append(Hash(self._node(level, sibling)))
+            index //= 2
+        return rv
+
+
+def verify_merkle_proof(txid, index, proof, merkle_root):
+    """ Verifies that a transaction is included in a block.
+
+    Args:
+        txid (Hash or bytes): The transaction hash.
+        index (int): Position of the transaction in the block.
+        proof (list(Hash)): The proof, as returned by
+            MerkleTree.proof() or Block.merkle_proof().
+        merkle_root (Hash or bytes): Merkle root from the block header.
+
+    Returns:
+        bool: True if the proof links txid to merkle_root, False otherwise.
     """
-    def __init__(self, hash=None, left_child=None, right_child=None):
-        self.left_child = left_child
-        self.right_child = right_child
-        self.hash = hash
+    if index < 0 or index >> len(proof):
+        return False
+
+    cur = bytes(txid)
+    for sibling in proof:
+        if index & 1:
+            cur = bytes(Hash.dhash(bytes(sibling) + cur))
+        else:
+            cur = bytes(Hash.dhash(cur + bytes(sibling)))
+        index >>= 1
+
+    return cur == bytes(merkle_root)
 
 
 class BlockHeader(object):
@@ -55,21 +215,32 @@ class BlockHeader(object):
             bh, b (tuple): A tuple containing two elements - a BlockHeader object
             and the remainder of the bytestream after deserialization.
         """
-        version, b = unpack_u32(b)
-        prev_block_hash, b = Hash(b[0:32]), b[32:]
-        merkle_root_hash, b = Hash(b[0:32]), b[32:]
-        time, b = unpack_u32(b)
-        bits, b = unpack_u32(b)
-        nonce, b = unpack_u32(b)
+        bh, offset = BlockHeader.from_buffer(b)
+        return (bh, b[offset:])
+
+    @staticmethod
+    def from_buffer(buf, offset=0):
+        """ Creates a BlockHeader object from the serialized header
+        found at offset in buf.
+
+        Args:
+            buf (bytes or memoryview): buffer containing the header.
+            offset (int): position in buf at which the (4-byte) version starts.
+
+        Returns:
+            bh, offset (tuple): A tuple containing two elements - a BlockHeader
+            object and the offset of the first byte following the header.
+        """
+        version, prev_block_hash, merkle_root_hash, time, bits, nonce = _HEADER_STRUCT.unpack_from(buf, offset)
 
         return (
             BlockHeader(version,
-                        prev_block_hash,
-                        merkle_root_hash,
+                        Hash(prev_block_hash),
+                        Hash(merkle_root_hash),
                         time,
                         bits,
                         nonce),
-            b
+            offset + _HEADER_STRUCT.size
         )
 
     def __init__(self, version, prev_block_hash, merkle_root_hash,
@@ -110,14 +281,26 @@ class BlockHeader(object):
         Returns:
             byte_str (bytes): The serialized byte stream.
         """
-        return (
-            pack_u32(self.version) +
-            bytes(self.prev_block_hash) +
-            bytes(self.merkle_root_hash) +
-            pack_u32(self.time) +
-            pack_u32(self.bits) +
-            pack_u32(self.nonce)
-        )
+        return _HEADER_STRUCT.pack(self.version,
+                                   bytes(self.prev_block_hash),
+                                   bytes(self.merkle_root_hash),
+                                   self.time,
+                                   self.bits,
+                                   self.nonce)
+
+    def serialize_into(self, writer):
+        """ Serializes the BlockHeader object into a ByteWriter.
+
+        Args:
+            writer (ByteWriter): The writer to serialize into.
+        """
+        writer.write_struct(_HEADER_STRUCT,
+                            self.version,
+                            bytes(self.prev_block_hash),
+                            bytes(self.merkle_root_hash),
+                            self.time,
+                            self.bits,
+                            self.nonce)
 
     @property
     def hash(self):
@@ -129,6 +312,324 @@ class BlockHeader(object):
         return Hash.dhash(bytes(self))
 
 
+class BlockValidationResult(object):
+    """ The outcome of Block.validate_block().
+
+    Attributes:
+        block (Block): The parsed block, or None if it could not be parsed.
+        error (str): Why the block is invalid, or None if it is valid.
+        input_results (list(list(bool))): For each transaction in the
+            block, whether each of its input scripts is verified. Inputs
+            that were not checked, because validation stopped early, are
+            reported as not verified.
+        timings (dict): Seconds spent in each of the stages (see
+            Block.VALIDATION_STAGES) and in total. Since stages overlap,
+            the stage timings may add up to more than the total.
+    """
+
+    def __init__(self):
+        self.block = None
+        self.error = None
+        self.input_results = []
+        self.timings = {stage: 0.0 for stage in Block.VALIDATION_STAGES}
+        self.timings['total'] = 0.0
+
+    @property
+    def valid(self):
+        """ bool: Whether the block passed all the checks.
+        """
+        return self.error is None
+
+
+class _ValidationAborted(Exception):
+    pass
+
+
+_DONE = object()
+
+
+class _ValidationPipeline(object):
+    """ Runs the stages of Block.validate_block().
+
+    Each stage is a generator consuming the items produced by the
+    previous one. When pipelined, each stage but the last runs in
+    its own thread and hands its items to the next one through a bounded
+    queue.
+    """
+
+    # Number of inputs of a transaction checked by each script task
+    SCRIPT_CHUNK_SIZE = 16
+
+    def __init__(self, buf, offset, height, utxo_lookup, workers, queue_size, pipelined):
+        self.buf = memoryview(buf)
+        self.offset = offset
+        self.height = height
+        self.utxo_lookup = utxo_lookup
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pipelined = pipelined
+
+        self.result = BlockValidationResult()
+        self.timings = self.result.timings
+        self.stop = threading.Event()
+        self.header = None
+
+    def fail(self, error):
+        if self.result.error is None:
+            self.result.error = error
+        self.stop.set()
+        raise _ValidationAborted()
+
+    def run(self):
+        start = time.perf_counter()
+        threads = []
+        try:
+            self._check_header()
+            txns = self._connect(self._parse(), threads)
+            txns = self._connect(self._merkle(txns), threads)
+            self._scripts(self._prevouts(txns))
+        except _ValidationAborted:
+            pass
+        finally:
+            self.stop.set()
+            for t in threads:
+                t.join()
+        self.timings['total'] = time.perf_counter() - start
+        return self.result
+
+    def _connect(self, stage, threads):
+        """ Runs a stage in its own thread, if pipelined.
+
+        Returns:
+            iterator: The items produced by the stage.
+        """
+        if not self.pipelined:
+            return stage
+
+        q = queue.Queue(self.queue_size)
+
+        def put(item):
+            while not self.stop.is_set():
+                try:
+                    q.put(item, timeout=0.05)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def feed():
+            try:
+                for item in stage:
+                    if not put(item):
+                        return
+            except _ValidationAborted:
+                pass
+            except Exception as e:
+                if self.result.error is None:
+                    self.result.error = str(e)
+                self.stop.set()
+            put(_DONE)
+
+        t = threading.Thread(target=feed, daemon=True)
+        threads.append(t)
+        t.start()
+
+        def drain():
+            while True:
+                try:
+                    item = q.get(timeout=0.05)
+                except queue.Empty:
+                    if self.stop.is_set():
+                        raise _ValidationAborted()
+                    continue
+                if item is _DONE:
+                    if self.stop.is_set():
+                        raise _ValidationAborted()
+                    return
+                yield item
+
+        return drain()
+
+    def _check_header(self):
+        t = time.perf_counter()
+        try:
+            self.header, self.offset = BlockHeader.from_buffer(self.buf, self.offset)
+        except struct.error:
+            self.fail("Block header is truncated.")
+        finally:
+            self.timings['header'] += time.perf_counter() - t
+        if not self.header.valid:
+            self.fail("Block hash %s does not meet the target." % self.header.hash)
+
+    def _parse(self):
+        t = time.perf_counter()
+        try:
+            num_txns, offset = unpack_compact_int_from(self.buf, self.offset)
+        except (IndexError, struct.error):
+            self.fail("Block is truncated.")
+        if num_txns == 0:
+            self.fail("Block has no transactions.")
+        self.result.input_results.extend([] for _ in range(num_txns))
+        txns = []
+        self.result.block = Block.__new__(Block)
+        self.result.block.block_header = self.header
+        self.result.block.txns = txns
+        self.result.block.merkle_tree = None
+        self.result.block.height = self.height
+        self.timings['parse'] += time.perf_counter() - t
+
+        for _ in range(num_txns):
+            t = time.perf_counter()
+            try:
+                txn, offset = Transaction.from_buffer(self.buf, offset)
+            except Exception as e:
+                self.fail("Transaction %d cannot be parsed: %s" % (len(txns), e))
+            txns.append(txn)
+            self.result.input_results[len(txns) - 1] = [False] * txn.num_inputs
+            self.timings['parse'] += time.perf_counter() - t
+            yield txn
+
+    def _merkle(self, txns):
+        txids = []
+        for txn in txns:
+            t = time.perf_counter()
+            txids.append(txn.hash)
+            self.timings['merkle'] += time.perf_counter() - t
+            yield txn
+
+        t = time.perf_counter()
+        tree = MerkleTree(txids)
+        self.result.block.merkle_tree = tree
+        self.timings['merkle'] += time.perf_counter() - t
+        if tree.hash != self.header.merkle_root_hash:
+            self.fail("Merkle root %s does not match the header (%s)." % (tree.hash, self.header.merkle_root_hash))
+
+    def _prevouts(self, txns):
+        """ Resolves the outputs spent by each transaction, and checks
+        that the coinbase reward does not exceed the subsidy plus fees.
+
+        Yields:
+            tuple: (txn_index, txn, prevout_scripts) for each
+            non-coinbase transaction.
+        """
+        block_outputs = {}
+        spent = set()
+        fees = 0
+        coinbase_value = 0
+        for n, txn in enumerate(txns):
+            t = time.perf_counter()
+            is_coinbase = [i.is_coinbase for i in txn.inputs]
+            if n == 0:
+                if is_coinbase != [True]:
+                    self.fail("The first transaction is not a coinbase.")
+                coinbase_value = sum(o.value for o in txn.outputs)
+                self.result.input_results[0] = [True]
+            else:
+                if any(is_coinbase):
+                    self.fail("Transaction %s has a coinbase input." % txn.hash)
+
+                in_value = 0
+                scripts = []
+                for inp in txn.inputs:
+                    key = (bytes(inp.outpoint), inp.outpoint_index)
+                    if key in spent:
+                        self.fail("Transaction %s double spends %s:%d." % (txn.hash, inp.outpoint, inp.outpoint_index))
+                    spent.add(key)
+                    prevout = block_outputs.get(key)
+                    if prevout is None:
+                        try:
+                            prevout = self.utxo_lookup(inp.outpoint, inp.outpoint_index)
+                        except Exception as e:
+                            self.fail("Looking up %s:%d failed: %s" % (inp.outpoint, inp.outpoint_index, e))
+                    if prevout is None:
+                        self.fail("Transaction %s spends unknown output %s:%d." %
+                                  (txn.hash, inp.outpoint, inp.outpoint_index))
+                    in_value += prevout.value
+                    scripts.append(prevout.script)
+
+                out_value = sum(o.value for o in txn.outputs)
+                if out_value > in_value:
+                    self.fail("Transaction %s spends more than its inputs." % txn.hash)
+                fees += in_value - out_value
+
+            txid = bytes(txn.hash)
+            for i, out in enumerate(txn.outputs):
+                block_outputs[(txid, i)] = out
+            self.timings['prevouts'] += time.perf_counter() - t
+
+            if n > 0:
+                yield n, txn, scripts
+
+        t = time.perf_counter()
+        max_value = compute_reward(self.height) + fees
+        self.timings['reward'] += time.perf_counter() - t
+        if coinbase_value > max_value:
+            self.fail("Coinbase pays %d, more than the allowed %d." % (coinbase_value, max_value))
+
+    def _check_scripts(self, n, i, r):
+        """ Records the results r of the checks of the inputs of
+        transaction n starting at input i, stopping at the first failure.
+        """
+        self.result.input_results[n][i:i + len(r)] = r
+        if not all(r):
+            self.fail("Input %d of transaction %s failed verification." %
+                      (i + r.index(False), self.result.block.txns[n].hash))
+
+    def _scripts(self, items):
+        from two1.bitcoin import verify
+
+        chunk_size = self.SCRIPT_CHUNK_SIZE
+        workers = (os.cpu_count() or 1) if self.workers is None else self.workers
+        if workers <= 1:
+            for n, txn, scripts in items:
+                t = time.perf_counter()
+                r = verify._verify_chunk(txn, list(range(txn.num_inputs)), scripts)
+                self.timings['scripts'] += time.perf_counter() - t
+                self._check_scripts(n, 0, r)
+            return
+
+        futures = {}
+        serialized = {}
+        completed = collections.deque()
+        first = None
+
+        def collect(f):
+            if f not in futures:
+                return
+            n, i = futures.pop(f)
+            try:
+                r = f.result()
+            except Exception as e:
+                self.fail("Verifying transaction %s failed: %s" % (self.result.block.txns[n].hash, e))
+            self._check_scripts(n, i, r)
+
+        with verify._new_executor(workers) as executor:
+            try:
+                for n, txn, scripts in items:
+                    if first is None:
+                        first = time.perf_counter()
+                    for i in range(0, txn.num_inputs, chunk_size):
+                        indices = list(range(i, min(i + chunk_size, txn.num_inputs)))
+                        f = verify._submit(executor, serialized, txn, indices, scripts[i:i + chunk_size])
+                        futures[f] = (n, i)
+                        f.add_done_callback(completed.append)
+                    # Check the chunks finished so far, so that a failure
+                    # stops validation before the rest is submitted.
+                    while completed:
+                        collect(completed.popleft())
+
+                for f in concurrent.futures.as_completed(list(futures)):
+                    collect(f)
+            except BaseException:
+                # Don't wait for the queued chunks when validation stops
+                for f in futures:
+                    f.cancel()
+                raise
+            finally:
+                if first is not None:
+                    self.timings['scripts'] = time.perf_counter() - first
+
+
 class Block(object):
     """ A Bitcoin Block object.
 
@@ -149,6 +650,8 @@ class Block(object):
         txns (list): List of Transaction objects
     """
 
+    VALIDATION_STAGES = ('header', 'parse', 'merkle', 'prevouts', 'reward', 'scripts')
+
     @staticmethod
     def from_bytes(b):
         """ Creates a Block from a serialized byte stream.
@@ -160,14 +663,71 @@ class Block(object):
             block, b (tuple): A tuple. The first item is the deserialized block
             and the second is the remainder of the byte stream.
         """
-        bh, b = BlockHeader.from_bytes(b)
-        num_txns, b = unpack_compact_int(b)
+        block, offset = Block.from_buffer(b)
+        return block, b[offset:]
+
+    @staticmethod
+    def from_buffer(buf, offset=0):
+        """ Creates a Block from the serialized block found at offset in buf.
+
+        The buffer is walked with a moving offset rather than being
+        sliced, so deserialization is linear in the size of the block.
+
+        Args:
+            buf (bytes or memoryview): buffer containing the block.
+            offset (int): position in buf at which the block version starts.
+
+        Returns:
+            block, offset (tuple): A tuple. The first item is the deserialized
+            block and the second is the offset of the first byte following
+            the block.
+        """
+        buf = memoryview(buf)
+        bh, offset = BlockHeader.from_buffer(buf, offset)
+        num_txns, offset = unpack_compact_int_from(buf, offset)
         txns = []
         for i in range(num_txns):
-            t, b = Transaction.from_bytes(b)
+            t, offset = Transaction.from_buffer(buf, offset)
             txns.append(t)
 
-        return Block.from_blockheader(bh, txns), b
+        return Block.from_blockheader(bh, txns), offset
+
+    @staticmethod
+    def validate_block(buf, height, utxo_lookup, offset=0, workers=None, queue_size=64, pipelined=True):
+        """ Parses and fully validates a serialized block.
+
+        The checks run as a pipeline of stages (see VALIDATION_STAGES):
+        the header proof of work is checked, transactions are parsed,
+        hashed into the merkle tree, have the outputs they spend
+        resolved, and finally have their input scripts verified by a pool
+        of workers. Once all the fees are known, the coinbase value is
+        checked against the block reward. Validation stops at the first
+        failure.
+
+        Args:
+            buf (bytes or memoryview): buffer containing the block.
+            height (int): Height of the block, used to compute the reward.
+            utxo_lookup (function): A function taking a transaction hash
+                (Hash) and an output index (int) and returning the
+                corresponding TransactionOutput, or None if it is not
+                known. Outputs created in the block itself are resolved
+                without it. An exception raised by it is reported as the
+                validation error.
+            offset (int): position in buf at which the block version starts.
+            workers (int): Number of script verification workers. Defaults
+                to the number of CPUs. If 1, scripts are verified in the
+                calling thread.
+            queue_size (int): Maximum number of transactions handed from
+                one stage to the next but not yet processed.
+            pipelined (bool): Whether to run the parsing, hashing and
+                prevout stages in their own threads, overlapping with the
+                stages that follow them.
+
+        Returns:
+            BlockValidationResult: The parsed block, the outcome of the
+            checks and the time spent in each stage.
+        """
+        return _ValidationPipeline(buf, offset, height, utxo_lookup, workers, queue_size, pipelined).run()
 
     @classmethod
     def from_blockheader(cls, bh, txns):
@@ -216,48 +776,18 @@ class Block(object):
             coinbase has been updated/changed. The whole merkle
             tree is not computed. Instead, just the left edge is.
         """
-        self._invalidate_coinbase()
-
-    def _invalidate_coinbase(self, merkle_node=None):
-        if merkle_node is None:
-            merkle_node = self.merkle_tree
-
-        if(merkle_node.left_child is None and
-           merkle_node.right_child is None):
-            # This is the node corresponding to the coinbase, update hash
-            merkle_node.hash = self.coinbase_transaction.hash
+        if self.merkle_tree is None:
+            self.invalidate()
             return
-        else:
-            self._invalidate_coinbase(merkle_node.left_child)
 
-        merkle_node.hash = Hash.dhash(bytes(merkle_node.left_child.hash) +
-                                      bytes(merkle_node.right_child.hash))
-
-        # If we're back at the root, update the blockheader
-        if merkle_node is self.merkle_tree:
-            self.block_header.merkle_root_hash = self.merkle_tree.hash
+        self.merkle_tree.update(0, self.coinbase_transaction.hash)
+        self.block_header.merkle_root_hash = self.merkle_tree.hash
 
     def _compute_merkle_tree(self):
         """ Computes the merkle tree from the transactions in self.txns.
-            The merkle root is the top node in the tree and can be accessed as
-            self.merkle_tree.merkle_hash.
-        """
-        # Tree gets built bottom up
-        level_nodes = [MerkleNode(t.hash, None, None) for t in self.txns]
-        while True:
-            if len(level_nodes) == 1:
-                self.merkle_tree = level_nodes[0]  # This is the root
-                return
-            if len(level_nodes) % 2 != 0:
-                # Make sure there are an even number of nodes
-                level_nodes.append(level_nodes[-1])
-            new_level = []
-            for i in range(0, len(level_nodes), 2):
-                left = level_nodes[i]
-                right = level_nodes[i+1]
-                n = MerkleNode(Hash.dhash(bytes(left.hash) + bytes(right.hash)), left, right)
-                new_level.append(n)
-            level_nodes = new_level
+            The merkle root can be accessed as self.merkle_tree.hash.
+        """
+        self.merkle_tree = MerkleTree(t.hash for t in self.txns)
 
     def get_merkle_edge(self):
         """ This function returns the merkle edge required for mining. Specifically,
@@ -267,21 +797,30 @@ class Block(object):
         Returns:
             edge (list): a list of hashes corresponding to the merkle edge
         """
-        return self._get_merkle_edge()
+        if self.merkle_tree is None:
+            self._compute_merkle_tree()
+        return [bytes(h) for h in self.merkle_tree.proof(0)]
 
-    def _get_merkle_edge(self, node=None):
-        # Start at root node and head recurse
-        if node is None:
-            if self.merkle_tree is None:
-                self._compute_merkle_tree()
-            node = self.merkle_tree
+    def merkle_proof(self, txid):
+        """ Returns the proof that a transaction is included in this block.
 
-        r = node.right_child
-        if r.left_child is None and r.right_child is None:
-            # Leaf, so just return right_childs hash
-            return [bytes(node.right_child.hash)]
-        else:
-            return self._get_merkle_edge(node.left_child) + [bytes(node.right_child.hash)]
+        The proof can be checked against the block header with
+        verify_merkle_proof().
+
+        Args:
+            txid (Hash): Hash of a transaction in the block.
+
+        Returns:
+            index, proof (tuple): A tuple. The first item is the position
+            of the transaction in the block and the second is the list of
+            sibling hashes (list(Hash)) from the transaction up to the root.
+        """
+        if self.merkle_tree is None:
+            self._compute_merkle_tree()
+        index = self.merkle_tree.index(txid)
+        if index is None:
+            raise ValueError("Transaction %s is not in this block." % txid)
+        return index, self.merkle_tree.proof(index)
 
     @property
     def coinbase_transaction(self):
@@ -316,11 +855,20 @@ class Block(object):
         Returns:
             b (bytes): The serialized byte stream.
         """
-        return (
-            bytes(self.block_header) +
-            pack_compact_int(len(self.txns)) +
-            b''.join([bytes(t) for t in self.txns])
-        )
+        w = ByteWriter()
+        self.serialize_into(w)
+        return w.getvalue()
+
+    def serialize_into(self, writer):
+        """ Serializes the Block object into a ByteWriter.
+
+        Args:
+            writer (ByteWriter): The writer to serialize into.
+        """
+        self.block_header.serialize_into(writer)
+        writer.write_compact_int(len(self.txns))
+        for t in self.txns:
+            t.serialize_into(writer)
 
 
 class CompactBlock(object):
@@ -0,0 +1,316 @@
+"""This submodule provides the BlockFileReader class, which reads serialized
+blocks from Bitcoin Core style block files (``blk*.dat``).
+
+A block file is a concatenation of records, each made of the network magic
+(4 bytes), the length of the block (4 bytes, little-endian) and the
+serialized block itself. Files are memory-mapped and an index mapping
+block hashes to (file, offset, length) is built by walking the records.
+Only the block headers are hashed while indexing, and blocks are parsed
+lazily, straight from the mapped files, when they are requested.
+
+The index can be persisted next to the block files so that later runs only
+need to scan the data appended since the index was written.
+"""
+import glob
+import hashlib
+import mmap
+import os
+import struct
+
+from two1.bitcoin.block import Block
+from two1.bitcoin.block import BlockHeader
+from two1.bitcoin.exceptions import InvalidBlockError
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.utils import bytes_to_str
+
+MAINNET_MAGIC = bytes.fromhex("f9beb4d9")
+TESTNET_MAGIC = bytes.fromhex("0b110907")
+REGTEST_MAGIC = bytes.fromhex("fabfb5da")
+
+_RECORD_STRUCT = struct.Struct('<4sI')
+_HEADER_SIZE = 80
+
+_INDEX_MAGIC = b'TWO1BIDX'
+_INDEX_VERSION = 1
+_INDEX_HEADER_STRUCT = struct.Struct('<8sII')
+_INDEX_FILE_STRUCT = struct.Struct('<QH')
+_INDEX_COUNT_STRUCT = struct.Struct('<I')
+_INDEX_ENTRY_STRUCT = struct.Struct('<32sIQI')
+
+
+class BlockFileReader(object):
+    """ Reads blocks from one or more block files.
+
+    Blocks are returned in file order, which (unlike block height order)
+    is the order in which they were received by the node that wrote the
+    files. Use the prev_block_hash of each header to link them into a
+    chain.
+
+    Args:
+        paths (str or list(str)): A directory containing ``blk*.dat``
+            files, or a list of files to read, in order.
+        magic (bytes): The network magic that starts every record.
+        index_path (str): If given, the index is loaded from this file
+            (when it exists) and saved back to it after any new blocks
+            have been indexed.
+    """
+
+    def __init__(self, paths, magic=MAINNET_MAGIC, index_path=None):
+        if isinstance(paths, str):
+            paths = sorted(glob.glob(os.path.join(paths, "blk*.dat")))
+        if len(magic) != 4:
+            raise ValueError("magic must be 4 bytes long")
+
+        self.paths = list(paths)
+        self.magic = magic
+        self.index_path = index_path
+
+        self._files = []
+        self._maps = []
+        try:
+            for path in self.paths:
+                f = open(path, "rb")
+                self._files.append(f)
+                size = os.fstat(f.fileno()).st_size
+                # Empty files cannot be mapped
+                self._maps.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b'')
+
+            # Block hash (bytes) -> (file number, offset, length). The
+            # offset is that of the block itself, following the record header.
+            self._index = {}
+            # Ordered list of block hashes, in file order.
+            self._order = []
+            # Offset up to which each file has been indexed.
+            self._scanned = [0] * len(self.paths)
+
+            if index_path is not None and os.path.exists(index_path):
+                self._load_index(index_path)
+
+            updated = False
+            for file_no in range(len(self.paths)):
+                updated |= self._scan(file_no)
+
+            if index_path is not None and updated:
+                self.save_index(index_path)
+        except BaseException:
+            # Don't leak the files opened so far
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Unmaps and closes all the block files.
+        """
+        for m in self._maps:
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for f in self._files:
+            f.close()
+        self._maps = []
+        self._files = []
+
+    def _scan(self, file_no):
+        """ Indexes the records of a file that have not been indexed yet.
+
+        Returns:
+            bool: True if any new blocks were indexed.
+        """
+        data = self._maps[file_no]
+        size = len(data)
+        pos = self._scanned[file_no]
+        found = False
+
+        while pos + _RECORD_STRUCT.size <= size:
+            magic, length = _RECORD_STRUCT.unpack_from(data, pos)
+            if magic != self.magic:
+                if magic == b'\x00\x00\x00\x00':
+                    # Block files are preallocated and zero-padded: this
+                    # is the end of the data written so far.
+                    break
+                raise InvalidBlockError("Bad magic %s at offset %d of %s" %
+                                        (bytes_to_str(magic), pos, self.paths[file_no]))
+
+            start = pos + _RECORD_STRUCT.size
+            if length < _HEADER_SIZE or start + length > size:
+                # Partially written record
+                break
+
+            with memoryview(data)[start:start + _HEADER_SIZE] as header:
+                block_hash = hashlib.sha256(hashlib.sha256(header).digest()).digest()
+            if block_hash not in self._index:
+                self._order.append(block_hash)
+            self._index[block_hash] = (file_no, start, length)
+            found = True
+            pos = start + length
+
+        self._scanned[file_no] = pos
+        return found
+
+    def _load_index(self, index_path):
+        """ Loads a previously saved index.
+
+        Entries for files that have shrunk since the index was saved
+        (or that are not being read) are dropped, so that these files
+        get rescanned.
+        """
+        with open(index_path, "rb") as f:
+            data = f.read()
+
+        index_magic, version, num_files = _INDEX_HEADER_STRUCT.unpack_from(data, 0)
+        if index_magic != _INDEX_MAGIC or version != _INDEX_VERSION:
+            return
+        offset = _INDEX_HEADER_STRUCT.size
+
+        names = [os.path.basename(p) for p in self.paths]
+        file_map = {}
+        for i in range(num_files):
+            scanned, name_len = _INDEX_FILE_STRUCT.unpack_from(data, offset)
+            offset += _INDEX_FILE_STRUCT.size
+            name = data[offset:offset + name_len].decode()
+            offset += name_len
+            if name in names:
+                file_no = names.index(name)
+                if scanned <= len(self._maps[file_no]):
+                    file_map[i] = file_no
+                    self._scanned[file_no] = scanned
+
+        num_entries, = _INDEX_COUNT_STRUCT.unpack_from(data, offset)
+        offset += _INDEX_COUNT_STRUCT.size
+        for block_hash, file_no, block_offset, length in _INDEX_ENTRY_STRUCT.iter_unpack(
+                data[offset:offset + num_entries * _INDEX_ENTRY_STRUCT.size]):
+            if file_no in file_map:
+                self._index[block_hash] = (file_map[file_no], block_offset, length)
+                self._order.append(block_hash)
+
+    def save_index(self, index_path):
+        """ Saves the index so that it does not need to be rebuilt.
+
+        Args:
+            index_path (str): The file to write the index to.
+        """
+        parts = [_INDEX_HEADER_STRUCT.pack(_INDEX_MAGIC, _INDEX_VERSION, len(self.paths))]
+        for path, scanned in zip(self.paths, self._scanned):
+            name = os.path.basename(path).encode()
+            parts.append(_INDEX_FILE_STRUCT.pack(scanned, len(name)))
+            parts.append(name)
+
+        parts.append(_INDEX_COUNT_STRUCT.pack(len(self._order)))
+        for block_hash in self._order:
+            parts.append(_INDEX_ENTRY_STRUCT.pack(block_hash, *self._index[block_hash]))
+
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b''.join(parts))
+        os.replace(tmp_path, index_path)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, block_hash):
+        return bytes(block_hash) in self._index
+
+    def locate(self, block_hash):
+        """ Returns where a block is stored.
+
+        Args:
+            block_hash (Hash): The hash of the block.
+
+        Returns:
+            tuple: (path, offset, length) of the serialized block, or
+            None if the block is not in the files.
+        """
+        entry = self._index.get(bytes(block_hash))
+        if entry is None:
+            return None
+        file_no, offset, length = entry
+        return self.paths[file_no], offset, length
+
+    def block_hashes(self):
+        """ Returns the hashes of all the blocks, in file order.
+
+        Returns:
+            list(Hash): The block hashes.
+        """
+        return [Hash(h) for h in self._order]
+
+    def get_raw_block(self, block_hash):
+        """ Returns a read-only view of a serialized block.
+
+        The view points directly into the mapped file and must be
+        released before the reader is closed.
+
+        Args:
+            block_hash (Hash): The hash of the block.
+
+        Returns:
+            memoryview: The serialized block.
+        """
+        file_no, offset, length = self._entry(block_hash)
+        return memoryview(self._maps[file_no])[offset:offset + length]
+
+    def get_header(self, block_hash):
+        """ Parses the header of a block.
+
+        Args:
+            block_hash (Hash): The hash of the block.
+
+        Returns:
+            BlockHeader: The block header.
+        """
+        file_no, offset, length = self._entry(block_hash)
+        header, _ = BlockHeader.from_buffer(self._maps[file_no], offset)
+        return header
+
+    def get_block(self, block_hash):
+        """ Parses a block.
+
+        Args:
+            block_hash (Hash): The hash of the block.
+
+        Returns:
+            Block: The block.
+        """
+        file_no, offset, length = self._entry(block_hash)
+        return self._parse_block(file_no, offset, length)
+
+    def headers(self):
+        """ Yields the headers of all the blocks, in file order.
+
+        Yields:
+            BlockHeader: Each block header.
+        """
+        for block_hash in self._order:
+            file_no, offset, length = self._index[block_hash]
+            header, _ = BlockHeader.from_buffer(self._maps[file_no], offset)
+            yield header
+
+    def blocks(self):
+        """ Yields all the blocks, in file order.
+
+        Each block is only parsed when it is reached, so memory use
+        does not depend on the size of the files.
+
+        Yields:
+            Block: Each block.
+        """
+        for block_hash in self._order:
+            yield self._parse_block(*self._index[block_hash])
+
+    def _entry(self, block_hash):
+        entry = self._index.get(bytes(block_hash))
+        if entry is None:
+            raise KeyError("Block %s not found." % Hash(bytes(block_hash)))
+        return entry
+
+    def _parse_block(self, file_no, offset, length):
+        with memoryview(self._maps[file_no]) as view:
+            block, end = Block.from_buffer(view, offset)
+        if end != offset + length:
+            raise InvalidBlockError("Block at offset %d of %s has length %d, expected %d" %
+                                    (offset, self.paths[file_no], end - offset, length))
+        return block
@@ -0,0 +1,409 @@
+"""This submodule provides compact block filters as specified in BIP158:
+the GCSFilter class, which builds, serializes and matches Golomb-coded
+sets, and functions to build and chain the basic filters of blocks.
+
+A basic filter commits to every output script created by a block and to
+every output script spent by its inputs. A client can test whether any of
+its scripts appears in a block by matching them against the filter, and
+only fetch the blocks that match. Matching has a false positive rate of
+about 1 / 784931, but no false negatives.
+
+Items are mapped to integers with SipHash-2-4, keyed by the block hash.
+When NumPy is available, the items of a query are hashed together as
+arrays of 64-bit words; otherwise a pure-Python SipHash is used.
+
+See: https://github.com/bitcoin/bips/blob/master/bip-0158.mediawiki
+"""
+import hashlib
+import struct
+
+from two1.bitcoin.utils import pack_compact_int
+from two1.bitcoin.utils import unpack_compact_int_from
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Parameters of basic filters
+BASIC_FILTER_P = 19
+BASIC_FILTER_M = 784931
+
+_MASK64 = 0xffffffffffffffff
+_OP_RETURN = 0x6a
+
+
+def _rotl(x, b):
+    return ((x << b) | (x >> (64 - b))) & _MASK64
+
+
+def siphash24(k0, k1, data):
+    """ Computes the SipHash-2-4 of data.
+
+    Args:
+        k0 (int): First 64-bit half of the key.
+        k1 (int): Second 64-bit half of the key.
+        data (bytes): The message.
+
+    Returns:
+        int: The 64-bit hash.
+    """
+    v0 = k0 ^ 0x736f6d6570736575
+    v1 = k1 ^ 0x646f72616e646f6d
+    v2 = k0 ^ 0x6c7967656e657261
+    v3 = k1 ^ 0x7465646279746573
+
+    n = len(data)
+    tail = n - n % 8
+    words = list(struct.unpack_from('<%dQ' % (tail // 8), data))
+    words.append(int.from_bytes(data[tail:], 'little') | ((n & 0xff) << 56))
+
+    for m in words:
+        v3 ^= m
+        for _ in range(2):
+            v0 = (v0 + v1) & _MASK64
+            v1 = _rotl(v1, 13) ^ v0
+            v0 = _rotl(v0, 32)
+            v2 = (v2 + v3) & _MASK64
+            v3 = _rotl(v3, 16) ^ v2
+            v0 = (v0 + v3) & _MASK64
+            v3 = _rotl(v3, 21) ^ v0
+            v2 = (v2 + v1) & _MASK64
+            v1 = _rotl(v1, 17) ^ v2
+            v2 = _rotl(v2, 32)
+        v0 ^= m
+
+    v2 ^= 0xff
+    for _ in range(4):
+        v0 = (v0 + v1) & _MASK64
+        v1 = _rotl(v1, 13) ^ v0
+        v0 = _rotl(v0, 32)
+        v2 = (v2 + v3) & _MASK64
+        v3 = _rotl(v3, 16) ^ v2
+        v0 = (v0 + v3) & _MASK64
+        v3 = _rotl(v3, 21) ^ v0
+        v2 = (v2 + v1) & _MASK64
+        v1 = _rotl(v1, 17) ^ v2
+        v2 = _rotl(v2, 32)
+
+    return v0 ^ v1 ^ v2 ^ v3
+
+
+def _np_rotl(x, b):
+    return (x << np.uint64(b)) | (x >> np.uint64(64 - b))
+
+
+def _np_siphash24(k0, k1, words):
+    """ Computes the SipHash-2-4 of equal-length messages at once.
+
+    Args:
+        k0 (int): First 64-bit half of the key.
+        k1 (int): Second 64-bit half of the key.
+        words (numpy.ndarray): (n, w) array of the padded 64-bit words
+            of n messages, as built by FilterQuery.
+
+    Returns:
+        numpy.ndarray: The n 64-bit hashes.
+    """
+    n = words.shape[0]
+    v0 = np.full(n, k0 ^ 0x736f6d6570736575, dtype=np.uint64)
+    v1 = np.full(n, k1 ^ 0x646f72616e646f6d, dtype=np.uint64)
+    v2 = np.full(n, k0 ^ 0x6c7967656e657261, dtype=np.uint64)
+    v3 = np.full(n, k1 ^ 0x7465646279746573, dtype=np.uint64)
+
+    def rounds(count):
+        nonlocal v0, v1, v2, v3
+        for _ in range(count):
+            v0 += v1
+            v1 = _np_rotl(v1, 13) ^ v0
+            v0 = _np_rotl(v0, 32)
+            v2 += v3
+            v3 = _np_rotl(v3, 16) ^ v2
+            v0 += v3
+            v3 = _np_rotl(v3, 21) ^ v0
+            v2 += v1
+            v1 = _np_rotl(v1, 17) ^ v2
+            v2 = _np_rotl(v2, 32)
+
+    for i in range(words.shape[1]):
+        m = words[:, i]
+        v3 ^= m
+        rounds(2)
+        v0 ^= m
+
+    v2 ^= np.uint64(0xff)
+    rounds(4)
+
+    return v0 ^ v1 ^ v2 ^ v3
+
+
+def _np_mulhi(a, f):
+    """ Computes (a * f) >> 64 for an array a and an integer f.
+    """
+    low = np.uint64(0xffffffff)
+    shift = np.uint64(32)
+    al, ah = a & low, a >> shift
+    fl, fh = np.uint64(f & 0xffffffff), np.uint64(f >> 32)
+    b = ah * fl
+    c = al * fh
+    mid = ((al * fl) >> shift) + (b & low) + (c & low)
+    return ah * fh + (b >> shift) + (c >> shift) + (mid >> shift)
+
+
+def _key_from_block_hash(block_hash):
+    k = bytes(block_hash)[:16]
+    return int.from_bytes(k[:8], 'little'), int.from_bytes(k[8:], 'little')
+
+
+class FilterQuery(object):
+    """ A set of items to be matched against many filters.
+
+    Hashing the items dominates the cost of matching, and since every
+    filter uses a different key, it has to be done for each filter. This
+    class prepares the items once so that hashing them with a new key is
+    as cheap as possible.
+
+    Args:
+        items (list(bytes)): The items to look for, e.g. output scripts.
+    """
+
+    def __init__(self, items):
+        self.items = sorted(set(bytes(i) for i in items))
+        self._groups = None
+        if np is not None and self.items:
+            # Group items by number of words so each group can be hashed
+            # as a single 2-D array.
+            by_words = {}
+            for item in self.items:
+                by_words.setdefault(len(item) // 8 + 1, []).append(item)
+            self._groups = []
+            for num_words, group in by_words.items():
+                buf = bytearray(len(group) * num_words * 8)
+                for j, item in enumerate(group):
+                    start = j * num_words * 8
+                    buf[start:start + len(item)] = item
+                    buf[start + num_words * 8 - 1] = len(item) & 0xff
+                self._groups.append(np.frombuffer(bytes(buf), dtype='<u8').reshape(len(group), num_words))
+
+    def __len__(self):
+        return len(self.items)
+
+    def hashed(self, k0, k1, f):
+        """ Maps the items into [0, f) using SipHash keyed by (k0, k1).
+
+        Returns:
+            list(int) or numpy.ndarray: The sorted mapped values.
+        """
+        if self._groups is not None:
+            values = np.concatenate([_np_mulhi(_np_siphash24(k0, k1, words), f) for words in self._groups])
+            values.sort()
+            return values
+        return sorted((siphash24(k0, k1, i) * f) >> 64 for i in self.items)
+
+
+class GCSFilter(object):
+    """ A Golomb-coded set.
+
+    Args:
+        n (int): Number of items in the set.
+        data (bytes): The Golomb-Rice coded differences between the
+            sorted hashed items.
+        key (bytes): 16-byte SipHash key. For block filters, this is
+            the first 16 bytes of the block hash.
+        p (int): Golomb-Rice coding parameter.
+        m (int): Inverse of the false positive rate.
+    """
+
+    def __init__(self, n, data, key, p=BASIC_FILTER_P, m=BASIC_FILTER_M):
+        self.n = n
+        self.data = data
+        self.key = bytes(key)[:16]
+        self.p = p
+        self.m = m
+        self._values = None
+
+    @staticmethod
+    def build(items, key, p=BASIC_FILTER_P, m=BASIC_FILTER_M):
+        """ Builds a filter from a set of items.
+
+        Args:
+            items (list(bytes)): The items. Duplicates are ignored.
+            key (bytes): 16-byte SipHash key.
+            p (int): Golomb-Rice coding parameter.
+            m (int): Inverse of the false positive rate.
+
+        Returns:
+            GCSFilter: The filter.
+        """
+        items = set(bytes(i) for i in items)
+        n = len(items)
+        k0, k1 = _key_from_block_hash(key)
+        f = n * m
+        values = sorted((siphash24(k0, k1, i) * f) >> 64 for i in items)
+
+        # The coded stream is assembled as a string of '0'/'1'
+        # characters: each difference is coded as its quotient in unary
+        # followed by its remainder in p bits.
+        fmt = '0%db' % p
+        mask = (1 << p) - 1
+        bits = []
+        last = 0
+        for v in values:
+            delta = v - last
+            bits.append('1' * (delta >> p) + '0' + format(delta & mask, fmt))
+            last = v
+        bits = ''.join(bits)
+        num_bytes = (len(bits) + 7) // 8
+        data = int(bits.ljust(num_bytes * 8, '0'), 2).to_bytes(num_bytes, 'big') if bits else b''
+
+        rv = GCSFilter(n, data, key, p, m)
+        rv._values = values
+        return rv
+
+    @staticmethod
+    def from_bytes(b, key, p=BASIC_FILTER_P, m=BASIC_FILTER_M):
+        """ Deserializes a filter: the number of items as a compact
+        integer, followed by the coded data.
+
+        Args:
+            b (bytes): The serialized filter.
+            key (bytes): 16-byte SipHash key.
+            p (int): Golomb-Rice coding parameter.
+            m (int): Inverse of the false positive rate.
+
+        Returns:
+            GCSFilter: The filter.
+        """
+        n, offset = unpack_compact_int_from(b)
+        return GCSFilter(n, bytes(b[offset:]), key, p, m)
+
+    def __bytes__(self):
+        return pack_compact_int(self.n) + self.data
+
+    @property
+    def hash(self):
+        """ bytes: Double SHA-256 of the serialized filter.
+        """
+        return hashlib.sha256(hashlib.sha256(bytes(self)).digest()).digest()
+
+    def values(self):
+        """ Decodes the sorted hashed items of the filter.
+
+        Returns:
+            list(int): The values in [0, n * m).
+        """
+        if self._values is None:
+            bits = format(int.from_bytes(self.data, 'big'), '0%db' % (len(self.data) * 8)) if self.data else ''
+            values = []
+            pos = 0
+            last = 0
+            p = self.p
+            for _ in range(self.n):
+                end = bits.index('0', pos)
+                last += ((end - pos) << p) + int(bits[end + 1:end + 1 + p], 2)
+                values.append(last)
+                pos = end + 1 + p
+            self._values = values
+        return self._values
+
+    def match(self, item):
+        """ Tests whether an item may be in the set.
+
+        Args:
+            item (bytes): The item to test.
+
+        Returns:
+            bool: False if the item is definitely not in the set, True
+            if it is in it (or is a false positive).
+        """
+        return self.match_any([item])
+
+    def match_any(self, query):
+        """ Tests whether any of several items may be in the set.
+
+        Args:
+            query (FilterQuery or list(bytes)): The items to test. When
+                matching the same items against many filters, pass a
+                FilterQuery to avoid preparing them each time.
+
+        Returns:
+            bool: True if any of the items may be in the set.
+        """
+        if self.n == 0:
+            return False
+        if not isinstance(query, FilterQuery):
+            query = FilterQuery(query)
+        if len(query) == 0:
+            return False
+
+        k0, k1 = _key_from_block_hash(self.key)
+        hashed = query.hashed(k0, k1, self.n * self.m)
+
+        if np is not None and isinstance(hashed, np.ndarray):
+            if not isinstance(self._values, np.ndarray):
+                self._values = np.array(self.values(), dtype=np.uint64)
+            return bool(np.isin(hashed, self._values, assume_unique=False).any())
+
+        values = self.values()
+        i = j = 0
+        while i < len(hashed) and j < len(values):
+            if hashed[i] == values[j]:
+                return True
+            if hashed[i] < values[j]:
+                i += 1
+            else:
+                j += 1
+        return False
+
+
+def basic_filter_items(block, prev_scripts):
+    """ Returns the items committed to by the basic filter of a block.
+
+    Args:
+        block (Block): The block.
+        prev_scripts (list(Script or bytes)): The output scripts spent by
+            the non-coinbase inputs of the block, in any order.
+
+    Returns:
+        set(bytes): The non-empty output scripts of the block, except
+        OP_RETURN ones, and the spent output scripts.
+    """
+    items = set()
+    for txn in block.txns:
+        for out in txn.outputs:
+            script = bytes(out.script)
+            if script and script[0] != _OP_RETURN:
+                items.add(script)
+    for script in prev_scripts:
+        script = bytes(script)
+        if script:
+            items.add(script)
+    return items
+
+
+def build_basic_filter(block, prev_scripts):
+    """ Builds the BIP158 basic filter of a block.
+
+    Args:
+        block (Block): The block.
+        prev_scripts (list(Script or bytes)): The output scripts spent by
+            the non-coinbase inputs of the block.
+
+    Returns:
+        GCSFilter: The filter.
+    """
+    return GCSFilter.build(basic_filter_items(block, prev_scripts), bytes(block.hash))
+
+
+def filter_header(block_filter, prev_header):
+    """ Computes the header committing to a filter and all previous ones.
+
+    Args:
+        block_filter (GCSFilter): The filter of a block.
+        prev_header (bytes): The filter header of the previous block, or
+            32 zero bytes for the genesis block.
+
+    Returns:
+        bytes: The filter header.
+    """
+    return hashlib.sha256(hashlib.sha256(block_filter.hash + bytes(prev_header)).digest()).digest()
@@ -0,0 +1,389 @@
+"""This submodule provides the BloomFilter class, which implements the
+transaction bloom filters specified in BIP37.
+
+A bloom filter is a probabilistic set of byte strings: testing whether an
+item is in the filter never gives false negatives, but gives false
+positives at a rate chosen when the filter is created. A wallet inserts
+the hash160 of each of its addresses (and the outpoints of the outputs it
+owns) and can then discard, without looking any further at them, all the
+transactions that do not match the filter. The filter can be serialized
+and sent to a peer, which only relays matching transactions.
+
+Items are hashed with MurmurHash3 (x86, 32-bit), seeded with the index of
+each hash function and the filter's nTweak.
+
+See: https://github.com/bitcoin/bips/blob/master/bip-0037.mediawiki
+"""
+import math
+import struct
+
+from two1.bitcoin.exceptions import DeserializationError
+from two1.bitcoin.utils import address_to_key_hash
+from two1.bitcoin.utils import pack_compact_int
+from two1.bitcoin.utils import unpack_compact_int_from
+
+# Flags controlling how matched outputs update the filter
+BLOOM_UPDATE_NONE = 0
+BLOOM_UPDATE_ALL = 1
+BLOOM_UPDATE_P2PUBKEY_ONLY = 2
+BLOOM_UPDATE_MASK = 3
+
+MAX_BLOOM_FILTER_SIZE = 36000  # bytes
+MAX_HASH_FUNCS = 50
+
+_HASH_SEED_STEP = 0xfba4c795
+_MASK32 = 0xffffffff
+_LN2 = math.log(2)
+_LN2_SQUARED = _LN2 * _LN2
+
+_TRAILER_STRUCT = struct.Struct('<IIB')
+_OUTPOINT_INDEX_STRUCT = struct.Struct('<I')
+# Unpacking functions for the 4-byte blocks of items, keyed by size
+_BLOCK_STRUCTS = {}
+
+_OP_PUSHDATA1 = 0x4c
+_OP_PUSHDATA2 = 0x4d
+_OP_PUSHDATA4 = 0x4e
+_OP_1 = 0x51
+_OP_16 = 0x60
+_OP_CHECKSIG = 0xac
+_OP_CHECKMULTISIG = 0xae
+
+
+def _murmur3_blocks(data):
+    """ Mixes the blocks of data, which does not depend on the seed.
+
+    Returns:
+        tuple: The mixed 4-byte blocks, the mixed tail (or None) and the
+        length of data, to be passed to _murmur3_finish().
+    """
+    n = len(data)
+    end = n & ~3
+    blocks = []
+    unpack = _BLOCK_STRUCTS.get(end)
+    if unpack is None:
+        unpack = _BLOCK_STRUCTS[end] = struct.Struct('<%dI' % (end >> 2)).unpack_from
+    for k in unpack(data):
+        k = (k * 0xcc9e2d51) & _MASK32
+        k = ((k << 15) | (k >> 17)) & _MASK32
+        blocks.append((k * 0x1b873593) & _MASK32)
+
+    tail = None
+    if n & 3:
+        k = (int.from_bytes(data[end:], 'little') * 0xcc9e2d51) & _MASK32
+        k = ((k << 15) | (k >> 17)) & _MASK32
+        tail = (k * 0x1b873593) & _MASK32
+
+    return blocks, tail, n
+
+
+def _murmur3_finish(seed, mixed):
+    blocks, tail, n = mixed
+    h = seed
+    for k in blocks:
+        h ^= k
+        h = ((h << 13) | (h >> 19)) & _MASK32
+        h = (h * 5 + 0xe6546b64) & _MASK32
+    if tail is not None:
+        h ^= tail
+
+    h ^= n
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & _MASK32
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & _MASK32
+    h ^= h >> 16
+    return h
+
+
+def murmur3(seed, data):
+    """ Computes the 32-bit x86 MurmurHash3 of data.
+
+    Args:
+        seed (int): 32-bit seed.
+        data (bytes): The data to hash.
+
+    Returns:
+        int: The 32-bit hash.
+    """
+    return _murmur3_finish(seed & _MASK32, _murmur3_blocks(data))
+
+
+def script_pushes(script):
+    """ Returns the data pushed by a script, the way BIP37 walks scripts.
+
+    Parsing stops at the first truncated push.
+
+    Args:
+        script (bytes): The serialized script.
+
+    Returns:
+        list(bytes): The data of each push, including empty pushes.
+    """
+    rv = []
+    n = len(script)
+    pos = 0
+    while pos < n:
+        op = script[pos]
+        pos += 1
+        if op > _OP_PUSHDATA4:
+            continue
+        if op < _OP_PUSHDATA1:
+            size = op
+        elif op == _OP_PUSHDATA1:
+            if pos + 1 > n:
+                break
+            size = script[pos]
+            pos += 1
+        elif op == _OP_PUSHDATA2:
+            if pos + 2 > n:
+                break
+            size = script[pos] | (script[pos + 1] << 8)
+            pos += 2
+        else:
+            if pos + 4 > n:
+                break
+            size = int.from_bytes(script[pos:pos + 4], 'little')
+            pos += 4
+        if pos + size > n:
+            break
+        rv.append(script[pos:pos + size])
+        pos += size
+    return rv
+
+
+def _is_p2pk_or_multisig(script, pushes):
+    """ Whether an output script pays to a public key or is a bare
+    multi-signature script, in which case spending it does not reveal
+    any data matching the filter.
+    """
+    if not script:
+        return False
+    if script[-1] == _OP_CHECKSIG:
+        return len(pushes) == 1 and len(pushes[0]) in (33, 65) and len(script) == len(pushes[0]) + 2
+    if script[-1] == _OP_CHECKMULTISIG and len(script) > 2:
+        m, n = script[0], script[-2]
+        return (_OP_1 <= m <= _OP_16 and _OP_1 <= n <= _OP_16 and
+                len(pushes) == n - _OP_1 + 1 and m <= n)
+    return False
+
+
+def outpoint_bytes(txid, index):
+    """ Serializes an outpoint, as inserted into bloom filters.
+
+    Args:
+        txid (Hash or bytes): Hash of the transaction.
+        index (int): Index of the output in the transaction.
+
+    Returns:
+        bytes: The 36-byte outpoint.
+    """
+    return bytes(txid) + _OUTPOINT_INDEX_STRUCT.pack(index)
+
+
+class BloomFilter(object):
+    """ A BIP37 bloom filter.
+
+    Args:
+        n_elements (int): Number of elements the filter is sized for.
+        fp_rate (float): Desired false positive rate once n_elements
+            have been inserted.
+        tweak (int): 32-bit value added to the seed of each hash
+            function, so that filters of different clients differ.
+        flags (int): One of the BLOOM_UPDATE_* constants, controlling
+            which outpoints are inserted when an output matches.
+    """
+
+    def __init__(self, n_elements, fp_rate, tweak=0, flags=BLOOM_UPDATE_ALL):
+        n_elements = max(n_elements, 1)
+        size = int(-1 / _LN2_SQUARED * n_elements * math.log(fp_rate) / 8)
+        size = max(1, min(size, MAX_BLOOM_FILTER_SIZE))
+        n_hash_funcs = int(size * 8 / n_elements * _LN2)
+        n_hash_funcs = max(1, min(n_hash_funcs, MAX_HASH_FUNCS))
+        self._init(bytearray(size), n_hash_funcs, tweak, flags)
+
+    def _init(self, data, n_hash_funcs, tweak, flags):
+        self.data = data
+        self.n_hash_funcs = n_hash_funcs
+        self.tweak = tweak & _MASK32
+        self.flags = flags
+        self._nbits = len(data) * 8
+        self._seeds = [(i * _HASH_SEED_STEP + self.tweak) & _MASK32 for i in range(n_hash_funcs)]
+        self._update_flags()
+
+    def _update_flags(self):
+        self._full = all(b == 0xff for b in self.data)
+        self._empty = not any(self.data)
+
+    @staticmethod
+    def from_bytes(b):
+        """ Deserializes a filter, as sent in a filterload message.
+
+        Args:
+            b (bytes): The serialized filter.
+
+        Returns:
+            BloomFilter: The filter.
+        """
+        size, offset = unpack_compact_int_from(b, 0)
+        if size > MAX_BLOOM_FILTER_SIZE or offset + size + _TRAILER_STRUCT.size != len(b):
+            raise DeserializationError("Invalid bloom filter.")
+        n_hash_funcs, tweak, flags = _TRAILER_STRUCT.unpack_from(b, offset + size)
+        if n_hash_funcs > MAX_HASH_FUNCS:
+            raise DeserializationError("Bloom filter has too many hash functions.")
+
+        rv = BloomFilter.__new__(BloomFilter)
+        rv._init(bytearray(b[offset:offset + size]), n_hash_funcs, tweak, flags)
+        return rv
+
+    def __bytes__(self):
+        return (pack_compact_int(len(self.data)) + bytes(self.data) +
+                _TRAILER_STRUCT.pack(self.n_hash_funcs, self.tweak, self.flags))
+
+    def __contains__(self, item):
+        return self.contains(item)
+
+    def insert(self, item):
+        """ Inserts an item.
+
+        Args:
+            item (bytes): The item to insert.
+        """
+        if self._full:
+            return
+        mixed = _murmur3_blocks(bytes(item))
+        data = self.data
+        nbits = self._nbits
+        for seed in self._seeds:
+            i = _murmur3_finish(seed, mixed) % nbits
+            data[i >> 3] |= 1 << (i & 7)
+        self._empty = False
+
+    def insert_address(self, address):
+        """ Inserts the hash160 of a Base58Check encoded address, which is
+        pushed by the output scripts paying to the address.
+
+        Args:
+            address (str): The address.
+        """
+        self.insert(address_to_key_hash(address)[1])
+
+    def insert_outpoint(self, txid, index):
+        """ Inserts an outpoint, so that the inputs spending it match.
+
+        Args:
+            txid (Hash): Hash of the transaction.
+            index (int): Index of the output in the transaction.
+        """
+        self.insert(outpoint_bytes(txid, index))
+
+    def contains(self, item):
+        """ Tests whether an item may have been inserted.
+
+        Args:
+            item (bytes): The item.
+
+        Returns:
+            bool: False if the item was definitely not inserted.
+        """
+        if self._full:
+            return True
+        if self._empty:
+            return False
+        # The blocks of the item are only mixed once for all the hash
+        # functions, and most items that are not in the filter are
+        # rejected after the first two.
+        mixed = _murmur3_blocks(bytes(item))
+        data = self.data
+        nbits = self._nbits
+        for seed in self._seeds:
+            i = _murmur3_finish(seed, mixed) % nbits
+            if not data[i >> 3] & (1 << (i & 7)):
+                return False
+        return True
+
+    def match_transaction(self, txn):
+        """ Tests whether a transaction matches the filter, the way BIP37
+        nodes do before relaying it.
+
+        A transaction matches if its hash, any data pushed by one of its
+        output scripts, any outpoint it spends or any data pushed by one
+        of its input scripts is in the filter. Depending on the flags,
+        the outpoints of the matching outputs are inserted into the
+        filter, so that the transactions spending them match too.
+
+        Args:
+            txn (Transaction): The transaction.
+
+        Returns:
+            bool: False if the transaction definitely does not match.
+        """
+        if self._full:
+            return True
+        if self._empty:
+            return False
+
+        found = False
+        txid = bytes(txn.hash)
+        if self.contains(txid):
+            found = True
+
+        update = self.flags & BLOOM_UPDATE_MASK
+        for i, out in enumerate(txn.outputs):
+            script = bytes(out.script)
+            pushes = script_pushes(script)
+            for data in pushes:
+                if data and self.contains(data):
+                    found = True
+                    if update == BLOOM_UPDATE_ALL or \
+                       (update == BLOOM_UPDATE_P2PUBKEY_ONLY and _is_p2pk_or_multisig(script, pushes)):
+                        self.insert(outpoint_bytes(txid, i))
+                    break
+
+        if found:
+            return True
+
+        for inp in txn.inputs:
+            if self.contains(outpoint_bytes(inp.outpoint, inp.outpoint_index)):
+                return True
+            for data in script_pushes(bytes(inp.script)):
+                if data and self.contains(data):
+                    return True
+
+        return False
+
+    def filter_transactions(self, txns):
+        """ Returns the transactions matching the filter.
+
+        Unlike calling match_transaction() on each transaction in turn,
+        a transaction spending an output of another transaction of txns
+        matches regardless of the order of txns, provided the flags
+        cause the outpoints of matching outputs to be inserted.
+
+        Args:
+            txns (list(Transaction)): The transactions, e.g. those of a
+                block or of a data provider response.
+
+        Returns:
+            list(Transaction): The matching transactions, in the order
+            they were given.
+        """
+        txns = list(txns)
+        matched = [self.match_transaction(t) for t in txns]
+
+        if self.flags & BLOOM_UPDATE_MASK:
+            # A transaction spending an output of a transaction that
+            # matched after it was tested may match now that the
+            # outpoint has been inserted.
+            checked = set()
+            while True:
+                new_ids = set(bytes(t.hash) for t, m in zip(txns, matched) if m) - checked
+                if not new_ids:
+                    break
+                checked |= new_ids
+                for i, t in enumerate(txns):
+                    if not matched[i] and \
+                       any(bytes(inp.outpoint) in new_ids for inp in t.inputs):
+                        matched[i] = self.match_transaction(t)
+
+        return [t for t, m in zip(txns, matched) if m]
@@ -2,21 +2,48 @@
 It also provides HDPublicKey and HDPrivateKey classes for working with HD
 wallets."""
 import math
-import base58
 import base64
+import concurrent.futures
 import hashlib
 import hmac
 from mnemonic.mnemonic import Mnemonic
+import os
 import random
 from two1.bitcoin.utils import bytes_to_str
 from two1.bitcoin.utils import address_to_key_hash
+from two1.bitcoin.utils import b58decode_check
+from two1.bitcoin.utils import b58encode_check
+from two1.bitcoin.utils import LRUCache
+from two1.bitcoin.utils import pubkey_to_address
 from two1.bitcoin.utils import rand_bytes
+from two1.crypto import ecdsa
+from two1.crypto import ecdsa_python
 from two1.crypto.ecdsa_base import Point
 from two1.crypto.ecdsa import ECPointAffine
 from two1.crypto.ecdsa import secp256k1
 
 bitcoin_curve = secp256k1()
 
+# Process-wide cache of successful signature verifications, keyed by
+# (message digest, public key x, public key y, r, s). Only successes
+# are cached, so a failed verification is always recomputed. Use
+# sig_cache.resize(0) to disable it.
+SIG_CACHE_SIZE = 50000
+sig_cache = LRUCache("Signature verification", SIG_CACHE_SIZE)
+
+# Process-wide cache of PublicKey objects parsed from compressed keys,
+# keyed by the 33 compressed bytes, so that parsing a key seen before
+# doesn't compute a modular square root again. The cached objects are
+# shared by all callers, which is safe because PublicKey objects are
+# immutable. Use pubkey_cache.resize(0) to disable it.
+PUBKEY_CACHE_SIZE = 20000
+pubkey_cache = LRUCache("Compressed public key", PUBKEY_CACHE_SIZE)
+
+# Number of children derived per chunk by derive_children(). Chunks
+# are spread over the workers; fewer children are derived in the
+# calling thread.
+DERIVE_CHUNK_SIZE = 500
+
 
 def get_bytes(s):
     """Returns the byte representation of a hex- or byte-string."""
@@ -175,6 +202,7 @@ class PublicKeyBase(object):
         PublicKey: The object representing the public key.
 
     """
+    __slots__ = ()
 
     @staticmethod
     def from_bytes(key_bytes):
@@ -340,7 +368,7 @@ class PrivateKey(PrivateKeyBase):
         Returns:
             PrivateKey: A PrivateKey object
         """
-        b58dec = base58.b58decode_check(private_key)
+        b58dec = b58decode_check(private_key)
         version = b58dec[0]
         assert version in [PrivateKey.TESTNET_VERSION,
                            PrivateKey.MAINNET_VERSION]
@@ -483,7 +511,7 @@ class PrivateKey(PrivateKeyBase):
             str: A Base58Check encoded string representing the key.
         """
         version = self.TESTNET_VERSION if testnet else self.MAINNET_VERSION
-        return base58.b58encode_check(bytes([version]) + bytes(self))
+        return b58encode_check(bytes([version]) + bytes(self))
 
     def __bytes__(self):
         return self.key.to_bytes(32, 'big')
@@ -498,6 +526,9 @@ class PublicKey(PublicKeyBase):
     This class provides a high-level API to using an ECDSA public
     key, specifically for Bitcoin (secp256k1) purposes.
 
+    PublicKey objects are immutable, so that they can be shared (see
+    `pubkey_cache`).
+
     Args:
         x (int): The x component of the public key point.
         y (int): The y component of the public key point.
@@ -506,6 +537,8 @@ class PublicKey(PublicKeyBase):
         PublicKey: The object representing the public key.
     """
 
+    __slots__ = ('point', 'ripe', 'ripe_compressed')
+
     TESTNET_VERSION = 0x6F
     MAINNET_VERSION = 0x00
 
@@ -570,6 +603,9 @@ class PublicKey(PublicKeyBase):
         odd y component, 0x03 is followed by 32 bytes containing
         the x component.
 
+        Compressed keys are looked up in (and added to) `pubkey_cache`,
+        so the same object may be returned for the same bytes.
+
         Args:
             key_bytes (bytes or str): A byte stream that conforms to the above.
 
@@ -591,6 +627,10 @@ class PublicKey(PublicKeyBase):
             if key_bytes_len != 33:
                 raise ValueError("key_bytes must be exactly 33 bytes long when compressed.")
 
+            public_key = pubkey_cache.get(b)
+            if public_key is not None:
+                return public_key
+
             x = int.from_bytes(b[1:33], 'big')
             ys = bitcoin_curve.y_from_x(x)
 
@@ -599,6 +639,10 @@ class PublicKey(PublicKeyBase):
             for y in ys:
                 if y & 0x1 == last_bit:
                     break
+
+            public_key = PublicKey(x, y)
+            pubkey_cache.put(b, public_key)
+            return public_key
         else:
             return None
 
@@ -687,16 +731,26 @@ class PublicKey(PublicKeyBase):
         if not bitcoin_curve.is_on_curve(p):
             raise ValueError("The provided (x, y) are not on the secp256k1 curve.")
 
-        self.point = p
+        # The fields are only ever set here (see __setattr__)
+        object.__setattr__(self, 'point', p)
 
         # RIPEMD-160 of SHA-256
         r = hashlib.new('ripemd160')
         r.update(hashlib.sha256(bytes(self)).digest())
-        self.ripe = r.digest()
+        object.__setattr__(self, 'ripe', r.digest())
 
         r = hashlib.new('ripemd160')
         r.update(hashlib.sha256(self.compressed_bytes).digest())
-        self.ripe_compressed = r.digest()
+        object.__setattr__(self, 'ripe_compressed', r.digest())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PublicKey objects are immutable.")
+
+    def __delattr__(self, name):
+        raise AttributeError("PublicKey objects are immutable.")
+
+    def __reduce__(self):
+        return (PublicKey, (self.point.x, self.point.y))
 
     def hash160(self, compressed=True):
         """ Return the RIPEMD-160 hash of the SHA-256 hash of the
@@ -724,8 +778,8 @@ class PublicKey(PublicKeyBase):
             bytes: Base58Check encoded string
         """
         # Put the version byte in front, 0x00 for Mainnet, 0x6F for testnet
-        version = bytes([self.TESTNET_VERSION]) if testnet else bytes([self.MAINNET_VERSION])
-        return base58.b58encode_check(version + self.hash160(compressed))
+        version = self.TESTNET_VERSION if testnet else self.MAINNET_VERSION
+        return pubkey_to_address(self.compressed_bytes if compressed else bytes(self), version)
 
     def verify(self, message, signature, do_hash=True):
         """ Verifies that message was appropriately signed.
@@ -743,7 +797,54 @@ class PublicKey(PublicKeyBase):
             otherwise.
         """
         msg = get_bytes(message)
-        return bitcoin_curve.verify(msg, signature, self.point, do_hash)
+        digest = hashlib.sha256(msg).digest() if do_hash else msg
+        key = (digest, self.point.x, self.point.y, signature.r, signature.s)
+        if sig_cache.get(key):
+            return True
+
+        verified = bitcoin_curve.verify(digest, signature, self.point, False)
+        if verified:
+            sig_cache.put(key, True)
+
+        return verified
+
+    @staticmethod
+    def verify_batch(items, do_hash=True):
+        """ Verifies many signatures in a single call.
+
+        This is considerably faster than calling verify() for each
+        signature with backends that can share work between
+        verifications.
+
+        Args:
+            items (list(tuple)): (message, signature, public_key) tuples
+               where message is bytes or a hex str, signature is a Signature
+               and public_key is a PublicKey or HDPublicKey.
+            do_hash (bool): True if the messages should be hashed prior
+              to verifying, False if not.
+
+        Returns:
+            list(bool): Whether each signature is verified.
+        """
+        rv = [True] * len(items)
+        keys = []
+        checks = []
+        for i, (message, signature, public_key) in enumerate(items):
+            if isinstance(public_key, HDPublicKey):
+                public_key = public_key._key
+            msg = get_bytes(message)
+            digest = hashlib.sha256(msg).digest() if do_hash else msg
+            key = (digest, public_key.point.x, public_key.point.y, signature.r, signature.s)
+            if not sig_cache.get(key):
+                keys.append((i, key))
+                checks.append((digest, signature, public_key.point))
+
+        for (i, key), verified in zip(keys, bitcoin_curve.verify_batch(checks, False)):
+            rv[i] = verified
+            if verified:
+                sig_cache.put(key, True)
+
+        return rv
 
     def to_base64(self):
         """ Hex representation of the serialized byte stream.
@@ -785,6 +886,7 @@ class Signature(object):
     Returns:
         sig (Signature): A Signature object.
     """
+    __slots__ = ('r', 's', 'recovery_id')
 
     @staticmethod
     def from_der(der):
@@ -1013,7 +1115,7 @@ class HDKey(object):
                 Either an HD private or
                 public key object, depending on what was serialized.
         """
-        return HDKey.from_bytes(base58.b58decode_check(key))
+        return HDKey.from_bytes(b58decode_check(key))
 
     @staticmethod
     def from_bytes(b):
@@ -1207,7 +1309,7 @@ class HDKey(object):
             str: A Base58Check encoded string representing the key.
         """
         b = self.testnet_bytes if testnet else bytes(self)
-        return base58.b58encode_check(b)
+        return b58encode_check(b)
 
     def _serialize(self, testnet=False):
         version = self.TESTNET_VERSION if testnet else self.MAINNET_VERSION
@@ -1506,6 +1608,11 @@ class HDPublicKey(HDKey, PublicKeyBase):
     MAINNET_VERSION = 0x0488B21E
     TESTNET_VERSION = 0x043587CF
 
+    # Maximum number of children cached per key by from_parent(). 0
+    # disables the cache. Only public keys cache their children, so
+    # that derived private keys are not kept around.
+    CHILD_CACHE_SIZE = 1000
+
     @staticmethod
     def from_parent(parent_key, i):
         """
@@ -1517,6 +1624,10 @@ class HDPublicKey(HDKey, PublicKeyBase):
             if i & 0x80000000:
                 raise ValueError("Can't generate a hardened child key from a parent public key.")
             else:
+                child = parent_key.child_cache.get(i)
+                if child is not None:
+                    return child
+
                 I = hmac.new(parent_key.chain_code,
                              parent_key.compressed_bytes + i.to_bytes(length=4, byteorder='big'),
                              hashlib.sha512).digest()
@@ -1531,20 +1642,99 @@ class HDPublicKey(HDKey, PublicKeyBase):
                     return None
 
                 child_depth = parent_key.depth + 1
-                return HDPublicKey(x=Ki.x,
-                                   y=Ki.y,
-                                   chain_code=Ir,
-                                   index=i,
-                                   depth=child_depth,
-                                   parent_fingerprint=parent_key.fingerprint)
+                child = HDPublicKey(x=Ki.x,
+                                    y=Ki.y,
+                                    chain_code=Ir,
+                                    index=i,
+                                    depth=child_depth,
+                                    parent_fingerprint=parent_key.fingerprint)
+                parent_key.child_cache.put(i, child)
+                return child
         else:
             raise TypeError("parent_key must be either a HDPrivateKey or HDPublicKey object")
 
+    @staticmethod
+    def from_parent_batch(parent_key, indices):
+        """ Derives many non-hardened child public keys from a parent
+        public key at once.
+
+        Children found in the parent's `child_cache` are reused. The
+        other child points are computed together by the curve backend
+        (see `tweak_add_batch()`), which lets the pure-Python backend
+        convert all of them to affine coordinates with a single
+        modular inversion.
+
+        Args:
+            parent_key (HDPublicKey): The parent public key.
+            indices (iterable(int)): Indices of the children to derive.
+
+        Returns:
+            list(HDPublicKey): The child keys, in the same order as
+            indices. An entry is None if the index results in an
+            invalid key.
+        """
+        if not isinstance(parent_key, HDPublicKey):
+            raise TypeError("parent_key must be an HDPublicKey object.")
+
+        indices = list(indices)
+        cache = parent_key.child_cache
+        rv = [cache.get(i) for i in indices]
+
+        parent_bytes = parent_key.compressed_bytes
+        derived = []
+        for pos, i in enumerate(indices):
+            if rv[pos] is not None:
+                continue
+            if i & 0x80000000:
+                raise ValueError("Can't generate a hardened child key from a parent public key.")
+
+            I = hmac.new(parent_key.chain_code,
+                         parent_bytes + i.to_bytes(length=4, byteorder='big'),
+                         hashlib.sha512).digest()
+            Il, Ir = I[:32], I[32:]
+            parse_Il = int.from_bytes(Il, 'big')
+            if parse_Il < bitcoin_curve.n:
+                derived.append((pos, i, parse_Il, Ir))
+
+        parent_point = parent_key._key.point
+        points = bitcoin_curve.tweak_add_batch([(d[2], parent_point) for d in derived])
+
+        child_depth = parent_key.depth + 1
+        parent_fingerprint = parent_key.fingerprint
+        for (pos, i, _, Ir), Ki in zip(derived, points):
+            if Ki.infinity:
+                continue
+            child = HDPublicKey(x=Ki.x,
+                                y=Ki.y,
+                                chain_code=Ir,
+                                index=i,
+                                depth=child_depth,
+                                parent_fingerprint=parent_fingerprint)
+            cache.put(i, child)
+            rv[pos] = child
+
+        return rv
+
     def __init__(self, x, y, chain_code, index, depth,
                  parent_fingerprint=b'\x00\x00\x00\x00'):
         key = PublicKey(x, y)
         HDKey.__init__(self, key, chain_code, index, depth, parent_fingerprint)
         PublicKeyBase.__init__(self)
+        self._child_cache = None
+
+    @property
+    def child_cache(self):
+        """ Returns the cache of the children derived from this key,
+        keyed by index. The cached children are shared by all callers
+        and must not be modified.
+
+        Returns:
+            LRUCache: The cache, holding at most `CHILD_CACHE_SIZE`
+            children.
+        """
+        if self._child_cache is None:
+            self._child_cache = LRUCache("HD child keys", self.CHILD_CACHE_SIZE)
+        return self._child_cache
 
     @property
     def identifier(self):
@@ -1615,3 +1805,82 @@ class HDPublicKey(HDKey, PublicKeyBase):
             b (bytes): A 33-byte long byte string.
         """
         return self._key.compressed_bytes
+
+
+def _derive_children_chunk(parent, indices):
+    """ Derives a chunk of children in a worker process. The parent is
+    passed as the arguments to HDPublicKey() and the children are
+    returned as (x, y, chain_code) tuples, which are cheaper to send
+    back than the keys.
+    """
+    children = HDPublicKey.from_parent_batch(HDPublicKey(*parent), indices)
+    return [(c._key.point.x, c._key.point.y, c.chain_code) if c is not None else None
+            for c in children]
+
+
+def derive_children(parent_key, indices, workers=1):
+    """ Derives many non-hardened child public keys of a key, such as
+    a range of payout or change addresses of a wallet account.
+
+    The indices are split into chunks of `DERIVE_CHUNK_SIZE` that are
+    derived with `HDPublicKey.from_parent_batch()` and fanned out over
+    a pool of workers: threads when the ECDSA backend is implemented
+    in C, processes with the pure-Python backend. The children are
+    added to the child cache of the parent public key.
+
+    Args:
+        parent_key (HDPrivateKey or HDPublicKey): The parent key. For
+            a private key, the children of its public key are derived.
+        indices (iterable(int)): Indices of the children to derive,
+            e.g. range(start, end).
+        workers (int): Number of workers to use. If 1 (the default),
+            or if there is a single chunk, the children are derived in
+            the calling thread. If None, the number of CPUs is used.
+
+    Returns:
+        list(HDPublicKey): The child keys, in the same order as
+        indices. An entry is None if the index results in an invalid
+        key.
+    """
+    if isinstance(parent_key, HDPrivateKey):
+        parent_key = parent_key.public_key
+    elif not isinstance(parent_key, HDPublicKey):
+        raise TypeError("parent_key must be either a HDPrivateKey or HDPublicKey object")
+
+    indices = list(indices)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = [indices[i:i + DERIVE_CHUNK_SIZE] for i in range(0, len(indices), DERIVE_CHUNK_SIZE)]
+    if workers <= 1 or len(chunks) <= 1:
+        return HDPublicKey.from_parent_batch(parent_key, indices)
+
+    if ecdsa._ecdsa is not ecdsa_python:
+        # ctypes calls release the GIL
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(HDPublicKey.from_parent_batch, parent_key, chunk)
+                       for chunk in chunks]
+            return [child for f in futures for child in f.result()]
+
+    parent = (parent_key._key.point.x, parent_key._key.point.y, parent_key.chain_code,
+              parent_key.index, parent_key.depth, parent_key.parent_fingerprint)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_derive_children_chunk, parent, chunk) for chunk in chunks]
+
+        rv = []
+        cache = parent_key.child_cache
+        child_depth = parent_key.depth + 1
+        parent_fingerprint = parent_key.fingerprint
+        for chunk, f in zip(chunks, futures):
+            for i, child in zip(chunk, f.result()):
+                if child is not None:
+                    x, y, chain_code = child
+                    child = HDPublicKey(x=x,
+                                        y=y,
+                                        chain_code=chain_code,
+                                        index=i,
+                                        depth=child_depth,
+                                        parent_fingerprint=parent_fingerprint)
+                    cache.put(i, child)
+                rv.append(child)
+
+    return rv
@@ -21,6 +21,7 @@ class Hash(object):
     Returns:
         Hash: a Hash object.
     """
+    __slots__ = ('_bytes',)
 
     @staticmethod
     def dhash(b):
@@ -32,7 +33,9 @@ class Hash(object):
         Returns:
             Hash: a hash object containing the double-hash of b.
         """
-        return Hash(hashlib.sha256(hashlib.sha256(b).digest()).digest())
+        h = Hash.__new__(Hash)
+        h._bytes = hashlib.sha256(hashlib.sha256(b).digest()).digest()
+        return h
 
     def __init__(self, h):
         if isinstance(h, bytes):
@@ -50,15 +53,21 @@ class Hash(object):
         return self._bytes
 
     def __eq__(self, b):
-        if isinstance(b, bytes):
-            return self._bytes == b
-        elif isinstance(b, Hash):
+        if isinstance(b, Hash):
             return self._bytes == b._bytes
+        elif isinstance(b, bytes):
+            return self._bytes == b
         elif isinstance(b, str):
             return self._bytes == Hash(b)._bytes
         else:
             raise TypeError("b must be either a Hash object or bytes")
 
+    def __hash__(self):
+        """ Hashes like the underlying bytes (which compare equal to the
+            Hash), so a Hash can be used directly as a dict key.
+        """
+        return hash(self._bytes)
+
     def __str__(self):
         """ Returns a hex string in RPC order
         """
@@ -0,0 +1,434 @@
+"""This submodule provides the HeaderChain class, a compact store for a
+chain of block headers.
+
+Headers are kept serialized (80 bytes each), back to back, in a single
+bytearray indexed by height, alongside a second bytearray holding their
+hashes. The store can be mirrored to a file of raw headers so that it
+survives restarts.
+
+New headers are validated in bulk before being connected: linkage to the
+previous header, proof of work against the target encoded in bits, and
+difficulty retargets every 2016 blocks. When NumPy is available, the
+linkage, proof of work and difficulty checks are done on whole arrays of
+headers at once. Competing branches are resolved by total work, which may
+disconnect (reorganize) headers at the tip.
+"""
+import hashlib
+import os
+import struct
+
+from two1.bitcoin.block import BlockHeader
+from two1.bitcoin.exceptions import InvalidBlockHeaderError
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.utils import bits_to_target
+from two1.bitcoin.utils import target_to_bits
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HEADER_SIZE = 80
+
+# Difficulty adjustment parameters, see: https://en.bitcoin.it/wiki/Difficulty
+RETARGET_INTERVAL = 2016
+TARGET_TIMESPAN = 14 * 24 * 60 * 60
+
+MAINNET_POW_LIMIT_BITS = 0x1d00ffff
+
+_BITS_STRUCT = struct.Struct('<I')
+_BITS_OFFSET = 72
+_TIME_OFFSET = 68
+
+
+def _dhash(b):
+    return hashlib.sha256(hashlib.sha256(b).digest()).digest()
+
+
+def _work(bits):
+    """ Returns the expected number of hashes needed to find a header
+        meeting the target encoded in bits.
+    """
+    return (1 << 256) // (bits_to_target(bits) + 1)
+
+
+class HeaderChain(object):
+    """ A chain of block headers, indexed by height.
+
+    Args:
+        path (str): If given, the headers are loaded from this file (when
+            it exists) and every change to the chain is written back to it.
+        start_height (int): Height of the first header in the chain. This
+            allows starting from a checkpoint rather than from the genesis
+            block.
+        pow_limit_bits (int): Compact representation of the easiest
+            allowed target.
+        check_retarget (bool): Whether to check difficulty adjustments.
+            This should be turned off for networks with special difficulty
+            rules, such as testnet.
+    """
+
+    def __init__(self, path=None, start_height=0, pow_limit_bits=MAINNET_POW_LIMIT_BITS, check_retarget=True):
+        self.start_height = start_height
+        self.pow_limit = bits_to_target(pow_limit_bits)
+        self.check_retarget = check_retarget
+
+        self._headers = bytearray()
+        self._hashes = bytearray()
+        # Block hash (bytes) -> height
+        self._heights = {}
+
+        self._file = None
+        if path is not None:
+            mode = "r+b" if os.path.exists(path) else "w+b"
+            self._file = open(path, mode)
+            data = self._file.read()
+            # Drop any partially written header
+            data = data[:len(data) - len(data) % HEADER_SIZE]
+            self._file.truncate(len(data))
+            self._connect(data, self._hash_headers(data), write=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ Closes the backing file, if any.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return len(self._headers) // HEADER_SIZE
+
+    def __contains__(self, block_hash):
+        return bytes(block_hash) in self._heights
+
+    @property
+    def height(self):
+        """ int: Height of the tip of the chain, or start_height - 1
+            if the chain is empty.
+        """
+        return self.start_height + len(self) - 1
+
+    @property
+    def tip(self):
+        """ BlockHeader: The header at the tip of the chain, or None
+            if the chain is empty.
+        """
+        if not self._headers:
+            return None
+        return self.get_header(self.height)
+
+    def _index(self, height):
+        i = height - self.start_height
+        if not 0 <= i < len(self):
+            raise IndexError("height %d is not in the chain" % height)
+        return i
+
+    def get_header(self, height):
+        """ Returns the header at a given height.
+
+        Args:
+            height (int): The height of the block.
+
+        Returns:
+            BlockHeader: The block header.
+        """
+        header, _ = BlockHeader.from_buffer(self._headers, self._index(height) * HEADER_SIZE)
+        return header
+
+    def get_hash(self, height):
+        """ Returns the hash of the block at a given height.
+
+        Args:
+            height (int): The height of the block.
+
+        Returns:
+            Hash: The block hash.
+        """
+        i = self._index(height) * 32
+        return Hash(bytes(self._hashes[i:i + 32]))
+
+    def height_of(self, block_hash):
+        """ Returns the height of a block in the chain.
+
+        Args:
+            block_hash (Hash): The hash of the block.
+
+        Returns:
+            int: The height of the block or None if it is not in the chain.
+        """
+        return self._heights.get(bytes(block_hash))
+
+    def confirmations(self, block_hash):
+        """ Returns the number of confirmations of a block.
+
+        Args:
+            block_hash (Hash): The hash of the block.
+
+        Returns:
+            int: 1 for the tip of the chain, 2 for its parent and so
+            on. 0 if the block is not in the chain.
+        """
+        height = self.height_of(block_hash)
+        if height is None:
+            return 0
+        return self.height - height + 1
+
+    def append(self, header):
+        """ Adds a header at the tip of the chain.
+
+        Args:
+            header (BlockHeader): The header to add.
+
+        Raises:
+            InvalidBlockHeaderError: If the header does not extend the tip
+                of the chain or fails validation.
+        """
+        if self._headers and header.prev_block_hash != self.get_hash(self.height):
+            raise InvalidBlockHeaderError("Header %s does not extend the tip of the chain." % header.hash)
+        self.add_headers([header])
+
+    def add_headers(self, headers):
+        """ Validates and connects a sequence of consecutive headers.
+
+        The first header must follow a header of the chain. If it does not
+        follow the tip, the headers form a competing branch, which replaces
+        the headers it conflicts with only if it has more total work.
+        Leading headers that are already in the chain are skipped.
+
+        Args:
+            headers (list(BlockHeader) or bytes): The headers, either as
+                objects or as a buffer of concatenated serialized headers.
+
+        Returns:
+            list(BlockHeader): The headers that were disconnected from the
+            tip of the chain, if any, or None if the headers form a branch
+            with less work than the chain and were not connected.
+
+        Raises:
+            InvalidBlockHeaderError: If the headers do not connect to the
+                chain or fail validation.
+        """
+        if isinstance(headers, (bytes, bytearray, memoryview)):
+            data = bytes(headers)
+            if len(data) % HEADER_SIZE:
+                raise InvalidBlockHeaderError("Buffer length is not a multiple of %d." % HEADER_SIZE)
+        else:
+            data = b''.join(bytes(h) for h in headers)
+        hashes = self._hash_headers(data)
+
+        # Skip headers already in the chain
+        skip = 0
+        while skip < len(hashes) // 32 and bytes(hashes[skip * 32:skip * 32 + 32]) in self._heights:
+            skip += 1
+        data = data[skip * HEADER_SIZE:]
+        hashes = hashes[skip * 32:]
+        if not data:
+            return []
+
+        if self._headers:
+            prev_height = self.height_of(data[4:36])
+            if prev_height is None:
+                raise InvalidBlockHeaderError("Header %s does not connect to the chain." % Hash(hashes[:32]))
+        else:
+            prev_height = self.start_height - 1
+
+        self.validate(data, hashes, prev_height + 1)
+
+        disconnected = []
+        if prev_height < self.height:
+            new_work = sum(_work(b) for b in self._bits(data))
+            old_start = self._index(prev_height + 1) * HEADER_SIZE
+            old_work = sum(_work(b) for b in self._bits(self._headers[old_start:]))
+            if new_work <= old_work:
+                return None
+            disconnected = [self.get_header(h) for h in range(prev_height + 1, self.height + 1)]
+            self._disconnect(prev_height + 1)
+
+        self._connect(data, hashes)
+        return disconnected
+
+    @staticmethod
+    def _hash_headers(data):
+        view = memoryview(data)
+        return b''.join(_dhash(view[i:i + HEADER_SIZE]) for i in range(0, len(data), HEADER_SIZE))
+
+    @staticmethod
+    def _bits(data):
+        return [_BITS_STRUCT.unpack_from(data, i)[0] for i in range(_BITS_OFFSET, len(data), HEADER_SIZE)]
+
+    def _connect(self, data, hashes, write=True):
+        height = self.height + 1
+        for i in range(0, len(hashes), 32):
+            self._heights[bytes(hashes[i:i + 32])] = height
+            height += 1
+        self._headers += data
+        self._hashes += hashes
+
+        if write and self._file is not None:
+            self._file.seek(len(self._headers) - len(data))
+            self._file.write(data)
+            self._file.flush()
+
+    def _disconnect(self, height):
+        """ Removes all the headers from height up to the tip.
+        """
+        i = self._index(height)
+        for j in range(i * 32, len(self._hashes), 32):
+            del self._heights[bytes(self._hashes[j:j + 32])]
+        del self._headers[i * HEADER_SIZE:]
+        del self._hashes[i * 32:]
+
+        if self._file is not None:
+            self._file.truncate(len(self._headers))
+            self._file.flush()
+
+    def _raw_header(self, height, data, first_height):
+        """ Returns the serialized header at height, looking first in
+            the headers being validated and then in the chain.
+        """
+        if height >= first_height:
+            i = (height - first_height) * HEADER_SIZE
+            return data[i:i + HEADER_SIZE]
+        i = self._index(height) * HEADER_SIZE
+        return self._headers[i:i + HEADER_SIZE]
+
+    def _expected_bits(self, height, data, first_height):
+        """ Computes the bits required at a retarget height, or returns
+            None if the headers needed are not available.
+        """
+        if height - RETARGET_INTERVAL < self.start_height:
+            return None
+        first = self._raw_header(height - RETARGET_INTERVAL, data, first_height)
+        last = self._raw_header(height - 1, data, first_height)
+        first_time, = _BITS_STRUCT.unpack_from(first, _TIME_OFFSET)
+        last_time, last_bits = struct.unpack_from('<II', last, _TIME_OFFSET)
+
+        timespan = last_time - first_time
+        timespan = max(TARGET_TIMESPAN // 4, min(timespan, TARGET_TIMESPAN * 4))
+        target = min(bits_to_target(last_bits) * timespan // TARGET_TIMESPAN, self.pow_limit)
+        return target_to_bits(target)
+
+    def validate(self, data, hashes, first_height):
+        """ Validates consecutive serialized headers against the chain.
+
+        Args:
+            data (bytes): The concatenated serialized headers.
+            hashes (bytes): The concatenated hashes of the headers.
+            first_height (int): Height of the first header. The header
+                before it (if any) must be in the chain.
+
+        Raises:
+            InvalidBlockHeaderError: If any of the headers is invalid.
+        """
+        n = len(data) // HEADER_SIZE
+        if n == 0:
+            return
+
+        if first_height > self.start_height:
+            prev = self._raw_header(first_height - 1, data, first_height)
+            j = self._index(first_height - 1) * 32
+            prev_hash = bytes(self._hashes[j:j + 32])
+            prev_bits, = _BITS_STRUCT.unpack_from(prev, _BITS_OFFSET)
+        else:
+            prev_hash = None
+            prev_bits = None
+
+        if np is not None:
+            bad = self._check_np(data, hashes, prev_hash, prev_bits, first_height)
+        else:
+            bad = self._check_py(data, hashes, prev_hash, prev_bits, first_height)
+        if bad is not None:
+            i, reason = bad
+            raise InvalidBlockHeaderError("Header %s at height %d: %s." %
+                                          (Hash(bytes(hashes[i * 32:i * 32 + 32])), first_height + i, reason))
+
+        if self.check_retarget:
+            start = first_height + (-first_height) % RETARGET_INTERVAL
+            for height in range(max(start, RETARGET_INTERVAL), first_height + n, RETARGET_INTERVAL):
+                expected = self._expected_bits(height, data, first_height)
+                i = height - first_height
+                bits, = _BITS_STRUCT.unpack_from(data, i * HEADER_SIZE + _BITS_OFFSET)
+                if expected is not None and bits != expected:
+                    raise InvalidBlockHeaderError("Header %s at height %d: bad difficulty retarget." %
+                                                  (Hash(bytes(hashes[i * 32:i * 32 + 32])), height))
+
+    def _check_py(self, data, hashes, prev_hash, prev_bits, first_height):
+        targets = {}
+        for i in range(len(data) // HEADER_SIZE):
+            header = data[i * HEADER_SIZE:(i + 1) * HEADER_SIZE]
+            if prev_hash is not None and header[4:36] != prev_hash:
+                return i, "does not follow the previous header"
+
+            bits, = _BITS_STRUCT.unpack_from(header, _BITS_OFFSET)
+            if bits not in targets:
+                targets[bits] = bits_to_target(bits)
+            if targets[bits] > self.pow_limit:
+                return i, "target is above the proof of work limit"
+
+            prev_hash = bytes(hashes[i * 32:i * 32 + 32])
+            if int.from_bytes(prev_hash, 'little') >= targets[bits]:
+                return i, "hash does not meet the target"
+
+            if (self.check_retarget and prev_bits is not None and
+                    (first_height + i) % RETARGET_INTERVAL != 0 and bits != prev_bits):
+                return i, "difficulty changed outside of a retarget"
+            prev_bits = bits
+
+        return None
+
+    def _check_np(self, data, hashes, prev_hash, prev_bits, first_height):
+        n = len(data) // HEADER_SIZE
+        headers = np.frombuffer(data, dtype=np.uint8).reshape(n, HEADER_SIZE)
+        block_hashes = np.frombuffer(hashes, dtype=np.uint8).reshape(n, 32)
+        bits = np.frombuffer(data, dtype='<u4').reshape(n, HEADER_SIZE // 4)[:, _BITS_OFFSET // 4]
+        rows = np.arange(n)
+
+        # Each header must point to the hash of the one before it
+        bad_link = np.zeros(n, dtype=bool)
+        bad_link[1:] = np.any(headers[1:, 4:36] != block_hashes[:-1], axis=1)
+        if prev_hash is not None:
+            bad_link[0] = bytes(headers[0, 4:36]) != prev_hash
+
+        # Expand the targets into big-endian 32-byte arrays so they can be
+        # compared with the hashes byte by byte.
+        exponent = (bits >> 24).astype(np.int64)
+        targets = np.zeros((n, 32), dtype=np.uint8)
+        for k in range(3):
+            pos = 32 - exponent + k
+            ok = (pos >= 0) & (pos < 32)
+            targets[rows[ok], pos[ok]] = (bits[ok] >> (8 * (2 - k))) & 0xff
+
+        def less(a, b):
+            diff = a != b
+            first = diff.argmax(axis=1)
+            return diff.any(axis=1) & (a[rows, first] < b[rows, first])
+
+        limit = np.frombuffer(self.pow_limit.to_bytes(32, 'big'), dtype=np.uint8)
+        bad_limit = less(np.broadcast_to(limit, (n, 32)), targets)
+        bad_pow = ~less(block_hashes[:, ::-1], targets)
+
+        bad_bits = np.zeros(n, dtype=bool)
+        if self.check_retarget:
+            bad_bits[1:] = bits[1:] != bits[:-1]
+            if prev_bits is not None:
+                bad_bits[0] = bits[0] != prev_bits
+            bad_bits &= (first_height + rows) % RETARGET_INTERVAL != 0
+
+        reasons = [(bad_link, "does not follow the previous header"),
+                   (bad_limit, "target is above the proof of work limit"),
+                   (bad_pow, "hash does not meet the target"),
+                   (bad_bits, "difficulty changed outside of a retarget")]
+        bad_any = bad_link | bad_limit | bad_pow | bad_bits
+        if not bad_any.any():
+            return None
+
+        i = int(bad_any.argmax())
+        for bad, reason in reasons:
+            if bad[i]:
+                return i, reason
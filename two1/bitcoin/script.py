@@ -3,22 +3,61 @@ Bitcoin opcodes. At the simplest level, it can read in the raw bytes of a
 Bitcoin script, parse it, and determine what type of script it is (P2PKH, P2SH,
 multi-sig, etc). It also provides capabilities for building more complex
 scripts programmatically."""
-import base58
-import copy
-import re
 import struct
 
 from two1.bitcoin.crypto import PublicKey
 from two1.bitcoin.crypto import Signature
 from two1.bitcoin.exceptions import ScriptParsingError
+from two1.bitcoin.utils import b58encode_check
+from two1.bitcoin.utils import ByteWriter
 from two1.bitcoin.utils import bytes_to_str
+from two1.bitcoin.utils import CacheStats
 from two1.bitcoin.utils import hash160
 from two1.bitcoin.utils import key_hash_to_address
 from two1.bitcoin.utils import pack_var_str
+from two1.bitcoin.utils import pubkey_to_address
 from two1.bitcoin.utils import unpack_var_str
+from two1.bitcoin.utils import unpack_var_str_from
 from two1.bitcoin.utils import render_int
 
 
+def _parse_pushes(raw, start=0):
+    """ Splits a push-only raw script into the data it pushes, without
+    disassembling it.
+
+    Args:
+        raw (bytes): The serialized script.
+        start (int): Offset of the first operation to consider.
+
+    Returns:
+        list(bytes): The data pushed by each operation, or None if
+        any operation (including OP_0) is not a data push or the
+        script is truncated.
+    """
+    pushes = []
+    i = start
+    end = len(raw)
+    while i < end:
+        op = raw[i]
+        i += 1
+        if op == 0 or op > 0x4e:
+            return None
+        if op < 0x4c:
+            datalen = op
+        else:
+            pushlen = 1 << (op - 0x4c)
+            if i + pushlen > end:
+                return None
+            datalen = int.from_bytes(raw[i:i + pushlen], 'little')
+            i += pushlen
+        if i + datalen > end:
+            return None
+        pushes.append(raw[i:i + datalen])
+        i += datalen
+
+    return pushes
+
+
 class Script(object):
     """ Handles all Bitcoin script-related needs.
     Currently this means: parsing text scripts,
@@ -71,6 +110,12 @@ class Script(object):
     BTC_OPCODE_REV_TABLE = {v: k for k, v in BTC_OPCODE_TABLE.items()}
     _ser_dispatch_table = None
 
+    # Counts how many times __bytes__ re-assembled the tokens (misses)
+    # versus returned the previously assembled bytes (hits).
+    serialization_stats = CacheStats("Script serialization")
+    _serialized = None
+    _hex = None
+
     P2SH_TESTNET_VERSION = 0xC4
     P2SH_MAINNET_VERSION = 0x05
     P2PKH_TESTNET_VERSION = 0x6F
@@ -93,6 +138,23 @@ class Script(object):
 
         return (Script(raw_script), b)
 
+    @staticmethod
+    def from_buffer(buf, offset=0):
+        """ Deserializes a script found at offset in buf into a Script
+        object. Assumes the script is prepended with its length in bytes.
+
+        Args:
+            buf (bytes or memoryview): buffer containing the script.
+            offset (int): position in buf at which the length prefix starts.
+
+        Returns:
+            (scr, offset) (tuple): A tuple with the deserialized Script object
+            and the offset of the first byte following the script.
+        """
+        raw_script, offset = unpack_var_str_from(buf, offset)
+
+        return (Script(raw_script), offset)
+
     @staticmethod
     def from_hex(h, size_prepended=False):
         """ Deserializes a hex-encoded string into a Script.
@@ -376,6 +438,16 @@ class Script(object):
 
         return self._ast
 
+    def _raw_bytes(self):
+        """ Returns the serialized script, or None if it cannot be
+        serialized (i.e. it was built from text containing words that
+        are not opcodes).
+        """
+        try:
+            return bytes(self)
+        except (KeyError, ValueError):
+            return None
+
     def hash160(self):
         """ Return the RIPEMD-160 hash of the SHA-256 hash of the
         script.
@@ -397,7 +469,7 @@ class Script(object):
         """
         rv = ""
         prefix = bytes([self.P2SH_TESTNET_VERSION if testnet else self.P2SH_MAINNET_VERSION])
-        rv = base58.b58encode_check(prefix + self.hash160())
+        rv = b58encode_check(prefix + self.hash160())
 
         return rv
 
@@ -411,29 +483,27 @@ class Script(object):
                 'signature': The DER-encoded signature
                 'public_key': The bytes corresponding the public key.
         """
-        if len(self) != 2:
-            raise TypeError("Script is not a P2PKH signature script")
-
-        if not isinstance(self[0], bytes) or \
-           not isinstance(self[1], bytes):
+        raw = self._raw_bytes()
+        pushes = _parse_pushes(raw) if raw else None
+        if pushes is None or len(pushes) != 2:
             raise TypeError(
                 "Signature script must contain two push operations.")
 
+        sig_bytes, public_key = pushes
         try:
-            sig_bytes = self[0]
             hash_type = sig_bytes[-1]
             Signature.from_der(sig_bytes[:-1])
-        except ValueError:
+        except (IndexError, ValueError):
             raise TypeError("Signature does not appear to be valid")
 
         try:
-            PublicKey.from_bytes(self[1])
+            PublicKey.from_bytes(public_key)
         except ValueError:
             raise TypeError("Public key does not appear to be valid")
 
         return dict(hash_type=hash_type,
                     signature=sig_bytes,
-                    public_key=self[1])
+                    public_key=public_key)
 
     def extract_multisig_redeem_info(self):
         """ Returns information about the multisig redeem script
@@ -449,9 +519,10 @@ class Script(object):
 
         # The last byte of the raw script should be 0xae which is
         # OP_CHECKMULTISIG
-        scr_bytes = bytes(self)
+        scr_bytes = self._raw_bytes()
 
-        if scr_bytes[-1] != self.BTC_OPCODE_TABLE['OP_CHECKMULTISIG']:
+        if not scr_bytes or len(scr_bytes) < 3 or \
+           scr_bytes[-1] != self.BTC_OPCODE_TABLE['OP_CHECKMULTISIG']:
             raise exc
 
         # Check m and n to be sure they are valid
@@ -464,21 +535,25 @@ class Script(object):
         if n < m or n >= 16:
             raise exc
 
-        # Now consume all the public keys and make sure those were
-        # the only things in.
-        b = scr_bytes[1:]
+        # Now consume all the public keys (which must be direct pushes)
+        # and make sure those were the only things in.
+        i = 1
         public_keys = []
-        for i in range(n):
-            pk, b = unpack_var_str(b)
-            public_keys.append(pk)
+        for _ in range(n):
+            if not 0 < scr_bytes[i] < 0x4c:
+                raise exc
+            datalen = scr_bytes[i]
+            public_keys.append(scr_bytes[i + 1:i + 1 + datalen])
+            i += 1 + datalen
             # May want to do additional checking to make
             # sure it's a public key in the future.
 
+            # Should leave room for n and OP_CHECKMULTISIG
+            if i > len(scr_bytes) - 2:
+                raise exc
+
         # Should only be 2 bytes left
-        if len(b) != 2:
-            raise exc
-        if (b[0] - 0x50) != n or \
-           b[1] != self.BTC_OPCODE_TABLE['OP_CHECKMULTISIG']:
+        if len(scr_bytes) - i != 2:
             raise exc
 
         return dict(m=m, n=n, public_keys=public_keys)
@@ -494,21 +569,20 @@ class Script(object):
                 'redeem_script' (Script): The associated redeem script.
         """
         # A signature script should start with OP_0
-        if self[0] != 'OP_0':
+        raw = self._raw_bytes()
+        if not raw or raw[0] != self.BTC_OPCODE_TABLE['OP_0']:
             raise TypeError("Script does not start with OP_0!")
 
-        # Everything after OP_0 and before the last operand is a signature.
-        # If it does not start with '0x', something is wrong.
-        sigs = []
-        for i, x in enumerate(self[1:-1]):
-            if isinstance(x, bytes):
-                sigs.append(x)
-            else:
-                raise TypeError(
-                    "Operand %d does not seem to be a signature!" % i)
+        # Everything after OP_0 and before the last operand is a signature
+        # and the last operand is the redeem script: they must all be
+        # pushes.
+        pushes = _parse_pushes(raw, 1)
+        if not pushes:
+            raise TypeError("Signatures and redeem script must be push operations.")
+        sigs = pushes[:-1]
 
         # The last operand should be the redeem script
-        redeem_script = Script(self[-1])
+        redeem_script = Script(pushes[-1])
 
         if not redeem_script.is_multisig_redeem():
             raise TypeError("Invalid or no redeem script found!")
@@ -519,27 +593,31 @@ class Script(object):
         """ Returns whether this script is a common Pay-to-Public-Key-Hash
         script.
 
+        As in Bitcoin Core, the key hash must be pushed directly: a
+        script pushing it with OP_PUSHDATA1 is not considered P2PKH.
+
         Returns:
             bool: True if it is a common P2PKH script, False otherwise.
         """
-        scr_str = str(self)
-        p2pkh_re = "^OP_DUP OP_HASH160 0x([0-9a-fA-F]{2}){20} OP_EQUALVERIFY OP_CHECKSIG$"
-        m = re.search(p2pkh_re, scr_str)
-
-        return bool(m)
+        # OP_DUP OP_HASH160 <20 bytes> OP_EQUALVERIFY OP_CHECKSIG
+        raw = self._raw_bytes()
+        return raw is not None and len(raw) == 25 and \
+            raw[:3] == b'\x76\xa9\x14' and raw[23:] == b'\x88\xac'
 
     def is_p2sh(self):
         """ Returns whether this script is a Pay-to-Script-Hash
         script.
 
+        As in Bitcoin Core, the script hash must be pushed directly: a
+        script pushing it with OP_PUSHDATA1 is not considered P2SH.
+
         Returns:
             bool: True if it is a P2SH script, False otherwise.
         """
-        scr_str = str(self)
-        p2sh_re = "^OP_HASH160 0x([0-9a-fA-F]{2}){20} OP_EQUAL$"
-        m = re.search(p2sh_re, scr_str)
-
-        return bool(m)
+        # OP_HASH160 <20 bytes> OP_EQUAL
+        raw = self._raw_bytes()
+        return raw is not None and len(raw) == 23 and \
+            raw[:2] == b'\xa9\x14' and raw[22] == 0x87
 
     def is_p2pkh_sig(self):
         """ Returns whether this script a Pay-to-Public-Key-Hash
@@ -585,6 +663,12 @@ class Script(object):
         Returns:
             bytes: the hash160 or None.
         """
+        # Standard scripts have it at a fixed offset
+        if self.is_p2pkh():
+            return self._raw_bytes()[3:23]
+        elif self.is_p2sh():
+            return self._raw_bytes()[2:22]
+
         self._check_tokenized()
         if not self._tokens:
             raise ScriptParsingError(
@@ -632,7 +716,7 @@ class Script(object):
             sig_info = self.extract_multisig_sig_info()
             redeem_info = sig_info['redeem_script'].extract_multisig_redeem_info()
             for p in redeem_info['public_keys']:
-                rv.append(key_hash_to_address(hash160(p), version))
+                rv.append(pubkey_to_address(p, version))
             # Also include the address of the redeem script itself.
             redeem_version = self.P2SH_TESTNET_VERSION if testnet else self.P2SH_MAINNET_VERSION
             rv.append(key_hash_to_address(sig_info['redeem_script'].hash160(), redeem_version))
@@ -640,11 +724,15 @@ class Script(object):
             version = self.P2PKH_TESTNET_VERSION if testnet else self.P2PKH_MAINNET_VERSION
             # Normal signature script...
             sig_info = self.extract_sig_info()
-            rv.append(key_hash_to_address(hash160(sig_info['public_key']),
-                                          version))
-        elif Script.validate_template(self, [bytes, 'OP_CHECKSIG']):
-            version = self.P2PKH_TESTNET_VERSION if testnet else self.P2PKH_MAINNET_VERSION
-            rv.append(key_hash_to_address(hash160(self[0]), version))
+            rv.append(pubkey_to_address(sig_info['public_key'], version))
+        else:
+            # Pay-to-Public-Key: <public key> OP_CHECKSIG
+            raw = self._raw_bytes()
+            if raw and raw[-1] == self.BTC_OPCODE_TABLE['OP_CHECKSIG']:
+                pushes = _parse_pushes(raw[:-1])
+                if pushes is not None and len(pushes) == 1:
+                    version = self.P2PKH_TESTNET_VERSION if testnet else self.P2PKH_MAINNET_VERSION
+                    rv.append(pubkey_to_address(pushes[0], version))
 
         return rv
 
@@ -684,9 +772,13 @@ class Script(object):
             interpretation of that script. The resultant tokens are stored
             in ``self._ast``.
         """
+        # Any change to the tokens goes through here, so this is
+        # where the cached serialization is invalidated.
+        self._serialized = None
         self._check_tokenized()
         if self._tokens:
-            self._temp_tokens = copy.deepcopy(self._tokens)
+            # Tokens are immutable (str or bytes), so a shallow copy will do.
+            self._temp_tokens = list(self._tokens)
             self._ast = self._do_parse()
 
     def _do_parse(self, in_if_else=False):
@@ -761,32 +853,33 @@ class Script(object):
             return
 
         raw = self._raw_script
+        i = 0
+        end = len(raw)
 
         self._tokens = []
-        while raw:
-            op, raw = raw[0], raw[1:]
+        while i < end:
+            op = raw[i]
+            i += 1
             if op == 0x00:
                 self._tokens.append('OP_0')
             elif op < 0x4b:
-                self._tokens.append(raw[0:op])
-                raw = raw[op:]
+                self._tokens.append(raw[i:i + op])
+                i += op
             else:
                 opcode = Script.BTC_OPCODE_REV_TABLE[op]
                 if opcode in ['OP_PUSHDATA1', 'OP_PUSHDATA2', 'OP_PUSHDATA4']:
                     pushlen = int(opcode[-1])
                     datalen = 0
                     if pushlen == 1:
-                        datalen = raw[0]
-                        datalen_bytes, raw = bytes([raw[0]]), raw[1:]
+                        datalen = raw[i]
                     elif pushlen == 2:
-                        datalen_bytes, raw = raw[0:2], raw[2:]
-                        datalen = struct.unpack("<H", datalen_bytes)[0]
+                        datalen = struct.unpack_from("<H", raw, i)[0]
                     elif pushlen == 4:
-                        datalen_bytes, raw = raw[0:4], raw[4:]
-                        datalen = struct.unpack("<I", datalen_bytes)[0]
+                        datalen = struct.unpack_from("<I", raw, i)[0]
+                    i += pushlen
 
-                    self._tokens.append(raw[:datalen])
-                    raw = raw[datalen:]
+                    self._tokens.append(raw[i:i + datalen])
+                    i += datalen
                 else:
                     self._tokens.append(opcode)
 
@@ -796,15 +889,9 @@ class Script(object):
         Returns:
             s (str): String representation of the script
         """
-        script = ""
         self._check_tokenized()
-        for t in self._tokens:
-            if isinstance(t, bytes):
-                script += "0x%s " % bytes_to_str(t)
-            else:
-                script += t + " "
-
-        return script.rstrip()
+        return " ".join(["0x%s" % bytes_to_str(t) if isinstance(t, bytes) else t
+                         for t in self._tokens])
 
     def __bytes__(self):
         """ Serializes the object into a byte stream.
@@ -815,44 +902,55 @@ class Script(object):
         Returns:
             b (bytes): a serialized byte stream of this Script object.
         """
-        b = b''
-        i = 0
         if self._raw_script is not None:
             return self._raw_script
 
-        while i < len(self):
-            t = self[i]
+        if self._serialized is not None:
+            self.serialization_stats.hits += 1
+            return self._serialized
+        self.serialization_stats.misses += 1
+
+        w = ByteWriter()
+        self._check_tokenized()
+        for t in self._tokens:
             if isinstance(t, bytes):
                 l = len(t)
                 if l < 0x01:
                     raise ValueError(
                         "Empty byte string not allowed.")
                 elif l <= 0x4b:
-                    b += bytes([l])
-                    b += t
+                    w.write_u8(l)
+                elif l <= 0xff:
+                    w.write_u8(self.BTC_OPCODE_TABLE['OP_PUSHDATA1'])
+                    w.write_u8(l)
+                elif l <= 0xffff:
+                    w.write_u8(self.BTC_OPCODE_TABLE['OP_PUSHDATA2'])
+                    w.write_u16(l)
+                elif l <= 0xffffffff:
+                    w.write_u8(self.BTC_OPCODE_TABLE['OP_PUSHDATA4'])
+                    w.write_u32(l)
                 else:
-                    if l <= 0xff:
-                        op = 'OP_PUSHDATA1'
-                        pushlen = bytes([l])
-                    elif l <= 0xffff:
-                        op = 'OP_PUSHDATA2'
-                        pushlen = struct.pack("<H", l)
-                    elif l <= 0xffffffff:
-                        op = 'OP_PUSHDATA4'
-                        pushlen = struct.pack("<I", l)
-                    else:
-                        raise ValueError(
-                            "op has too much data to push onto stack.")
-
-                    b += bytes([self.BTC_OPCODE_TABLE[op]])
-                    b += pushlen
-                    b += t
+                    raise ValueError(
+                        "op has too much data to push onto stack.")
+                w.write(t)
             else:
-                b += bytes([self.BTC_OPCODE_TABLE[t]])
+                w.write_u8(self.BTC_OPCODE_TABLE[t])
 
-            i += 1
+        self._serialized = w.getvalue()
+        return self._serialized
+
+    def serialize_into(self, writer, size_prepended=False):
+        """ Serializes the object into a ByteWriter.
 
-        return b
+        Args:
+            writer (ByteWriter): The writer to serialize into.
+            size_prepended (bool): Whether to prepend the length of the
+                script, as is done in transactions.
+        """
+        if size_prepended:
+            writer.write_var_str(bytes(self))
+        else:
+            writer.write(bytes(self))
 
     def to_hex(self):
         """ Generates a hex encoding of the serialized script.
@@ -860,4 +958,7 @@ class Script(object):
         Returns:
             str: Hex-encoded serialization.
         """
-        return bytes_to_str(bytes(self))
+        b = bytes(self)
+        if self._hex is None or self._hex[0] is not b:
+            self._hex = (b, bytes_to_str(b))
+        return self._hex[1]
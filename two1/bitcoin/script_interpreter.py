@@ -3,15 +3,146 @@ conjunciton with a Script class for deserialization and validation."""
 from collections import deque
 import copy
 import hashlib
-import struct
 
 from two1.bitcoin.crypto import PublicKey
 from two1.bitcoin.crypto import Signature
 from two1.bitcoin.exceptions import ScriptInterpreterError
+from two1.bitcoin.exceptions import ScriptParsingError
 from two1.bitcoin.hash import Hash
 from two1.bitcoin.script import Script
 from two1.bitcoin import utils
 
+# Process-wide cache of compiled scripts, keyed by the raw script
+# bytes. Standard scriptPubKeys and redeem scripts are run over and
+# over, so they are only compiled once. Use
+# compiled_script_cache.resize(0) to disable it.
+COMPILED_SCRIPT_CACHE_SIZE = 10000
+compiled_script_cache = utils.LRUCache("Compiled scripts", COMPILED_SCRIPT_CACHE_SIZE)
+
+_OP_PUSHDATA1 = Script.BTC_OPCODE_TABLE['OP_PUSHDATA1']
+_OP_PUSHDATA4 = Script.BTC_OPCODE_TABLE['OP_PUSHDATA4']
+_OP_1 = Script.BTC_OPCODE_TABLE['OP_1']
+_OP_16 = Script.BTC_OPCODE_TABLE['OP_16']
+_OP_IF = Script.BTC_OPCODE_TABLE['OP_IF']
+_OP_NOTIF = Script.BTC_OPCODE_TABLE['OP_NOTIF']
+_OP_ELSE = Script.BTC_OPCODE_TABLE['OP_ELSE']
+_OP_ENDIF = Script.BTC_OPCODE_TABLE['OP_ENDIF']
+
+
+def _compile(raw):
+    """ Compiles a raw script into bytecode. See ScriptInterpreter.compile().
+
+    Args:
+        raw (bytes): The serialized script.
+
+    Returns:
+        tuple: The compiled script.
+    """
+    code = []
+    # (enclosing code, opcode, if branch) for each open OP_IF/OP_NOTIF.
+    blocks = []
+    i = 0
+    end = len(raw)
+    while i < end:
+        op = raw[i]
+        i += 1
+        if 0 < op <= _OP_PUSHDATA4:
+            if op < _OP_PUSHDATA1:
+                datalen = op
+            else:
+                pushlen = 1 << (op - _OP_PUSHDATA1)
+                if i + pushlen > end:
+                    raise ScriptParsingError("Truncated data length in push op.")
+                datalen = int.from_bytes(raw[i:i + pushlen], 'little')
+                i += pushlen
+            data = raw[i:i + datalen]
+            i += datalen
+            # Pushes are evaluated according to the length of the data,
+            # just as if the script had been built from text.
+            if len(data) <= 0x4b:
+                code.append((0x01, (data,)))
+            else:
+                code.append((_OP_PUSHDATA1, (len(data), data)))
+        elif op in (_OP_IF, _OP_NOTIF):
+            blocks.append([code, op, None])
+            code = []
+        elif op == _OP_ELSE:
+            if not blocks or blocks[-1][2] is not None:
+                raise ScriptParsingError("Illegal OP_ELSE when not in if/else.")
+            blocks[-1][2] = tuple(code)
+            code = []
+        elif op == _OP_ENDIF:
+            if not blocks:
+                raise ScriptParsingError("Illegal OP_ENDIF when not in if/else.")
+            outer, if_op, if_code = blocks.pop()
+            if if_code is None:
+                args = (if_op, tuple(code), None)
+            else:
+                args = (if_op, if_code, tuple(code))
+            code = outer
+            code.append((if_op, args))
+        elif _OP_1 <= op <= _OP_16:
+            code.append((op, (op,)))
+        elif op in Script.BTC_OPCODE_REV_TABLE:
+            code.append((op, ()))
+        else:
+            raise ScriptParsingError("Unknown opcode 0x%02x." % op)
+
+    if blocks:
+        raise ScriptParsingError("No matching OP_ENDIF")
+
+    return tuple(code)
+
+
+def _compile_ast(ast):
+    """ Compiles the parse tree of a script (see Script.ast) into bytecode.
+
+    Args:
+        ast (list): The parse tree.
+
+    Returns:
+        tuple: The compiled script.
+
+    Raises:
+        ScriptInterpreterError: If the length of the data of an
+            OP_PUSHDATA does not match its datalen.
+        ScriptParsingError: If the tree contains something that is
+            neither data nor a word.
+    """
+    dispatch = ScriptInterpreter._get_dispatch_table()
+    code = []
+    for a in ast:
+        if isinstance(a, bytes):
+            code.append((0x01, (a,)))
+        elif isinstance(a, list):
+            if a[0] in ('OP_IF', 'OP_NOTIF'):
+                op = Script.BTC_OPCODE_TABLE[a[0]]
+                else_code = _compile_ast(a[2]) if len(a) == 4 else None
+                code.append((op, (op, _compile_ast(a[1]), else_code)))
+            else:
+                # OP_PUSHDATA1/2/4, datalen, data
+                pushlen = int(a[0][-1])
+                datalen = int.from_bytes(a[1], 'little')
+                if pushlen != (datalen.bit_length() + 7) // 8:
+                    raise ScriptInterpreterError(
+                        "datalen does not correspond with opcode")
+                if len(a[2]) != datalen:
+                    raise ScriptInterpreterError(
+                        "len(data) != datalen in %s" % a[0])
+                code.append((_OP_PUSHDATA1, (datalen, a[2])))
+        elif a in Script.BTC_OPCODE_TABLE:
+            op = Script.BTC_OPCODE_TABLE[a]
+            code.append((op, (op,) if _OP_1 <= op <= _OP_16 else ()))
+        elif a in dispatch:
+            code.append((a, ()))
+        elif isinstance(a, str) and a.startswith("OP_"):
+            # Reserved and unknown words make the script fail
+            code.append(('OP_RESERVED', ()))
+        else:
+            raise ScriptParsingError("Cannot compile %r." % (a,))
+
+    return tuple(code)
+
 
 class ScriptInterpreter(object):
     """ This class interprets/evaluates Bitcoin scripts.
@@ -33,16 +164,23 @@ class ScriptInterpreter(object):
             signature script when verifying the transaction. In the
             case of a P2PKH UTXO, this will be the UTXO scriptPubKey.
             In the case of a P2SH UTXO, this will be the redeemScript.
+        deferred_sigs (list): If provided, OP_CHECKSIG and
+            OP_CHECKSIGVERIFY do not verify signatures but assume they
+            are valid and append (sig_hash, signature, public_key) to
+            this list, so that the caller can verify all of them at once
+            (see PublicKey.verify_batch()). The result of running the
+            scripts is only meaningful if every deferred signature is
+            valid; otherwise they must be run again without deferring.
     """
     DISABLED_OPS = ['OP_CAT', 'OP_SUBSTR', 'OP_LEFT', 'OP_RIGHT',
                     'OP_INVERT', 'OP_AND', 'OP_OR', 'OP_XOR',
                     'OP_2MUL', 'OP_2DIV', 'OP_MUL', 'OP_DIV', 'OP_MOD',
                     'OP_LSHIFT', 'OP_RSHIFT']
-    RESERVED_WORDS = ['OP_RESERVED', 'OP_VER', 'OP_VERIF', 'OP_VERNOTIF'
+    RESERVED_WORDS = ['OP_RESERVED', 'OP_VER', 'OP_VERIF', 'OP_VERNOTIF',
                       'OP_RESERVED1', 'OP_RESERVED2']
-    NOP_WORDS = ['OP_NOP%d' for i in [1] + list(range(3, 11))]
+    NOP_WORDS = ['OP_NOP%d' % i for i in [1] + list(range(3, 11))]
 
-    def __init__(self, txn=None, input_index=-1, sub_script=None):
+    def __init__(self, txn=None, input_index=-1, sub_script=None, deferred_sigs=None):
         self._stack = deque()
         self._alt_stack = deque()
         self._stack_copy = None
@@ -50,12 +188,89 @@ class ScriptInterpreter(object):
         self._txn = txn
         self._input_index = input_index
         self._sub_script = sub_script
+        self._deferred_sigs = deferred_sigs
         self.stop = False
 
         self._if_else_stack = deque()
 
-    def _walk_ast(self, ast):
-        for a in ast:
+    @classmethod
+    def _get_dispatch_table(cls):
+        """ Returns a table mapping every opcode to the method that
+            evaluates it. The table is built once per class.
+
+        Returns:
+            dict: (unbound) methods taking the instruction's arguments,
+            keyed by opcode (int). Words without an opcode, which can only
+            appear in scripts built from text, are keyed by name (str).
+            Reserved words make the script fail.
+        """
+        table = cls.__dict__.get("_dispatch_table")
+        if table is None:
+            table = {}
+            for attr in dir(cls):
+                if attr.startswith("_op_"):
+                    table["OP_" + attr[4:].upper()] = getattr(cls, attr)
+
+            for op in range(0x100):
+                table[op] = cls._op_nop
+            for opcode, op in Script.BTC_OPCODE_TABLE.items():
+                f = getattr(cls, "_" + opcode.lower(), None)
+                if f is not None:
+                    table[op] = f
+            for op in range(0x01, _OP_PUSHDATA1):
+                table[op] = cls._op_push
+            for op in range(_OP_PUSHDATA1, _OP_PUSHDATA4 + 1):
+                table[op] = cls._op_pushdata
+            for op in range(_OP_1, _OP_16 + 1):
+                table[op] = cls._op_pushnum
+            for opcode in cls.DISABLED_OPS:
+                table[Script.BTC_OPCODE_TABLE[opcode]] = cls._op_disabled
+            for opcode in cls.RESERVED_WORDS:
+                table[opcode] = cls._op_reserved
+            for opcode in cls.NOP_WORDS:
+                table[opcode] = cls._op_nop
+            table[_OP_NOTIF] = cls._op_if
+            table[Script.BTC_OPCODE_TABLE['OP_LESSTHANOREQUAL']] = cls._op_lessthanequal
+            table[Script.BTC_OPCODE_TABLE['OP_GREATERTHANOREQUAL']] = cls._op_greaterthanequal
+            cls._dispatch_table = table
+
+        return table
+
+    @staticmethod
+    def compile(script):
+        """ Compiles a script into bytecode that can be evaluated without
+            any string handling.
+
+            The bytecode is a tuple of (opcode, args) instructions, where
+            opcode is an integer and args a tuple of arguments for the
+            method evaluating it. OP_IF/OP_NOTIF blocks are compiled to a
+            single instruction whose arguments contain the bytecode of
+            each branch. Compiled scripts are cached, keyed by their raw
+            bytes (see compiled_script_cache).
+
+        Args:
+            script (Script or bytes): The script to compile.
+
+        Returns:
+            tuple: The compiled script.
+        """
+        try:
+            raw = bytes(script)
+        except (KeyError, ValueError):
+            # Scripts built from text may contain words that cannot
+            # be serialized, so compile those from their parse tree.
+            return _compile_ast(script.ast)
+
+        code = compiled_script_cache.get(raw)
+        if code is None:
+            code = _compile(raw)
+            compiled_script_cache.put(raw, code)
+
+        return code
+
+    def _run_code(self, code):
+        dispatch = self._get_dispatch_table()
+        for op, args in code:
             total_stack_size = len(self._stack) + len(self._alt_stack)
             if total_stack_size > 1000:
                 raise ScriptInterpreterError(
@@ -63,59 +278,24 @@ class ScriptInterpreter(object):
             if self.stop:
                 break
 
-            opcode = None
-            args = None
-            if isinstance(a, list):
-                opcode = a[0]
-                args = a[1:]
-            else:
-                opcode = a
-
-            if opcode in self.DISABLED_OPS + self.RESERVED_WORDS:
-                self.stop = True
-                break
+            dispatch[op](self, *args)
 
-            if opcode in Script.BTC_OPCODE_TABLE:
-                op = Script.BTC_OPCODE_TABLE[opcode]
-            else:
-                op = None
-
-            if opcode == "OP_0":
-                self._op_0()
-            elif isinstance(opcode, bytes):
-                self._op_push(opcode)
-            elif opcode in ['OP_PUSHDATA1', 'OP_PUSHDATA2', 'OP_PUSHDATA4']:
-                pushlen = int(opcode[-1])
-                if pushlen == 1:
-                    datalen = args[0][0]
-                elif pushlen == 2:
-                    datalen = struct.unpack("<H", args[0])[0]
-                elif pushlen == 4:
-                    datalen = struct.unpack("<I", args[0])[0]
-                data = args[1]
-                if pushlen != (datalen.bit_length() + 7) // 8:
-                    raise ScriptInterpreterError(
-                        "datalen does not correspond with opcode")
-                if len(data) != datalen:
-                    raise ScriptInterpreterError(
-                        "len(data) != datalen in %s" % opcode)
-                self._op_pushdata(datalen, data)
-            elif op and op >= Script.BTC_OPCODE_TABLE['OP_1'] and op <= Script.BTC_OPCODE_TABLE['OP_16']:
-                self._op_pushnum(opcode)
-            elif opcode in ['OP_IF', 'OP_NOTIF']:
-                self._op_if(opcode, args)
-            elif hasattr(self, "_" + opcode.lower()):
-                f = getattr(self, "_" + opcode.lower())
-                f()
-
-    def run_script(self, script):
+    def run_script(self, script, partial_multisig=False):
         """ Runs a script
 
         Args:
             script (Script): A Script object to evaluate
+            partial_multisig (bool): If True, the last opcode of the
+                script (which should be OP_CHECKMULTISIG) only checks
+                the signatures that are present, setting match_count to
+                the number of signatures that were verified. This is used
+                for checking partially signed multi-sig transactions.
         """
         if not self.stop:
-            self._walk_ast(script.ast)
+            code = self.compile(script)
+            if partial_multisig and code:
+                code = code[:-1] + ((Script.BTC_OPCODE_TABLE['OP_CHECKMULTISIG'], (True,)),)
+            self._run_code(code)
 
     @property
     def valid(self):
@@ -277,10 +457,12 @@ class ScriptInterpreter(object):
 
     def _op_pushnum(self, opcode):
         """ Pushes the number in opcode onto the stack
+
+        Args:
+            opcode (int): One of OP_1 - OP_16.
         """
-        op_int = Script.BTC_OPCODE_TABLE[opcode]
         base = Script.BTC_OPCODE_TABLE['OP_1'] - 1
-        self._stack.append(op_int - base)
+        self._stack.append(opcode - base)
 
     # Flow control ops
     def _op_nop(self):
@@ -288,28 +470,30 @@ class ScriptInterpreter(object):
         """
         pass
 
-    def _op_if(self, opcode, data):
+    def _op_if(self, opcode, if_code, else_code):
         """ If the top stack value is not 0 (OP_IF) or 1 (OP_NOTIF),
             the statements are executed. The top stack value is
             removed.
+
+        Args:
+            opcode (int): OP_IF or OP_NOTIF.
+            if_code (tuple): Compiled statements up to the matching
+                OP_ELSE or OP_ENDIF.
+            else_code (tuple): Compiled statements between OP_ELSE and
+                OP_ENDIF, or None if there is no OP_ELSE.
         """
         self._check_stack_len(1)
         do = self._get_bool()
-        if opcode == 'OP_NOTIF':
+        if opcode == Script.BTC_OPCODE_TABLE['OP_NOTIF']:
             do = not do
 
+        self._if_else_stack.append(do)
         if do:
-            self._if_else_stack.append(do)
-            self._walk_ast(data[0])
-        elif len(data) == 3:
-            self._if_else_stack.append(do)
-            self._op_else(data[1])
-
-        if data[-1] == "OP_ENDIF":
-            if self._if_else_stack:
-                self._op_endif()
-        else:
-            raise ScriptInterpreterError("No matching OP_ENDIF!")
+            self._run_code(if_code)
+        elif else_code is not None:
+            self._op_else(else_code)
+
+        self._op_endif()
 
     def _op_else(self, data):
         """ If the preceding OP_IF or OP_NOTIF or OP_ELSE was not
@@ -322,7 +506,7 @@ class ScriptInterpreter(object):
             raise ScriptInterpreterError("In OP_ELSE without OP_IF/NOTIF")
 
         if not self._if_else_stack[-1]:
-            self._walk_ast(data)
+            self._run_code(data)
 
     def _op_endif(self):
         """ Ends an if/else block. All blocks must end, or the
@@ -335,6 +519,16 @@ class ScriptInterpreter(object):
 
         self._if_else_stack.pop()
 
+    def _op_disabled(self):
+        """ Disabled opcodes make the script fail.
+        """
+        self.stop = True
+
+    def _op_reserved(self):
+        """ Reserved and unknown words make the script fail.
+        """
+        self.stop = True
+
     def _op_verify(self):
         x = self._get_int()
         if not x:
@@ -730,13 +924,15 @@ class ScriptInterpreter(object):
         pub_key = PublicKey.from_bytes(pub_key_bytes)
         sig = Signature.from_der(sig_der)
 
-        txn_copy = self._txn._copy_for_sig(input_index=self._input_index,
-                                           hash_type=hash_type,
-                                           sub_script=self._sub_script)
-        msg = bytes(txn_copy) + utils.pack_u32(hash_type)
-        tx_digest = hashlib.sha256(msg).digest()
+        sig_hash = self._txn.get_sig_hash(input_index=self._input_index,
+                                          hash_type=hash_type,
+                                          sub_script=self._sub_script)
 
-        verified = pub_key.verify(tx_digest, sig)
+        if self._deferred_sigs is not None:
+            self._deferred_sigs.append((sig_hash, sig, pub_key))
+            verified = True
+        else:
+            verified = pub_key.verify(sig_hash, sig, False)
 
         self._stack.append(verified)
 
@@ -802,12 +998,9 @@ class ScriptInterpreter(object):
             raise ScriptInterpreterError("Not all signatures have the same hash type!")
 
         hash_type = hash_types.pop()
-        txn_copy = self._txn._copy_for_sig(input_index=self._input_index,
-                                           hash_type=hash_type,
-                                           sub_script=self._sub_script)
-
-        msg = bytes(txn_copy) + utils.pack_u32(hash_type)
-        txn_digest = hashlib.sha256(msg).digest()
+        sig_hash = self._txn.get_sig_hash(input_index=self._input_index,
+                                          hash_type=hash_type,
+                                          sub_script=self._sub_script)
 
         # Now we verify
         last_match = -1
@@ -817,7 +1010,7 @@ class ScriptInterpreter(object):
         for sig in sigs:
             matched_any = False
             for i, pub_key in enumerate(public_keys[last_match+1:]):
-                if pub_key.verify(txn_digest, sig):
+                if pub_key.verify(sig_hash, sig, False):
                     last_match = i
                     match_count += 1
                     matched_any = True
@@ -1,8 +1,6 @@
 """This submodule provides Transaction, Coinbase, TransactionInput,
 TransactionOutput, and UnspentTransactionOutput classes for building and
 parsing Bitcoin transactions and their constituent inputs and outputs."""
-import copy
-import struct
 
 from two1.bitcoin import crypto
 from two1.bitcoin.exceptions import ScriptInterpreterError
@@ -11,13 +9,19 @@ from two1.bitcoin.script import Script
 from two1.bitcoin.script_interpreter import ScriptInterpreter
 from two1.bitcoin.utils import address_to_key_hash
 from two1.bitcoin.utils import bytes_to_str
+from two1.bitcoin.utils import CacheStats
+from two1.bitcoin.utils import ByteWriter
 from two1.bitcoin.utils import pack_compact_int
 from two1.bitcoin.utils import pack_u32
-from two1.bitcoin.utils import pack_u64
 from two1.bitcoin.utils import pack_var_str
-from two1.bitcoin.utils import unpack_compact_int
-from two1.bitcoin.utils import unpack_u32
-from two1.bitcoin.utils import unpack_u64
+from two1.bitcoin.utils import unpack_compact_int_from
+from two1.bitcoin.utils import unpack_u32_from
+from two1.bitcoin.utils import unpack_u64_from
+
+# An input with an empty script: outpoint, index, script length, sequence
+_BLANK_INPUT_LEN = 32 + 4 + 1 + 4
+# An output with a value of -1 and an empty script (for SIG_HASH_SINGLE)
+_BLANK_OUTPUT = b'\xff' * 8 + b'\x00'
 
 
 class TransactionInput(object):
@@ -32,6 +36,14 @@ class TransactionInput(object):
         sequence_num (uint): Sequence number. Endianness: host
     """
 
+    __slots__ = ('outpoint', 'outpoint_index', 'script', 'sequence_num', '_serialized')
+
+    # The bytes produced by __bytes__ are kept together with the fields
+    # they were built from, and those fields are compared again on every
+    # read: this is a check-on-read cache, not an invalidated one. A hit
+    # only means the final assembly of the bytes was skipped.
+    serialization_check_stats = CacheStats("TransactionInput serialization check")
+
     @staticmethod
     def from_bytes(b):
         """ Deserializes a byte stream into a TransactionInput.
@@ -44,17 +56,35 @@ class TransactionInput(object):
                  First element of the tuple is the TransactionInput
                  object and the second is the remaining byte stream.
         """
-        outpoint = b[0:32]
-        outpoint_index, b1 = unpack_u32(b[32:])
-        script, b1 = Script.from_bytes(b1)
-        sequence_num, b1 = unpack_u32(b1)
+        inp, offset = TransactionInput.from_buffer(b)
+        return (inp, b[offset:])
+
+    @staticmethod
+    def from_buffer(buf, offset=0):
+        """ Deserializes a TransactionInput found at offset in buf without
+        copying the remainder of the buffer.
+
+        Args:
+            buf (bytes or memoryview): buffer containing the input.
+            offset (int): position in buf at which the outpoint starts.
+
+        Returns:
+            tuple:
+                 First element of the tuple is the TransactionInput
+                 object and the second is the offset of the first byte
+                 following the input.
+        """
+        outpoint = bytes(buf[offset:offset + 32])
+        outpoint_index, offset = unpack_u32_from(buf, offset + 32)
+        script, offset = Script.from_buffer(buf, offset)
+        sequence_num, offset = unpack_u32_from(buf, offset)
 
         return (
             TransactionInput(Hash(outpoint),
                              outpoint_index,
                              script,
                              sequence_num),
-            b1
+            offset
         )
 
     def __init__(self, outpoint, outpoint_index, script, sequence_num):
@@ -64,6 +94,7 @@ class TransactionInput(object):
         self.outpoint_index = outpoint_index
         self.script = script
         self.sequence_num = sequence_num
+        self._serialized = None
 
     def get_addresses(self, testnet=False):
         """ Returns all addresses associated with the script in this input.
@@ -76,6 +107,18 @@ class TransactionInput(object):
         """
         return self.script.get_addresses(testnet)
 
+    @property
+    def is_coinbase(self):
+        """ Whether this is the input of a coinbase transaction, i.e.
+        whether it spends the null outpoint. This also holds for
+        deserialized inputs, which are never CoinbaseInput objects.
+
+        Returns:
+            bool: True if the input is a coinbase input.
+        """
+        return (self.outpoint_index == CoinbaseInput.MAX_INT and
+                self.outpoint == CoinbaseInput.NULL_OUTPOINT)
+
     def __str__(self):
         """ Returns a human readable formatting of this input.
 
@@ -95,12 +138,32 @@ class TransactionInput(object):
         Returns:
             b (bytes): byte stream containing the serialized input.
         """
-        return (
-            bytes(self.outpoint) +
-            pack_u32(self.outpoint_index) +
-            pack_var_str(bytes(self.script)) +
-            pack_u32(self.sequence_num)
-        )
+        # Hash objects are immutable and Script.__bytes__ returns the
+        # same object until the script is changed, so comparing the
+        # fields is cheap and any mutation, including one made to the
+        # script in place, is noticed.
+        fields = (self.outpoint, self.outpoint_index, bytes(self.script), self.sequence_num)
+        if self._serialized is not None and self._serialized[0] == fields:
+            self.serialization_check_stats.hits += 1
+            return self._serialized[1]
+        self.serialization_check_stats.misses += 1
+
+        w = ByteWriter()
+        self.serialize_into(w)
+        b = w.getvalue()
+        self._serialized = (fields, b)
+        return b
+
+    def serialize_into(self, writer):
+        """ Serializes the object into a ByteWriter.
+
+        Args:
+            writer (ByteWriter): The writer to serialize into.
+        """
+        writer.write(bytes(self.outpoint))
+        writer.write_u32(self.outpoint_index)
+        writer.write_var_str(bytes(self.script))
+        writer.write_u32(self.sequence_num)
 
 
 class CoinbaseInput(TransactionInput):
@@ -122,6 +185,8 @@ class CoinbaseInput(TransactionInput):
                              already contains the height of the block,
                              this must be 1.
     """
+    __slots__ = ('height',)
+
     NULL_OUTPOINT = Hash(bytes(32))
     MAX_INT = 0xffffffff
 
@@ -164,19 +229,6 @@ class CoinbaseInput(TransactionInput):
             "Script: %s " % (bytes_to_str(self.script)) +
             "Sequence: 0x%08x)" % (self.sequence_num))
 
-    def __bytes__(self):
-        """ Serializes the object into a byte stream.
-
-        Returns:
-            b (bytes): byte stream containing the serialized coinbase input.
-        """
-        return (
-            bytes(self.outpoint) +
-            pack_u32(self.outpoint_index) +
-            pack_var_str(self.script) +
-            pack_u32(self.sequence_num)
-        )
-
 
 class TransactionOutput(object):
     """ See https://bitcoin.org/en/developer-reference#txout
@@ -186,6 +238,11 @@ class TransactionOutput(object):
         script (Script): A pay-out script.
     """
 
+    __slots__ = ('value', 'script', '_serialized')
+
+    # A check-on-read cache, like the one of TransactionInput.
+    serialization_check_stats = CacheStats("TransactionOutput serialization check")
+
     @staticmethod
     def from_bytes(b):
         """ Deserializes a byte stream into a TransactionOutput object.
@@ -198,15 +255,33 @@ class TransactionOutput(object):
                 First element of the tuple is a TransactionOutput,
                 the second is the remainder of the byte stream.
         """
-        value, b0 = unpack_u64(b)
-        script_len, b0 = unpack_compact_int(b0)
+        out, offset = TransactionOutput.from_buffer(b)
+        return (out, b[offset:])
+
+    @staticmethod
+    def from_buffer(buf, offset=0):
+        """ Deserializes a TransactionOutput found at offset in buf without
+        copying the remainder of the buffer.
+
+        Args:
+            buf (bytes or memoryview): buffer containing the output.
+            offset (int): position in buf at which the value starts.
+
+        Returns:
+            tuple:
+                First element of the tuple is a TransactionOutput,
+                the second is the offset of the first byte following
+                the output.
+        """
+        value, offset = unpack_u64_from(buf, offset)
+        script, offset = Script.from_buffer(buf, offset)
 
-        return (TransactionOutput(value, Script(b0[:script_len])),
-                b0[script_len:])
+        return (TransactionOutput(value, script), offset)
 
     def __init__(self, value, script):
         self.value = value
         self.script = script
+        self._serialized = None
 
     def get_addresses(self, testnet=False):
         """ Returns all addresses associated with the script in this output.
@@ -237,7 +312,26 @@ class TransactionOutput(object):
             b (bytes): byte stream containing the serialized
             transaction output.
         """
-        return pack_u64(self.value) + pack_var_str(bytes(self.script))
+        fields = (self.value, bytes(self.script))
+        if self._serialized is not None and self._serialized[0] == fields:
+            self.serialization_check_stats.hits += 1
+            return self._serialized[1]
+        self.serialization_check_stats.misses += 1
+
+        w = ByteWriter()
+        self.serialize_into(w)
+        b = w.getvalue()
+        self._serialized = (fields, b)
+        return b
+
+    def serialize_into(self, writer):
+        """ Serializes the object into a ByteWriter.
+
+        Args:
+            writer (ByteWriter): The writer to serialize into.
+        """
+        writer.write_u64(self.value)
+        self.script.serialize_into(writer, size_prepended=True)
 
 
 class UnspentTransactionOutput(object):
@@ -251,6 +345,7 @@ class UnspentTransactionOutput(object):
         scr (Script): The scriptPubKey of the output.
         confirmations (int): Number of confirmations for the transaction.
     """
+    __slots__ = ('transaction_hash', 'outpoint_index', 'value', 'script', 'num_confirmations')
 
     def __init__(self, transaction_hash, outpoint_index, value, scr,
                  confirmations):
@@ -298,6 +393,15 @@ class Transaction(object):
     SIG_HASH_SINGLE = 0x03
     SIG_HASH_ANY = 0x80
 
+    # A check-on-read cache: every read re-checks the inputs and
+    # outputs (see TransactionInput), so a hit only saves assembling
+    # the transaction from their serializations.
+    serialization_check_stats = CacheStats("Transaction serialization check")
+    _serialized = None
+    _hash = None
+    _hex = None
+    _sig_hash_data = None
+
     @staticmethod
     def from_bytes(b):
         """ Deserializes a byte stream into a Transaction.
@@ -310,30 +414,52 @@ class Transaction(object):
                 First element of the tuple is the Transaction,
                 second is the remainder of the byte stream.
         """
+        txn, offset = Transaction.from_buffer(b)
+        return (txn, b[offset:])
+
+    @staticmethod
+    def from_buffer(buf, offset=0):
+        """ Deserializes a Transaction found at offset in buf.
+
+        The buffer is walked with a moving offset rather than being
+        sliced, so deserialization is linear in the size of the
+        transaction.
+
+        Args:
+            buf (bytes or memoryview): buffer containing the transaction.
+            offset (int): position in buf at which the version starts.
+
+        Returns:
+            tuple:
+                First element of the tuple is the Transaction,
+                second is the offset of the first byte following the
+                transaction.
+        """
+        buf = memoryview(buf)
+
         # First 4 bytes are version
-        version = struct.unpack('<I', b[:4])[0]
-        b1 = b[4:]
+        version, offset = unpack_u32_from(buf, offset)
 
         # Work on inputs
-        num_inputs, b1 = unpack_compact_int(b1)
+        num_inputs, offset = unpack_compact_int_from(buf, offset)
 
         inputs = []
         for i in range(num_inputs):
-            inp, b1 = TransactionInput.from_bytes(b1)
+            inp, offset = TransactionInput.from_buffer(buf, offset)
             inputs.append(inp)
 
         # Work on outputs
-        num_outputs, b1 = unpack_compact_int(b1)
+        num_outputs, offset = unpack_compact_int_from(buf, offset)
 
         outputs = []
         for o in range(num_outputs):
-            out, b1 = TransactionOutput.from_bytes(b1)
+            out, offset = TransactionOutput.from_buffer(buf, offset)
             outputs.append(out)
 
         # Lock time
-        lock_time = struct.unpack('<I', b1[:4])[0]
+        lock_time, offset = unpack_u32_from(buf, offset)
 
-        return (Transaction(version, inputs, outputs, lock_time), b1[4:])
+        return (Transaction(version, inputs, outputs, lock_time), offset)
 
     @staticmethod
     def from_hex(h):
@@ -345,7 +471,7 @@ class Transaction(object):
         Returns:
             Transaction: the deserialized Transaction object.
         """
-        tx, _ = Transaction.from_bytes(bytes.fromhex(h))
+        tx, _ = Transaction.from_buffer(bytes.fromhex(h))
         return tx
 
     def __init__(self, version, inputs, outputs, lock_time):
@@ -366,43 +492,113 @@ class Transaction(object):
         """
         return len(self.outputs)
 
-    def _copy_for_sig(self, input_index, hash_type, sub_script):
-        """ Returns a copy of this txn appropriate for signing, based
-            on hash_type.
+    def _get_sig_hash_data(self):
+        """ Returns the parts of the transaction that are shared by the
+            signature hash preimages of all of its inputs.
+
+            Only the outpoints and sequence numbers of the inputs (not
+            their scripts) are involved, so this stays valid while the
+            inputs are being signed one after another.
         """
-        new_txn = copy.deepcopy(self)
+        prevouts = [(bytes(i.outpoint), i.outpoint_index, i.sequence_num) for i in self.inputs]
+        outputs = [bytes(o) for o in self.outputs]
+        key = (self.version, self.lock_time, prevouts, outputs)
+        if self._sig_hash_data is not None and self._sig_hash_data[0] == key:
+            return self._sig_hash_data[1]
+
+        outpoints = [h + pack_u32(index) for h, index, _ in prevouts]
+        sequences = [pack_u32(seq) for _, _, seq in prevouts]
+        data = dict(version=pack_u32(self.version),
+                    lock_time=pack_u32(self.lock_time),
+                    num_inputs=pack_compact_int(len(prevouts)),
+                    outpoints=outpoints,
+                    sequences=sequences,
+                    # Every input serialized with an empty script, back
+                    # to back. Each one is _BLANK_INPUT_LEN bytes long,
+                    # so the input being signed can be spliced in by
+                    # offset.
+                    blank_inputs=b''.join(o + b'\x00' + s for o, s in zip(outpoints, sequences)),
+                    blank_inputs_no_seq=None,
+                    outputs=outputs,
+                    all_outputs=pack_compact_int(len(outputs)) + b''.join(outputs))
+        self._sig_hash_data = (key, data)
+
+        return data
+
+    def _sig_hash_preimage(self, input_index, hash_type, sub_script):
+        """ Returns the serialized transaction, modified according to
+            hash_type, followed by hash_type. This is what gets double
+            SHA-256 hashed when creating or checking a signature.
+
+            The preimage is written directly from the (cached) serialized
+            parts of the transaction rather than from a modified copy of
+            it.
+        """
+        data = self._get_sig_hash_data()
+        base_type = hash_type & 0x1f
+        this_input = (data['outpoints'][input_index] +
+                      pack_var_str(bytes(sub_script)) +
+                      data['sequences'][input_index])
 
         # First deal w/the inputs
-
-        # For the SIG_HASH_ANY case, we only care about
-        # self.inputs[input_index]
-        if hash_type == self.SIG_HASH_ANY:
-            ti = new_txn.inputs[input_index]
-            new_txn.inputs = [ti]
+        if hash_type & self.SIG_HASH_ANY:
+            # Only the input being signed is included.
+            inputs = b'\x01' + this_input
         else:
-            for i, inp in enumerate(new_txn.inputs):
-                inp.script = sub_script if i == input_index else Script("")
+            if base_type in (self.SIG_HASH_NONE, self.SIG_HASH_SINGLE):
+                # Sequence numbers (nSequence) must be set to 0 for all but
+                # the input we care about.
+                if data['blank_inputs_no_seq'] is None:
+                    data['blank_inputs_no_seq'] = b''.join(o + bytes(5) for o in data['outpoints'])
+                blank_inputs = data['blank_inputs_no_seq']
+            else:
+                blank_inputs = data['blank_inputs']
 
-                if hash_type & 0x1f in [self.SIG_HASH_NONE, self.SIG_HASH_SINGLE] and input_index != i:
-                    # Sequence numbers (nSequence) must be set to 0 for all but
-                    # the input we care about.
-                    inp.sequence_num = 0
+            start = input_index * _BLANK_INPUT_LEN
+            inputs = (data['num_inputs'] +
+                      blank_inputs[:start] +
+                      this_input +
+                      blank_inputs[start + _BLANK_INPUT_LEN:])
 
         # Now deal with outputs
+        if base_type == self.SIG_HASH_NONE:
+            outputs = b'\x00'
+        elif base_type == self.SIG_HASH_SINGLE:
+            # Resize output vector to input_index + 1. All outputs
+            # except outputs[input_index] have a value of -1 and a
+            # blank script.
+            outputs = (pack_compact_int(input_index + 1) +
+                       _BLANK_OUTPUT * input_index +
+                       data['outputs'][input_index])
+        else:
+            outputs = data['all_outputs']
+
+        return data['version'] + inputs + outputs + data['lock_time'] + pack_u32(hash_type)
+
+    def get_sig_hash(self, input_index, hash_type, sub_script):
+        """ Computes the signature hash (the message which is actually
+        signed) for an input.
 
-        if hash_type & 0x1f == self.SIG_HASH_NONE:
-            new_txn.outputs = []
-        elif hash_type & 0x1f == self.SIG_HASH_SINGLE:
-            # Resize output vector to input_index + 1
-            new_txn.outputs = new_txn.outputs[:input_index+1]
-            # All outputs except outputs[i] have a value of -1 (0xffffffff)
-            # and a blank script
-            for i, out in enumerate(new_txn.outputs):
-                if i != input_index:
-                    out.script = Script("")
-                    out.value = 0xffffffff
+        Args:
+            input_index (int): The index of the input being signed.
+            hash_type (int): What kind of signature hash to do.
+            sub_script (Script): the script to put in place of the
+                input's script. Any OP_CODESEPARATORs should already
+                have been handled by the caller.
 
-        return new_txn
+        Returns:
+            bytes: The 32-byte signature hash.
+        """
+        if input_index < 0 or input_index >= len(self.inputs):
+            raise ValueError("Invalid input index.")
+
+        if hash_type & 0x1f == self.SIG_HASH_SINGLE and input_index >= len(self.outputs):
+            # This is to deal with the bug where specifying an index
+            # that is out of range (wrt outputs) results in a
+            # signature hash of 0x1 (little-endian)
+            return 0x1.to_bytes(32, 'little')
+
+        return bytes(Hash.dhash(self._sig_hash_preimage(input_index, hash_type, sub_script)))
 
     def _get_public_key_bytes(self, private_key, compressed=True):
         # In the case of extended keys (HDPublicKey), need to get
@@ -492,16 +688,7 @@ class Transaction(object):
             raise ValueError("Invalid input index.")
 
         tmp_script = sub_script.remove_op("OP_CODESEPARATOR")
-        if hash_type & 0x1f == self.SIG_HASH_SINGLE and len(self.inputs) > len(self.outputs):
-            # This is to deal with the bug where specifying an index
-            # that is out of range (wrt outputs) results in a
-            # signature hash of 0x1 (little-endian)
-            msg_to_sign = 0x1.to_bytes(32, 'little')
-        else:
-            txn_copy = self._copy_for_sig(input_index, hash_type, tmp_script)
-
-            msg_to_sign = bytes(Hash.dhash(bytes(txn_copy) +
-                                           pack_u32(hash_type)))
+        msg_to_sign = self.get_sig_hash(input_index, hash_type, tmp_script)
 
         sig = private_key.sign(msg_to_sign, False)
 
@@ -671,14 +858,54 @@ class Transaction(object):
         """
         return self._verify_input(input_index, sub_script, True)
 
-    def _verify_input(self, input_index, sub_script, partial_multisig=False):
+    def verify_input_signatures(self, sub_scripts, input_indices=None):
+        """ Verifies the signatures for all (or some) inputs.
+
+        The scripts of every input are run with signature checks
+        (OP_CHECKSIG and OP_CHECKSIGVERIFY) deferred, and all the
+        deferred signatures are then verified in a single call to
+        PublicKey.verify_batch(). Inputs with an invalid signature are
+        run again without deferring so that the result is the same as
+        that of verify_input_signature().
+
+        Args:
+            sub_scripts (list(Script)): The script in the corresponding
+               outpoint of each input to verify.
+            input_indices (list(int)): The indices of the inputs to
+               verify. If not provided, all inputs are verified.
+
+        Returns:
+            list(bool): Whether each input's sigScript is verified.
+        """
+        if input_indices is None:
+            input_indices = range(self.num_inputs)
+        if len(sub_scripts) != len(input_indices):
+            raise ValueError("Expected %d sub_scripts, got %d." %
+                             (len(input_indices), len(sub_scripts)))
+
+        results = []
+        deferred = []
+        for i, sub_script in zip(input_indices, sub_scripts):
+            deferred_sigs = []
+            results.append(self._verify_input(i, sub_script, deferred_sigs=deferred_sigs))
+            deferred.append(deferred_sigs)
+
+        verified = iter(crypto.PublicKey.verify_batch([d for sigs in deferred for d in sigs], False))
+        for j, deferred_sigs in enumerate(deferred):
+            if not all([next(verified) for _ in deferred_sigs]):
+                results[j] = self._verify_input(input_indices[j], sub_scripts[j])
+
+        return results
+
+    def _verify_input(self, input_index, sub_script, partial_multisig=False, deferred_sigs=None):
         p2sh = sub_script.is_p2sh()
 
         sig_script = self.inputs[input_index].script
 
         si = ScriptInterpreter(txn=self,
                                input_index=input_index,
-                               sub_script=sub_script)
+                               sub_script=sub_script,
+                               deferred_sigs=deferred_sigs)
         try:
             si.run_script(sig_script)
         except ScriptInterpreterError:
@@ -703,12 +930,8 @@ class Transaction(object):
 
             try:
                 if sig_script.is_multisig_sig() and partial_multisig:
-                    # This is a hack for partial verification
-                    partial_script = copy.deepcopy(redeem_script)
-                    partial_script.ast[-1] = 'OP_CHECKPARTIALMULTISIG'
-
                     sig_info = sig_script.extract_multisig_sig_info()
-                    si.run_script(partial_script)
+                    si.run_script(redeem_script, partial_multisig=True)
                     rv &= si.match_count > 0 and si.match_count <= len(sig_info['signatures'])
                 else:
                     si.run_script(redeem_script)
@@ -770,23 +993,56 @@ class Transaction(object):
         Returns:
             b (bytes): The serialized transaction.
         """
-        return (
-            pack_u32(self.version) +                      # Version
-            pack_compact_int(self.num_inputs) +           # Input count
-            b''.join([bytes(i) for i in self.inputs]) +   # Inputs
-            pack_compact_int(self.num_outputs) +          # Output count
-            b''.join([bytes(o) for o in self.outputs]) +  # Outputs
-            pack_u32(self.lock_time)                      # Lock time
-        )
+        # Inputs and outputs check their own cached serializations, so
+        # comparing those against the ones used to build the cached
+        # bytes catches mutations anywhere in the transaction. This
+        # still costs a call per input and output on every read.
+        inputs = [bytes(i) for i in self.inputs]
+        outputs = [bytes(o) for o in self.outputs]
+        fields = (self.version, inputs, outputs, self.lock_time)
+        if self._serialized is not None and self._serialized[0] == fields:
+            self.serialization_check_stats.hits += 1
+            return self._serialized[1]
+        self.serialization_check_stats.misses += 1
+
+        w = ByteWriter()
+        self.serialize_into(w)
+        b = w.getvalue()
+        self._serialized = (fields, b)
+        return b
+
+    def serialize_into(self, writer):
+        """ Serializes the object into a ByteWriter.
+
+        Many transactions can be serialized into the same writer (and
+        so the same, possibly preallocated, buffer).
+
+        Args:
+            writer (ByteWriter): The writer to serialize into.
+        """
+        writer.write_u32(self.version)                    # Version
+        writer.write_compact_int(len(self.inputs))        # Input count
+        for i in self.inputs:                             # Inputs
+            i.serialize_into(writer)
+        writer.write_compact_int(len(self.outputs))       # Output count
+        for o in self.outputs:                            # Outputs
+            o.serialize_into(writer)
+        writer.write_u32(self.lock_time)                  # Lock time
 
     @property
     def hash(self):
         """ Computes the hash of the transaction.
 
+        The hash is only recomputed if the serialized transaction has
+        changed since the last time it was computed.
+
         Returns:
             dhash (bytes): Double SHA-256 hash of the serialized transaction.
         """
-        return Hash.dhash(bytes(self))
+        b = bytes(self)
+        if self._hash is None or self._hash[0] is not b:
+            self._hash = (b, Hash.dhash(b))
+        return self._hash[1]
 
     def to_hex(self):
         """ Generates a hex encoding of the serialized transaction.
@@ -794,7 +1050,10 @@ class Transaction(object):
         Returns:
             str: Hex-encoded serialization.
         """
-        return bytes_to_str(bytes(self))
+        b = bytes(self)
+        if self._hex is None or self._hex[0] is not b:
+            self._hex = (b, bytes_to_str(b))
+        return self._hex[1]
 
     def get_addresses(self, testnet=False):
         """ Returns all addresses associated with this transaction.
@@ -1,15 +1,34 @@
 """This submodule provides functions for accomplishing common tasks encountered
 in creating and parsing Bitcoin objects, like turning difficulties into targets
 or deserializing and serializing various kinds of packed byte formats."""
-import base58
 import codecs
+import collections
 import hashlib
 import random
 import struct
 import os
+import threading
 
 MAX_TARGET = 0x00000000FFFF0000000000000000000000000000000000000000000000000000
 
+_U8 = struct.Struct('<B')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+_COMPACT16 = struct.Struct('<BH')
+_COMPACT32 = struct.Struct('<BI')
+_COMPACT64 = struct.Struct('<BQ')
+
+B58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+_B58_VALUES = {c: i for i, c in enumerate(B58_ALPHABET)}
+# Numbers are converted to and from base 58 ten digits at a time, and
+# each group of ten digits two digits at a time, through these tables.
+_B58_PAIRS = [a + b for a in B58_ALPHABET for b in B58_ALPHABET]
+_B58_PAIR_VALUES = {p: i for i, p in enumerate(_B58_PAIRS)}
+_B58_CHUNK_DIGITS = 10
+_B58_CHUNK = 58 ** _B58_CHUNK_DIGITS
+_B58_PAIR = 58 ** 2
+
 
 def rand_bytes(n, secure=True):
     """ Returns n random bytes.
@@ -98,13 +117,13 @@ def pack_compact_int(i):
         b (bytes): Serialized bytes corresponding to i.
     """
     if i < 0xfd:
-        return struct.pack('<B', i)
+        return _U8.pack(i)
     elif i <= 0xffff:
-        return struct.pack('<BH', 0xfd, i)
+        return _COMPACT16.pack(0xfd, i)
     elif i <= 0xffffffff:
-        return struct.pack('<BI', 0xfe, i)
+        return _COMPACT32.pack(0xfe, i)
     else:
-        return struct.pack('<BQ', 0xff, i)
+        return _COMPACT64.pack(0xff, i)
 
 
 def unpack_compact_int(bytestr):
@@ -118,18 +137,31 @@ def unpack_compact_int(bytestr):
     Returns:
         n (int): deserialized integer.
     """
+    n, offset = unpack_compact_int_from(bytestr)
+    return (n, bytestr[offset:])
+
 
-    b0 = bytestr[0]
+def unpack_compact_int_from(buf, offset=0):
+    """ Deserializes a compact integer found at offset in buf without
+    copying the remainder of the buffer.
+
+    Args:
+        buf (bytes or memoryview): buffer containing the serialized integer.
+        offset (int): position in buf at which the integer starts.
+
+    Returns:
+        (n, offset) (tuple): A tuple containing the deserialized integer and
+        the offset of the first byte following it.
+    """
+    b0 = buf[offset]
     if b0 < 0xfd:
-        return (b0, bytestr[1:])
+        return (b0, offset + 1)
     elif b0 == 0xfd:
-        return (struct.unpack('<H', bytestr[1:3])[0], bytestr[3:])
+        return (_U16.unpack_from(buf, offset + 1)[0], offset + 3)
     elif b0 == 0xfe:
-        return (struct.unpack('<I', bytestr[1:5])[0], bytestr[5:])
-    elif b0 == 0xff:
-        return (struct.unpack('<Q', bytestr[1:9])[0], bytestr[9:])
+        return (_U32.unpack_from(buf, offset + 1)[0], offset + 5)
     else:
-        return None
+        return (_U64.unpack_from(buf, offset + 1)[0], offset + 9)
 
 
 def pack_u32(i):
@@ -141,7 +173,7 @@ def pack_u32(i):
     Returns:
         b (bytes): 4 bytes containing the little-endian serialization of i.
     """
-    return struct.pack('<I', i)
+    return _U32.pack(i)
 
 
 def unpack_u32(b):
@@ -158,6 +190,20 @@ def unpack_u32(b):
     return (u32[0], b[4:])
 
 
+def unpack_u32_from(buf, offset=0):
+    """ Deserializes a 32-bit integer found at offset in buf.
+
+    Args:
+        buf (bytes or memoryview): buffer containing the serialized integer.
+        offset (int): position in buf at which the integer starts.
+
+    Returns:
+        (i, offset) (tuple): A tuple containing the deserialized integer and
+        the offset of the first byte following it.
+    """
+    return (_U32.unpack_from(buf, offset)[0], offset + 4)
+
+
 def pack_u64(i):
     """ Serializes a 64-bit integer into little-endian form.
 
@@ -167,7 +213,7 @@ def pack_u64(i):
     Returns:
         b (bytes): 8 bytes containing the little-endian serialization of i.
     """
-    return struct.pack('<Q', i)
+    return _U64.pack(i)
 
 
 def unpack_u64(b):
@@ -184,6 +230,20 @@ def unpack_u64(b):
     return (u64[0], b[8:])
 
 
+def unpack_u64_from(buf, offset=0):
+    """ Deserializes a 64-bit integer found at offset in buf.
+
+    Args:
+        buf (bytes or memoryview): buffer containing the serialized integer.
+        offset (int): position in buf at which the integer starts.
+
+    Returns:
+        (i, offset) (tuple): A tuple containing the deserialized integer and
+        the offset of the first byte following it.
+    """
+    return (_U64.unpack_from(buf, offset)[0], offset + 8)
+
+
 def pack_var_str(s):
     """ Serializes a variable length byte stream.
 
@@ -211,6 +271,24 @@ def unpack_var_str(b):
     return (b0[:strlen], b0[strlen:])
 
 
+def unpack_var_str_from(buf, offset=0):
+    """ Deserializes a variable length byte stream found at offset in buf.
+
+    Only the variable length byte stream itself is copied out of buf.
+
+    Args:
+        buf (bytes or memoryview): buffer containing the serialized stream.
+        offset (int): position in buf at which the length prefix starts.
+
+    Returns:
+        (s, offset) (tuple): A tuple containing the variable length byte
+        stream (as bytes) and the offset of the first byte following it.
+    """
+    strlen, offset = unpack_compact_int_from(buf, offset)
+    end = offset + strlen
+    return (bytes(buf[offset:end]), end)
+
+
 def bits_to_target(bits):
     """ Decodes the full target from a compact representation.
     See: https://bitcoin.org/en/developer-reference#target-nbits
@@ -222,6 +300,9 @@ def bits_to_target(bits):
         target (Bignum): Full 256-bit target
     """
     shift = bits >> 24
+    if shift < 3:
+        # As in Bitcoin Core, the mantissa is shifted right
+        return (bits & 0xffffff) >> (8 * (3 - shift))
     target = (bits & 0xffffff) * (1 << (8 * (shift - 3)))
     return target
 
@@ -286,10 +367,111 @@ def difficulty_to_bits(difficulty):
     return target_to_bits(difficulty_to_target(difficulty))
 
 
+def b58encode(b):
+    """ Encodes bytes in base 58, keeping leading zero bytes as
+    leading '1' characters.
+
+    Args:
+        b (bytes): The bytes to encode.
+
+    Returns:
+        str: The base 58 encoded string.
+    """
+    n = int.from_bytes(b, 'big')
+    chunks = []
+    while n:
+        n, r = divmod(n, _B58_CHUNK)
+        chunks.append(r)
+
+    pairs = _B58_PAIRS
+    digits = []
+    for r in reversed(chunks):
+        r, p4 = divmod(r, _B58_PAIR)
+        r, p3 = divmod(r, _B58_PAIR)
+        r, p2 = divmod(r, _B58_PAIR)
+        p0, p1 = divmod(r, _B58_PAIR)
+        digits.append(pairs[p0] + pairs[p1] + pairs[p2] + pairs[p3] + pairs[p4])
+
+    pad = len(b) - len(b.lstrip(b'\0'))
+    return '1' * pad + ''.join(digits).lstrip('1')
+
+
+def b58decode(s):
+    """ Decodes a base 58 encoded string.
+
+    Args:
+        s (str): The string to decode.
+
+    Returns:
+        bytes: The decoded bytes.
+
+    Raises:
+        ValueError: If s contains characters that are not in the base
+        58 alphabet.
+    """
+    if isinstance(s, bytes):
+        s = s.decode('ascii')
+    digits = s.lstrip('1')
+    pad = len(s) - len(digits)
+
+    n = 0
+    first = len(digits) % _B58_CHUNK_DIGITS
+    pair_values = _B58_PAIR_VALUES
+    try:
+        for c in digits[:first]:
+            n = n * 58 + _B58_VALUES[c]
+        for i in range(first, len(digits), _B58_CHUNK_DIGITS):
+            v = pair_values[digits[i:i + 2]]
+            v = v * _B58_PAIR + pair_values[digits[i + 2:i + 4]]
+            v = v * _B58_PAIR + pair_values[digits[i + 4:i + 6]]
+            v = v * _B58_PAIR + pair_values[digits[i + 6:i + 8]]
+            v = v * _B58_PAIR + pair_values[digits[i + 8:i + 10]]
+            n = n * _B58_CHUNK + v
+    except KeyError:
+        raise ValueError("Invalid base58 string: %r" % s)
+
+    return b'\0' * pad + n.to_bytes((n.bit_length() + 7) // 8, 'big')
+
+
+def b58encode_check(b):
+    """ Encodes bytes in Base58Check: base 58 with a 4-byte checksum
+    appended.
+
+    Args:
+        b (bytes): The bytes to encode.
+
+    Returns:
+        str: The Base58Check encoded string.
+    """
+    return b58encode(b + hashlib.sha256(hashlib.sha256(b).digest()).digest()[:4])
+
+
+def b58decode_check(s):
+    """ Decodes a Base58Check encoded string and verifies its checksum.
+
+    Args:
+        s (str): The string to decode.
+
+    Returns:
+        bytes: The decoded bytes, without the checksum.
+
+    Raises:
+        ValueError: If s is not valid base 58 or the checksum does not
+        match.
+    """
+    b = b58decode(s)
+    data, checksum = b[:-4], b[-4:]
+    if len(checksum) != 4 or hashlib.sha256(hashlib.sha256(data).digest()).digest()[:4] != checksum:
+        raise ValueError("Invalid checksum")
+    return data
+
+
 def address_to_key_hash(s):
     """ Given a Bitcoin address decodes the version and
     RIPEMD-160 hash of the public key.
 
+    Results are memoized in address_cache.
+
     Args:
         s (bytes): The Bitcoin address to decode
 
@@ -297,10 +479,12 @@ def address_to_key_hash(s):
         (version, h160) (tuple): A tuple containing the version and
         RIPEMD-160 hash of the public key.
     """
-    n = base58.b58decode_check(s)
-    version = n[0]
-    h160 = n[1:]
-    return version, h160
+    rv = address_cache.get(s)
+    if rv is None:
+        n = b58decode_check(s)
+        rv = (n[0], n[1:])
+        address_cache.put(s, rv)
+    return rv
 
 
 def key_hash_to_address(hash160, version=0x0):
@@ -322,10 +506,57 @@ def key_hash_to_address(hash160, version=0x0):
     elif isinstance(hash160, bytes):
         h160 = hash160
 
-    address = base58.b58encode_check(bytes([version]) + h160)
+    address = b58encode_check(bytes([version]) + h160)
+    return address
+
+
+def pubkey_to_address(public_key, version=0x0):
+    """ Computes the P2PKH address of a serialized public key.
+
+    Results are memoized in pubkey_address_cache.
+
+    Args:
+        public_key (bytes): The serialized (compressed or uncompressed)
+            public key.
+        version (int): The version prefix
+
+    Returns:
+        str: The Base58Check encoded address.
+    """
+    key = (public_key, version)
+    address = pubkey_address_cache.get(key)
+    if address is None:
+        address = b58encode_check(bytes([version]) + hash160(public_key))
+        pubkey_address_cache.put(key, address)
     return address
 
 
+def addresses_from_pubkeys(public_keys, version=0x0):
+    """ Computes the P2PKH addresses of many serialized public keys.
+
+    Args:
+        public_keys (list(bytes)): The serialized public keys.
+        version (int): The version prefix
+
+    Returns:
+        list(str): The Base58Check encoded address of each key.
+    """
+    rv = []
+    get = pubkey_address_cache.get
+    prefix = bytes([version])
+    misses = []
+    for public_key in public_keys:
+        address = get((public_key, version))
+        if address is None:
+            misses.append((len(rv), public_key))
+        rv.append(address)
+
+    for i, public_key in misses:
+        address = rv[i] = b58encode_check(prefix + hash160(public_key))
+        pubkey_address_cache.put((public_key, version), address)
+    return rv
+
+
 def hash160(b):
     """ Computes the HASH160 of b.
 
@@ -358,3 +589,258 @@ def compute_reward(height):
     if era == 0:
         return base_subsidy
     return int(base_subsidy / 2 ** era)
+
+
+class ByteWriter(object):
+    """ A growable buffer that objects serialize themselves into, so
+    that building the serialization of a large object (or of many
+    objects) takes linear time and a single final allocation.
+
+    Args:
+        buf (bytearray): If provided, the buffer to write into. It may
+            be preallocated: data is written starting at offset,
+            overwriting what is already there, and the buffer only
+            grows once the write position passes its end.
+        offset (int): Position in buf at which to start writing.
+    """
+
+    def __init__(self, buf=None, offset=0):
+        self.buf = bytearray() if buf is None else buf
+        self.start = offset
+        self.offset = offset
+
+    def __len__(self):
+        return self.offset - self.start
+
+    def write(self, b):
+        """ Writes bytes at the current position.
+
+        Args:
+            b (bytes): The bytes to write.
+        """
+        end = self.offset + len(b)
+        if self.offset == len(self.buf):
+            self.buf += b
+        else:
+            self.buf[self.offset:end] = b
+        self.offset = end
+
+    def write_struct(self, st, *values):
+        """ Writes values packed with a precompiled struct.
+
+        Args:
+            st (struct.Struct): The struct describing the values.
+            values: The values to pack.
+        """
+        end = self.offset + st.size
+        if end <= len(self.buf):
+            st.pack_into(self.buf, self.offset, *values)
+            self.offset = end
+        else:
+            self.write(st.pack(*values))
+
+    def write_u8(self, i):
+        """ Writes an 8-bit integer.
+
+        Args:
+            i (int): integer to be serialized.
+        """
+        self.write_struct(_U8, i)
+
+    def write_u16(self, i):
+        """ Writes a 16-bit integer in little-endian form.
+
+        Args:
+            i (int): integer to be serialized.
+        """
+        self.write_struct(_U16, i)
+
+    def write_u32(self, i):
+        """ Writes a 32-bit integer in little-endian form.
+
+        Args:
+            i (int): integer to be serialized.
+        """
+        self.write_struct(_U32, i)
+
+    def write_u64(self, i):
+        """ Writes a 64-bit integer in little-endian form.
+
+        Args:
+            i (int): integer to be serialized.
+        """
+        self.write_struct(_U64, i)
+
+    def write_compact_int(self, i):
+        """ Writes an integer in compact form (see pack_compact_int()).
+
+        Args:
+            i (int): integer to be serialized.
+        """
+        if i < 0xfd:
+            self.write_struct(_U8, i)
+        elif i <= 0xffff:
+            self.write_struct(_COMPACT16, 0xfd, i)
+        elif i <= 0xffffffff:
+            self.write_struct(_COMPACT32, 0xfe, i)
+        else:
+            self.write_struct(_COMPACT64, 0xff, i)
+
+    def write_var_str(self, s):
+        """ Writes a variable length byte stream prepended with its
+        length (see pack_var_str()).
+
+        Args:
+            s (bytes): byte stream to serialize.
+        """
+        self.write_compact_int(len(s))
+        self.write(s)
+
+    def getvalue(self):
+        """ Returns everything written so far.
+
+        Returns:
+            b (bytes): The bytes written since the writer was created.
+        """
+        if self.start == 0 and self.offset == len(self.buf):
+            return bytes(self.buf)
+        return bytes(self.buf[self.start:self.offset])
+
+
+class CacheStats(object):
+    """ Hit/miss counters for one of the caches used to avoid repeating
+    expensive work (serialization, hashing, etc.).
+
+    Args:
+        name (str): A descriptive name for the cache being counted.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self):
+        """ Resets both counters to zero.
+        """
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def lookups(self):
+        """ The total number of lookups made against the cache.
+        """
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self):
+        """ The fraction of lookups that were served from the cache.
+        """
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def __str__(self):
+        """ Returns a human readable formatting of the counters.
+
+        Returns:
+            s (str): A string containing the counters.
+        """
+        return "%s: %d hits, %d misses (%.1f%% hit rate)" % (
+            self.name, self.hits, self.misses, 100 * self.hit_rate)
+
+
+class LRUCache(object):
+    """ A thread-safe mapping of bounded size that evicts the least
+    recently used entries first.
+
+    Args:
+        name (str): A descriptive name for the cache, used for its
+            statistics.
+        max_size (int): The maximum number of entries. A size of 0
+            disables the cache: nothing is stored and lookups always
+            miss (without being counted).
+    """
+
+    def __init__(self, name, max_size):
+        self.stats = CacheStats(name)
+        self.max_size = max_size
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def enabled(self):
+        """ Whether the cache stores anything at all.
+        """
+        return self.max_size > 0
+
+    def get(self, key, default=None):
+        """ Looks up an entry, marking it as the most recently used.
+
+        Args:
+            key: The key to look up.
+            default: The value to return if key is not in the cache.
+
+        Returns:
+            The cached value, or default.
+        """
+        if self.max_size <= 0:
+            return default
+
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.stats.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+
+        return value
+
+    def put(self, key, value):
+        """ Adds (or replaces) an entry, evicting the least recently
+        used entries if the cache is full.
+
+        Args:
+            key: The key of the entry.
+            value: The value to store.
+        """
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def resize(self, max_size):
+        """ Changes the maximum number of entries, evicting entries
+        if needed.
+
+        Args:
+            max_size (int): The new maximum number of entries. 0
+                disables the cache.
+        """
+        with self._lock:
+            self.max_size = max_size
+            while len(self._data) > max(max_size, 0):
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """ Removes all entries and resets the statistics.
+        """
+        with self._lock:
+            self._data.clear()
+            self.stats.reset()
+
+
+# Decoded addresses, keyed by Base58Check address
+ADDRESS_CACHE_SIZE = 20000
+address_cache = LRUCache("Address decoding", ADDRESS_CACHE_SIZE)
+
+# P2PKH addresses, keyed by serialized public key and version
+PUBKEY_ADDRESS_CACHE_SIZE = 20000
+pubkey_address_cache = LRUCache("Public key addresses", PUBKEY_ADDRESS_CACHE_SIZE)
@@ -0,0 +1,301 @@
+"""This submodule provides the UTXOSet class, an in-memory set of unspent
+transaction outputs that blocks can be applied to and undone from.
+
+Outputs are keyed by their 36-byte outpoint (transaction hash followed by
+the output index as a little-endian u32) and each is stored as a single
+bytes object holding its value, the height of the block that created it,
+whether it was created by a coinbase transaction, and its scriptPubKey.
+Compared to keeping Transaction or TransactionOutput objects around, this
+keeps the cost of each output to two small bytes objects and a dict slot,
+so that sets of millions of outputs fit comfortably in memory.
+
+The set can be written to, and read back from, a compact binary snapshot
+file, which is filled through a memory map.
+"""
+import collections
+import mmap
+import os
+import struct
+
+from two1.bitcoin.exceptions import InvalidBlockError
+from two1.bitcoin.hash import Hash
+from two1.bitcoin.script import Script
+from two1.bitcoin.txn import TransactionOutput
+from two1.bitcoin.utils import ByteWriter
+from two1.bitcoin.utils import pack_compact_int
+from two1.bitcoin.utils import unpack_compact_int_from
+
+_OUTPOINT_INDEX_STRUCT = struct.Struct('<I')
+# value, (height << 1) | coinbase
+_COIN_STRUCT = struct.Struct('<QI')
+_OP_RETURN = 0x6a
+
+_SNAPSHOT_MAGIC = b'TWO1UTXO'
+_SNAPSHOT_HEADER_STRUCT = struct.Struct('<8s32sIQ')
+
+UTXOEntry = collections.namedtuple('UTXOEntry', ['value', 'script', 'height', 'coinbase'])
+
+
+def outpoint_key(txid, index):
+    """ Builds the compact key of an outpoint.
+
+    Args:
+        txid (Hash or bytes): Hash of the transaction.
+        index (int): Index of the output in the transaction.
+
+    Returns:
+        bytes: The 36-byte key.
+    """
+    return bytes(txid) + _OUTPOINT_INDEX_STRUCT.pack(index)
+
+
+def _pack_coin(value, script, height, coinbase):
+    return _COIN_STRUCT.pack(value, (height << 1) | bool(coinbase)) + bytes(script)
+
+
+def _unpack_coin(coin):
+    value, code = _COIN_STRUCT.unpack_from(coin)
+    return UTXOEntry(value, coin[_COIN_STRUCT.size:], code >> 1, bool(code & 1))
+
+
+class UTXOSet(object):
+    """ A set of unspent transaction outputs.
+
+    Attributes:
+        best_block_hash (Hash): Hash of the last block applied, or None.
+        height (int): Height of the last block applied, or -1.
+    """
+
+    def __init__(self):
+        self._coins = {}
+        self.best_block_hash = None
+        self.height = -1
+
+    def __len__(self):
+        return len(self._coins)
+
+    def __contains__(self, outpoint):
+        if isinstance(outpoint, tuple):
+            outpoint = outpoint_key(*outpoint)
+        return outpoint in self._coins
+
+    def add(self, txid, index, output, height, coinbase=False):
+        """ Adds an unspent output.
+
+        Args:
+            txid (Hash): Hash of the transaction containing the output.
+            index (int): Index of the output in the transaction.
+            output (TransactionOutput): The output.
+            height (int): Height of the block containing the transaction.
+            coinbase (bool): Whether the transaction is a coinbase.
+        """
+        self._coins[outpoint_key(txid, index)] = _pack_coin(output.value, output.script, height, coinbase)
+
+    def spend(self, txid, index):
+        """ Removes an output from the set.
+
+        Args:
+            txid (Hash): Hash of the transaction containing the output.
+            index (int): Index of the output in the transaction.
+
+        Returns:
+            UTXOEntry: The output that was spent, or None if it was not
+            in the set.
+        """
+        coin = self._coins.pop(outpoint_key(txid, index), None)
+        return None if coin is None else _unpack_coin(coin)
+
+    def get(self, txid, index):
+        """ Looks up an unspent output.
+
+        Args:
+            txid (Hash): Hash of the transaction containing the output.
+            index (int): Index of the output in the transaction.
+
+        Returns:
+            UTXOEntry: The value, scriptPubKey (bytes), height and coinbase
+            flag of the output, or None if it is not in the set.
+        """
+        coin = self._coins.get(outpoint_key(txid, index))
+        return None if coin is None else _unpack_coin(coin)
+
+    def lookup(self, txid, index):
+        """ Looks up an unspent output, for use as the utxo_lookup
+        function of two1.bitcoin.verify_block().
+
+        Args:
+            txid (Hash): Hash of the transaction containing the output.
+            index (int): Index of the output in the transaction.
+
+        Returns:
+            TransactionOutput: The output, or None if it is not in the set.
+        """
+        coin = self._coins.get(outpoint_key(txid, index))
+        if coin is None:
+            return None
+        value, _ = _COIN_STRUCT.unpack_from(coin)
+        return TransactionOutput(value, Script(coin[_COIN_STRUCT.size:]))
+
+    def prevouts(self, txn):
+        """ Looks up the outputs spent by a transaction, for use with
+        two1.bitcoin.verify_transaction().
+
+        Args:
+            txn (Transaction): The transaction.
+
+        Returns:
+            list(TransactionOutput): The output spent by each input, or
+            None for inputs spending outputs not in the set.
+        """
+        return [self.lookup(i.outpoint, i.outpoint_index) for i in txn.inputs]
+
+    def apply_block(self, block, height=None):
+        """ Spends the outputs consumed by a block and adds the ones it
+        creates.
+
+        Provably unspendable (OP_RETURN) outputs are not added. If any
+        input of the block spends an output that is not in the set, the
+        set is left unchanged.
+
+        Args:
+            block (Block): The block to apply.
+            height (int): Height of the block. Defaults to one more than
+                that of the last block applied.
+
+        Returns:
+            bytes: Undo data, to be passed to undo_block() to revert the
+            changes.
+
+        Raises:
+            InvalidBlockError: If the block spends an unknown output.
+        """
+        if height is None:
+            height = self.height + 1
+
+        coins = self._coins
+        undo = ByteWriter()
+        applied = []
+        for txn in block.txns:
+            txid = bytes(txn.hash)
+            spent = []
+            for inp in txn.inputs:
+                if inp.is_coinbase:
+                    continue
+                key = outpoint_key(inp.outpoint, inp.outpoint_index)
+                coin = coins.pop(key, None)
+                if coin is None:
+                    coins.update(spent)
+                    self._revert(applied, self._parse_undo(undo.getvalue()))
+                    raise InvalidBlockError("Transaction %s spends unknown output %s:%d." %
+                                            (txn.hash, inp.outpoint, inp.outpoint_index))
+                spent.append((key, coin))
+
+            for key, coin in spent:
+                undo.write_var_str(coin)
+            applied.append(txn)
+
+            coinbase = txn.inputs[0].is_coinbase if txn.inputs else False
+            for i, out in enumerate(txn.outputs):
+                script = bytes(out.script)
+                if script and script[0] == _OP_RETURN:
+                    continue
+                coins[outpoint_key(txid, i)] = _pack_coin(out.value, script, height, coinbase)
+
+        self.best_block_hash = block.hash
+        self.height = height
+        return undo.getvalue()
+
+    @staticmethod
+    def _parse_undo(undo):
+        coins = []
+        offset = 0
+        while offset < len(undo):
+            n, offset = unpack_compact_int_from(undo, offset)
+            coins.append(undo[offset:offset + n])
+            offset += n
+        return coins
+
+    def _revert(self, txns, coins):
+        """ Reverts the changes made by txns, given the coins they spent.
+        """
+        coins = list(coins)
+        for txn in reversed(txns):
+            txid = bytes(txn.hash)
+            for i in range(len(txn.outputs)):
+                self._coins.pop(outpoint_key(txid, i), None)
+            for inp in reversed(txn.inputs):
+                if inp.is_coinbase:
+                    continue
+                self._coins[outpoint_key(inp.outpoint, inp.outpoint_index)] = coins.pop()
+
+    def undo_block(self, block, undo):
+        """ Reverts the changes made by apply_block().
+
+        Blocks must be undone in the reverse order they were applied.
+
+        Args:
+            block (Block): The block to undo, which must be the last
+                block applied.
+            undo (bytes): The undo data returned by apply_block().
+        """
+        coins = self._parse_undo(undo)
+        num_spent = sum(1 for txn in block.txns for i in txn.inputs if not i.is_coinbase)
+        if len(coins) != num_spent:
+            raise ValueError("Undo data has %d outputs, block spends %d." % (len(coins), num_spent))
+
+        self._revert(block.txns, coins)
+        self.best_block_hash = block.block_header.prev_block_hash
+        self.height -= 1
+
+    def save_snapshot(self, path):
+        """ Writes the set to a snapshot file.
+
+        Args:
+            path (str): The file to write.
+        """
+        size = _SNAPSHOT_HEADER_STRUCT.size
+        for coin in self._coins.values():
+            size += 36 + len(pack_compact_int(len(coin))) + len(coin)
+
+        best = bytes(self.best_block_hash) if self.best_block_hash is not None else bytes(32)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w+b") as f:
+            f.truncate(size)
+            with mmap.mmap(f.fileno(), size) as m:
+                w = ByteWriter(m)
+                w.write_struct(_SNAPSHOT_HEADER_STRUCT, _SNAPSHOT_MAGIC, best, self.height & 0xffffffff,
+                               len(self._coins))
+                for key, coin in self._coins.items():
+                    w.write(key)
+                    w.write_var_str(coin)
+                m.flush()
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load_snapshot(path):
+        """ Reads a set from a snapshot file.
+
+        Args:
+            path (str): The file written by save_snapshot().
+
+        Returns:
+            UTXOSet: The set.
+        """
+        rv = UTXOSet()
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                magic, best, height, count = _SNAPSHOT_HEADER_STRUCT.unpack_from(m)
+                if magic != _SNAPSHOT_MAGIC:
+                    raise ValueError("%s is not a UTXO set snapshot." % path)
+
+                coins = rv._coins
+                offset = _SNAPSHOT_HEADER_STRUCT.size
+                for _ in range(count):
+                    key = m[offset:offset + 36]
+                    n, offset = unpack_compact_int_from(m, offset + 36)
+                    coins[key] = m[offset:offset + n]
+                    offset += n
+
+        rv.height = height if height != 0xffffffff else -1
+        rv.best_block_hash = Hash(best) if rv.height >= 0 else None
+        return rv
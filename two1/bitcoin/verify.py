@@ -0,0 +1,215 @@
+"""This submodule provides functions for verifying the input scripts of
+transactions and blocks in parallel.
+
+Input checks are independent of each other, so they are split into
+chunks and fanned out over a pool of workers. When the ECDSA backend is
+implemented in C (libsecp256k1 or OpenSSL, see two1.crypto.ecdsa),
+signature verification runs in ctypes calls that release the GIL and a
+thread pool is used. With the pure-Python backend a process pool is
+used instead, and transactions and scripts are sent to the workers in
+serialized form. Worker processes have their own signature cache (see
+two1.bitcoin.crypto.sig_cache), so verifications made there are not
+remembered by the calling process.
+
+Starting a pool costs far more than checking a few inputs, so by
+default everything is done in the calling thread.
+"""
+import concurrent.futures
+import os
+
+from two1.bitcoin.script import Script
+from two1.bitcoin.txn import Transaction
+from two1.bitcoin.txn import TransactionOutput
+from two1.crypto import ecdsa
+from two1.crypto import ecdsa_python
+
+# Number of chunks to create per worker, so that a few slow chunks
+# do not leave the other workers idle.
+CHUNKS_PER_WORKER = 4
+
+# Minimum number of inputs per chunk of a transaction. Checks of at
+# most this many inputs in total are always done in the calling thread.
+MIN_CHUNK_SIZE = 16
+
+
+def _to_script(prevout):
+    if isinstance(prevout, TransactionOutput):
+        return prevout.script
+    return prevout
+
+
+def _verify_chunk(txn, input_indices, sub_scripts):
+    return txn.verify_input_signatures(sub_scripts, input_indices)
+
+
+def _verify_serialized_chunk(txn_bytes, input_indices, sub_scripts_bytes):
+    txn, _ = Transaction.from_bytes(txn_bytes)
+    return _verify_chunk(txn, input_indices, [Script(b) for b in sub_scripts_bytes])
+
+
+def _uses_threads():
+    return ecdsa._ecdsa is not ecdsa_python
+
+
+def _new_executor(workers):
+    """ Creates a pool suited to the ECDSA backend in use.
+    """
+    if _uses_threads():
+        return concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+
+
+def _submit(executor, serialized, txn, input_indices, sub_scripts):
+    """ Submits a chunk of input checks of txn to an executor created
+    by _new_executor().
+
+    Args:
+        executor (Executor): The pool.
+        serialized (dict): Cache of serialized transactions, keyed by
+            id(txn), so that a transaction split into several chunks is
+            only serialized once.
+        txn (Transaction): The transaction.
+        input_indices (list(int)): The inputs to check.
+        sub_scripts (list(Script)): The scriptPubKey spent by each input.
+
+    Returns:
+        Future: The future list(bool) results of the checks.
+    """
+    if _uses_threads():
+        return executor.submit(_verify_chunk, txn, input_indices, sub_scripts)
+
+    if id(txn) not in serialized:
+        serialized[id(txn)] = bytes(txn)
+    return executor.submit(_verify_serialized_chunk,
+                           serialized[id(txn)],
+                           input_indices,
+                           [bytes(s) for s in sub_scripts])
+
+
+def _run(checks, workers):
+    """ Runs input checks, possibly in parallel.
+
+    Args:
+        checks (list(tuple)): (txn, input_index, sub_script) tuples.
+           sub_script is None for inputs whose outpoint could not be
+           found; those are not verified.
+        workers (int): Number of workers, or None for the number of CPUs.
+
+    Returns:
+        list(bool): Result of each check.
+    """
+    results = [False] * len(checks)
+
+    # Group the checks by transaction and split them into chunks
+    todo = [i for i, (txn, input_index, sub_script) in enumerate(checks) if sub_script is not None]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunk_size = max(MIN_CHUNK_SIZE, len(todo) // (workers * CHUNKS_PER_WORKER))
+
+    chunks = []
+    by_txn = {}
+    for i in todo:
+        txn = checks[i][0]
+        key = id(txn)
+        if key not in by_txn or len(by_txn[key]) >= chunk_size:
+            by_txn[key] = []
+            chunks.append(by_txn[key])
+        by_txn[key].append(i)
+
+    if workers <= 1 or len(chunks) <= 1 or len(todo) <= MIN_CHUNK_SIZE:
+        for chunk in chunks:
+            txn = checks[chunk[0]][0]
+            chunk_results = _verify_chunk(txn,
+                                          [checks[i][1] for i in chunk],
+                                          [checks[i][2] for i in chunk])
+            for i, r in zip(chunk, chunk_results):
+                results[i] = r
+        return results
+
+    futures = {}
+    serialized = {}
+    with _new_executor(workers) as executor:
+        for chunk in chunks:
+            txn = checks[chunk[0]][0]
+            f = _submit(executor, serialized, txn,
+                        [checks[i][1] for i in chunk],
+                        [checks[i][2] for i in chunk])
+            futures[f] = chunk
+
+        for f in concurrent.futures.as_completed(futures):
+            for i, r in zip(futures[f], f.result()):
+                results[i] = r
+
+    return results
+
+
+def verify_transaction(txn, prevouts, workers=1):
+    """ Verifies the input scripts of a transaction.
+
+    Args:
+        txn (Transaction): The transaction to verify.
+        prevouts (list): For each input, the TransactionOutput (or its
+            scriptPubKey as a Script) being spent. None may be given for
+            unknown outputs, in which case the input fails verification.
+        workers (int): Number of workers to use, or None for the number
+            of CPUs. If 1 (the default), everything is done in the
+            calling thread.
+
+    Returns:
+        list(bool): Whether each input is verified.
+    """
+    if len(prevouts) != txn.num_inputs:
+        raise ValueError("Expected %d prevouts, got %d." % (txn.num_inputs, len(prevouts)))
+
+    checks = [(txn, i, _to_script(prevout)) for i, prevout in enumerate(prevouts)]
+    return _run(checks, workers)
+
+
+def verify_block(block, utxo_lookup, workers=1):
+    """ Verifies the input scripts of all transactions in a block.
+
+    Outputs spent by a transaction are first looked up among the outputs
+    of the transactions that precede it in the block, and then using
+    utxo_lookup.
+
+    Args:
+        block (Block): The block to verify.
+        utxo_lookup (function): A function taking a transaction hash
+            (Hash) and an output index (int) and returning the
+            corresponding TransactionOutput (or its scriptPubKey as a
+            Script), or None if it is not known. Inputs spending unknown
+            outputs fail verification.
+        workers (int): Number of workers to use, or None for the number
+            of CPUs. If 1 (the default), everything is done in the
+            calling thread.
+
+    Returns:
+        list(list(bool)): For each transaction in the block, whether
+        each of its inputs is verified. The coinbase input is always
+        reported as verified.
+    """
+    block_outputs = {}
+    checks = []
+    for n, txn in enumerate(block.txns):
+        if n > 0:
+            for i, inp in enumerate(txn.inputs):
+                key = (bytes(inp.outpoint), inp.outpoint_index)
+                if key in block_outputs:
+                    prevout = block_outputs[key]
+                else:
+                    prevout = utxo_lookup(inp.outpoint, inp.outpoint_index)
+                checks.append((txn, i, _to_script(prevout)))
+
+        txn_hash = bytes(txn.hash)
+        for i, out in enumerate(txn.outputs):
+            block_outputs[(txn_hash, i)] = out
+
+    results = iter(_run(checks, workers))
+    rv = []
+    for n, txn in enumerate(block.txns):
+        if n == 0:
+            rv.append([True] * txn.num_inputs)
+        else:
+            rv.append([next(results) for _ in range(txn.num_inputs)])
+
+    return rv
@@ -7,13 +7,11 @@ import time
 
 from two1 import TWO1_CHANNELS_FEE
 from two1 import TWO1_CHANNELS_MIN_DURATION
-from two1.bitcoin import Hash
 from two1.bitcoin import PublicKey
 from two1.bitcoin import Script
 from two1.bitcoin import Signature
 from two1.bitcoin import Transaction
 from two1.bitcoin.utils import pack_compact_int
-from two1.bitcoin.utils import pack_u32
 from two1.channels.blockchain import TwentyOneBlockchain
 from two1.channels.statemachine import PaymentChannelRedeemScript
 from two1.channels.walletwrapper import Two1WalletWrapper
@@ -239,8 +237,7 @@ class PaymentServer:
             raise BadTransactionError('Invalid merchant pubkey.')
 
         # Verify that the payment has a valid signature from the customer
-        txn_copy = payment_tx._copy_for_sig(0, Transaction.SIG_HASH_ALL, redeem_script)
-        msg_to_sign = bytes(Hash.dhash(bytes(txn_copy) + pack_u32(Transaction.SIG_HASH_ALL)))
+        msg_to_sign = payment_tx.get_sig_hash(0, Transaction.SIG_HASH_ALL, redeem_script)
         sig = Signature.from_der(payment_tx.inputs[0].script[0][:-1])
         if not redeem_script.customer_public_key.verify(msg_to_sign, sig, False):
             raise BadTransactionError('Invalid payment signature.')
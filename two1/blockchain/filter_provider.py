@@ -0,0 +1,167 @@
+"""This submodule provides a concrete `FilterProvider` class that provides
+information about the blockchain by scanning blocks from a local source.
+
+Rather than sending the wallet's addresses to a server, the provider
+matches their output scripts against the BIP158 compact filter of each
+block of the chain, and only reads the blocks whose filter matches."""
+from collections import defaultdict
+
+from two1.bitcoin.blockfilter import FilterQuery
+from two1.bitcoin.script import Script
+from two1.bitcoin.utils import address_to_key_hash
+from two1.blockchain import exceptions
+from two1.blockchain.base_provider import BaseProvider
+
+
+class FilterProvider(BaseProvider):
+    """ Transaction data provider using compact block filters.
+
+    Args:
+        chain (HeaderChain): The chain of headers to scan, which also
+            gives the height and number of confirmations of blocks.
+        get_block (function): A function taking a block hash (Hash) and
+            returning the corresponding Block, for example
+            BlockFileReader.get_block or a function downloading the block
+            from a peer.
+        get_filter (function): A function taking a block hash (Hash) and
+            returning the basic filter of the block (GCSFilter), or None
+            if it is not available, in which case the block is read.
+        broadcast_provider (BaseProvider): If given, transactions are
+            broadcast through this provider.
+        testnet (bool): Whether the addresses are testnet addresses.
+    """
+
+    def __init__(self, chain, get_block, get_filter, broadcast_provider=None, testnet=False):
+        super().__init__()
+        self.chain = chain
+        self.get_block = get_block
+        self.get_filter = get_filter
+        self.broadcast_provider = broadcast_provider
+        self.testnet = testnet
+        self.can_limit_by_height = True
+
+        # Transactions found while scanning, keyed by txid
+        self._txns = {}
+
+    @staticmethod
+    def _address_to_script(address):
+        version, hash160 = address_to_key_hash(address)
+        if version in (Script.P2SH_MAINNET_VERSION, Script.P2SH_TESTNET_VERSION):
+            return Script.build_p2sh(hash160)
+        return Script.build_p2pkh(hash160)
+
+    def _txn_addresses(self, txn):
+        """ Returns the addresses found in the inputs and outputs of txn.
+        """
+        scripts = [i.script for i in txn.inputs if not i.is_coinbase]
+        scripts += [o.script for o in txn.outputs]
+
+        rv = set()
+        for script in scripts:
+            try:
+                rv.update(script.get_addresses(self.testnet))
+            except Exception:
+                # Non-standard scripts have no addresses
+                pass
+        return rv
+
+    def get_transactions(self, address_list, limit=100, min_block=None):
+        """ Provides transactions associated with each address in address_list.
+
+        Args:
+            address_list (list): List of Base58Check encoded Bitcoin
+                addresses.
+            limit (int): Maximum number of transactions to return.
+            min_block (int): Block height from which to start getting
+                transactions. If None, will get transactions from the
+                entire chain.
+
+        Returns:
+            dict: A dict keyed by address with each value being a list of
+            Transaction objects.
+        """
+        ret = defaultdict(list)
+        addresses = set(address_list)
+        if not addresses:
+            return ret
+        query = FilterQuery(bytes(self._address_to_script(a)) for a in addresses)
+
+        start = self.chain.start_height
+        if min_block is not None:
+            start = max(start, min_block)
+
+        for height in range(start, self.chain.height + 1):
+            block_hash = self.chain.get_hash(height)
+            block_filter = self.get_filter(block_hash)
+            if block_filter is not None and not block_filter.match_any(query):
+                continue
+
+            block = self.get_block(block_hash)
+            metadata = None
+            for txn in block.txns:
+                found = self._txn_addresses(txn) & addresses
+                if not found:
+                    continue
+
+                if metadata is None:
+                    metadata = dict(block=height,
+                                    block_hash=block_hash,
+                                    network_time=block.block_header.time,
+                                    confirmations=self.chain.confirmations(block_hash))
+                entry = dict(metadata=metadata, transaction=txn)
+                self._txns[str(txn.hash)] = entry
+                for addr in found:
+                    if len(ret[addr]) < limit:
+                        ret[addr].append(entry)
+
+        return ret
+
+    def get_transactions_by_id(self, ids):
+        """ Gets transactions by their IDs.
+
+        Only transactions found by previous calls to get_transactions()
+        are known to this provider.
+
+        Args:
+            ids (list): List of TXIDs to retrieve.
+
+        Returns:
+            dict: A dict keyed by TXID of Transaction objects.
+        """
+        ret = {}
+        for txid in ids:
+            if txid not in self._txns:
+                raise exceptions.DataProviderError("Transaction %s has not been scanned." % txid)
+            ret[txid] = self._txns[txid]
+        return ret
+
+    def get_block_height(self):
+        """ Returns the latest block height
+
+        Returns:
+            int: Block height
+        """
+        return self.chain.height
+
+    def broadcast_transaction(self, transaction):
+        """ Broadcasts a transaction to the Bitcoin network
+
+        Args:
+            transaction (bytes or str): serialized, signed transaction
+
+        Returns:
+            str: The transaction ID
+        """
+        if self.broadcast_provider is None:
+            raise NotImplementedError("No provider to broadcast transactions through.")
+        return self.broadcast_provider.broadcast_transaction(transaction)
+
+    def get_balance(self, address_list):
+        """ Deprecated Method
+        """
+        raise NotImplementedError("This method has been deprecated")
+
+    def get_utxos(self, address_list):
+        """ Deprecated Method
+        """
+        raise NotImplementedError("This method has been deprecated")
@@ -1,7 +1,12 @@
+# The native backends raise ImportError or OSError when their library
+# cannot be loaded, and AttributeError when it lacks a symbol they use.
 try:
-    from two1.crypto import ecdsa_openssl as _ecdsa
-except:
-    from two1.crypto import ecdsa_python as _ecdsa
+    from two1.crypto import ecdsa_secp256k1 as _ecdsa
+except (ImportError, OSError, AttributeError):
+    try:
+        from two1.crypto import ecdsa_openssl as _ecdsa
+    except (ImportError, OSError, AttributeError):
+        from two1.crypto import ecdsa_python as _ecdsa
 
 ECPointAffine = _ecdsa.ECPointAffine
 EllipticCurve = _ecdsa.EllipticCurve
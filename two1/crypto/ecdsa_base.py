@@ -63,6 +63,35 @@ class EllipticCurveBase(object):
         """
         raise NotImplementedError
 
+    def public_key_batch(self, private_keys):
+        """ Returns the public keys for many private keys.
+
+        Backends that can share work between keys should override
+        this. By default each public key is computed in turn.
+
+        Args:
+            private_keys (list(int)): the private keys.
+
+        Returns:
+            list(ECPointAffine): The points representing the public keys.
+        """
+        return [self.public_key(k) for k in private_keys]
+
+    def tweak_add_batch(self, items):
+        """ Computes tweak * G + P for many (tweak, P) pairs.
+
+        Backends that can share work between points should override
+        this. By default each point is computed in turn.
+
+        Args:
+            items (list(tuple)): (tweak, point) tuples, where tweak is
+               an int and point an ECPointAffine.
+
+        Returns:
+            list(ECPointAffine): The resulting points.
+        """
+        return [self.public_key(tweak) + point for tweak, point in items]
+
     def recover_public_key(self, message, signature, recovery_id=None):
         """ Recovers possibilities for the public key associated with the
             private key used to sign message and generate signature.
@@ -121,6 +150,24 @@ class EllipticCurveBase(object):
         """
         raise NotImplementedError
 
+    def verify_batch(self, items, do_hash=True):
+        """ Verifies many signatures at once.
+
+        Backends that can share work between verifications should
+        override this. By default each signature is verified in turn.
+
+        Args:
+            items (list(tuple)): (message, signature, public_key) tuples,
+               with the same types as the arguments to `verify()`.
+            do_hash (bool): True if the messages should be hashed prior
+               to verifying, False if not.
+
+        Returns:
+            list(bool): Whether each signature is verified.
+        """
+        return [self.verify(message, signature, public_key, do_hash)
+                for message, signature, public_key in items]
+
     def _nonce_random(self):
         return random.SystemRandom().randrange(1, self.n - 1)
 
@@ -27,6 +27,7 @@ class ECPointAffine(object):
     Returns:
         ECPointAffine: the point formed by (x, y) on curve.
     """
+    __slots__ = ('x', 'y', 'curve', 'infinity')
 
     def __init__(self, curve, x, y, infinity=False):
         self.x = x
@@ -44,14 +45,18 @@ class ECPointAffine(object):
     def __add__(self, b):
         assert self.curve == b.curve
 
-        a_pt = ossl.point_new_from_ints(self.curve.os_group, self.x, self.y, self.infinity)
-        b_pt = ossl.point_new_from_ints(b.curve.os_group, b.x, b.y, b.infinity)
-        ossl.lc.EC_POINT_add(self.curve.os_group, a_pt, a_pt, b_pt, None)
+        res = ossl.thread_resources()
+        points = res.point_pool(self.curve.os_group)
+        a_pt = points.get()
+        b_pt = points.get()
+        ossl.point_new_from_ints(self.curve.os_group, self.x, self.y, self.infinity, pt=a_pt)
+        ossl.point_new_from_ints(b.curve.os_group, b.x, b.y, b.infinity, pt=b_pt)
+        ossl.lc.EC_POINT_add(self.curve.os_group, a_pt, a_pt, b_pt, res.bn_ctx)
 
         x, y, inf = ossl.point_get_xy_ints(self.curve.os_group, a_pt)
 
-        ossl.lc.EC_POINT_free(a_pt)
-        ossl.lc.EC_POINT_free(b_pt)
+        points.put(a_pt)
+        points.put(b_pt)
 
         return ECPointAffine(self.curve, x, y, inf)
 
@@ -120,9 +125,12 @@ class EllipticCurve(EllipticCurveBase):
         Returns:
             bool: True if p is on the curve, False otherwise.
         """
-        ec_pt = ossl.point_new_from_ints(self.os_group, p.x, p.y)
-        on_curve = ossl.lc.EC_POINT_is_on_curve(self.os_group, ec_pt, None)
-        ossl.lc.EC_POINT_free(ec_pt)
+        res = ossl.thread_resources()
+        points = res.point_pool(self.os_group)
+        ec_pt = points.get()
+        on_curve = ossl.point_new_from_ints(self.os_group, p.x, p.y, pt=ec_pt) is not None and \
+            ossl.lc.EC_POINT_is_on_curve(self.os_group, ec_pt, res.bn_ctx)
+        points.put(ec_pt)
 
         return bool(on_curve)
 
@@ -137,33 +145,40 @@ class EllipticCurve(EllipticCurveBase):
             x (int): x component of the point.
 
         Returns:
-            tuple: both possible y components of the point.
+            tuple: both possible y components of the point, or an
+            empty list if there is no point on the curve with that x.
         """
         rv = []
-        x_bn = ossl.int_to_bn(x)
+        res = ossl.thread_resources()
+        ctx = res.bn_ctx
+        points = res.point_pool(self.os_group)
+        ossl.lc.BN_CTX_start(ctx)
+        x_bn = ossl.int_to_bn(x, c_void_p(ossl.lc.BN_CTX_get(ctx)))
+        ec_pt = points.get()
         for y_bit in [0, 1]:
-            # Create a new point
-            ec_pt = c_void_p(ossl.lc.EC_POINT_new(self.os_group))
-            ossl.lc.EC_POINT_set_compressed_coordinates_GFp(self.os_group,
-                                                            ec_pt,
-                                                            x_bn,
-                                                            y_bit,
-                                                            c_void_p())
+            # On failure ec_pt still holds whatever point it was last
+            # used for, so it must not be read.
+            if not ossl.lc.EC_POINT_set_compressed_coordinates_GFp(self.os_group,
+                                                                   ec_pt,
+                                                                   x_bn,
+                                                                   y_bit,
+                                                                   ctx):
+                rv = []
+                break
 
             on_curve = ossl.lc.EC_POINT_is_on_curve(self.os_group,
                                                     ec_pt,
-                                                    c_void_p())
+                                                    ctx)
             if not on_curve:
-                ossl.lc.EC_POINT_free(ec_pt)
                 rv.append(None)
                 continue
 
             # Get the y value
             _, y, _ = ossl.point_get_xy_ints(self.os_group, ec_pt)
             rv.append(y)
-            ossl.lc.EC_POINT_free(ec_pt)
 
-        ossl.lc.BN_free(x_bn)
+        points.put(ec_pt)
+        ossl.lc.BN_CTX_end(ctx)
 
         return rv
 
@@ -190,9 +205,14 @@ class EllipticCurve(EllipticCurveBase):
         Returns:
             ECPointAffine: The point representing the public key.
         """
-        k = ossl.new_key(self.curve_name, private_key)
-        pub_x, pub_y, is_inf = ossl.get_public_key_ints(k)
-        ossl.lc.EC_KEY_free(k)
+        keys = ossl.thread_resources().key_pool(self.curve_name)
+        k = keys.get()
+        try:
+            ossl.set_key(k, private_key)
+            pub_x, pub_y, is_inf = ossl.get_public_key_ints(k)
+        finally:
+            ossl.clear_private_key(k)
+            keys.put(k)
         return ECPointAffine(self, pub_x, pub_y, is_inf)
 
     def recover_public_key(self, message, signature, recovery_id=None):
@@ -216,7 +236,9 @@ class EllipticCurve(EllipticCurveBase):
         r = signature.x
         s = signature.y
 
-        ctx = c_void_p(ossl.lc.BN_CTX_new())
+        res = ossl.thread_resources()
+        points = res.point_pool(self.os_group)
+        ctx = res.bn_ctx
         ossl.lc.BN_CTX_start(ctx)
 
         order_bn = c_void_p(ossl.lc.BN_CTX_get(ctx))
@@ -248,11 +270,12 @@ class EllipticCurve(EllipticCurveBase):
         z = int.from_bytes(self.hash_function(message).digest()[:num_bytes], 'big')
         ossl.int_to_bn(z, z_bn)
 
-        zG = c_void_p(ossl.lc.EC_POINT_new(self.os_group))
-        sR = c_void_p(ossl.lc.EC_POINT_new(self.os_group))
-        temp = c_void_p(ossl.lc.EC_POINT_new(self.os_group))
-        pub_key = c_void_p(ossl.lc.EC_POINT_new(self.os_group))
-        Rn = c_void_p(ossl.lc.EC_POINT_new(self.os_group))
+        zG = points.get()
+        sR = points.get()
+        temp = points.get()
+        pub_key = points.get()
+        Rn = points.get()
+        R = points.get()
 
         for i in i_list:
             ossl.int_to_bn(i, i_bn)
@@ -266,7 +289,7 @@ class EllipticCurve(EllipticCurveBase):
                 if y & 0x1 != k:
                     y = ys[k ^ 1]
 
-                R = ossl.point_new_from_ints(self.os_group, r, y)
+                ossl.point_new_from_ints(self.os_group, r, y, pt=R)
                 ossl.lc.EC_POINT_mul(self.os_group,
                                      Rn,
                                      None,
@@ -297,20 +320,14 @@ class EllipticCurve(EllipticCurveBase):
                                      rinv_bn,
                                      ctx)
 
-                ossl.lc.EC_POINT_free(R)
-
                 # Convert to ECPointAffine
                 pub_x, pub_y, inf = ossl.point_get_xy_ints(self.os_group, pub_key)
                 rv.append((ECPointAffine(self, pub_x, pub_y, inf), 2 * i + k))
 
-        ossl.lc.EC_POINT_free(zG)
-        ossl.lc.EC_POINT_free(sR)
-        ossl.lc.EC_POINT_free(temp)
-        ossl.lc.EC_POINT_free(pub_key)
-        ossl.lc.EC_POINT_free(Rn)
+        for pt in [zG, sR, temp, pub_key, Rn, R]:
+            points.put(pt)
 
         ossl.lc.BN_CTX_end(ctx)
-        ossl.lc.BN_CTX_free(ctx)
 
         return rv
 
@@ -332,9 +349,13 @@ class EllipticCurve(EllipticCurveBase):
         s = 0
         recovery_id = 0
 
-        key = ossl.new_key(self.curve_name, private_key)
+        res = ossl.thread_resources()
+        keys = res.key_pool(self.curve_name)
+        points = res.point_pool(self.os_group)
+        key = keys.get()
+        p = points.get()
 
-        ctx = c_void_p(ossl.lc.BN_CTX_new())
+        ctx = res.bn_ctx
         ossl.lc.BN_CTX_start(ctx)
 
         order_bn = c_void_p(ossl.lc.BN_CTX_get(ctx))
@@ -342,58 +363,68 @@ class EllipticCurve(EllipticCurveBase):
         kinv_bn = c_void_p(ossl.lc.BN_CTX_get(ctx))
         px_bn = c_void_p(ossl.lc.BN_CTX_get(ctx))
         r_bn = c_void_p(ossl.lc.BN_CTX_get(ctx))
-        ossl.lc.EC_GROUP_get_order(self.os_group, order_bn, ctx)
 
-        while r == 0 or s == 0:
-            k = self._nonce_rfc6979(private_key, hashed) if secret is None else secret
-            ossl.int_to_bn(k, k_bn)
+        try:
+            ossl.set_key(key, private_key)
+            ossl.lc.EC_GROUP_get_order(self.os_group, order_bn, ctx)
+
+            while r == 0 or s == 0:
+                k = self._nonce_rfc6979(private_key, hashed) if secret is None else secret
+                ossl.int_to_bn(k, k_bn)
 
-            ossl.lc.BN_mod_inverse(kinv_bn, k_bn, order_bn, ctx)
+                ossl.lc.BN_mod_inverse(kinv_bn, k_bn, order_bn, ctx)
 
-            p = c_void_p(ossl.lc.EC_POINT_new(self.os_group))
-            ossl.lc.EC_POINT_mul(self.os_group,
-                                 p,
-                                 k_bn,
-                                 c_void_p(),
-                                 c_void_p(),
-                                 ctx)
-            assert self.h == 1
+                ossl.lc.EC_POINT_mul(self.os_group,
+                                     p,
+                                     k_bn,
+                                     c_void_p(),
+                                     c_void_p(),
+                                     ctx)
+                assert self.h == 1
 
-            px, py, _ = ossl.point_get_xy_ints(self.os_group, p)
-            recovery_id = 2 if px > self.n else 0
-            recovery_id |= (py & 0x1)
+                px, py, _ = ossl.point_get_xy_ints(self.os_group, p)
+                recovery_id = 2 if px > self.n else 0
+                recovery_id |= (py & 0x1)
 
-            # Get r
-            ossl.int_to_bn(px, px_bn)
-            ossl.lc.BN_nnmod(r_bn, px_bn, order_bn, ctx)
-            r = ossl.bn_to_int(r_bn)
+                # Get r
+                ossl.int_to_bn(px, px_bn)
+                ossl.lc.BN_nnmod(r_bn, px_bn, order_bn, ctx)
+                r = ossl.bn_to_int(r_bn)
 
-            if r == 0:
-                continue
+                if r == 0:
+                    continue
 
-            hashed_buf = c_char_p(hashed)
-            sig = ossl.lc.ECDSA_do_sign_ex(hashed_buf,
-                                           len(hashed),
-                                           kinv_bn,
-                                           r_bn,
-                                           key)
-            err = ossl.lc.ERR_peek_error()
-            if err:
-                err_buf = create_string_buffer(120)
-                ossl.lc.ERR_error_string(err, err_buf)
-                raise Exception("Problem when signing: %s" %
-                                err_buf.raw.decode())
-
-            sig_r = ossl.bn_to_int(sig.contents.r)
-            sig_s = ossl.bn_to_int(sig.contents.s)
-
-            if sig_r != r:
-                raise ValueError("Didn't get the same r value.")
-            s = sig_s
-
-        ossl.lc.EC_KEY_free(key)
-        ossl.lc.BN_CTX_end(ctx)
-        ossl.lc.BN_CTX_free(ctx)
+                hashed_buf = c_char_p(hashed)
+                sig = ossl.lc.ECDSA_do_sign_ex(hashed_buf,
+                                               len(hashed),
+                                               kinv_bn,
+                                               r_bn,
+                                               key)
+                err = ossl.lc.ERR_peek_error()
+                if err:
+                    if sig:
+                        ossl.lc.ECDSA_SIG_free(sig)
+                    err_buf = create_string_buffer(120)
+                    ossl.lc.ERR_error_string(err, err_buf)
+                    raise Exception("Problem when signing: %s" %
+                                    err_buf.raw.decode())
+
+                sig_r = ossl.bn_to_int(sig.contents.r)
+                sig_s = ossl.bn_to_int(sig.contents.s)
+                ossl.lc.ECDSA_SIG_free(sig)
+
+                if sig_r != r:
+                    raise ValueError("Didn't get the same r value.")
+                s = sig_s
+        finally:
+            # Don't leave secrets behind in pooled objects, and keep
+            # the shared BN_CTX balanced, even if signing failed.
+            ossl.lc.BN_clear(k_bn)
+            ossl.lc.BN_clear(kinv_bn)
+            ossl.clear_private_key(key)
+            keys.put(key)
+            points.put(p)
+            ossl.lc.BN_CTX_end(ctx)
 
         return (Point(r, s), recovery_id)
 
@@ -416,21 +447,25 @@ class EllipticCurve(EllipticCurveBase):
         r = signature.x
         s = signature.y
 
-        sig = ossl.sig_new_from_ints(r, s)
-
         hashed = self.hash_function(message).digest() if do_hash else message
 
-        key = c_void_p(ossl.lc.EC_KEY_new_by_curve_name(self.curve_name))
-        ossl.set_public_key_from_ints(key=key,
-                                      x=public_key.x,
-                                      y=public_key.y,
-                                      infinity=public_key.infinity)
+        # The EC_KEY for the public key is cached, as the same key is
+        # often used for many verifications.
+        res = ossl.thread_resources()
+        key = res.public_key(self.curve_name,
+                             public_key.x.to_bytes(32, byteorder='big'),
+                             public_key.y.to_bytes(32, byteorder='big'),
+                             public_key.infinity)
+        if key is None:
+            return False
+
+        sig = res.sigs.get()
+        ossl.sig_new_from_ints(r, s, sig=sig)
 
         dig_buf = create_string_buffer(hashed)
         verified = ossl.lc.ECDSA_do_verify(dig_buf, len(hashed), sig, key)
 
-        ossl.lc.ECDSA_SIG_free(sig)
-        ossl.lc.EC_KEY_free(key)
+        res.sigs.put(sig)
 
         return bool(verified)
 
@@ -1,6 +1,8 @@
 import hashlib
 import math
+import os
 import random
+import sys
 
 from collections import namedtuple
 
@@ -27,6 +29,14 @@ from two1.crypto.ecdsa_base import EllipticCurveBase
 
 Point = namedtuple('Point', ['x', 'y'])
 
+# Fixed-base tables, shared by all curve instances with the same
+# parameters. See EllipticCurve.fixed_base_table.
+_fixed_base_tables = {}
+
+# pow() computes modular inverses natively (and much faster than the
+# extended Euclidean algorithm in Python) from Python 3.8.
+_POW_MODINV = sys.version_info >= (3, 8)
+
 
 def montgomery_ladder(k, p):
     """ Implements scalar multiplication via the Montgomery ladder
@@ -62,6 +72,215 @@ def montgomery_ladder(k, p):
     return r[0]
 
 
+def _batch_inverse(values, n):
+    """ Inverts every value modulo n with a single modular inversion
+    (Montgomery's trick).
+
+    Args:
+        values (list(int)): Values to invert. Values that are 0 mod n
+           are left as 0.
+        n (int): modulus
+
+    Returns:
+        list(int): the inverses.
+    """
+    prods = []
+    acc = 1
+    for v in values:
+        if v % n:
+            acc = (acc * v) % n
+        prods.append(acc)
+
+    if not values:
+        return []
+    inv = EllipticCurve.modinv(acc, n)
+
+    rv = [0] * len(values)
+    for i in reversed(range(len(values))):
+        v = values[i] % n
+        if not v:
+            continue
+        rv[i] = (inv * prods[i - 1]) % n if i else inv
+        inv = (inv * v) % n
+
+    return rv
+
+
+def _jacobian_to_affine_batch(points, p):
+    """ Converts (X, Y, Z) Jacobian coordinates to affine coordinates
+    using a single modular inversion.
+
+    Args:
+        points (list(tuple)): (X, Y, Z) tuples.
+        p (int): Prime that defines the field.
+
+    Returns:
+        list(tuple): (x, y) tuples, or None for points at infinity.
+    """
+    z_invs = _batch_inverse([Z for X, Y, Z in points], p)
+
+    rv = []
+    for (X, Y, Z), z_inv in zip(points, z_invs):
+        if not z_inv:
+            rv.append(None)
+            continue
+        z_inv2 = (z_inv * z_inv) % p
+        rv.append(((X * z_inv2) % p, (Y * z_inv2 * z_inv) % p))
+
+    return rv
+
+
+def to_affine_batch(points):
+    """ Converts points to affine coordinates using a single modular
+    inversion for all of them (Montgomery's trick), instead of one
+    per point as `ECPoint.to_affine()` does.
+
+    Args:
+        points (list(ECPoint)): Points to convert. They must all be on
+           the same curve.
+
+    Returns:
+        list(ECPointAffine): The affine representations, in the same
+        order.
+    """
+    if not points:
+        return []
+
+    curve = points[0].curve
+    jacobian = []
+    for pt in points:
+        if pt.infinity:
+            jacobian.append((0, 0, 0))
+        elif isinstance(pt, ECPointAffine):
+            jacobian.append((pt.x, pt.y, 1))
+        else:
+            jacobian.append((pt.x, pt.y, pt.z))
+
+    return [ECPointAffine(curve, pt[0], pt[1]) if pt is not None else ECPointAffine(curve, 0, 0, True)
+            for pt in _jacobian_to_affine_batch(jacobian, curve.p)]
+
+
+def _jacobian_double(X, Y, Z, p, a):
+    """ Doubles a point in Jacobian coordinates. (0, 1, 0) is
+    the point at infinity.
+    """
+    if Z == 0 or Y == 0:
+        return 0, 1, 0
+
+    y2 = (Y * Y) % p
+    s = (4 * X * y2) % p
+    if a == 0:
+        m = (3 * X * X) % p
+    else:
+        z2 = (Z * Z) % p
+        m = (3 * X * X + a * z2 * z2) % p
+
+    X3 = (m * m - 2 * s) % p
+    Y3 = (m * (s - X3) - 8 * y2 * y2) % p
+    Z3 = (2 * Y * Z) % p
+
+    return X3, Y3, Z3
+
+
+def _jacobian_add(X1, Y1, Z1, X2, Y2, Z2, p, a):
+    """ Adds two points in Jacobian coordinates.
+    """
+    if Z1 == 0:
+        return X2, Y2, Z2
+    if Z2 == 0:
+        return X1, Y1, Z1
+
+    z1z1 = (Z1 * Z1) % p
+    z2z2 = (Z2 * Z2) % p
+    u1 = (X1 * z2z2) % p
+    u2 = (X2 * z1z1) % p
+    s1 = (Y1 * Z2 * z2z2) % p
+    s2 = (Y2 * Z1 * z1z1) % p
+    h = (u2 - u1) % p
+    r = (s2 - s1) % p
+    if h == 0:
+        if r == 0:
+            return _jacobian_double(X1, Y1, Z1, p, a)
+        return 0, 1, 0
+
+    hh = (h * h) % p
+    hhh = (h * hh) % p
+    v = (u1 * hh) % p
+    X3 = (r * r - hhh - 2 * v) % p
+    Y3 = (r * (v - X3) - s1 * hhh) % p
+    Z3 = (Z1 * Z2 * h) % p
+
+    return X3, Y3, Z3
+
+
+def _jacobian_add_affine(X1, Y1, Z1, x2, y2, p, a):
+    """ Adds an affine point to a point in Jacobian coordinates
+    (mixed addition).
+    """
+    if Z1 == 0:
+        return x2, y2, 1
+
+    z1z1 = (Z1 * Z1) % p
+    h = (x2 * z1z1 - X1) % p
+    r = (y2 * Z1 * z1z1 - Y1) % p
+    if h == 0:
+        if r == 0:
+            return _jacobian_double(X1, Y1, Z1, p, a)
+        return 0, 1, 0
+
+    hh = (h * h) % p
+    hhh = (h * hh) % p
+    v = (X1 * hh) % p
+    X3 = (r * r - hhh - 2 * v) % p
+    Y3 = (r * (v - X3) - Y1 * hhh) % p
+    Z3 = (Z1 * h) % p
+
+    return X3, Y3, Z3
+
+
+def _odd_multiples(x, y, count, p, a):
+    """ Computes the affine points P, 3P, 5P, ..., (2 * count - 1)P.
+    """
+    two_p = _jacobian_double(x, y, 1, p, a)
+    points = [(x, y, 1)]
+    for i in range(count - 1):
+        X, Y, Z = points[-1]
+        points.append(_jacobian_add(X, Y, Z, two_p[0], two_p[1], two_p[2], p, a))
+
+    return _jacobian_to_affine_batch(points, p)
+
+
+def _wnaf(k, w):
+    """ Computes the width-w non-adjacent form of k.
+
+    Args:
+        k (int): A non-negative integer.
+        w (int): The window width.
+
+    Returns:
+        list(int): The digits, least significant first. Every non-zero
+        digit is odd and less than 2^(w-1) in absolute value.
+    """
+    naf = []
+    full = 1 << w
+    half = 1 << (w - 1)
+    while k:
+        if k & 1:
+            d = k & (full - 1)
+            if d >= half:
+                d -= full
+            k -= d
+            naf.append(d)
+            k >>= 1
+        else:
+            # Skip the whole run of zeros
+            zeros = (k & -k).bit_length() - 1
+            naf += [0] * zeros
+            k >>= zeros
+
+    return naf
+
+
 class ECPoint(object):
     """ Base class for any elliptic curve point implementations.
 
@@ -84,6 +303,8 @@ class ECPoint(object):
     Returns:
         ECPoint: the point formed by (x, y, z) on curve.
     """
+    __slots__ = ('x', 'y', 'z', 'curve', 'infinity')
+
     @staticmethod
     def from_affine():
         """ Converts from an Affine representation to a Jacobian.
@@ -156,6 +377,7 @@ class ECPointJacobian(ECPoint):
     Returns:
         ECPointAffine: the point formed by (x, y) on curve.
     """
+    __slots__ = ('z2', 'z3')
 
     @staticmethod
     def from_affine(affine_point):
@@ -299,8 +521,10 @@ class ECPointJacobian(ECPoint):
         if self.z == 1:
             return ECPointAffine(self.curve, self.x, self.y)
 
-        x = (self.x * self.curve.modinv(self.z2, self.curve.p)) % self.curve.p
-        y = (self.y * self.curve.modinv(self.z3, self.curve.p)) % self.curve.p
+        z_inv = self.curve.modinv(self.z, self.curve.p)
+        z_inv2 = (z_inv * z_inv) % self.curve.p
+        x = (self.x * z_inv2) % self.curve.p
+        y = (self.y * z_inv2 * z_inv) % self.curve.p
 
         return ECPointAffine(self.curve, x, y)
 
@@ -330,6 +554,7 @@ class ECPointAffine(ECPoint):
     Returns:
         ECPointAffine: the point formed by (x, y) on curve.
     """
+    __slots__ = ()
 
     @staticmethod
     def from_affine(affine_point):
@@ -489,6 +714,171 @@ class ECPointAffine(ECPoint):
         return bytes([0x04]) + self.x.to_bytes(nbytes, 'big') + self.y.to_bytes(nbytes, 'big')
 
 
+class FixedBaseTable(object):
+    """ A precomputed table for fast multiplication of a fixed point.
+
+    The scalar is split into w-bit windows and, for every window i and
+    every digit j, the table holds the affine point (j * 2^(w*i) + 1) * P.
+    A multiplication is then a sum of one table entry per window (no
+    doublings) followed by the subtraction of the accumulated offset,
+    which is num_windows * P. The offset ensures that no table entry is
+    the point at infinity, so every window costs exactly one mixed
+    Jacobian-affine addition regardless of the value of its digit.
+
+    When `constant_time` is requested, every entry of a window is read
+    and the wanted one is selected arithmetically, so neither the
+    sequence of operations nor the memory access pattern depends on the
+    scalar.
+
+    Args:
+        curve (EllipticCurve): The curve the point is on.
+        point (Point): The (affine) point to precompute multiples of.
+        window (int): Window size in bits.
+        rows (list): Precomputed table, as returned by `rows`. If not
+           provided, the table is computed.
+
+    Returns:
+        FixedBaseTable: the table.
+    """
+    MAGIC = b'two1fbt\x01'
+
+    def __init__(self, curve, point, window=4, rows=None):
+        self.curve = curve
+        self.point = Point(point.x, point.y)
+        self.window = window
+        self.num_windows = math.ceil(curve.nlen / window)
+        self.rows = rows if rows is not None else self._compute_rows()
+
+        offset = (ECPointJacobian(curve, point.x, point.y, 1) * self.num_windows).to_affine()
+        self._neg_offset = (offset.x, curve.p - offset.y)
+
+    def _compute_rows(self):
+        G = ECPointJacobian(self.curve, self.point.x, self.point.y, 1)
+        base = G
+        points = []
+        for i in range(self.num_windows):
+            pt = G
+            for j in range(2 ** self.window):
+                points.append(pt)
+                pt = pt + base
+            for _ in range(self.window):
+                base = base.double()
+
+        # Convert all points to affine with a single modular inversion.
+        affine = _jacobian_to_affine_batch([(pt.x, pt.y, pt.z) for pt in points], self.curve.p)
+
+        size = 2 ** self.window
+        return [affine[i * size:(i + 1) * size] for i in range(self.num_windows)]
+
+    def multiply(self, k, constant_time=False):
+        """ Computes k * P, where P is the point this table was built for.
+
+        Args:
+            k (int): The scalar to multiply by.
+            constant_time (bool): Whether to select table entries
+               without branching or indexing on the scalar.
+
+        Returns:
+            ECPointJacobian: k * P
+        """
+        curve = self.curve
+        p = curve.p
+        a = curve.a
+        k %= curve.n
+        mask = 2 ** self.window - 1
+
+        X, Y, Z = 0, 0, 0
+        for i, row in enumerate(self.rows):
+            d = (k >> (i * self.window)) & mask
+            if constant_time:
+                x2 = y2 = 0
+                for j, (ex, ey) in enumerate(row):
+                    m = -(j == d)
+                    x2 |= ex & m
+                    y2 |= ey & m
+            else:
+                x2, y2 = row[d]
+
+            if i == 0:
+                X, Y, Z = x2, y2, 1
+            else:
+                X, Y, Z = _jacobian_add_affine(X, Y, Z, x2, y2, p, a)
+
+        X, Y, Z = _jacobian_add_affine(X, Y, Z, self._neg_offset[0], self._neg_offset[1], p, a)
+        return ECPointJacobian(curve, X, Y, Z)
+
+    def to_bytes(self):
+        """ Serializes the table so that it can be cached on disk.
+
+        Returns:
+            bytes: The serialized table.
+        """
+        nbytes = math.ceil(self.curve.plen / 8)
+        out = [self.MAGIC,
+               bytes([self.window]),
+               self.curve.p.to_bytes(nbytes, 'big'),
+               self.point.x.to_bytes(nbytes, 'big'),
+               self.point.y.to_bytes(nbytes, 'big')]
+        for row in self.rows:
+            for x, y in row:
+                out.append(x.to_bytes(nbytes, 'big'))
+                out.append(y.to_bytes(nbytes, 'big'))
+
+        return b''.join(out)
+
+    @staticmethod
+    def from_bytes(curve, point, window, b):
+        """ Deserializes a table created by `to_bytes()`.
+
+        The table is checked to be for the right curve, point and
+        window size, every entry is checked to be on the curve and a
+        sample of entries is recomputed.
+
+        Args:
+            curve (EllipticCurve): The curve the point is on.
+            point (Point): The point the table is expected to be for.
+            window (int): The expected window size in bits.
+            b (bytes): The serialized table.
+
+        Returns:
+            FixedBaseTable: the table, or None if b is not a valid
+            table for the given parameters.
+        """
+        nbytes = math.ceil(curve.plen / 8)
+        num_windows = math.ceil(curve.nlen / window)
+        size = 2 ** window
+        header = (FixedBaseTable.MAGIC +
+                  bytes([window]) +
+                  curve.p.to_bytes(nbytes, 'big') +
+                  point.x.to_bytes(nbytes, 'big') +
+                  point.y.to_bytes(nbytes, 'big'))
+        if b[:len(header)] != header or len(b) != len(header) + num_windows * size * 2 * nbytes:
+            return None
+
+        pos = len(header)
+        rows = []
+        for i in range(num_windows):
+            row = []
+            for j in range(size):
+                x = int.from_bytes(b[pos:pos + nbytes], 'big')
+                y = int.from_bytes(b[pos + nbytes:pos + 2 * nbytes], 'big')
+                pos += 2 * nbytes
+                if not curve.is_on_curve(Point(x, y)):
+                    return None
+                row.append((x, y))
+            rows.append(row)
+
+        G = ECPointJacobian(curve, point.x, point.y, 1)
+        for _ in range(4):
+            i = random.randrange(num_windows)
+            j = random.randrange(size)
+            expected = (G * (j * 2 ** (window * i) + 1)).to_affine()
+            if rows[i][j] != (expected.x, expected.y):
+                return None
+
+        return FixedBaseTable(curve, point, window, rows)
+
+
 class EllipticCurve(EllipticCurveBase):
     """ A generic class for elliptic curves and operations on them.
 
@@ -503,6 +893,34 @@ class EllipticCurve(EllipticCurveBase):
         h (int): The curve co-factor.
         hash_function (function): The function to use for hashing messages.
     """
+    # Window size (in bits) of the precomputed table used for
+    # multiplications of the base point.
+    fixed_base_window = 4
+
+    # Whether operations involving the private key (public key
+    # computation and signing) should use constant-time table
+    # lookups. Verification and public key recovery only involve
+    # public values and always use the faster lookups.
+    constant_time = True
+
+    # wNAF window sizes used for the base point and for public keys
+    # in the joint multiplication performed when verifying.
+    g_wnaf_window = 8
+    q_wnaf_window = 5
+
+    # For curves with an efficiently computable endomorphism
+    # (x, y) -> (beta * x, y) = lambda * (x, y), the tuple
+    # (beta, lambda, a1, b1, a2, b2) where (a1, b1) and (a2, b2) are a
+    # short basis of the lattice of (k1, k2) with k1 + k2 * lambda = 0
+    # (mod n). Multiplications by public scalars then split the scalar
+    # in two halves of about half the length (GLV), halving the number
+    # of doublings. None if the curve has no such endomorphism.
+    endomorphism = None
+
+    # Directory in which to cache fixed-base tables across processes.
+    # If None, tables are only kept in memory.
+    table_cache_dir = os.environ.get("TWO1_ECDSA_TABLE_CACHE")
+
     @staticmethod
     def _extended_gcd(aa, bb):
         # https://en.wikipedia.org/wiki/Extended_Euclidean_algorithm
@@ -518,13 +936,20 @@ class EllipticCurve(EllipticCurveBase):
     def modinv(a, n):
         """ Provides the modular inverse of a wrt n.
 
-        This uses the extended Euclidean algorithm to compute the
-        the GCD of a, n.
+        This uses the builtin pow() where available, falling back on
+        the extended Euclidean algorithm to compute the GCD of a, n.
 
         Args:
             a (int): number to find modular inverse of
             n (int): modulus
         """
+        if _POW_MODINV:
+            try:
+                return pow(a, -1, n)
+            except ValueError:
+                # Not invertible: report the GCD below
+                pass
+
         # From http://rosettacode.org/wiki/Modular_inverse#Python
         g, x, y = EllipticCurve._extended_gcd(a, n)
         if g != 1:
@@ -579,6 +1004,124 @@ class EllipticCurve(EllipticCurveBase):
         """
         return ECPointJacobian(self, self.G.x, self.G.y, 1)
 
+    @property
+    def fixed_base_table(self):
+        """ Returns the precomputed table for the base point.
+
+        The table is built on first use (or loaded from
+        `table_cache_dir` if set) and then shared by all curve
+        objects with the same parameters.
+
+        Returns:
+            FixedBaseTable: the table for G.
+        """
+        key = (self.p, self.a, self.b, self.G.x, self.G.y, self.fixed_base_window)
+        table = _fixed_base_tables.get(key)
+        if table is None:
+            table = self._load_fixed_base_table()
+            _fixed_base_tables[key] = table
+
+        return table
+
+    def _load_fixed_base_table(self):
+        if not self.table_cache_dir:
+            return FixedBaseTable(self, self.G, self.fixed_base_window)
+
+        params = repr((self.p, self.a, self.b, self.G.x, self.G.y)).encode()
+        path = os.path.join(self.table_cache_dir, "fixed_base_%s_w%d.bin" % (
+            hashlib.sha256(params).hexdigest()[:16], self.fixed_base_window))
+
+        table = None
+        try:
+            with open(path, "rb") as f:
+                table = FixedBaseTable.from_bytes(self, self.G, self.fixed_base_window, f.read())
+        except OSError:
+            pass
+
+        if table is None:
+            table = FixedBaseTable(self, self.G, self.fixed_base_window)
+            try:
+                os.makedirs(self.table_cache_dir, exist_ok=True)
+                tmp_path = "%s.%d.tmp" % (path, os.getpid())
+                with open(tmp_path, "wb") as f:
+                    f.write(table.to_bytes())
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+
+        return table
+
+    @property
+    def base_point_odd_multiples(self):
+        """ Returns the odd multiples of the base point used for
+        the joint multiplication when verifying.
+
+        Returns:
+            list(tuple): (x, y) for G, 3G, 5G, ..., (2^(w-1) - 1)G
+            where w is `g_wnaf_window`.
+        """
+        key = ('wnaf', self.p, self.a, self.b, self.G.x, self.G.y, self.g_wnaf_window)
+        table = _fixed_base_tables.get(key)
+        if table is None:
+            table = _odd_multiples(self.G.x, self.G.y, 2 ** (self.g_wnaf_window - 2), self.p, self.a)
+            _fixed_base_tables[key] = table
+
+        return table
+
+    @property
+    def base_point_endomorphism_multiples(self):
+        """ Returns the odd multiples of lambda * G, the image of the
+        base point by the endomorphism.
+
+        Returns:
+            list(tuple): (x, y) for lambda * G, 3 * lambda * G, ...
+        """
+        key = ('wnaf-endo', self.p, self.a, self.b, self.G.x, self.G.y, self.g_wnaf_window)
+        table = _fixed_base_tables.get(key)
+        if table is None:
+            table = self._endomorphism_multiples(self.base_point_odd_multiples)
+            _fixed_base_tables[key] = table
+
+        return table
+
+    def _endomorphism_multiples(self, multiples):
+        """ Maps affine multiples of P to the same multiples of
+        lambda * P.
+        """
+        beta = self.endomorphism[0]
+        return [((beta * x) % self.p, y) for x, y in multiples]
+
+    def _split_scalar(self, k):
+        """ Splits k into (k1, k2) such that k = k1 + k2 * lambda
+        (mod n), where k1 and k2 (which may be negative) are about
+        half as long as n.
+
+        Args:
+            k (int): The scalar to split, in [0, n).
+
+        Returns:
+            tuple: (k1, k2)
+        """
+        n = self.n
+        _, _, a1, b1, a2, b2 = self.endomorphism
+        half = n >> 1
+        c1 = (b2 * k + half) // n
+        c2 = (-b1 * k + half) // n
+        return k - c1 * a1 - c2 * a2, -c1 * b1 - c2 * b2
+
+    def base_point_mul(self, k, constant_time=False):
+        """ Multiplies the base point by k using the fixed-base table.
+
+        Args:
+            k (int): The scalar to multiply by.
+            constant_time (bool): Whether k is secret and table lookups
+               should not depend on its value.
+
+        Returns:
+            ECPointJacobian: k * G
+        """
+        return self.fixed_base_table.multiply(k, constant_time)
+
     def y_from_x(self, x):
         """ Computes the y component corresponding to x.
 
@@ -630,10 +1173,111 @@ class EllipticCurve(EllipticCurveBase):
         Returns:
             ECPointAffine: The point representing the public key.
         """
-        public = (self.base_point * private_key).to_affine()
+        public = self.base_point_mul(private_key, self.constant_time).to_affine()
 
         return public
 
+    def public_key_batch(self, private_keys):
+        """ Returns the public keys for many private keys, converting
+        them to affine coordinates with a single modular inversion.
+
+        Args:
+            private_keys (list(int)): the private keys.
+
+        Returns:
+            list(ECPointAffine): The points representing the public keys.
+        """
+        return to_affine_batch([self.base_point_mul(k, self.constant_time) for k in private_keys])
+
+    def tweak_add_batch(self, items):
+        """ Computes tweak * G + P for many (tweak, P) pairs, as done
+        when deriving non-hardened BIP32 child public keys. The results
+        are converted to affine coordinates with a single modular
+        inversion.
+
+        Args:
+            items (list(tuple)): (tweak, point) tuples, where tweak is
+               an int and point an ECPointAffine.
+
+        Returns:
+            list(ECPointAffine): The resulting points, which may be the
+            point at infinity.
+        """
+        return to_affine_batch([self.base_point_mul(tweak, self.constant_time) + point.to_jacobian()
+                                for tweak, point in items])
+
+    def public_point_mul(self, point, k):
+        """ Multiplies a point by a public scalar.
+
+        The operations performed depend on the value of k, so this
+        must not be used with secret scalars (use `*`, which runs the
+        Montgomery ladder, instead). The multiplication uses wNAF and,
+        if the curve has an endomorphism, splits k in two halves that
+        are processed together.
+
+        Args:
+            point (ECPoint): The point to multiply.
+            k (int): The scalar to multiply by.
+
+        Returns:
+            ECPointJacobian: k * point
+        """
+        affine = point.to_affine()
+        k %= self.n
+        if affine.infinity or not k:
+            return ECPointJacobian(self, 0, 1, 0, True)
+
+        multiples = _odd_multiples(affine.x, affine.y, 2 ** (self.q_wnaf_window - 2), self.p, self.a)
+        X, Y, Z = self._multi_mul(self._scalar_terms(k, self.q_wnaf_window, multiples))
+        return ECPointJacobian(self, X, Y, Z)
+
+    def _scalar_terms(self, k, window, multiples, endo_multiples=None):
+        """ Returns the terms (scalar, window, multiples) whose sum is
+        k * P, given the odd multiples of P, for `_multi_mul()`.
+        """
+        if self.endomorphism is None:
+            return [(k, window, multiples)]
+
+        if endo_multiples is None:
+            endo_multiples = self._endomorphism_multiples(multiples)
+        k1, k2 = self._split_scalar(k)
+        return [(k1, window, multiples), (k2, window, endo_multiples)]
+
+    def _multi_mul(self, terms):
+        """ Computes the sum of k * P over terms in Jacobian
+        coordinates, using Strauss-Shamir over interleaved wNAF: all
+        the terms share the same doublings.
+
+        Args:
+            terms (list(tuple)): (k, w, multiples) where k is an integer
+               (possibly negative), w the wNAF window size and multiples
+               the affine P, 3P, ..., (2^(w-1) - 1)P.
+
+        Returns:
+            tuple: (X, Y, Z) of the result.
+        """
+        p = self.p
+        a = self.a
+
+        # The points to add after each doubling, by bit position
+        adds = []
+        for k, w, multiples in terms:
+            naf = _wnaf(abs(k), w)
+            if len(naf) > len(adds):
+                adds += [[] for _ in range(len(naf) - len(adds))]
+            for i, d in enumerate(naf):
+                if d:
+                    x, y = multiples[abs(d) >> 1]
+                    adds[i].append((x, y if (d > 0) == (k > 0) else p - y))
+
+        X, Y, Z = 0, 1, 0
+        for points in reversed(adds):
+            X, Y, Z = _jacobian_double(X, Y, Z, p, a)
+            for x, y in points:
+                X, Y, Z = _jacobian_add_affine(X, Y, Z, x, y, p, a)
+
+        return X, Y, Z
+
     def recover_public_key(self, message, signature, recovery_id=None):
         """ Recovers possibilities for the public key associated with the
         private key used to sign message and generate signature.
@@ -677,15 +1321,21 @@ class EllipticCurve(EllipticCurveBase):
                 y = ys[k]
                 if y & 0x1 != k:
                     y = ys[k ^ 1]
-                R = ECPointJacobian(self, r, y, 1)
-
-                if not (R * self.n).to_affine().infinity:
-                    continue
+                # With a co-factor of 1, every point on the curve has
+                # order n.
+                if self.h != 1:
+                    R = ECPointJacobian(self, x, y, 1)
+                    if not (R * self.n).to_affine().infinity:
+                        continue
 
                 z = int.from_bytes(self.hash_function(message).digest()[:num_bytes], 'big')
 
-                zG = self.base_point * z
-                pub_key = ((R * s - zG) * r_modinv).to_affine()
+                # Q = r^-1 (sR - zG), computed as one joint multiplication
+                u = (-z * r_modinv) % self.n
+                v = (s * r_modinv) % self.n
+                r_multiples = _odd_multiples(x, y, 2 ** (self.q_wnaf_window - 2), self.p, self.a)
+                X, Y, Z = self._joint_mul(u, v, r_multiples)
+                pub_key = ECPointJacobian(self, X, Y, Z).to_affine()
 
                 rv.append((pub_key, 2 * i + k))
 
@@ -695,15 +1345,13 @@ class EllipticCurve(EllipticCurveBase):
         hashed = self.hash_function(message).digest() if do_hash else message
         z = int.from_bytes(hashed, 'big')
 
-        G = self.base_point
-
         r = 0
         s = 0
         recovery_id = 0
         while r == 0 or s == 0:
             k = self._nonce_rfc6979(private_key, hashed) if secret is None else secret
 
-            p = (G * k).to_affine()
+            p = self.base_point_mul(k, self.constant_time).to_affine()
             assert self.h == 1
             recovery_id = 2 if p.x > self.n else 0
             recovery_id |= (p.y & 0x1)
@@ -731,24 +1379,122 @@ class EllipticCurve(EllipticCurveBase):
         Returns:
             bool: True if the signature is verified, False otherwise.
         """
-        r = signature.x
-        s = signature.y
+        return self._verify_batch([(message, signature, public_key)], do_hash)[0]
 
-        hashed = self.hash_function(message).digest() if do_hash else message
-        z = int.from_bytes(hashed, 'big')
+    def verify_batch(self, items, do_hash=True):
+        """ Verifies many signatures at once.
+
+        Every signature is checked by computing u*G + v*Q with a single
+        joint (Strauss-Shamir) multiplication over interleaved wNAF
+        representations of u and v. The x coordinate of the result is
+        compared in Jacobian coordinates, so no inversion is needed for
+        it. The inversions of all s values and the conversion of the
+        precomputed multiples of all public keys to affine coordinates
+        are each done with a single modular inversion for the whole
+        batch.
+
+        Args:
+            items (list(tuple)): (message, signature, public_key) tuples,
+               with the same types as the arguments to `verify()`.
+            do_hash (bool): True if the messages should be hashed prior
+               to verifying, False if not.
+
+        Returns:
+            list(bool): Whether each signature is verified.
+        """
+        return self._verify_batch(items, do_hash)
+
+    def _verify_batch(self, items, do_hash):
+        rv = [False] * len(items)
+
+        prepared = []
+        for i, (message, signature, public_key) in enumerate(items):
+            r = signature.x
+            s = signature.y
+
+            assert public_key.x >= 1 and public_key.x <= (self.n - 1)
+            assert public_key.y >= 1 and public_key.y <= (self.n - 1)
+
+            if not (0 < r < self.n and 0 < s < self.n):
+                continue
 
-        G = self.base_point
+            hashed = self.hash_function(message).digest() if do_hash else message
+            z = int.from_bytes(hashed, 'big')
+            prepared.append((i, r, s, z, (public_key.x, public_key.y)))
+
+        if not prepared:
+            return rv
+
+        s_invs = _batch_inverse([s for _, _, s, _, _ in prepared], self.n)
+
+        # Precompute the odd multiples of every distinct public key
+        q_count = 2 ** (self.q_wnaf_window - 2)
+        q_index = {}
+        q_points = []
+        two_qs = []
+        for _, _, _, _, q in prepared:
+            if q not in q_index:
+                q_index[q] = len(q_points)
+                q_points.append((q[0], q[1], 1))
+                two_qs.append(_jacobian_double(q[0], q[1], 1, self.p, self.a))
+
+        two_qs = _jacobian_to_affine_batch(two_qs, self.p)
+        q_multiples = []
+        for (x, y, z), two_q in zip(q_points, two_qs):
+            pt = (x, y, z)
+            q_multiples.append(pt)
+            for j in range(q_count - 1):
+                pt = _jacobian_add_affine(pt[0], pt[1], pt[2], two_q[0], two_q[1], self.p, self.a)
+                q_multiples.append(pt)
+        q_multiples = _jacobian_to_affine_batch(q_multiples, self.p)
+
+        for (i, r, s, z, q), w in zip(prepared, s_invs):
+            u = (z * w) % self.n
+            v = (r * w) % self.n
+
+            start = q_index[q] * q_count
+            X, Y, Z = self._joint_mul(u, v, q_multiples[start:start + q_count])
+            rv[i] = self._x_equals_r(X, Z, r)
 
-        assert public_key.x >= 1 and public_key.x <= (self.n - 1)
-        assert public_key.y >= 1 and public_key.y <= (self.n - 1)
+        return rv
 
-        w = self.modinv(s, self.n)
-        u = (z * w) % self.n
+    def _joint_mul(self, u, v, q_multiples):
+        """ Computes u*G + v*Q in Jacobian coordinates using
+        Strauss-Shamir over interleaved wNAF.
 
-        v = (r * w) % self.n
-        pt = (G * u + ECPointJacobian.from_affine(public_key) * v).to_affine()
+        If the curve has an endomorphism, u and v are each split in two
+        and the four half-length scalars are processed together.
 
-        return r == (pt.x % self.n)
+        Args:
+            u (int): scalar for the base point.
+            v (int): scalar for Q.
+            q_multiples (list(tuple)): affine Q, 3Q, 5Q, ...
+
+        Returns:
+            tuple: (X, Y, Z) of the result.
+        """
+        g_endo_multiples = None
+        if self.endomorphism is not None:
+            g_endo_multiples = self.base_point_endomorphism_multiples
+
+        terms = self._scalar_terms(u, self.g_wnaf_window, self.base_point_odd_multiples, g_endo_multiples)
+        terms += self._scalar_terms(v, self.q_wnaf_window, q_multiples)
+        return self._multi_mul(terms)
+
+    def _x_equals_r(self, X, Z, r):
+        """ Checks whether the x coordinate of the Jacobian point
+        (X, Y, Z), reduced mod n, equals r without converting the
+        point to affine coordinates.
+        """
+        if Z == 0:
+            return False
+
+        z2 = (Z * Z) % self.p
+        if (r * z2) % self.p == X:
+            return True
+
+        # x may be in [n, p)
+        return r + self.n < self.p and ((r + self.n) * z2) % self.p == X
 
 
 class p256(EllipticCurve):
@@ -786,6 +1532,17 @@ class secp256k1(EllipticCurve):
     Gy = 0x483ada7726a3c4655da4fbfc0e1108a8fd17b448a68554199c47d08ffb10d4b8
     H = 1
 
+    # (beta * x, y) = lambda * (x, y). See "Guide to Elliptic Curve
+    # Cryptography", Hankerson, Menezes, Vanstone, section 3.5.
+    BETA = 0x7ae96a2b657c07106e64479eac3434e99cf0497512f58995c1396c28719501ee
+    LAMBDA = 0x5363ad4cc05c30e0a5261c028812645a122e22ea20816678df02967c1b23bd72
+    A1 = 0x3086d221a7d46bcde86c90e49284eb15
+    B1 = -0xe4437ed6010e88286f547fa90abfe4c3
+    A2 = 0x114ca50f7a8e2f3f657c1108d9d44cfd8
+    B2 = 0x3086d221a7d46bcde86c90e49284eb15
+
+    endomorphism = (BETA, LAMBDA, A1, B1, A2, B2)
+
     def __init__(self):
         EllipticCurve.__init__(
             self,
@@ -0,0 +1,185 @@
+""" This submodule provides an ECDSA backend for the secp256k1 curve
+backed by libsecp256k1.
+
+Points and curve parameters are shared with the pure-Python backend
+(ecdsa_python), so the objects returned are interchangeable. The
+expensive operations (public key computation, signing, verification,
+public key recovery and point decompression) are delegated to
+libsecp256k1. Anything the library cannot handle (an explicit nonce,
+digests that are not 32 bytes long, ...) falls back to the pure-Python
+implementation.
+"""
+from two1.crypto.ecdsa_base import EllipticCurveBase
+from two1.crypto.ecdsa_base import Point
+from two1.crypto import ecdsa_python
+from two1.crypto import libsecp256k1 as lsecp
+
+ECPointAffine = ecdsa_python.ECPointAffine
+EllipticCurve = ecdsa_python.EllipticCurve
+
+
+class secp256k1(ecdsa_python.secp256k1):
+    """ Elliptic curve used in Bitcoin.
+
+    Note:
+        Signatures produced by this class are always lower-s
+        normalized, with the recovery id adjusted accordingly.
+    """
+
+    def y_from_x(self, x):
+        """ Computes the y component corresponding to x.
+
+        Since elliptic curves are symmetric about the x-axis,
+        the x component (and sign) is all that is required to determine
+        a point on the curve.
+
+        Args:
+            x (int): x component of the point.
+
+        Returns:
+            tuple: both possible y components of the point.
+        """
+        if x < 0 or x.bit_length() > 256:
+            return super().y_from_x(x)
+
+        pubkey = lsecp.pubkey_parse(b'\x02' + x.to_bytes(32, 'big'))
+        if pubkey is None:
+            return []
+
+        _, y = lsecp.pubkey_to_ints(pubkey)
+        # Put the even parity one first.
+        return [y, self.p - y]
+
+    def public_key(self, private_key):
+        """ Returns the public (verifying) key for a given private key.
+
+        Args:
+            private_key (int): the private key to derive the public key for.
+
+        Returns:
+            ECPointAffine: The point representing the public key.
+        """
+        pubkey = None
+        if 0 < private_key < self.n:
+            pubkey = lsecp.pubkey_create(private_key)
+        if pubkey is None:
+            return super().public_key(private_key)
+
+        x, y = lsecp.pubkey_to_ints(pubkey)
+        return ECPointAffine(self, x, y)
+
+    def recover_public_key(self, message, signature, recovery_id=None):
+        """ Recovers possibilities for the public key associated with the
+        private key used to sign message and generate signature.
+
+        Since there are multiple possibilities (two for curves with
+        co-factor = 1), each possibility that successfully verifies the
+        signature is returned.
+
+        Args:
+           message (bytes): The message that was signed.
+           signature (ECPointAffine): The point representing the signature.
+           recovery_id (int) (Optional): If provided, limits the valid x and y
+              point to only that described by the recovery_id.
+
+        Returns:
+           list(ECPointAffine): List of points representing valid public
+           keys that verify signature.
+        """
+        msg32 = self.hash_function(message).digest()
+        rec_ids = range(4) if recovery_id is None else [recovery_id]
+
+        rv = []
+        for rec_id in rec_ids:
+            pubkey = lsecp.recover(msg32, signature.x, signature.y, rec_id)
+            if pubkey is None:
+                continue
+            x, y = lsecp.pubkey_to_ints(pubkey)
+            rv.append((ECPointAffine(self, x, y), rec_id))
+
+        return rv
+
+    def _sign(self, message, private_key, do_hash=True, secret=None):
+        hashed = self.hash_function(message).digest() if do_hash else message
+
+        sig = None
+        if secret is None and len(hashed) == 32 and 0 < private_key < self.n:
+            sig = lsecp.sign_recoverable(hashed, private_key)
+        if sig is None:
+            return super()._sign(hashed, private_key, False, secret)
+
+        r, s, recovery_id = sig
+        return (Point(r, s), recovery_id)
+
+    def verify(self, message, signature, public_key, do_hash=True):
+        """ Verifies that signature was generated with a private key corresponding
+        to public key, operating on message.
+
+        Args:
+            message (bytes): The message to be signed
+            signature (Point): (r, s) representing the signature
+            public_key (ECPointAffine): ECPointAffine of the public key
+            do_hash (bool): True if the message should be hashed prior
+               to signing, False if not. This should always be left as
+               True except in special situations which require doing
+               the hash outside (e.g. handling Bitcoin bugs).
+
+        Returns:
+            bool: True if the signature is verified, False otherwise.
+        """
+        hashed = self.hash_function(message).digest() if do_hash else message
+        if len(hashed) != 32:
+            return super().verify(hashed, signature, public_key, False)
+
+        if public_key.infinity:
+            return False
+        pubkey = lsecp.pubkey_from_ints(public_key.x, public_key.y)
+        if pubkey is None:
+            return False
+
+        return lsecp.verify(hashed, signature.x, signature.y, pubkey)
+
+    def verify_batch(self, items, do_hash=True):
+        """ Verifies many signatures at once.
+
+        libsecp256k1 already uses a joint multiplication for each
+        verification, so each signature is simply verified in turn.
+
+        Args:
+            items (list(tuple)): (message, signature, public_key) tuples,
+               with the same types as the arguments to `verify()`.
+            do_hash (bool): True if the messages should be hashed prior
+               to verifying, False if not.
+
+        Returns:
+            list(bool): Whether each signature is verified.
+        """
+        return EllipticCurveBase.verify_batch(self, items, do_hash)
+
+    def public_key_batch(self, private_keys):
+        """ Returns the public keys for many private keys.
+
+        libsecp256k1 computes each public key faster than the batched
+        pure-Python implementation, so each key is computed in turn.
+
+        Args:
+            private_keys (list(int)): the private keys.
+
+        Returns:
+            list(ECPointAffine): The points representing the public keys.
+        """
+        return EllipticCurveBase.public_key_batch(self, private_keys)
+
+    def tweak_add_batch(self, items):
+        """ Computes tweak * G + P for many (tweak, P) pairs.
+
+        tweak * G is computed by libsecp256k1 for each pair in turn.
+
+        Args:
+            items (list(tuple)): (tweak, point) tuples, where tweak is
+               an int and point an ECPointAffine.
+
+        Returns:
+            list(ECPointAffine): The resulting points.
+        """
+        return EllipticCurveBase.tweak_add_batch(self, items)
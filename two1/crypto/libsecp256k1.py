@@ -0,0 +1,290 @@
+""" This submodule provides ctypes bindings to libsecp256k1.
+
+The library is located using, in order, the path in the
+TWO1_LIBSECP256K1 environment variable, ctypes.util.find_library()
+and the platform's default shared library names. The library must
+have been built with the recovery module enabled. An ImportError is
+raised if no usable library can be found.
+"""
+from ctypes import c_char_p
+from ctypes import c_int
+from ctypes import c_size_t
+from ctypes import c_uint
+from ctypes import c_void_p
+from ctypes import byref
+from ctypes import create_string_buffer
+from ctypes import CDLL
+from ctypes.util import find_library
+
+import os
+import platform
+
+# Flags from include/secp256k1.h
+SECP256K1_FLAGS_TYPE_CONTEXT = (1 << 0)
+SECP256K1_FLAGS_TYPE_COMPRESSION = (1 << 1)
+SECP256K1_FLAGS_BIT_CONTEXT_VERIFY = (1 << 8)
+SECP256K1_FLAGS_BIT_CONTEXT_SIGN = (1 << 9)
+SECP256K1_FLAGS_BIT_COMPRESSION = (1 << 8)
+
+SECP256K1_CONTEXT_VERIFY = SECP256K1_FLAGS_TYPE_CONTEXT | SECP256K1_FLAGS_BIT_CONTEXT_VERIFY
+SECP256K1_CONTEXT_SIGN = SECP256K1_FLAGS_TYPE_CONTEXT | SECP256K1_FLAGS_BIT_CONTEXT_SIGN
+
+SECP256K1_EC_COMPRESSED = SECP256K1_FLAGS_TYPE_COMPRESSION | SECP256K1_FLAGS_BIT_COMPRESSION
+SECP256K1_EC_UNCOMPRESSED = SECP256K1_FLAGS_TYPE_COMPRESSION
+
+# Sizes of the opaque structures
+PUBKEY_SIZE = 64
+SIGNATURE_SIZE = 64
+RECOVERABLE_SIGNATURE_SIZE = 65
+
+
+def _load_library():
+    candidates = []
+    env_path = os.environ.get("TWO1_LIBSECP256K1")
+    if env_path:
+        candidates.append(env_path)
+
+    found = find_library("secp256k1")
+    if found:
+        candidates.append(found)
+
+    sys_type = platform.system()
+    if sys_type == "Darwin":
+        candidates.append("libsecp256k1.dylib")
+    elif sys_type == "Linux":
+        candidates += ["libsecp256k1.so", "libsecp256k1.so.0"]
+    elif sys_type == "Windows":
+        candidates.append("libsecp256k1.dll")
+
+    for name in candidates:
+        try:
+            lib = CDLL(name)
+        except OSError:
+            continue
+        if hasattr(lib, "secp256k1_ecdsa_recover"):
+            return lib
+
+    raise ImportError("Could not find libsecp256k1 with the recovery module enabled.")
+
+
+libsecp256k1 = _load_library()
+ls = libsecp256k1
+
+ls.secp256k1_context_create.argtypes = [c_uint]
+ls.secp256k1_context_create.restype = c_void_p
+ls.secp256k1_context_destroy.argtypes = [c_void_p]
+ls.secp256k1_context_destroy.restype = None
+ls.secp256k1_context_randomize.argtypes = [c_void_p, c_char_p]
+ls.secp256k1_context_randomize.restype = c_int
+
+ls.secp256k1_ec_seckey_verify.argtypes = [c_void_p, c_char_p]
+ls.secp256k1_ec_seckey_verify.restype = c_int
+
+ls.secp256k1_ec_pubkey_create.argtypes = [c_void_p, c_char_p, c_char_p]
+ls.secp256k1_ec_pubkey_create.restype = c_int
+ls.secp256k1_ec_pubkey_parse.argtypes = [c_void_p, c_char_p, c_char_p, c_size_t]
+ls.secp256k1_ec_pubkey_parse.restype = c_int
+ls.secp256k1_ec_pubkey_serialize.argtypes = [c_void_p, c_char_p, c_void_p, c_char_p, c_uint]
+ls.secp256k1_ec_pubkey_serialize.restype = c_int
+
+ls.secp256k1_ecdsa_signature_parse_compact.argtypes = [c_void_p, c_char_p, c_char_p]
+ls.secp256k1_ecdsa_signature_parse_compact.restype = c_int
+ls.secp256k1_ecdsa_signature_normalize.argtypes = [c_void_p, c_char_p, c_char_p]
+ls.secp256k1_ecdsa_signature_normalize.restype = c_int
+ls.secp256k1_ecdsa_verify.argtypes = [c_void_p, c_char_p, c_char_p, c_char_p]
+ls.secp256k1_ecdsa_verify.restype = c_int
+
+ls.secp256k1_ecdsa_sign_recoverable.argtypes = [c_void_p, c_char_p, c_char_p, c_char_p, c_void_p, c_void_p]
+ls.secp256k1_ecdsa_sign_recoverable.restype = c_int
+ls.secp256k1_ecdsa_recoverable_signature_parse_compact.argtypes = [c_void_p, c_char_p, c_char_p, c_int]
+ls.secp256k1_ecdsa_recoverable_signature_parse_compact.restype = c_int
+ls.secp256k1_ecdsa_recoverable_signature_serialize_compact.argtypes = [c_void_p, c_char_p, c_void_p, c_char_p]
+ls.secp256k1_ecdsa_recoverable_signature_serialize_compact.restype = c_int
+ls.secp256k1_ecdsa_recover.argtypes = [c_void_p, c_char_p, c_char_p, c_char_p]
+ls.secp256k1_ecdsa_recover.restype = c_int
+
+
+def _new_context():
+    ctx = ls.secp256k1_context_create(SECP256K1_CONTEXT_SIGN | SECP256K1_CONTEXT_VERIFY)
+    if not ctx:
+        raise ImportError("secp256k1_context_create() failed.")
+
+    # Blind the signing context against side-channel attacks.
+    ls.secp256k1_context_randomize(ctx, os.urandom(32))
+
+    return c_void_p(ctx)
+
+
+# A single context is shared by the whole process. Once created
+# (and randomized), it is only ever read by the library, so it is
+# safe to use concurrently from multiple threads.
+context = _new_context()
+
+
+def pubkey_parse(data):
+    """ Parses a serialized (compressed or uncompressed) public key.
+
+    Args:
+        data (bytes): The serialized public key.
+
+    Returns:
+        ctypes buffer: The parsed public key or None if the
+        bytes do not represent a valid point on the curve.
+    """
+    pubkey = create_string_buffer(PUBKEY_SIZE)
+    if not ls.secp256k1_ec_pubkey_parse(context, pubkey, data, len(data)):
+        return None
+    return pubkey
+
+
+def pubkey_serialize(pubkey, compressed=False):
+    """ Serializes a parsed public key.
+
+    Args:
+        pubkey (ctypes buffer): The parsed public key.
+        compressed (bool): Whether or not to use the compressed encoding.
+
+    Returns:
+        bytes: The serialized public key.
+    """
+    length = c_size_t(33 if compressed else 65)
+    out = create_string_buffer(length.value)
+    flags = SECP256K1_EC_COMPRESSED if compressed else SECP256K1_EC_UNCOMPRESSED
+    ls.secp256k1_ec_pubkey_serialize(context, out, byref(length), pubkey, flags)
+    return out.raw[:length.value]
+
+
+def pubkey_from_ints(x, y):
+    """ Builds a parsed public key from affine coordinates.
+
+    Args:
+        x (int): x component of the point.
+        y (int): y component of the point.
+
+    Returns:
+        ctypes buffer: The parsed public key or None if (x, y)
+        is not a valid point on the curve.
+    """
+    if x < 0 or y < 0 or x.bit_length() > 256 or y.bit_length() > 256:
+        return None
+    return pubkey_parse(b'\x04' + x.to_bytes(32, 'big') + y.to_bytes(32, 'big'))
+
+
+def pubkey_to_ints(pubkey):
+    """ Extracts the affine coordinates of a parsed public key.
+
+    Args:
+        pubkey (ctypes buffer): The parsed public key.
+
+    Returns:
+        tuple: x and y components of the point.
+    """
+    data = pubkey_serialize(pubkey)
+    return int.from_bytes(data[1:33], 'big'), int.from_bytes(data[33:], 'big')
+
+
+def pubkey_create(private_key):
+    """ Computes the public key for a private key.
+
+    Args:
+        private_key (int): The private key.
+
+    Returns:
+        ctypes buffer: The parsed public key or None if the
+        private key is out of range.
+    """
+    if private_key <= 0 or private_key.bit_length() > 256:
+        return None
+    pubkey = create_string_buffer(PUBKEY_SIZE)
+    if not ls.secp256k1_ec_pubkey_create(context, pubkey, private_key.to_bytes(32, 'big')):
+        return None
+    return pubkey
+
+
+def signature_from_ints(r, s):
+    """ Builds a lower-s normalized signature from r and s.
+
+    Args:
+        r (int): r component of the signature.
+        s (int): s component of the signature.
+
+    Returns:
+        ctypes buffer: The parsed signature or None if r or s
+        are out of range.
+    """
+    if r < 0 or s < 0 or r.bit_length() > 256 or s.bit_length() > 256:
+        return None
+    sig = create_string_buffer(SIGNATURE_SIZE)
+    compact = r.to_bytes(32, 'big') + s.to_bytes(32, 'big')
+    if not ls.secp256k1_ecdsa_signature_parse_compact(context, sig, compact):
+        return None
+    # libsecp256k1 only verifies lower-s signatures.
+    ls.secp256k1_ecdsa_signature_normalize(context, sig, sig)
+    return sig
+
+
+def verify(msg32, r, s, pubkey):
+    """ Verifies an ECDSA signature over a 32-byte digest.
+
+    Args:
+        msg32 (bytes): The 32-byte message digest.
+        r (int): r component of the signature.
+        s (int): s component of the signature.
+        pubkey (ctypes buffer): The parsed public key.
+
+    Returns:
+        bool: True if the signature is valid, False otherwise.
+    """
+    sig = signature_from_ints(r, s)
+    if sig is None:
+        return False
+    return bool(ls.secp256k1_ecdsa_verify(context, sig, msg32, pubkey))
+
+
+def sign_recoverable(msg32, private_key):
+    """ Signs a 32-byte digest using RFC6979 deterministic nonces.
+
+    Args:
+        msg32 (bytes): The 32-byte message digest.
+        private_key (int): The private key.
+
+    Returns:
+        tuple: (r, s, recovery_id) or None if signing failed.
+    """
+    if private_key <= 0 or private_key.bit_length() > 256:
+        return None
+    sig = create_string_buffer(RECOVERABLE_SIGNATURE_SIZE)
+    if not ls.secp256k1_ecdsa_sign_recoverable(context, sig, msg32, private_key.to_bytes(32, 'big'),
+                                               None, None):
+        return None
+
+    out = create_string_buffer(64)
+    recid = c_int()
+    ls.secp256k1_ecdsa_recoverable_signature_serialize_compact(context, out, byref(recid), sig)
+    return int.from_bytes(out.raw[:32], 'big'), int.from_bytes(out.raw[32:], 'big'), recid.value
+
+
+def recover(msg32, r, s, recovery_id):
+    """ Recovers the public key from a signature and recovery id.
+
+    Args:
+        msg32 (bytes): The 32-byte message digest.
+        r (int): r component of the signature.
+        s (int): s component of the signature.
+        recovery_id (int): The recovery id (0 - 3).
+
+    Returns:
+        ctypes buffer: The parsed public key or None if no
+        public key could be recovered.
+    """
+    if r < 0 or s < 0 or r.bit_length() > 256 or s.bit_length() > 256:
+        return None
+    sig = create_string_buffer(RECOVERABLE_SIGNATURE_SIZE)
+    compact = r.to_bytes(32, 'big') + s.to_bytes(32, 'big')
+    if not ls.secp256k1_ecdsa_recoverable_signature_parse_compact(context, sig, compact, recovery_id):
+        return None
+
+    pubkey = create_string_buffer(PUBKEY_SIZE)
+    if not ls.secp256k1_ecdsa_recover(context, pubkey, sig, msg32):
+        return None
+    return pubkey
@@ -9,6 +9,9 @@ from ctypes import Structure
 
 import math
 import platform
+import threading
+
+from collections import OrderedDict
 
 
 class OpenSSLSignature(Structure):
@@ -21,13 +24,14 @@ if sys_type == "Darwin":
 elif sys_type == "Linux":
     libcrypto = CDLL('libcrypto.so')
 else:
-    raise Exception("Unsupported platform %s" % sys_type)
+    raise ImportError("Unsupported platform %s" % sys_type)
 
 lc = libcrypto
 
 lc.OBJ_sn2nid.argtypes = [c_char_p]
 lc.OBJ_sn2nid.restype = c_int
 
+lc.EC_KEY_new_by_curve_name.argtypes = [c_int]
 lc.EC_KEY_new_by_curve_name.restype = c_void_p
 lc.EC_KEY_generate_key.argtypes = [c_void_p]
 lc.EC_KEY_generate_key.restype = c_int
@@ -45,7 +49,10 @@ lc.EC_KEY_get0_group.argtypes = [c_void_p]
 lc.EC_KEY_get0_group.restype = c_void_p
 lc.EC_KEY_free.argtypes = [c_void_p]
 
+lc.EC_GROUP_new_by_curve_name.argtypes = [c_int]
 lc.EC_GROUP_new_by_curve_name.restype = c_void_p
+lc.EC_GROUP_get_curve_name.argtypes = [c_void_p]
+lc.EC_GROUP_get_curve_name.restype = c_int
 lc.EC_GROUP_get_order.argtypes = [c_void_p] * 3
 lc.EC_GROUP_get_order.restype = c_int
 lc.EC_GROUP_get_curve_GFp.argtypes = [c_void_p] * 5
@@ -99,6 +106,7 @@ lc.BN_mod_add.restype = c_int
 lc.BN_mod_inverse.argtypes = [c_void_p] * 4
 lc.BN_mod_inverse.restype = c_void_p
 lc.BN_free.argtypes = [c_void_p]
+lc.BN_clear.argtypes = [c_void_p]
 lc.BN_CTX_new.restype = c_void_p
 lc.BN_CTX_start.argtypes = [c_void_p]
 lc.BN_CTX_get.argtypes = [c_void_p]
@@ -109,6 +117,198 @@ lc.BN_CTX_free.argtypes = [c_void_p]
 lc.ERR_load_crypto_strings()
 
 
+class ObjectPool(object):
+    """ A pool of native OpenSSL objects of one kind, which are reused
+    rather than allocated and freed for every operation.
+
+    Pools are not thread-safe: use `thread_resources()` to get the
+    pools of the current thread.
+
+    Args:
+        new (function): Allocates a new object.
+        free (function): Frees an object.
+        max_size (int): Maximum number of idle objects kept. Objects
+            returned to a full pool are freed.
+
+    Returns:
+        ObjectPool: The pool.
+    """
+
+    def __init__(self, new, free, max_size=8):
+        self._new = new
+        self._free = free
+        self.max_size = max_size
+        self._idle = []
+        self.allocated = 0
+
+    def get(self):
+        """ Takes an object from the pool, allocating one if the pool
+        is empty.
+
+        Returns:
+            c_void_p: The object.
+        """
+        if self._idle:
+            return self._idle.pop()
+
+        self.allocated += 1
+        return self._new()
+
+    def put(self, obj):
+        """ Returns an object to the pool.
+
+        Args:
+            obj (c_void_p): An object obtained with `get()`.
+        """
+        if len(self._idle) < self.max_size:
+            self._idle.append(obj)
+        else:
+            self._free(obj)
+
+    def clear(self):
+        """ Frees all idle objects.
+        """
+        while self._idle:
+            self._free(self._idle.pop())
+
+
+class ThreadResources(object):
+    """ Native objects reused by the OpenSSL calls made from one thread.
+
+    This holds a BN_CTX, pools of BIGNUM, ECDSA_SIG, EC_KEY and
+    EC_POINT objects, and a bounded cache of EC_KEY objects set up with
+    public keys that were used for verification, keyed by curve and
+    public key bytes. All of them are freed when the thread exits.
+
+    Returns:
+        ThreadResources: The resources.
+    """
+    PUBLIC_KEY_CACHE_SIZE = 256
+
+    def __init__(self):
+        # Keep a reference to libcrypto so that it is still around
+        # when __del__ is called.
+        self._lc = lc
+        self.bn_ctx = c_void_p(lc.BN_CTX_new())
+        self.bns = ObjectPool(lambda: c_void_p(lc.BN_new()), lc.BN_free)
+        self.sigs = ObjectPool(lc.ECDSA_SIG_new, lc.ECDSA_SIG_free)
+        self._key_pools = {}
+        self._point_pools = {}
+        self._groups = {}
+        self.public_keys = OrderedDict()
+        self.public_key_hits = 0
+        self.public_key_misses = 0
+
+    def key_pool(self, curve_name):
+        """ Returns the pool of EC_KEY objects for a curve.
+
+        Args:
+            curve_name (int): The OpenSSL identifier of the curve.
+
+        Returns:
+            ObjectPool: The pool.
+        """
+        pool = self._key_pools.get(curve_name)
+        if pool is None:
+            pool = ObjectPool(lambda: c_void_p(lc.EC_KEY_new_by_curve_name(curve_name)),
+                              lc.EC_KEY_free)
+            self._key_pools[curve_name] = pool
+
+        return pool
+
+    def point_pool(self, group):
+        """ Returns the pool of EC_POINT objects for the curve of a
+        group.
+
+        Points are allocated with a group owned by this object, so
+        they can outlive group (e.g. the group of a freed EC_KEY).
+
+        Args:
+            group (c_void_p): An OpenSSL group (curve).
+
+        Returns:
+            ObjectPool: The pool.
+        """
+        curve_name = lc.EC_GROUP_get_curve_name(group)
+        pool = self._point_pools.get(curve_name)
+        if pool is None:
+            own_group = c_void_p(lc.EC_GROUP_new_by_curve_name(curve_name))
+            self._groups[curve_name] = own_group
+            pool = ObjectPool(lambda: c_void_p(lc.EC_POINT_new(own_group)),
+                              lc.EC_POINT_free)
+            self._point_pools[curve_name] = pool
+
+        return pool
+
+    def public_key(self, curve_name, x_bytes, y_bytes, infinity=False):
+        """ Returns an EC_KEY set up with a public key, from the cache
+        if the same key was used before in this thread.
+
+        Args:
+            curve_name (int): The OpenSSL identifier of the curve.
+            x_bytes (bytes): Big-endian, positive byte representation of x.
+            y_bytes (bytes): Big-endian, positive byte representation of y.
+            infinity (bool): True if the point is at infinity, False otherwise.
+
+        Returns:
+            c_void_p: An opaque pointer to the EC_KEY, or None if the
+                public key is invalid. The key belongs to the cache and
+                must not be freed by the caller.
+        """
+        cache_key = (curve_name, x_bytes, y_bytes, infinity)
+        key = self.public_keys.get(cache_key)
+        if key is not None:
+            self.public_keys.move_to_end(cache_key)
+            self.public_key_hits += 1
+            return key
+
+        self.public_key_misses += 1
+        key = c_void_p(lc.EC_KEY_new_by_curve_name(curve_name))
+        if not set_public_key_from_bytes(key, x_bytes, y_bytes, infinity):
+            lc.EC_KEY_free(key)
+            return None
+
+        self.public_keys[cache_key] = key
+        if len(self.public_keys) > self.PUBLIC_KEY_CACHE_SIZE:
+            _, evicted = self.public_keys.popitem(last=False)
+            lc.EC_KEY_free(evicted)
+
+        return key
+
+    def clear(self):
+        """ Frees all pooled and cached objects, except for the BN_CTX.
+        """
+        self.bns.clear()
+        self.sigs.clear()
+        for pool in list(self._key_pools.values()) + list(self._point_pools.values()):
+            pool.clear()
+        while self.public_keys:
+            self._lc.EC_KEY_free(self.public_keys.popitem()[1])
+
+    def __del__(self):
+        self.clear()
+        for group in self._groups.values():
+            self._lc.EC_GROUP_free(group)
+        self._lc.BN_CTX_free(self.bn_ctx)
+
+
+_thread_local = threading.local()
+
+
+def thread_resources():
+    """ Returns the native objects reused by the current thread.
+
+    Returns:
+        ThreadResources: The resources of the current thread.
+    """
+    res = getattr(_thread_local, 'resources', None)
+    if res is None:
+        res = ThreadResources()
+        _thread_local.resources = res
+
+    return res
+
+
 def get_curve_params(group):
     """ Retrieves all elliptic curve parameters
 
@@ -164,7 +364,21 @@ def new_key(curve_name, private_key=None):
             caller is responsible for freeing the key object.
     """
     k = c_void_p(lc.EC_KEY_new_by_curve_name(curve_name))
+    set_key(k, private_key)
+
+    return k
+
 
+def set_key(k, private_key=None):
+    """ Sets the private and public portions of an existing EC_KEY,
+    such as one taken from a `ThreadResources` pool.
+
+    Args:
+        k (c_void_p): A pointer to an EC_KEY object.
+        private_key (int): If not provided, a random key pair will be
+            generated. Otherwise, the key will be initiated with the
+            provided private key (and corresponding public key)
+    """
     if private_key is None:
         lc.EC_KEY_generate_key(k)
     else:
@@ -172,7 +386,17 @@ def new_key(curve_name, private_key=None):
         if not key_ok:
             raise ValueError("Key is not ok")
 
-    return k
+
+def clear_private_key(key):
+    """ Zeroes the private portion of key in place, before returning
+    the key to a pool.
+
+    Args:
+        key (c_void_p): A pointer to an EC_KEY object.
+    """
+    priv_key_bn = lc.EC_KEY_get0_private_key(key)
+    if priv_key_bn:
+        lc.BN_clear(priv_key_bn)
 
 
 def get_private_key_bytes(key):
@@ -222,23 +446,30 @@ def set_private_key_from_bytes(key, b):
         bool: Whether key passes OpenSSL's sanity checks after
             both private & public keys are set.
     """
-    priv_bn = bytes_to_bn(b)
+    res = thread_resources()
+    ctx = res.bn_ctx
+    lc.BN_CTX_start(ctx)
+    priv_bn = bytes_to_bn(b, c_void_p(lc.BN_CTX_get(ctx)))
 
     group = c_void_p(lc.EC_KEY_get0_group(key))
 
     lc.EC_KEY_set_private_key(key, priv_bn)
 
     # Now jam the public key
-    pub_pt = c_void_p(lc.EC_POINT_new(group))
+    points = res.point_pool(group)
+    pub_pt = points.get()
     lc.EC_POINT_mul(group,
                     pub_pt,
                     priv_bn,
                     c_void_p(),
                     c_void_p(),
-                    c_void_p())
+                    ctx)
     lc.EC_KEY_set_public_key(key, pub_pt)
 
-    lc.EC_POINT_free(pub_pt)
+    # EC_KEY_set_private_key() copied the private key
+    lc.BN_clear(priv_bn)
+    lc.BN_CTX_end(ctx)
+    points.put(pub_pt)
 
     return lc.EC_KEY_check_key(key)
 
@@ -341,21 +572,22 @@ def point_get_xy_bytes(group, pt):
         tuple: Containing the x bytes, y bytes and a boolean representing
             whether the point is at infinity or not.
     """
-    x_bn = c_void_p(lc.BN_new())
-    y_bn = c_void_p(lc.BN_new())
-    lc.EC_POINT_make_affine(group, pt, c_void_p(None))
+    ctx = thread_resources().bn_ctx
+    lc.BN_CTX_start(ctx)
+    x_bn = c_void_p(lc.BN_CTX_get(ctx))
+    y_bn = c_void_p(lc.BN_CTX_get(ctx))
+    lc.EC_POINT_make_affine(group, pt, ctx)
     lc.EC_POINT_get_affine_coordinates_GFp(group,
                                            pt,
                                            x_bn,
                                            y_bn,
-                                           c_void_p(None))
+                                           ctx)
     inf = bool(lc.EC_POINT_is_at_infinity(group, pt))
 
     x_bytes = bn_to_bytes(x_bn)
     y_bytes = bn_to_bytes(y_bn)
 
-    lc.BN_free(x_bn)
-    lc.BN_free(y_bn)
+    lc.BN_CTX_end(ctx)
 
     return (x_bytes, y_bytes, inf)
 
@@ -379,7 +611,7 @@ def point_get_xy_ints(group, pt):
     return (x, y, inf)
 
 
-def point_new_from_bytes(group, x_bytes, y_bytes, infinity=False):
+def point_new_from_bytes(group, x_bytes, y_bytes, infinity=False, pt=None):
     """ Creates a new OpenSSL EC_POINT from bytes.
 
     Args:
@@ -388,24 +620,33 @@ def point_new_from_bytes(group, x_bytes, y_bytes, infinity=False):
         x_bytes (bytes): Big-endian, positive byte representation of x.
         y_bytes (bytes): Big-endian, positive byte representation of y.
         infinity (bool): True if the point is at infinity, False otherwise.
+        pt (c_void_p): If not None, an existing EC_POINT to set
+            rather than allocating a new one.
 
     Returns:
         c_void_p: An opaque pointer to the newly constructed OpenSSL
-            EC_POINT object. The caller bears responsibility for freeing
-            the memory associated with the returned object.
+            EC_POINT object (or pt), or None if the coordinates are
+            invalid. The caller bears responsibility for freeing the
+            memory associated with the returned object.
     """
-    pt = c_void_p(lc.EC_POINT_new(group))
+    new = pt is None
+    if new:
+        pt = c_void_p(lc.EC_POINT_new(group))
 
-    x_bn = bytes_to_bn(x_bytes)
-    y_bn = bytes_to_bn(y_bytes)
+    ctx = thread_resources().bn_ctx
+    lc.BN_CTX_start(ctx)
+    x_bn = bytes_to_bn(x_bytes, c_void_p(lc.BN_CTX_get(ctx)))
+    y_bn = bytes_to_bn(y_bytes, c_void_p(lc.BN_CTX_get(ctx)))
 
     res = lc.EC_POINT_set_affine_coordinates_GFp(group,
                                                  pt,
                                                  x_bn,
                                                  y_bn,
-                                                 c_void_p(None))
+                                                 ctx)
+    lc.BN_CTX_end(ctx)
     if not res:
-        lc.EC_POINT_free(pt)
+        if new:
+            lc.EC_POINT_free(pt)
         return None
 
     if infinity:
@@ -414,7 +655,7 @@ def point_new_from_bytes(group, x_bytes, y_bytes, infinity=False):
     return pt
 
 
-def point_new_from_ints(group, x, y, infinity=False, size=32):
+def point_new_from_ints(group, x, y, infinity=False, size=32, pt=None):
     """ Creates a new OpenSSL EC_POINT from x & y integers.
 
     Args:
@@ -424,6 +665,8 @@ def point_new_from_ints(group, x, y, infinity=False, size=32):
         y_bytes (bytes): Big-endian, positive byte representation of y.
         infinity (bool): True if the point is at infinity, False otherwise.
         size (int): Maximal byte-length of x and y.
+        pt (c_void_p): If not None, an existing EC_POINT to set
+            rather than allocating a new one.
 
     Returns:
         c_void_p: An opaque pointer to the newly constructed OpenSSL
@@ -433,7 +676,7 @@ def point_new_from_ints(group, x, y, infinity=False, size=32):
     x_bytes = x.to_bytes(size, byteorder='big')
     y_bytes = y.to_bytes(size, byteorder='big')
 
-    return point_new_from_bytes(group, x_bytes, y_bytes, infinity)
+    return point_new_from_bytes(group, x_bytes, y_bytes, infinity, pt)
 
 
 def get_public_key_bytes(key):
@@ -486,8 +729,15 @@ def set_public_key_from_bytes(key, x_bytes, y_bytes, infinity):
         bool: True if the public key was set properly, False otherwise.
     """
     group = c_void_p(lc.EC_KEY_get0_group(key))
-    pub_pt = point_new_from_bytes(group, x_bytes, y_bytes, infinity)
+    points = thread_resources().point_pool(group)
+    pub_pt = points.get()
+    if point_new_from_bytes(group, x_bytes, y_bytes, infinity, pub_pt) is None:
+        points.put(pub_pt)
+        return False
+
+    # EC_KEY_set_public_key() copies the point
     res = lc.EC_KEY_set_public_key(key, pub_pt)
+    points.put(pub_pt)
 
     return bool(res)
 
@@ -514,7 +764,7 @@ def set_public_key_from_ints(key, x, y, infinity, size=32):
                                      infinity)
 
 
-def sig_new_from_bytes(r_bytes, s_bytes):
+def sig_new_from_bytes(r_bytes, s_bytes, sig=None):
     """ Creates a new OpenSSL ECDSA_SIG structure from r & s bytes.
 
     Args:
@@ -522,12 +772,15 @@ def sig_new_from_bytes(r_bytes, s_bytes):
             r component of the signature.
         s_bytes (bytes): Big-endian, positive byte-representation of the
             s component of the signature.
+        sig (POINTER(OpenSSLSignature)): If not None, an existing
+            ECDSA_SIG structure to set rather than allocating a new one.
 
     Returns:
         c_void_p: An opaque pointer to a new OpenSSL ECDSA_SIG structure
-            represented by the `OpenSSLSignature` class.
+            (or sig) represented by the `OpenSSLSignature` class.
     """
-    sig = lc.ECDSA_SIG_new()
+    if sig is None:
+        sig = lc.ECDSA_SIG_new()
 
     r_buf = create_string_buffer(r_bytes)
     s_buf = create_string_buffer(s_bytes)
@@ -537,17 +790,20 @@ def sig_new_from_bytes(r_bytes, s_bytes):
     return sig
 
 
-def sig_new_from_ints(r, s, size=32):
+def sig_new_from_ints(r, s, size=32, sig=None):
     """ Creates a new OpenSSL ECDSA_SIG structure from r & s integers.
 
     Args:
         r (int): R component of the signature.
         s (int): S component of the signature.
         size (int): Maximal byte-size of r & s.
+        sig (POINTER(OpenSSLSignature)): If not None, an existing
+            ECDSA_SIG structure to set rather than allocating a new one.
 
     Returns:
         c_void_p: An opaque pointer to a new OpenSSL ECDSA_SIG structure
-            represented by the `OpenSSLSignature` class.
+            (or sig) represented by the `OpenSSLSignature` class.
     """
     return sig_new_from_bytes(r_bytes=r.to_bytes(size, byteorder='big'),
-                              s_bytes=s.to_bytes(size, byteorder='big'))
+                              s_bytes=s.to_bytes(size, byteorder='big'),
+                              sig=sig)
@@ -2,6 +2,9 @@ import json
 import os
 import time
 
+from two1.bitcoin.bloom import BLOOM_UPDATE_ALL
+from two1.bitcoin.bloom import BloomFilter
+from two1.bitcoin.bloom import outpoint_bytes
 from two1.bitcoin.hash import Hash
 from two1.bitcoin.script import Script
 from two1.bitcoin.txn import CoinbaseInput
@@ -9,6 +12,7 @@ from two1.bitcoin.txn import TransactionInput
 from two1.bitcoin.txn import TransactionOutput
 from two1.bitcoin.txn import Transaction
 from two1.bitcoin.txn import UnspentTransactionOutput
+from two1.bitcoin.utils import address_to_key_hash
 from two1.bitcoin.utils import key_hash_to_address
 from two1.wallet.wallet_txn import WalletTransaction
 
@@ -27,6 +31,10 @@ class CacheManager(object):
     PROVISIONAL_MAX_DURATION = 60*60  # 60 minutes
     CACHE_VERSION = "0.3.0"
 
+    # Sizing of the bloom filter of the wallet's addresses and outputs
+    BLOOM_FP_RATE = 0.0001
+    BLOOM_MIN_ELEMENTS = 1000
+
     def __init__(self, testnet=False):
         self._address_cache = {}
         self._txns_by_addr = {}
@@ -40,6 +48,10 @@ class CacheManager(object):
 
         self._last_block = None
 
+        self._bloom_filter = None
+        self._bloom_capacity = 0
+        self._bloom_count = 0
+
         self.testnet = testnet
 
     @property
@@ -131,6 +143,7 @@ class CacheManager(object):
                                                        for k3, v3 in v2.items()}
                                              for k2, v2 in v1.items()}
                                    for k1, v1 in d['addresses'].items()}
+            self._bloom_filter = None
 
         if "txns" in d:
             now = time.time()
@@ -181,9 +194,90 @@ class CacheManager(object):
             self._address_cache[acct_index] = {0: {}, 1: {}}
 
         self._address_cache[acct_index][chain][index] = address
+        self._bloom_insert([address_to_key_hash(address)[1]])
 
         self._dirty = True
 
+    def _bloom_insert(self, items):
+        """ Inserts items into the bloom filter, if it has been built.
+            All insertions go through here, so that the filter never
+            holds more items than it was sized for.
+
+        Args:
+            items (list(bytes)): The items (hash160s or outpoints).
+        """
+        if self._bloom_filter is None or not items:
+            return
+        if self._bloom_count + len(items) > self._bloom_capacity:
+            # The false positive rate would degrade: rebuild a larger
+            # filter when it is next needed.
+            self._bloom_filter = None
+            return
+        for item in items:
+            self._bloom_filter.insert(item)
+        self._bloom_count += len(items)
+
+    @property
+    def bloom_filter(self):
+        """ A bloom filter matching the transactions that pay to, or
+            spend from, any address in the cache.
+
+        The filter holds the hash160 of every address in the cache and
+        the outpoint of every known output paying to one of them. It is
+        kept up to date as addresses and transactions are inserted.
+
+        Returns:
+            BloomFilter: The filter, with BLOOM_UPDATE_ALL set.
+        """
+        if self._bloom_filter is None:
+            addresses = [a for chains in self._address_cache.values()
+                         for chain_addrs in chains.values()
+                         for a in chain_addrs.values()]
+            outpoints = [(txid, i) for a in addresses
+                         for txid, indices in self._deposits_for_addr.get(a, {}).items()
+                         for i in indices]
+
+            count = len(addresses) + len(outpoints)
+            self._bloom_capacity = max(2 * count, self.BLOOM_MIN_ELEMENTS)
+            self._bloom_count = count
+            bf = BloomFilter(self._bloom_capacity, self.BLOOM_FP_RATE,
+                             flags=BLOOM_UPDATE_ALL)
+            for a in addresses:
+                bf.insert_address(a)
+            for txid, i in outpoints:
+                bf.insert_outpoint(Hash(txid), i)
+            self._bloom_filter = bf
+
+        return self._bloom_filter
+
+    def filter_relevant_txns(self, txns, addresses=[]):
+        """ Quickly discards the transactions that cannot involve any
+            address in the cache.
+
+        The transactions that are kept can then be inserted, which
+        requires walking all their scripts to find their addresses.
+        A few unrelated transactions may be kept, but none that involve
+        the wallet are discarded.
+
+        Args:
+            txns (list): List of Transaction objects, e.g. a data
+                provider response or the transactions of a block.
+            addresses (list): Addresses about to be inserted into the
+                cache, whose transactions should be kept too.
+
+        Returns:
+            list: The transactions that may involve the wallet, in the
+                order they were given.
+        """
+        # Screen with a copy of the filter. Matching inserts outpoints
+        # of outputs that may not belong to the wallet, and the
+        # addresses are only inserted into the filter with
+        # insert_address().
+        bf = BloomFilter.from_bytes(bytes(self.bloom_filter))
+        for a in addresses:
+            bf.insert_address(a)
+        return bf.filter_transactions(txns)
+
     def get_address(self, acct_index, chain, index):
         """ Returns the address for chain/index, if it exists in the cache
 
@@ -358,6 +452,14 @@ class CacheManager(object):
         self._insert_txid(txid, addrs['inputs'], 'input')
         self._insert_txid(txid, addrs['outputs'], 'output')
 
+        if self._bloom_filter is not None:
+            # Insert the outpoints of outputs paying to the wallet, so
+            # that transactions spending them match.
+            bf = self._bloom_filter
+            self._bloom_insert([outpoint_bytes(wallet_txn.hash, i)
+                                for i, out_addrs in enumerate(addrs['outputs'])
+                                if any(address_to_key_hash(a)[1] in bf for a in out_addrs)])
+
         self._dirty = True
 
     def _insert_txid(self, txid, addresses, inout):
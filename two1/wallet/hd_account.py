@@ -1,5 +1,7 @@
 import time
-from two1.bitcoin.crypto import HDKey, HDPrivateKey, HDPublicKey
+from two1.bitcoin.crypto import HDKey, HDPrivateKey, HDPublicKey, PublicKey
+from two1.bitcoin.crypto import derive_children
+from two1.bitcoin.utils import addresses_from_pubkeys
 from two1.wallet.wallet_txn import WalletTransaction
 
 
@@ -96,8 +98,7 @@ class HDAccount(object):
             while not found_last:
                 # Try a 2 * GAP_LIMIT at a go
                 end = addr_range + self.DISCOVERY_INCREMENT
-                addresses = {i: self.get_address(change, i)
-                             for i in range(addr_range, end)}
+                addresses = self.get_addresses(change, range(addr_range, end))
 
                 if self.data_provider.can_limit_by_height:
                     min_block = None if check_all else self._cache_manager.last_block
@@ -110,6 +111,15 @@ class HDAccount(object):
                         list(addresses.values()),
                         limit=10000)
 
+                # Only the transactions matching the wallet's bloom
+                # filter can involve it: skip walking the scripts of
+                # the others when inserting them.
+                response = {str(t['transaction'].hash): t['transaction']
+                            for addr in addresses.values() if addr in txns
+                            for t in txns[addr]}
+                relevant = set(str(t.hash) for t in self._cache_manager.filter_relevant_txns(
+                    list(response.values()), addresses.values()))
+
                 inserted_txns = set()
                 for i in sorted(addresses.keys()):
                     addr = addresses[i]
@@ -128,7 +138,7 @@ class HDAccount(object):
                         current_last = i
                         for t in txns[addr]:
                             txid = str(t['transaction'].hash)
-                            if txid not in inserted_txns:
+                            if txid not in inserted_txns and txid in relevant:
                                 wt = WalletTransaction.from_transaction(
                                     t['transaction'])
                                 wt.block = t['metadata']['block']
@@ -189,16 +199,45 @@ class HDAccount(object):
                 containing the chain (0 or 1) and child index in the chain.
                 Only found addresses are included in the dict.
         """
+        wanted = set(addresses)
         found = {}
         for change in [0, 1]:
-            for i in range(self.last_indices[change] + self.GAP_LIMIT + 1):
-                addr = self.get_address(change, i)
-
-                if addr in addresses:
+            if len(found) == len(wanted):
+                break
+            chain = self.get_addresses(change, range(self.last_indices[change] + self.GAP_LIMIT + 1))
+            for i, addr in chain.items():
+                if addr in wanted:
                     found[addr] = (self.index, change, i)
 
         return found
 
+    def get_addresses(self, change, indices, workers=1):
+        """ Returns many public addresses in a chain.
+
+        Addresses that are not in the wallet's address cache are
+        derived together with `derive_children()`.
+
+        Args:
+            change (bool): If True, returns addresses for change purposes,
+               otherwise returns addresses for payment.
+            indices (iterable(int)): Indices of the addresses in the chain.
+            workers (int): Number of workers to derive the addresses
+               with (see `derive_children()`). By default they are
+               derived in the calling thread.
+
+        Returns:
+            dict: Base58Check encoded addresses keyed by index.
+        """
+        c = int(change)
+        rv = {i: self._cache_manager.get_address(self.index, c, i) for i in indices}
+        missing = [i for i, addr in rv.items() if addr is None]
+        if missing:
+            pub_keys = [pk.compressed_bytes for pk in derive_children(self._chain_pub_keys[c], missing, workers)]
+            version = PublicKey.TESTNET_VERSION if self.testnet else PublicKey.MAINNET_VERSION
+            rv.update(zip(missing, addresses_from_pubkeys(pub_keys, version)))
+
+        return rv
+
     def get_public_key(self, change, n=-1):
         """ Returns a public key in the chain
 